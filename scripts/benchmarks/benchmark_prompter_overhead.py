@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: scripts/benchmarks/benchmark_prompter_overhead.py
+
+"""
+Benchmarks the per-call overhead of the Stage 2 session engines.
+
+Runs the same set of trials against the local mock chat-completions server
+(`src/mock_llm_server.py`) using (1) the default one-`subprocess.run`-per-trial path
+(`replication_manager.session_worker`), (2) the persistent `--serve` worker
+pool, and (3) the in-process engine. Because the endpoint answers with a fixed
+latency, the difference in mean time per call is the orchestration overhead.
+Optional failure injection (`--rate-429`, `--rate-500`, `--seed`) shows how
+each engine behaves when the provider throttles or fails.
+
+Usage:
+    python scripts/benchmarks/benchmark_prompter_overhead.py --calls 40 --workers 1
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from llm_session_engine import AsyncSessionEngine, PrompterWorkerPool  # noqa: E402
+from mock_llm_server import MockLLMServer, MockServerProfile  # noqa: E402
+from replication_manager import session_worker  # noqa: E402
+
+
+def _prepare_run_dir(base_dir, num_calls, endpoint):
+    """Creates a minimal run directory with queries and an archived config."""
+    run_dir = os.path.join(base_dir, "run")
+    queries_dir = os.path.join(run_dir, "session_queries")
+    os.makedirs(queries_dir)
+    for i in range(1, num_calls + 1):
+        with open(os.path.join(queries_dir, f"llm_query_{i:03d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Benchmark query {i}")
+    with open(os.path.join(run_dir, 'config.ini.archived'), 'w', encoding='utf-8') as f:
+        f.write(f"[LLM]\nmodel_name = benchmark/model\nmax_tokens = 16\ntemperature = 0.0\n"
+                f"[API]\napi_endpoint = {endpoint}\napi_timeout_seconds = 30\n")
+    return run_dir
+
+
+def _fresh_responses_dir(run_dir, label):
+    responses_dir = os.path.join(run_dir, f"session_responses_{label}")
+    os.makedirs(responses_dir)
+    return responses_dir
+
+
+def _run_subprocess_mode(run_dir, indices, workers):
+    from concurrent.futures import ThreadPoolExecutor
+    responses_dir = _fresh_responses_dir(run_dir, "subprocess")
+    script = os.path.join(SRC_DIR, 'llm_prompter.py')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda i: session_worker(i, run_dir, responses_dir, script, SRC_DIR, False), indices))
+
+
+def _run_pool_mode(run_dir, indices, workers):
+    responses_dir = _fresh_responses_dir(run_dir, "pool")
+    with PrompterWorkerPool(os.path.join(SRC_DIR, 'llm_prompter.py'), SRC_DIR, workers) as pool:
+        return list(pool.run(run_dir, responses_dir, indices))
+
+
+def _run_async_mode(run_dir, indices, workers):
+    responses_dir = _fresh_responses_dir(run_dir, "async")
+    return list(AsyncSessionEngine(run_dir, responses_dir, workers).run(indices))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call overhead of the Stage 2 session engines.")
+    parser.add_argument("--calls", type=int, default=40, help="Number of trials to run per mode.")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent sessions per mode.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed latency of the mocked endpoint in seconds.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of calls answered with HTTP 429.")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of calls answered with HTTP 500.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the injected failures.")
+    parser.add_argument("--modes", nargs='+', default=["subprocess", "pool", "async"],
+                        choices=["subprocess", "pool", "async"], help="Engines to benchmark.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    profile = MockServerProfile(latency_median=args.latency, rate_429=args.rate_429, rate_500=args.rate_500,
+                                retry_after=0, seed=args.seed)
+    server = MockLLMServer(profile).start()
+    endpoint = server.endpoint
+    os.environ["OPENROUTER_API_KEY"] = os.environ.get("OPENROUTER_API_KEY", "benchmark-key")
+
+    runners = {"subprocess": _run_subprocess_mode, "pool": _run_pool_mode, "async": _run_async_mode}
+    indices = list(range(1, args.calls + 1))
+
+    print(f"Mock endpoint latency: {args.latency:.3f}s | calls: {args.calls} | workers: {args.workers}\n")
+    print(f"{'Mode':<12}{'Wall (s)':>10}{'Per call (ms)':>16}{'Overhead/call (ms)':>20}{'Failures':>10}")
+    with tempfile.TemporaryDirectory(prefix="prompter_bench_") as tmp:
+        run_dir = _prepare_run_dir(tmp, args.calls, endpoint)
+        for mode in args.modes:
+            start = time.perf_counter()
+            results = runners[mode](run_dir, indices, args.workers)
+            wall = time.perf_counter() - start
+            failures = sum(1 for r in results if not r[1])
+            per_call_ms = wall / args.calls * args.workers * 1000
+            overhead_ms = per_call_ms - args.latency * 1000
+            print(f"{mode:<12}{wall:>10.2f}{per_call_ms:>16.1f}{overhead_ms:>20.1f}{failures:>10}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
+
+# === End of scripts/benchmarks/benchmark_prompter_overhead.py ===
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: scripts/benchmarks/benchmark_response_parser.py
+
+"""
+Benchmarks the score-table search of Stage 3 (Process LLM Responses).
+
+Times `process_llm_responses.find_score_block` (one classification per line)
+against the former window-by-window scan (every candidate start re-splits up
+to k lines) on a corpus of responses, and checks that both find the same
+block in every response. The corpus is either the real
+`session_responses/llm_response_NNN.txt` files below `--responses` (k is
+read from each trial's query, as Stage 3 does) or, by default, a synthetic
+set of chatty answers whose reasoning lines partially look like score rows.
+
+Usage:
+    python scripts/benchmarks/benchmark_response_parser.py --responses output/new_experiments
+    python scripts/benchmarks/benchmark_response_parser.py --synthetic 500 --k 14
+"""
+
+# === Start of scripts/benchmarks/benchmark_response_parser.py ===
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from process_llm_responses import find_score_block, get_list_a_details_from_query  # noqa: E402
+
+RESPONSE_PATTERN = re.compile(r'^llm_response_(\d+)\.txt$')
+
+
+def windowed_find_score_block(all_lines, k_value):
+    """The former parser: tries every start line and re-splits its k-line window."""
+    for start_idx in range(len(all_lines) - k_value + 1):
+        valid_rows = []
+        for line in all_lines[start_idx:start_idx + k_value]:
+            parts = re.sub(r'\t*\|\t*', ' ', line).replace('\t', ' ').split()
+            if len(parts) < k_value:
+                break
+            try:
+                valid_rows.append([float(part) for part in parts[-k_value:]])
+            except ValueError:
+                break
+        if len(valid_rows) == k_value:
+            return start_idx, valid_rows
+    return None
+
+
+def load_real_corpus(root):
+    """Returns `(lines, k)` for every response below `root` whose query is still available."""
+    corpus = []
+    for dirpath, _, filenames in os.walk(root):
+        if os.path.basename(dirpath) != "session_responses":
+            continue
+        queries_dir = os.path.join(os.path.dirname(dirpath), "session_queries")
+        for name in sorted(filenames):
+            match = RESPONSE_PATTERN.match(name)
+            if not match:
+                continue
+            k, _ = get_list_a_details_from_query(os.path.join(queries_dir, f"llm_query_{match.group(1)}.txt"))
+            if not k:
+                continue
+            with open(os.path.join(dirpath, name), 'r', encoding='utf-8') as f:
+                corpus.append(([line.strip() for line in f.read().split('\n') if line.strip()], k))
+    return corpus
+
+
+def build_synthetic_corpus(count, k, seed=0):
+    """Builds chatty responses: reasoning with partial score rows, then the k x k table, then a trailer."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        lines = ["Let me work through each person and description in turn."]
+        for i in range(rng.randint(10, 60)):
+            # Reasoning lines that end in a few (fewer than k) numbers qualify for part of a window.
+            numbers = " ".join(f"{rng.random():.2f}" for _ in range(rng.randint(1, k)))
+            lines.append(f"Person {i % k + 1} (19{rng.randint(10, 99)}) compared with descriptions: {numbers}")
+        lines.append("| Name | " + " | ".join(f"ID {j}" for j in range(1, k + 1)) + " |")
+        for i in range(k):
+            lines.append(f"| Person {i + 1} (1900) | " + " | ".join(f"{rng.random():.2f}" for _ in range(k)) + " |")
+        lines += ["Note: these scores reflect an overall impression of each description."] * rng.randint(1, 5)
+        corpus.append((lines, k))
+    return corpus
+
+
+def _time(finder, corpus, repeats):
+    best, results = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = [finder(lines, k) for lines, k in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Stage 3 score-table search.")
+    parser.add_argument("--responses", help="Directory searched for session_responses/llm_response_NNN.txt files.")
+    parser.add_argument("--synthetic", type=int, default=500, help="Synthetic responses used without --responses.")
+    parser.add_argument("--k", type=int, default=14, help="Group size of the synthetic responses.")
+    parser.add_argument("--repeats", type=int, default=5, help="Passes per parser; the fastest is reported.")
+    args = parser.parse_args()
+
+    corpus = load_real_corpus(args.responses) if args.responses else build_synthetic_corpus(args.synthetic, args.k)
+    if not corpus:
+        print("No responses with readable queries were found.")
+        return 1
+    source = args.responses or f"synthetic, k={args.k}"
+    print(f"Corpus: {len(corpus)} responses ({source}), {sum(len(lines) for lines, _ in corpus)} lines")
+
+    windowed_time, windowed_results = _time(windowed_find_score_block, corpus, args.repeats)
+    single_pass_time, single_pass_results = _time(find_score_block, corpus, args.repeats)
+    identical = windowed_results == single_pass_results
+    print(f"  windowed scan: {windowed_time * 1000:8.1f} ms")
+    print(f"  single pass:   {single_pass_time * 1000:8.1f} ms  ({windowed_time / single_pass_time:.1f}x)")
+    print(f"  identical blocks: {'yes' if identical else 'NO'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# === End of scripts/benchmarks/benchmark_response_parser.py ===
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: scripts/benchmarks/benchmark_response_processing.py
+
+"""
+Benchmarks the trial loop and post-write check of Stage 3 (Process LLM Responses).
+
+Builds a synthetic replication (`--trials` k x k trials with chatty
+responses) in a temporary directory and times:
+-   parsing every trial in-process against a pool of `--workers` processes,
+    checking that both produce identical outcomes in the same order, and
+-   the former read-back validation of `all_scores.txt`
+    (`validate_all_scores_file_content`) against the checksum / in-memory
+    check (`verify_scores_file`).
+
+Usage:
+    python scripts/benchmarks/benchmark_response_processing.py --trials 1000 --k 10 --workers 4
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import process_llm_responses as plr  # noqa: E402
+
+
+def build_replication(root, trials, k, rng):
+    """Writes queries and responses for `trials` trials and returns the response tasks."""
+    queries_dir = os.path.join(root, "session_queries")
+    responses_dir = os.path.join(root, "session_responses")
+    os.makedirs(queries_dir)
+    os.makedirs(responses_dir)
+    names = [f"Person {i} ({1900 + i})" for i in range(k)]
+    for index in range(1, trials + 1):
+        with open(os.path.join(queries_dir, f"llm_query_{index:03d}.txt"), 'w', encoding='utf-8') as f:
+            f.write("LIST A\n" + "\n".join(names) + "\n\nLIST B\n" + "\n".join(f"ID {i + 1}: desc" for i in range(k)))
+        reasoning = [f"Step {i}: comparing {rng.random():.2f} with {rng.random():.2f} for ID {i}" for i in range(3 * k)]
+        table = ["Name\t" + "\t".join(f"ID {i + 1}" for i in range(k))]
+        table += [name + "\t" + "\t".join(f"{rng.random():.2f}" for _ in range(k)) for name in names]
+        with open(os.path.join(responses_dir, f"llm_response_{index:03d}.txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(reasoning + ["```"] + table + ["```", "Hope this helps."]))
+    return [(os.path.join(responses_dir, f"llm_response_{index:03d}.txt"), queries_dir, False, True)
+            for index in range(1, trials + 1)]
+
+
+def time_outcomes(tasks, workers):
+    start = time.perf_counter()
+    outcomes = list(plr.iter_response_outcomes(tasks, workers, logging.WARNING))
+    return time.perf_counter() - start, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Stage 3 trial parsing and post-write validation.")
+    parser.add_argument("--trials", type=int, default=1000, help="Trials in the synthetic replication.")
+    parser.add_argument("--k", type=int, default=10, help="Group size of every trial.")
+    parser.add_argument("--workers", type=int, default=0, help="Pool size to compare against (0 = one per CPU, at most 8).")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    workers = args.workers if args.workers > 0 else min(os.cpu_count() or 1, 8)
+
+    with tempfile.TemporaryDirectory(prefix="stage3_bench_") as root:
+        tasks = build_replication(root, args.trials, args.k, random.Random(args.seed))
+
+        seq_time, seq_outcomes = time_outcomes(tasks, 1)
+        pool_time, pool_outcomes = time_outcomes(tasks, workers)
+        identical = len(seq_outcomes) == len(pool_outcomes) and all(
+            a[0] == b[0] and a[2:] == b[2:] and np.array_equal(a[1], b[1]) for a, b in zip(seq_outcomes, pool_outcomes))
+        print(f"{args.trials} trials, k={args.k}, {os.cpu_count()} CPU(s)")
+        print(f"  parse in-process:        {seq_time * 1000:9.1f} ms")
+        print(f"  parse with {workers} worker(s):  {pool_time * 1000:9.1f} ms   (identical outcomes: {identical})")
+
+        matrices = [outcome[1] for outcome in seq_outcomes]
+        matrix_map = {outcome[0]: outcome[1] for outcome in seq_outcomes}
+        scores_path = os.path.join(root, "all_scores.txt")
+        text = plr.format_score_matrices(matrices, ".2f")
+        with open(scores_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        start = time.perf_counter()
+        old_ok = plr.validate_all_scores_file_content(scores_path, matrix_map, args.k)
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        new_ok = plr.verify_scores_file(scores_path, text, matrices)
+        new_time = time.perf_counter() - start
+        print(f"  read-back validation:    {old_time * 1000:9.1f} ms   (passed: {old_ok})")
+        print(f"  checksum + in-memory:    {new_time * 1000:9.1f} ms   (passed: {new_ok})")
+
+
+if __name__ == "__main__":
+    main()
+
+# === End of scripts/benchmarks/benchmark_response_processing.py ===
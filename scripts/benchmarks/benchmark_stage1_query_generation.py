@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: scripts/benchmarks/benchmark_stage1_query_generation.py
+
+"""
+Benchmarks Stage 1 (Build LLM Queries) with in-process and subprocess query generation.
+
+Builds the same replication twice with `build_llm_queries.py`, once with the
+default in-process generator and once with `--qgen_subprocess` (one
+`query_generator.py` process and temporary directory per trial), using fixed
+seeds and a synthetic personalities database. Reports the wall time of each
+mode and checks that both produced byte-identical `session_queries` files.
+
+Usage:
+    python scripts/benchmarks/benchmark_stage1_query_generation.py --trials 80 --k 10
+"""
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+BUILD_SCRIPT = os.path.join(PROJECT_ROOT, 'src', 'build_llm_queries.py')
+
+
+def _write_personalities_db(path, rows):
+    """Writes a synthetic personalities database with the columns Stage 1 expects."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Index\tidADB\tName\tBirthYear\tDescriptionText\n")
+        for i in range(1, rows + 1):
+            f.write(f"{i}\t{1000 + i}\tPerson {i}\t{1900 + i % 100}\t"
+                    f"Person {i} is described by a paragraph of neutral personality text, number {i}.\n")
+
+
+def _build(run_dir, db_path, args, subprocess_mode):
+    cmd = [sys.executable, BUILD_SCRIPT, "--run_output_dir", run_dir, "-m", str(args.trials), "-k", str(args.k),
+           "--master_personalities_file", db_path, "--base_seed", "1", "--qgen_base_seed", "2", "--quiet"]
+    if subprocess_mode:
+        cmd.append("--qgen_subprocess")
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=PROJECT_ROOT)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Stage 1 query generation (in-process vs. subprocess).")
+    parser.add_argument("--trials", type=int, default=80, help="Trials (m) per replication.")
+    parser.add_argument("--k", type=int, default=10, help="Group size (k).")
+    parser.add_argument("--repeats", type=int, default=1, help="Builds per mode; the fastest is reported.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="stage1_bench_") as tmp:
+        db_path = os.path.join(tmp, "personalities_db.txt")
+        _write_personalities_db(db_path, args.trials * args.k * 6)
+        timings = {}
+        for label, subprocess_mode in (("subprocess", True), ("in-process", False)):
+            runs = []
+            for repeat in range(args.repeats):
+                run_dir = os.path.join(tmp, f"run_{label}_{repeat}")
+                runs.append(_build(run_dir, db_path, args, subprocess_mode))
+            timings[label] = min(runs)
+
+        queries_a = os.path.join(tmp, "run_subprocess_0", "session_queries")
+        queries_b = os.path.join(tmp, "run_in-process_0", "session_queries")
+        names = sorted(os.listdir(queries_a))
+        _, mismatch, errors = filecmp.cmpfiles(queries_a, queries_b, names, shallow=False)
+        identical = not mismatch and not errors and names == sorted(os.listdir(queries_b))
+
+    print(f"Trials: {args.trials} | k: {args.k}\n")
+    print(f"{'Mode':<12}{'Wall (s)':>10}{'Per trial (ms)':>16}")
+    for label, wall in timings.items():
+        print(f"{label:<12}{wall:>10.2f}{wall / args.trials * 1000:>16.1f}")
+    print(f"\nSpeed-up: {timings['subprocess'] / timings['in-process']:.1f}x | "
+          f"identical output: {'yes' if identical else 'NO (' + ', '.join(mismatch + errors) + ')'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# === End of scripts/benchmarks/benchmark_stage1_query_generation.py ===
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: scripts/benchmarks/benchmark_trial_evaluation.py
+
+"""
+Benchmarks the trial evaluation of Stage 4 (Analyze LLM Performance).
+
+Times one `analyze_llm_performance.evaluate_single_test` call per trial (the
+former loop in `main`) against `evaluate_all_tests` on the whole m x k x k
+tensor, with the same NumPy seed for both. It checks that every per-trial
+result and the state of the random stream afterwards are identical. Scores
+are rounded to `--decimals` places, so rows with tied maxima (which need
+random tie-breaking) are common.
+
+Usage:
+    python scripts/benchmarks/benchmark_trial_evaluation.py --m 1000 --k 30
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from analyze_llm_performance import evaluate_all_tests, evaluate_single_test  # noqa: E402
+
+
+def same_results(batched, per_trial):
+    for actual, expected in zip(batched, per_trial):
+        for key, value in expected.items():
+            if not np.array_equal(np.asarray(actual[key]), np.asarray(value)):
+                return False
+    return len(batched) == len(per_trial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-trial against batched trial evaluation.")
+    parser.add_argument("--m", type=int, default=1000, help="Number of trials.")
+    parser.add_argument("--k", type=int, default=30, help="Group size.")
+    parser.add_argument("--decimals", type=int, default=2, help="Decimals the synthetic scores are rounded to.")
+    parser.add_argument("--top_k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tensor = np.round(rng.random((args.m, args.k, args.k)), args.decimals)
+    mappings = [list(rng.permutation(args.k) + 1) for _ in range(args.m)]
+    tied_rows = int(((tensor == tensor.max(axis=2, keepdims=True)).sum(axis=2) > 1).sum())
+
+    np.random.seed(args.seed)
+    start = time.perf_counter()
+    per_trial = [evaluate_single_test(matrix, mapping, args.k, args.top_k) for matrix, mapping in zip(tensor, mappings)]
+    per_trial_time = time.perf_counter() - start
+    per_trial_next_draw = np.random.random()
+
+    np.random.seed(args.seed)
+    start = time.perf_counter()
+    batched = evaluate_all_tests(tensor, mappings, args.k, args.top_k)
+    batched_time = time.perf_counter() - start
+    batched_next_draw = np.random.random()
+
+    print(f"m={args.m}, k={args.k}, {tied_rows} of {args.m * args.k} rows with a tied maximum")
+    print(f"  per-trial evaluation: {per_trial_time * 1000:9.1f} ms")
+    print(f"  batched evaluation:   {batched_time * 1000:9.1f} ms   ({per_trial_time / batched_time:.1f}x)")
+    print(f"  identical results: {same_results(batched, per_trial)}, "
+          f"identical random stream: {per_trial_next_draw == batched_next_draw}")
+
+
+if __name__ == "__main__":
+    main()
+
+# === End of scripts/benchmarks/benchmark_trial_evaluation.py ===
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/adaptive_concurrency.py
+
+"""
+Adaptive (AIMD) Concurrency Controller for Stage 2.
+
+A fixed `max_parallel_sessions` is either too low for fast providers or high
+enough to trigger rate limiting (HTTP 429) and failed trials that then need a
+repair cycle. With `[LLM] adaptive_concurrency = true`, `replication_manager.py`
+routes every trial through an `AdaptiveConcurrencyLimiter`, which adjusts the
+number of in-flight calls at runtime using additive-increase /
+multiplicative-decrease:
+
+-   **Additive Increase**: After a full window of successful calls (one per
+    currently allowed slot) at normal latency, the limit grows by one.
+-   **Multiplicative Decrease**: An HTTP 429, a 5xx, a timeout (including
+    ones absorbed by the call-layer retry policy), or a smoothed
+    latency above `adaptive_latency_tolerance` times the best latency seen so
+    far multiplies the limit by `adaptive_decrease_factor`. Further decreases
+    are ignored for one smoothed call duration, so a single burst of errors
+    counts as one congestion event.
+-   **Retry-After**: A `Retry-After` header pauses all new calls until the
+    indicated time has passed.
+-   **Bounded and Logged**: The limit always stays between the configured
+    minimum and maximum. Every adjustment is logged and, when a log path is
+    given, appended to a TSV file in the run directory for per-provider tuning.
+"""
+
+# === Start of src/adaptive_concurrency.py ===
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Weight of the newest observation in the smoothed (EWMA) call latency.
+LATENCY_SMOOTHING = 0.2
+
+
+def _congestion_signal(status: Optional[int], timeout: Optional[bool]) -> Optional[str]:
+    """Names the congestion signal in a call outcome, or returns None if there is none."""
+    if status == 429 or (status is not None and status >= 500):
+        return f"HTTP {status}"
+    if timeout:
+        return "timeout"
+    return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """A resizable semaphore whose limit follows AIMD on observed call outcomes."""
+
+    def __init__(self, initial_limit: int, min_limit: int = 1, max_limit: Optional[int] = None,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0,
+                 log_path: Optional[str] = None, clock: Callable[[], float] = time.monotonic):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit if max_limit is not None else initial_limit))
+        self.limit = min(max(int(initial_limit), self.min_limit), self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.log_path = log_path
+        self.adjustments: List[Tuple[float, int, int, str]] = []
+
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._successes_in_window = 0
+        self._smoothed_latency: Optional[float] = None
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease: Optional[float] = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        """Blocks until a slot is free and no `Retry-After` pause is active."""
+        with self._cond:
+            while True:
+                now = self._clock()
+                if self._in_flight < self.limit and now >= self._paused_until:
+                    self._in_flight += 1
+                    return
+                wait_for = self._paused_until - now if self._paused_until > now else None
+                self._cond.wait(wait_for)
+
+    def release(self, success: bool, duration: float, report: Optional[Dict[str, Any]] = None):
+        """Frees a slot and adapts the limit to the outcome of the call that held it."""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._observe(success, duration, report or {})
+            self._cond.notify_all()
+
+    def wrap(self, run_query: Callable[..., tuple]) -> Callable[[int], tuple]:
+        """
+        Wraps `run_query(index, call_report)` so that each call holds one slot.
+
+        The wrapped function returns the engine's usual
+        `(index, success, error_details, duration)` result.
+        """
+        def _limited(index: int):
+            self.acquire()
+            report: Dict[str, Any] = {}
+            result = None
+            try:
+                result = run_query(index, report)
+                return result
+            finally:
+                success = bool(result and result[1])
+                duration = result[3] if result else 0.0
+                self.release(success, duration, report)
+        return _limited
+
+    # --- Internal state machine (called with the condition held) ---
+
+    def _observe(self, success: bool, duration: float, report: Dict[str, Any]):
+        now = self._clock()
+        status = report.get("status")
+        retry_after = report.get("retry_after")
+
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + float(retry_after))
+            self._record(self.limit, self.limit, f"Retry-After {float(retry_after):.1f}s: pausing new calls")
+
+        congestion = _congestion_signal(status, report.get("timeout"))
+        if congestion is None:
+            # A call that succeeded after retries still tells us the provider was throttling.
+            for attempt in report.get("attempts") or []:
+                congestion = _congestion_signal(attempt.get("status"), attempt.get("timeout"))
+                if congestion is not None:
+                    congestion = f"retried {congestion}"
+                    break
+        if congestion is not None:
+            self._decrease(now, congestion)
+            return
+        if not success:
+            return  # Non-throttling failures (e.g., malformed responses) carry no load signal.
+
+        if self._smoothed_latency is None:
+            self._smoothed_latency = duration
+        else:
+            self._smoothed_latency += LATENCY_SMOOTHING * (duration - self._smoothed_latency)
+        if self._baseline_latency is None or self._smoothed_latency < self._baseline_latency:
+            self._baseline_latency = self._smoothed_latency
+
+        if self._smoothed_latency > self.latency_tolerance * self._baseline_latency:
+            self._decrease(now, f"latency {self._smoothed_latency:.2f}s > {self.latency_tolerance:g}x baseline {self._baseline_latency:.2f}s")
+            return
+
+        self._successes_in_window += 1
+        if self._successes_in_window >= self.limit and self.limit < self.max_limit:
+            self._set_limit(self.limit + 1, "additive increase")
+
+    def _decrease(self, now: float, reason: str):
+        window = self._smoothed_latency or 0.0
+        if self._last_decrease is not None and now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, int(math.floor(self.limit * self.decrease_factor)))
+        if new_limit != self.limit:
+            self._set_limit(new_limit, f"multiplicative decrease ({reason})")
+        else:
+            self._successes_in_window = 0
+
+    def _set_limit(self, new_limit: int, reason: str):
+        old_limit = self.limit
+        self.limit = new_limit
+        self._successes_in_window = 0
+        self._record(old_limit, new_limit, reason)
+
+    def _record(self, old_limit: int, new_limit: int, reason: str):
+        timestamp = time.time()
+        self.adjustments.append((timestamp, old_limit, new_limit, reason))
+        logging.info(f"Adaptive concurrency: {old_limit} -> {new_limit} ({reason}).")
+        if not self.log_path:
+            return
+        try:
+            write_header = not os.path.exists(self.log_path)
+            with open(self.log_path, "a", encoding='utf-8') as f:
+                if write_header:
+                    f.write("Timestamp\tOld_Limit\tNew_Limit\tIn_Flight\tSmoothed_Latency_s\tReason\n")
+                latency = f"{self._smoothed_latency:.2f}" if self._smoothed_latency is not None else "NA"
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}\t"
+                        f"{old_limit}\t{new_limit}\t{self._in_flight}\t{latency}\t{reason}\n")
+        except OSError as e:
+            logging.warning(f"Could not write concurrency log {self.log_path}: {e}")
+
+# === End of src/adaptive_concurrency.py ===
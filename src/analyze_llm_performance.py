@@ -33,6 +33,12 @@ Key Features:
     against individual trial manifests to ensure data integrity.
 -   **Robust Error Handling**: Gracefully handles edge cases like zero valid responses,
     file parsing errors, and statistical computation failures.
+-   **Batched Trial Evaluation**: Evaluates all trials of a replication as one
+    score tensor with array operations, matching the per-trial evaluation
+    (including average-rank ties and seeded random top-1 tie-breaking).
+-   **Binary Input Store**: Reads scores, mappings, and successful indices
+    from Stage 3's `score_tensor.npz` when it matches the text files, and
+    parses the text files otherwise.
 -   **Detailed Performance Tracking**: Includes positional bias analysis and lift
     metrics to measure performance relative to chance levels.
 
@@ -65,6 +71,19 @@ except ImportError:
     PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     def get_config_value(cfg, section, key, fallback=None, value_type=str): return fallback
 
+try:
+    import query_bundle
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    import query_bundle
+try:
+    import score_store
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    import score_store
+
 # --- I. Per-Test Evaluation Function (Enhanced) ---
 def evaluate_single_test(score_matrix, correct_mapping_indices_1_based, k_val, top_k_value_for_accuracy=3):
     matrix = np.array(score_matrix) 
@@ -138,6 +157,72 @@ def evaluate_single_test(score_matrix, correct_mapping_indices_1_based, k_val, t
         'raw_chosen_positions': chosen_positions
     }
 
+def evaluate_all_tests(score_tensor, mappings, k_val, top_k_value_for_accuracy=3):
+    """
+    Evaluates every trial of a replication at once.
+
+    Takes the m x k x k score tensor and the m x k array of 1-based correct
+    columns and returns one `evaluate_single_test` result per trial (None
+    for trials it rejects), with identical values. Ranks use average ranks
+    for ties and are computed with array operations. Top-1 picks are
+    `argmax` except in rows with a tied maximum, where `np.random.choice`
+    is called per tied row in trial and row order. The legacy global RNG
+    draws nothing when choosing from a single candidate, so the random
+    stream matches the per-trial evaluation exactly. Trials that are not
+    valid k x k tensors with in-range mappings, or that contain NaN, are
+    passed to `evaluate_single_test` in place.
+    """
+    try:
+        scores = np.asarray(score_tensor, dtype=float)
+        mapping_array = np.asarray(mappings, dtype=np.int64)
+    except (ValueError, TypeError):
+        scores = mapping_array = None
+    if scores is None or scores.ndim != 3 or scores.shape[1:] != (k_val, k_val) or mapping_array.shape != (len(scores), k_val):
+        return [evaluate_single_test(matrix, mapping, k_val, top_k_value_for_accuracy)
+                for matrix, mapping in zip(score_tensor, mappings)]
+    mappings = mapping_array
+
+    num_tests = len(scores)
+    vectorizable = np.all((mappings >= 1) & (mappings <= k_val), axis=1) & ~np.isnan(scores).any(axis=(1, 2))
+    correct_cols = np.where(vectorizable[:, None], mappings - 1, 0)
+    test_idx = np.arange(num_tests)[:, None]
+    person_idx = np.arange(k_val)[None, :]
+
+    # rankdata(-row, method='average') at the correct id: ids scored higher, plus the mean position among equals.
+    correct_scores = scores[test_idx, person_idx, correct_cols]
+    num_higher = (scores > correct_scores[:, :, None]).sum(axis=2)
+    num_equal = (scores == correct_scores[:, :, None]).sum(axis=2)
+    ranks = num_higher + (num_equal + 1) * 0.5
+
+    mrr = np.mean(1.0 / ranks, axis=1)
+    mean_ranks = np.mean(ranks, axis=1)
+    top_1_hits = (ranks == 1).sum(axis=1)
+    top_k_hits = (ranks <= top_k_value_for_accuracy).sum(axis=1)
+
+    is_top = scores == scores.max(axis=2, keepdims=True)
+    chosen = scores.argmax(axis=2)
+    tied_rows = is_top.sum(axis=2) > 1
+    incorrect_mask = np.ones(scores.shape, dtype=bool)
+    incorrect_mask[test_idx, person_idx, correct_cols] = False
+
+    results = []
+    for t in range(num_tests):
+        if not vectorizable[t]:
+            results.append(evaluate_single_test(scores[t], mappings[t].tolist(), k_val, top_k_value_for_accuracy))
+            continue
+        for person in np.flatnonzero(tied_rows[t]):
+            chosen[t, person] = np.random.choice(np.flatnonzero(is_top[t, person]))
+        results.append({
+            'k_val': k_val,
+            'mrr': mrr[t], 'top_1_accuracy': int(top_1_hits[t]) / k_val,
+            f'top_{top_k_value_for_accuracy}_accuracy': int(top_k_hits[t]) / k_val,
+            'mean_rank_of_correct_id': mean_ranks[t],
+            'raw_correct_scores': list(correct_scores[t]),
+            'raw_incorrect_scores': list(scores[t][incorrect_mask[t]]),
+            'raw_chosen_positions': list(chosen[t])
+        })
+    return results
+
 # --- II. Meta-Analysis Functions ---
 def analyze_metric_distribution(metric_values, chance_level, metric_name):
     """
@@ -722,11 +807,21 @@ def main():
             actual_delimiter_for_parsing = args.delimiter
 
     # --- Start of Processing ---
-    if not args.quiet:
-        print(f"Attempting to read mappings from: {mappings_filepath_abs}")
-    
-    mappings_list, k_val_from_map_func, delimiter_determined_for_map = \
-        read_mappings_and_deduce_k(mappings_filepath_abs, args.k_value, actual_delimiter_for_parsing)
+    # Use the score store when it fits the requested k; the text files otherwise.
+    store = score_store.load_store(analysis_inputs_dir)
+    if store is not None and (len(store.scores) == 0 or (args.k_value is not None and args.k_value != store.k)):
+        store = None
+
+    if store is not None:
+        if not args.quiet:
+            print(f"Reading scores, mappings, and successful indices from: {score_store.store_path(analysis_inputs_dir)}")
+        mappings_list, k_val_from_map_func, delimiter_determined_for_map = store.mappings.tolist(), store.k, '\t'
+    else:
+        if not args.quiet:
+            print(f"Attempting to read mappings from: {mappings_filepath_abs}")
+
+        mappings_list, k_val_from_map_func, delimiter_determined_for_map = \
+            read_mappings_and_deduce_k(mappings_filepath_abs, args.k_value, actual_delimiter_for_parsing)
 
     # Gracefully handle the case of zero valid responses
     if mappings_list is None:
@@ -776,11 +871,14 @@ def main():
     k_to_use = k_val_from_map_func 
     delimiter_for_scores = delimiter_determined_for_map
     
-    if not args.quiet:
-        print(f"Using k={k_to_use}. Delimiter for mappings: '{repr(delimiter_determined_for_map)}'.")
-        print(f"Attempting to read scores from: {scores_filepath_abs} (using same delimiter: '{repr(delimiter_for_scores)}')")
-    
-    score_matrices = read_score_matrices(scores_filepath_abs, k_to_use, delimiter_for_scores)
+    if store is not None:
+        score_matrices = list(store.scores)
+    else:
+        if not args.quiet:
+            print(f"Using k={k_to_use}. Delimiter for mappings: '{repr(delimiter_determined_for_map)}'.")
+            print(f"Attempting to read scores from: {scores_filepath_abs} (using same delimiter: '{repr(delimiter_for_scores)}')")
+
+        score_matrices = read_score_matrices(scores_filepath_abs, k_to_use, delimiter_for_scores)
 
     # Reorder checks to handle None from score_matrices or empty lists gracefully
     if score_matrices is None:
@@ -812,7 +910,7 @@ def main():
     # The queries directory is still needed to find the manifests.
     queries_dir_for_validation = os.path.join(args.run_output_dir if args.run_output_dir else os.path.dirname(analysis_inputs_dir_for_validation), 'session_queries')
 
-    original_indices = read_successful_indices(successful_indices_path)
+    original_indices = store.indices.tolist() if store is not None else read_successful_indices(successful_indices_path)
 
     # A flag to control the final success signal.
     validation_passed = False 
@@ -825,19 +923,19 @@ def main():
         for i, mapping_line in enumerate(mappings_list):
             original_index = original_indices[i]
             manifest_path = os.path.join(queries_dir_for_validation, f"llm_query_{original_index:03d}_manifest.txt")
-            if not os.path.exists(manifest_path):
-                logging.error(f"  VALIDATION FAIL: Manifest for original index {original_index} not found at '{manifest_path}'")
-                validation_errors += 1
-                continue
-            # ... (rest of validation loop logic remains the same)
             try:
-                with open(manifest_path, 'r', encoding='utf-8') as f_manifest:
-                    manifest_lines = f_manifest.read().strip().split('\n')[1:] # Skip header
-                    manifest_indices = [line.split('\t')[2] for line in manifest_lines]
-                    mapping_from_file = [str(m) for m in mapping_line]
-                    if manifest_indices != mapping_from_file:
-                        logging.error(f"  VALIDATION FAIL: Mismatch for original index {original_index}!")
-                        validation_errors += 1
+                # The manifest is a file, or a record of the run's query bundle.
+                manifest_text = query_bundle.read_manifest_text(queries_dir_for_validation, original_index)
+                if manifest_text is None:
+                    logging.error(f"  VALIDATION FAIL: Manifest for original index {original_index} not found at '{manifest_path}'")
+                    validation_errors += 1
+                    continue
+                manifest_lines = manifest_text.strip().split('\n')[1:] # Skip header
+                manifest_indices = [line.split('\t')[2] for line in manifest_lines]
+                mapping_from_file = [str(m) for m in mapping_line]
+                if manifest_indices != mapping_from_file:
+                    logging.error(f"  VALIDATION FAIL: Mismatch for original index {original_index}!")
+                    validation_errors += 1
             except FileNotFoundError as file_err:
                 logging.error(f"  VALIDATION ERROR: Manifest file missing for index {original_index}: {file_err}")
                 validation_errors += 1
@@ -868,17 +966,11 @@ def main():
     all_correct_scores_flat = []
     all_incorrect_scores_flat = []
     all_chosen_positions_flat = []
-    for i in range(num_tests_loaded):
+    # All trials are evaluated as one tensor; the loop only collects their results.
+    batch_results = evaluate_all_tests(score_matrices, mappings_list, k_to_use, args.top_k_acc)
+    for i, results_single_test in enumerate(batch_results):
         if not args.quiet:
             print(f"Processing Test {i+1}/{num_tests_loaded}...")
-        
-        try:
-            current_score_matrix_np = np.array(score_matrices[i], dtype=float)
-        except ValueError:
-            print(f"  Warning: Could not convert score matrix for Test {i+1} to numbers. Skipping this test.")
-            continue 
-
-        results_single_test = evaluate_single_test(current_score_matrix_np, mappings_list[i], k_to_use, args.top_k_acc)
 
         if results_single_test:
             all_test_results.append(results_single_test)
@@ -28,12 +28,29 @@ replication run.
 
 Key Workflow:
 1.  Samples unique personalities from the master database without replacement.
-2.  Calls the `query_generator.py` worker script in a loop to create the
-    individual trial files (`llm_query_XXX.txt`, `_manifest.txt`, etc.).
+    With `[Experiment] selection_mode = permutation`, one seeded permutation
+    of the available personalities is drawn up front and consecutive k-blocks
+    are taken from it (linear in m). The default `legacy` mode samples each
+    trial from the remaining pool with seed `base_seed + index - 1`, which
+    reproduces the selections of earlier versions.
+2.  Generates each trial in-process with `query_generator.generate_query_set()`
+    and writes its files (`llm_query_XXX.txt`, `_manifest.txt`, etc.)
+    directly. `--qgen_subprocess` instead runs `query_generator.py` once per
+    trial through a temporary subset file and output directory (the original
+    method, kept for verification); both produce identical files for the
+    same seeds.
 3.  Copies the master `base_query.txt` into the run's `session_queries`
     directory for archival and reporting purposes.
 4.  Creates the aggregated `mappings.txt` file for the entire replication.
 
+With `[General] query_layout = bundle`, step 2 appends each trial's query,
+manifest, mapping, and seeds to a single `query_bundle.jsonl` instead of
+writing per-trial files (see `query_bundle.py`).
+
+With `[General] personalities_cache = true`, the master database is loaded
+through `personalities_cache.py`, which keeps a compiled columnar copy next to
+the source file and only re-parses it when its content changes.
+
 It is called by `orchestrate_replication.py`.
 """
 
@@ -45,6 +62,7 @@ import os
 import sys
 import subprocess 
 import shutil     
+import numpy as np
 import pandas as pd 
 import glob 
 import logging
@@ -67,6 +85,13 @@ except ImportError:
             print(f"FATAL: build_queries.py - Could not import config_loader.py. Error: {e_bq}")
             sys.exit(1)
 
+try:
+    import query_bundle
+except ImportError:
+    current_script_dir_bq = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir_bq not in sys.path: sys.path.insert(0, current_script_dir_bq)
+    import query_bundle
+
 # --- Configuration from Config or Defaults (defined at module level) ---
 QUERY_GENERATOR_SCRIPT_NAME = "query_generator.py"
 
@@ -136,13 +161,16 @@ def get_next_start_index(output_dir, file_prefix="llm_query_"):
                 index = int(index_str)
                 if index > max_index: max_index = index
         except ValueError: continue 
+    bundle = query_bundle.open_bundle(output_dir)
+    if bundle is not None and bundle.indices():
+        max_index = max(max_index, bundle.indices()[-1])
     return max_index + 1
 
 def clear_output_files_for_fresh_run(output_dir, aggregate_mappings_filepath, used_indices_filepath):
     logging.info(f"Clearing previous query output files in '{output_dir}' for a fresh run...")
     cleared_any_query_files = False
     # Use a more robust wildcard pattern to catch all numbered query files.
-    for pattern in ["llm_query_*.txt", "llm_query_*_full.json"]:
+    for pattern in ["llm_query_*.txt", "llm_query_*_full.json", query_bundle.BUNDLE_FILENAME]:
         for filepath_to_delete in glob.glob(os.path.join(output_dir, pattern)):
             try:
                 os.remove(filepath_to_delete)
@@ -151,7 +179,7 @@ def clear_output_files_for_fresh_run(output_dir, aggregate_mappings_filepath, us
             except OSError as e:
                 logging.warning(f"  Warning: Could not delete {os.path.basename(filepath_to_delete)}: {e}")
     if not cleared_any_query_files:
-        logging.info("  No 'llm_query_*.txt' or JSON files found to clear.")
+        logging.info("  No 'llm_query_*.txt', JSON, or bundle files found to clear.")
 
     if os.path.exists(aggregate_mappings_filepath):
         try:
@@ -172,6 +200,73 @@ def clear_output_files_for_fresh_run(output_dir, aggregate_mappings_filepath, us
         except OSError as e: logging.warning(f"Could not delete used indices file {os.path.basename(used_indices_filepath)}: {e}")
 
 
+def iter_legacy_selections(available_df, num_iterations, k, start_index, base_seed):
+    """
+    Yields one k-row selection per trial by sampling the remaining pool.
+
+    Trial i is sampled with `random_state = base_seed + i - 1`, then removed
+    from the pool. This copies the pool on every trial, but reproduces the
+    selections of runs made before `selection_mode` existed.
+    """
+    for i_loop in range(num_iterations):
+        if len(available_df) < k:
+            logging.error("Ran out of unique available personalities during generation loop."); return
+        selection_seed = None
+        if base_seed is not None:
+            selection_seed = base_seed + start_index + i_loop - 1
+        selected_subset_df = available_df.sample(n=k, random_state=selection_seed)
+        available_df = available_df.drop(selected_subset_df.index)
+        yield selected_subset_df
+
+def iter_permutation_selections(available_df, num_iterations, k, start_index, base_seed):
+    """
+    Yields one k-row selection per trial from a single seeded permutation.
+
+    The permutation is seeded with `base_seed + start_index - 1` (the legacy
+    seed of the batch's first trial), so a continued run draws a new order.
+    Trial i takes the i-th consecutive block of k positions.
+    """
+    selection_seed = None if base_seed is None else base_seed + start_index - 1
+    order = np.random.default_rng(selection_seed).permutation(len(available_df))
+    for i_loop in range(num_iterations):
+        block = order[i_loop * k:(i_loop + 1) * k]
+        if len(block) < k:
+            logging.error("Ran out of unique available personalities during generation loop."); return
+        yield available_df.iloc[block]
+
+SELECTION_ENGINES = {'legacy': iter_legacy_selections, 'permutation': iter_permutation_selections}
+
+def selected_rows_to_items(selected_subset_df):
+    """Converts the selected personalities to the item dicts expected by `query_generator`."""
+    return [{'original_index_from_file': int(row.Index_), 'name': str(row.Name), 'year': int(row.BirthYearInt),
+             'description': str(row.DescriptionText)}
+            for row in selected_subset_df.rename(columns={'Index': 'Index_'}).itertuples(index=False)]
+
+def generate_trial_in_process(query_generator, selected_subset_df, base_prompt_content, k_per_query, mapping_strategy, qgen_seed):
+    """Returns `(query_text, mapping_line, manifest_text)` of one trial generated in memory."""
+    trial = query_generator.generate_query_set(selected_rows_to_items(selected_subset_df), base_prompt_content,
+                                               k_per_query, mapping_strategy, random.Random(qgen_seed))
+    manifest_text = query_generator.format_tab_separated(query_generator.MANIFEST_HEADER, trial["manifest_rows"])
+    return trial["query_text"], "\t".join(map(str, trial["mapping"])), manifest_text
+
+def write_trial_files(queries_dir, global_index, query_text, manifest_text, mapping_line, aggregate_mappings_filepath):
+    """Writes a trial's query and manifest and appends its mapping to the aggregate mappings file."""
+    dest_query_filename_base = f"llm_query_{global_index:03d}"
+    with open(os.path.join(queries_dir, f"{dest_query_filename_base}.txt"), 'w', encoding='utf-8') as f:
+        f.write(query_text)
+    with open(os.path.join(queries_dir, f"{dest_query_filename_base}_manifest.txt"), 'w', encoding='utf-8') as f:
+        f.write(manifest_text)
+    with open(aggregate_mappings_filepath, 'a', encoding='utf-8') as f_map_agg:
+        f_map_agg.write(mapping_line + "\n")
+
+def write_trial_to_bundle(queries_dir, global_index, query_text, manifest_text, mapping_line, aggregate_mappings_filepath,
+                          qgen_seed, personality_indices):
+    """Appends a trial (with its seed and personalities) to the run's query bundle and its mapping to the aggregate mappings file."""
+    query_bundle.append_trial(queries_dir, global_index, query_text, manifest_text, mapping_line, qgen_seed,
+                              [int(i) for i in personality_indices])
+    with open(aggregate_mappings_filepath, 'a', encoding='utf-8') as f_map_agg:
+        f_map_agg.write(mapping_line + "\n")
+
 def main():
     # --- Load dynamic defaults from config inside main() to ensure testability ---
     DEFAULT_MASTER_PERSONALITIES_FN = get_config_value(APP_CONFIG, 'Filenames', 'personalities_src', fallback="personalities_db.txt")
@@ -208,6 +303,16 @@ def main():
     parser.add_argument("--run_output_dir", required=True,
                         help="The absolute path to the self-contained output directory for this specific run.")
     parser.add_argument("--quiet", action="store_true", help="Suppress per-iteration progress messages.")
+    parser.add_argument("--selection_mode", choices=sorted(SELECTION_ENGINES),
+                        default=get_config_value(APP_CONFIG, 'Experiment', 'selection_mode', fallback='legacy'),
+                        help="How personalities are drawn: 'legacy' (per-trial sampling, reproduces earlier runs) "
+                             "or 'permutation' (one seeded permutation, linear in m).")
+    parser.add_argument("--query_layout", choices=query_bundle.QUERY_LAYOUTS,
+                        default=get_config_value(APP_CONFIG, 'General', 'query_layout', fallback='files'),
+                        help="'files' writes llm_query_NNN.txt and _manifest.txt per trial; "
+                             "'bundle' appends every trial to one query_bundle.jsonl.")
+    parser.add_argument("--qgen_subprocess", action="store_true",
+                        help="Run query_generator.py as a subprocess per trial instead of in-process (slower; identical output).")
 
     args = parser.parse_args()
     
@@ -252,7 +357,8 @@ def main():
         logging.info(f"Using queries subdirectory: {final_queries_output_dir}")
 
     # --- Automatically determine run_mode ---
-    if not glob.glob(os.path.join(final_queries_output_dir, "llm_query_*.txt")):
+    if (not glob.glob(os.path.join(final_queries_output_dir, "llm_query_*.txt"))
+            and query_bundle.open_bundle(final_queries_output_dir) is None):
         run_mode = 'new'
     else:
         run_mode = 'continue'
@@ -284,9 +390,23 @@ def main():
         else:
             logging.warning(f"Master base query file not found at: {base_query_src_path}. Report will show 'NOT FOUND'.")
 
+        # In-process generation needs the base query and the generator functions once for all trials.
+        query_generator = None
+        if args.qgen_subprocess and args.query_layout == 'bundle':
+            logging.warning("--qgen_subprocess writes per-trial files; ignoring query_layout = bundle.")
+        if not args.qgen_subprocess:
+            import query_generator
+            base_prompt_content = query_generator.load_base_query(base_query_src_path)
+            mapping_strategy = get_config_value(APP_CONFIG, 'Experiment', 'mapping_strategy', fallback='correct')
+
         master_personalities_src_path = os.path.join(PROJECT_ROOT, "data", args.master_personalities_file)
         logging.info(f"Loading master personalities from: {master_personalities_src_path}")
-        master_personalities_df, _ = load_all_personalities_df(master_personalities_src_path)
+        if get_config_value(APP_CONFIG, 'General', 'personalities_cache', fallback=False, value_type=bool):
+            import personalities_cache
+            master_personalities_df, _ = personalities_cache.load_with_cache(master_personalities_src_path,
+                                                                            load_all_personalities_df)
+        else:
+            master_personalities_df, _ = load_all_personalities_df(master_personalities_src_path)
         
         # Define the exact header the query_generator.py worker expects.
         worker_input_header = "Index\tidADB\tName\tBirthYear\tDescriptionText"
@@ -317,88 +437,98 @@ def main():
                 logging.info(f"Initialized aggregate mappings file: {aggregate_mappings_filepath}")
             except Exception as e: logging.error(f"Error initializing aggregate mappings file: {e}"); sys.exit(1)
 
-        for i_loop in range(args.num_iterations):
+        logging.info(f"Personality selection mode: {args.selection_mode}")
+        selections = SELECTION_ENGINES[args.selection_mode](
+            available_personalities_df, args.num_iterations, args.k_per_query, start_index, args.base_seed)
+        for i_loop, selected_subset_df in enumerate(selections):
             current_global_iteration_index = start_index + i_loop
             
-            qgen_iter_temp_subdir_name = f"temp_qgen_outputs_iter_{current_global_iteration_index:03d}"
-            qgen_iter_temp_dir_abs = os.path.join(script_dir, qgen_iter_temp_subdir_name)
-            qgen_output_prefix_for_arg = os.path.join(qgen_iter_temp_subdir_name, f"iter_{current_global_iteration_index:03d}_")
-
             if not args.quiet:
                 logging.info(f"--- Generating Set (Global Index {current_global_iteration_index}) / Iteration {i_loop+1} of {args.num_iterations} ---")
 
-            if len(available_personalities_df) < args.k_per_query:
-                logging.error("Ran out of unique available personalities during generation loop."); break
-            
-            current_selection_seed = None
-            if args.base_seed is not None:
-                current_selection_seed = args.base_seed + current_global_iteration_index - 1
-            
-            selected_subset_df = available_personalities_df.sample(n=args.k_per_query, random_state=current_selection_seed)
             current_iter_indices = selected_subset_df['Index'].tolist()
             
-            # Select all required columns to pass to the worker script, matching the master header.
-            df_to_write = selected_subset_df[['Index', 'idADB', 'Name', 'BirthYearInt', 'DescriptionText']].copy()
-            df_to_write.rename(columns={'BirthYearInt': 'BirthYear'}, inplace=True)
-            
-            with open(temp_subset_qgen_input_path, 'w', encoding='utf-8') as f_temp:
-                f_temp.write(worker_input_header + "\n") 
-                df_to_write.to_csv(f_temp, sep='\t', index=False, header=False, encoding='utf-8')
-            
-            qgen_base_query_filename = get_config_value(APP_CONFIG, 'Filenames', 'base_query_src', fallback="base_query.txt")
-
-            cmd = [
-                sys.executable, query_generator_path, "-k", str(args.k_per_query),
-                "--personalities_file", DEFAULT_TEMP_SUBSET_FN, 
-                "--base_query_file", qgen_base_query_filename,
-                "--output_basename_prefix", qgen_output_prefix_for_arg 
-            ]
-            if args.verbose >=2: cmd.append("-vv") 
-            elif args.verbose ==1: cmd.append("-v")
-            
             iteration_qgen_seed_value = None
             if args.qgen_base_seed is not None:
                 iteration_qgen_seed_value = args.qgen_base_seed + current_global_iteration_index - 1
             else:
                 iteration_qgen_seed_value = random.randint(0, 2**32 - 1)
-            cmd.extend(["--seed", str(iteration_qgen_seed_value)])
+
+            if query_generator is not None:
+                query_text, mapping_line, manifest_text = generate_trial_in_process(
+                    query_generator, selected_subset_df, base_prompt_content, args.k_per_query,
+                    mapping_strategy, iteration_qgen_seed_value)
+                if args.query_layout == 'bundle':
+                    write_trial_to_bundle(final_queries_output_dir, current_global_iteration_index, query_text,
+                                          manifest_text, mapping_line, aggregate_mappings_filepath,
+                                          iteration_qgen_seed_value, current_iter_indices)
+                else:
+                    write_trial_files(final_queries_output_dir, current_global_iteration_index, query_text,
+                                      manifest_text, mapping_line, aggregate_mappings_filepath)
+                newly_used_indices_this_batch.update(current_iter_indices)
+            else:
+                qgen_iter_temp_subdir_name = f"temp_qgen_outputs_iter_{current_global_iteration_index:03d}"
+                qgen_iter_temp_dir_abs = os.path.join(script_dir, qgen_iter_temp_subdir_name)
+                qgen_output_prefix_for_arg = os.path.join(qgen_iter_temp_subdir_name, f"iter_{current_global_iteration_index:03d}_")
+
+                # Select all required columns to pass to the worker script, matching the master header.
+                df_to_write = selected_subset_df[['Index', 'idADB', 'Name', 'BirthYearInt', 'DescriptionText']].copy()
+                df_to_write.rename(columns={'BirthYearInt': 'BirthYear'}, inplace=True)
             
-            logging.debug(f"  QGEN Command: {' '.join(cmd)}")
+                with open(temp_subset_qgen_input_path, 'w', encoding='utf-8') as f_temp:
+                    f_temp.write(worker_input_header + "\n") 
+                    df_to_write.to_csv(f_temp, sep='\t', index=False, header=False, encoding='utf-8')
             
-            try:
-                process_qgen = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=script_dir, encoding='utf-8')
-                if not args.quiet_worker and process_qgen.stderr:
-                    logging.warning(f"  query_generator.py stderr:\n{process_qgen.stderr.strip()}")
+                qgen_base_query_filename = get_config_value(APP_CONFIG, 'Filenames', 'base_query_src', fallback="base_query.txt")
+
+                cmd = [
+                    sys.executable, query_generator_path, "-k", str(args.k_per_query),
+                    "--personalities_file", DEFAULT_TEMP_SUBSET_FN, 
+                    "--base_query_file", qgen_base_query_filename,
+                    "--output_basename_prefix", qgen_output_prefix_for_arg 
+                ]
+                if args.verbose >=2: cmd.append("-vv") 
+                elif args.verbose ==1: cmd.append("-v")
+            
+                cmd.extend(["--seed", str(iteration_qgen_seed_value)])
+            
+                logging.debug(f"  QGEN Command: {' '.join(cmd)}")
+            
+                try:
+                    process_qgen = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=script_dir, encoding='utf-8')
+                    if not args.quiet_worker and process_qgen.stderr:
+                        logging.warning(f"  query_generator.py stderr:\n{process_qgen.stderr.strip()}")
                 
-                newly_used_indices_this_batch.update(current_iter_indices)
-                available_personalities_df = available_personalities_df.drop(selected_subset_df.index)
+                    newly_used_indices_this_batch.update(current_iter_indices)
 
-                src_full_query_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_llm_query.txt")
-                src_mapping_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_mapping.txt")
-                src_manifest_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_manifest.txt")
+                    src_full_query_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_llm_query.txt")
+                    src_mapping_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_mapping.txt")
+                    src_manifest_path = os.path.join(qgen_iter_temp_dir_abs, f"iter_{current_global_iteration_index:03d}_manifest.txt")
 
-                dest_query_filename_base = f"llm_query_{current_global_iteration_index:03d}"
-                dest_query_txt_path = os.path.join(final_queries_output_dir, f"{dest_query_filename_base}.txt")
+                    dest_query_filename_base = f"llm_query_{current_global_iteration_index:03d}"
+                    dest_query_txt_path = os.path.join(final_queries_output_dir, f"{dest_query_filename_base}.txt")
                 
-                shutil.copy2(src_full_query_path, dest_query_txt_path)
+                    shutil.copy2(src_full_query_path, dest_query_txt_path)
                 
-                if os.path.exists(src_manifest_path):
-                    dest_manifest_path = os.path.join(final_queries_output_dir, f"{dest_query_filename_base}_manifest.txt")
-                    shutil.copy2(src_manifest_path, dest_manifest_path)
+                    if os.path.exists(src_manifest_path):
+                        dest_manifest_path = os.path.join(final_queries_output_dir, f"{dest_query_filename_base}_manifest.txt")
+                        shutil.copy2(src_manifest_path, dest_manifest_path)
                 
-                if os.path.exists(src_mapping_path):
-                    with open(src_mapping_path, 'r', encoding='utf-8') as f_qgen_map:
-                        qgen_map_lines = f_qgen_map.readlines()
-                        if len(qgen_map_lines) > 1: 
-                            mapping_data_line = qgen_map_lines[1].strip()
-                            with open(aggregate_mappings_filepath, 'a', encoding='utf-8') as f_map_agg:
-                                f_map_agg.write(mapping_data_line + "\n")
+                    if os.path.exists(src_mapping_path):
+                        with open(src_mapping_path, 'r', encoding='utf-8') as f_qgen_map:
+                            qgen_map_lines = f_qgen_map.readlines()
+                            if len(qgen_map_lines) > 1: 
+                                mapping_data_line = qgen_map_lines[1].strip()
+                                with open(aggregate_mappings_filepath, 'a', encoding='utf-8') as f_map_agg:
+                                    f_map_agg.write(mapping_data_line + "\n")
                 
-            except subprocess.CalledProcessError as e:
-                logging.error(f"query_generator.py failed for set index {current_global_iteration_index}. Stderr:\n{e.stderr}"); raise 
-            finally: 
-                if os.path.exists(qgen_iter_temp_dir_abs):
-                    shutil.rmtree(qgen_iter_temp_dir_abs)
+                except subprocess.CalledProcessError as e:
+                    logging.error(f"query_generator.py failed for set index {current_global_iteration_index}. Stderr:\n{e.stderr}"); raise 
+                finally: 
+                    if os.path.exists(qgen_iter_temp_dir_abs):
+                        shutil.rmtree(qgen_iter_temp_dir_abs)
+            
+
             
             if not args.quiet:
                 logging.info(f"--- Set (Global Index {current_global_iteration_index}) Generation Complete ---\n")
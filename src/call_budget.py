@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/call_budget.py
+
+"""
+Experiment-Wide Budget of In-Flight API Calls.
+
+When `experiment_manager.py` runs several replications at once
+(`[LLM] concurrent_replications`), each replication still starts up to
+`max_parallel_sessions` sessions. To keep the number of simultaneous API calls
+from multiplying with the number of replications, every call made by
+`llm_prompter.py` first takes one of a fixed number of slots shared by all
+processes of the experiment.
+
+Key Features:
+-   **Slot Files**: A slot is taken by exclusively creating its lock file in
+    the budget directory, so coordination works on Windows and POSIX alike
+    (the same approach as `rate_limiter.py`).
+-   **Crash-Safe**: Holders refresh their slot files from a heartbeat thread.
+    A slot file that has not been refreshed for `STALE_SLOT_SECONDS` belongs to
+    a crashed process and is reclaimed.
+-   **Inherited Configuration**: The budget directory and size reach every
+    descendant process (subprocess and pool workers) through the
+    `LLM_CALL_BUDGET_DIR` and `LLM_CALL_BUDGET_LIMIT` environment variables.
+"""
+
+# === Start of src/call_budget.py ===
+
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Iterator, Optional, Set
+
+BUDGET_DIR_ENV = "LLM_CALL_BUDGET_DIR"
+BUDGET_LIMIT_ENV = "LLM_CALL_BUDGET_LIMIT"
+# Slot files are refreshed this often while held.
+HEARTBEAT_SECONDS = 5.0
+# A slot file not refreshed for this long is assumed to belong to a crashed process.
+STALE_SLOT_SECONDS = 30.0
+POLL_SECONDS = 0.05
+
+
+class SharedCallBudget:
+    """A counting semaphore over slot files, shared by every process using the same directory."""
+
+    def __init__(self, budget_dir: str, limit: int, sleep=time.sleep):
+        if limit < 1:
+            raise ValueError("A call budget needs at least one slot.")
+        self.budget_dir = budget_dir
+        self.limit = int(limit)
+        os.makedirs(budget_dir, exist_ok=True)
+        self._sleep = sleep
+        self._held: Set[str] = set()
+        self._held_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _slot_path(self, slot: int) -> str:
+        return os.path.join(self.budget_dir, f"slot_{slot:04d}.lock")
+
+    def _try_take(self, slot_path: str) -> bool:
+        try:
+            with open(slot_path, 'x') as f:
+                f.write(str(os.getpid()))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(slot_path) > STALE_SLOT_SECONDS:
+                    os.remove(slot_path)
+                    logging.warning(f"Call budget: reclaimed stale slot {os.path.basename(slot_path)}.")
+            except OSError:
+                pass  # The holder released the slot in the meantime.
+            return False
+
+    def _refresh_held_slots(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._held_lock:
+                held = list(self._held)
+            for slot_path in held:
+                try:
+                    os.utime(slot_path)
+                except OSError:
+                    pass
+
+    def acquire(self) -> tuple:
+        """
+        Blocks until a slot is free and takes it.
+
+        Returns `(slot_path, seconds_waited)`.
+        """
+        waited = 0.0
+        while True:
+            # Start at a random slot so waiting processes do not all contend for slot 0.
+            offset = random.randrange(self.limit)
+            for i in range(self.limit):
+                slot_path = self._slot_path((offset + i) % self.limit)
+                if self._try_take(slot_path):
+                    with self._held_lock:
+                        self._held.add(slot_path)
+                        if self._heartbeat is None:
+                            self._heartbeat = threading.Thread(target=self._refresh_held_slots, daemon=True)
+                            self._heartbeat.start()
+                    return slot_path, waited
+            self._sleep(POLL_SECONDS)
+            waited += POLL_SECONDS
+
+    def release(self, slot_path: str):
+        with self._held_lock:
+            self._held.discard(slot_path)
+        try:
+            os.remove(slot_path)
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[float]:
+        """Holds one slot for the duration of the block; yields the seconds spent waiting for it."""
+        slot_path, waited = self.acquire()
+        try:
+            yield waited
+        finally:
+            self.release(slot_path)
+
+    def in_use(self) -> int:
+        """Returns the number of slots currently taken by any process."""
+        return sum(1 for name in os.listdir(self.budget_dir) if name.startswith("slot_"))
+
+
+def get_call_budget_from_env(environ=None) -> Optional[SharedCallBudget]:
+    """Returns the budget announced by a parent `experiment_manager.py`, or None."""
+    environ = os.environ if environ is None else environ
+    budget_dir = environ.get(BUDGET_DIR_ENV)
+    if not budget_dir:
+        return None
+    try:
+        limit = int(environ.get(BUDGET_LIMIT_ENV, "0"))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        logging.warning(f"Ignoring call budget: {BUDGET_LIMIT_ENV} must be a positive integer.")
+        return None
+    return SharedCallBudget(budget_dir, limit)
+
+# === End of src/call_budget.py ===
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/call_telemetry.py
+
+"""
+Structured Per-Call Telemetry for Stage 2.
+
+`api_times.log` is written for people reading a single run. For capacity
+planning across a whole study, `replication_manager.py` also appends one JSON
+record per trial to `call_telemetry.jsonl` in the run directory. This module
+builds those records and summarizes them.
+
+Key Features:
+-   **One Record per Trial**: Queue wait, rate-limit wait, time to first byte,
+    time to first token, total latency, HTTP status, retry count, hedge, and
+    bytes sent/received, taken from the trial's call report.
+-   **Authoritative Token Counts**: Prompt, completion, and cached prompt
+    tokens are read from the `usage` block of the trial's `_full.json`.
+-   **Append-Only JSONL**: Records are appended as trials complete, so an
+    interrupted or repaired run keeps every call it made.
+-   **Study Report**: `report` finds every `call_telemetry.jsonl` below a
+    directory and prints latency percentiles and tokens/s per model.
+
+Usage:
+    python src/call_telemetry.py report path/to/study_or_experiment
+    python src/call_telemetry.py report path/to/study --json
+"""
+
+# === Start of src/call_telemetry.py ===
+
+import argparse
+import datetime
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_TELEMETRY_FILENAME = "call_telemetry.jsonl"
+REPORT_PERCENTILES = (50, 90, 95, 99)
+
+
+def _sum_attempts(attempts: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [a[key] for a in attempts if a.get(key) is not None]
+    return round(sum(values), 3) if values else None
+
+
+def read_usage(full_json_path: str) -> Dict[str, Optional[int]]:
+    """Returns the prompt, completion, and cached prompt token counts of a `_full.json` response."""
+    usage: Dict[str, Any] = {}
+    try:
+        with open(full_json_path, 'r', encoding='utf-8') as f:
+            usage = json.load(f).get("usage") or {}
+    except (OSError, ValueError, AttributeError):
+        pass
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "cached_tokens": details.get("cached_tokens") if isinstance(details, dict) else None,
+    }
+
+
+def build_call_record(index: int, success: bool, duration: float, report: Optional[Dict[str, Any]],
+                      full_json_path: str, model: str, engine: str, submitted_at: Optional[float] = None,
+                      source: str = "api", error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Builds the telemetry record of one trial.
+
+    `report` is the trial's call report; `submitted_at` is when the trial was
+    handed to the session engine, so the queue wait is the time until the
+    engine started it.
+    """
+    report = report or {}
+    attempts = report.get("attempts") or []
+    final = attempts[-1] if attempts else {}
+    started_at = report.get("started_at")
+    queue_wait = None
+    if started_at is not None and submitted_at is not None:
+        queue_wait = round(max(0.0, started_at - submitted_at), 3)
+    hedge = next((a["hedge"] for a in attempts if (a.get("hedge") or {}).get("after") is not None), None)
+
+    record: Dict[str, Any] = {
+        "query_id": f"{index:03d}",
+        "timestamp": datetime.datetime.fromtimestamp(started_at).isoformat(timespec='seconds') if started_at else None,
+        "model": model,
+        "engine": engine,
+        "source": source,
+        "success": bool(success),
+        "http_status": final.get("status", report.get("status")),
+        "queue_wait_s": queue_wait,
+        "rate_limit_wait_s": _sum_attempts(attempts, "rate_limit_wait"),
+        "budget_wait_s": _sum_attempts(attempts, "budget_wait"),
+        "ttfb_s": final.get("ttfb"),
+        "ttft_s": final.get("ttft"),
+        "latency_s": round(duration, 3) if source == "api" else 0.0,
+        "attempts": len(attempts),
+        "retries": max(0, len(attempts) - 1),
+        "hedged": hedge is not None,
+        "hedge_winner": hedge.get("winner") if hedge else None,
+        "bytes_sent": _sum_attempts(attempts, "bytes_sent"),
+        "bytes_received": final.get("bytes_received"),
+    }
+    record.update(read_usage(full_json_path) if success else
+                  {"prompt_tokens": None, "completion_tokens": None, "cached_tokens": None})
+    if error:
+        record["error"] = error.strip().splitlines()[-1][:200] if error.strip() else None
+    return record
+
+
+class CallTelemetryWriter:
+    """Appends telemetry records to a run's JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, record: Dict[str, Any]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def find_telemetry_files(root: str, filename: str = DEFAULT_TELEMETRY_FILENAME) -> List[str]:
+    """Returns every telemetry file at or below `root`, sorted by path."""
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        if filename in filenames:
+            found.append(os.path.join(dirpath, filename))
+    return sorted(found)
+
+
+def iter_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yields the records of the given telemetry files, skipping unreadable lines."""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Returns the report percentiles of `values`, linearly interpolated between closest ranks."""
+    if not values:
+        return {f"p{p}": None for p in REPORT_PERCENTILES}
+    ordered = sorted(values)
+    result = {}
+    for p in REPORT_PERCENTILES:
+        position = (len(ordered) - 1) * p / 100.0
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        result[f"p{p}"] = round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 3)
+    return result
+
+
+def summarize(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarizes API calls per model.
+
+    Cache hits are counted but excluded from latency and throughput. Tokens/s
+    is completion tokens over call latency, per successful call.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault(record.get("model") or "unknown", []).append(record)
+
+    summary = {}
+    for model, group in sorted(groups.items()):
+        calls = [r for r in group if r.get("source", "api") == "api"]
+        ok = [r for r in calls if r.get("success")]
+        throughput = [r["completion_tokens"] / r["latency_s"] for r in ok
+                      if r.get("completion_tokens") and r.get("latency_s")]
+        summary[model] = {
+            "calls": len(calls),
+            "cache_hits": len(group) - len(calls),
+            "success_rate": round(len(ok) / len(calls), 4) if calls else None,
+            "retries": sum(r.get("retries") or 0 for r in calls),
+            "hedged": sum(1 for r in calls if r.get("hedged")),
+            "latency_s": _percentiles([r["latency_s"] for r in ok if r.get("latency_s") is not None]),
+            "ttfb_s": _percentiles([r["ttfb_s"] for r in ok if r.get("ttfb_s") is not None]),
+            "tokens_per_s": _percentiles(throughput),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in ok),
+            "completion_tokens": sum(r.get("completion_tokens") or 0 for r in ok),
+            "cached_tokens": sum(r.get("cached_tokens") or 0 for r in ok),
+        }
+    return summary
+
+
+def format_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    """Formats a `summarize` result as a plain-text table."""
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}"
+
+    header = (f"{'Model':<40} {'Calls':>6} {'OK%':>6} {'Retry':>6} "
+              + " ".join(f"{'lat_p' + str(p):>8}" for p in REPORT_PERCENTILES)
+              + f" {'ttfb_p50':>8} {'tok/s_p50':>9} {'Cached%':>8}")
+    lines = [header, "-" * len(header)]
+    for model, stats in summary.items():
+        success = "-" if stats["success_rate"] is None else f"{100 * stats['success_rate']:.1f}"
+        cached = (f"{100 * stats['cached_tokens'] / stats['prompt_tokens']:.1f}"
+                  if stats["prompt_tokens"] else "-")
+        lines.append(f"{model[:40]:<40} {stats['calls']:>6} {success:>6} {stats['retries']:>6} "
+                     + " ".join(f"{fmt(stats['latency_s'][f'p{p}']):>8}" for p in REPORT_PERCENTILES)
+                     + f" {fmt(stats['ttfb_s']['p50']):>8} {fmt(stats['tokens_per_s']['p50']):>9} {cached:>8}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarizes per-call telemetry across runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Print latency percentiles and tokens/s per model.")
+    report_parser.add_argument("path", help="A study, experiment, or run directory (or a single telemetry file).")
+    report_parser.add_argument("--filename", default=DEFAULT_TELEMETRY_FILENAME,
+                               help="Name of the per-run telemetry file.")
+    report_parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args(argv)
+
+    paths = find_telemetry_files(args.path, args.filename)
+    if not paths:
+        print(f"No {args.filename} files found under {args.path}.", file=sys.stderr)
+        return 1
+    summary = summarize(iter_records(paths))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Call telemetry from {len(paths)} run(s):\n")
+        print(format_summary(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# === End of src/call_telemetry.py ===
@@ -54,6 +54,8 @@ if current_dir not in sys.path:
 
 try:
     from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
+    import query_bundle
+    import score_store
 except ImportError as e:
     print(f"FATAL: Could not import config_loader.py. Error: {e}", file=sys.stderr)
     sys.exit(1)
@@ -85,6 +87,7 @@ FILE_MANIFEST = {
     "query_files":   {"path": "session_queries/llm_query_*.txt", "pattern": r"llm_query_(\d+)\.txt"},
     "trial_manifests": {"path": "session_queries/llm_query_*_manifest.txt", "pattern": r"llm_query_(\d+)_manifest\.txt"},
     "aggregated_mappings_file": {"path": "session_queries/mappings.txt"},
+    "query_bundle":  {"path": "session_queries/query_bundle.jsonl"},
     "responses_dir": {"path": "session_responses"},
     "response_files":{"path": "session_responses/llm_response_*.txt", "pattern": r"llm_response_(\d+)\.txt"},
     "response_json_files": {"path": "session_responses/llm_response_*_full.json", "pattern": r"llm_response_(\d+)_full\.json"},
@@ -124,6 +127,14 @@ def _get_file_indices(run_path: Path, spec: dict) -> set[int]:
             indices.add(int(match.group(1)))
     return indices
 
+def _get_query_indices(run_path: Path) -> set[int]:
+    """Returns the indices of the run's queries, whether stored as files or in a query bundle."""
+    indices = _get_file_indices(run_path, FILE_MANIFEST["query_files"])
+    bundle = query_bundle.open_bundle(str(run_path / FILE_MANIFEST["queries_dir"]["path"]))
+    if bundle is not None:
+        indices.update(bundle.indices())
+    return indices
+
 def _count_lines_in_file(filepath: str, skip_header: bool = True) -> int:
     """Counts data lines in a file, optionally skipping a header."""
     if not os.path.exists(filepath):
@@ -343,21 +354,32 @@ def _check_file_set(run_path: Path, spec: dict, expected_count: int):
     else:
         actual = all_files_in_dir
 
-    label = glob_pattern.split("/", 1)[0]
-    if not actual: return f"{label.upper()}_MISSING"
-    count = len(actual)
+    return _check_count(glob_pattern.split("/", 1)[0], len(actual), expected_count)
+
+def _check_count(label: str, count: int, expected_count: int):
+    if not count: return f"{label.upper()}_MISSING"
     if count < expected_count: return f"{label.upper()}_INCOMPLETE"
     if count > expected_count: return f"{label.upper()}_TOO_MANY"
     return "VALID"
 
+def _check_query_set(run_path: Path, expected_count: int):
+    """Checks the run's queries; a query bundle holds each trial's query and manifest in one record."""
+    if not (run_path / FILE_MANIFEST["query_bundle"]["path"]).exists():
+        return _check_file_set(run_path, FILE_MANIFEST["query_files"], expected_count)
+    return _check_count(FILE_MANIFEST["queries_dir"]["path"], len(_get_query_indices(run_path)), expected_count)
+
 def _check_analysis_files(run_path: Path, expected_entries: int, k_value: int):
     scores_p = run_path / FILE_MANIFEST["scores_file"]["path"]
     mappings_p = run_path / FILE_MANIFEST["mappings_file"]["path"]
     if not all(p.exists() for p in [scores_p, mappings_p]):
         return "ANALYSIS_FILES_MISSING"
     try:
-        n_mappings = _count_lines_in_file(mappings_p, skip_header=True)
-        n_scores = _count_matrices_in_file(scores_p, k_value)
+        store = score_store.load_store(str(run_path / FILE_MANIFEST["analysis_dir"]["path"]))
+        if store is not None and store.k == k_value:
+            n_mappings, n_scores = len(store.mappings), len(store.scores)
+        else:
+            n_mappings = _count_lines_in_file(mappings_p, skip_header=True)
+            n_scores = _count_matrices_in_file(scores_p, k_value)
     except Exception:
         return "ANALYSIS_DATA_MALFORMED"
     if n_scores != expected_entries or n_mappings != expected_entries:
@@ -409,7 +431,7 @@ def _verify_single_run_completeness(run_path: Path) -> tuple[str, list[str]]:
     if stat_cfg != "VALID": status_details.append(stat_cfg)
     else: status_details.append("config OK")
 
-    stat_q = _check_file_set(run_path, FILE_MANIFEST["query_files"], m_expected)
+    stat_q = _check_query_set(run_path, m_expected)
     if stat_q != "VALID": status_details.append(stat_q)
     else: status_details.append("queries OK")
 
@@ -430,7 +452,7 @@ def _verify_single_run_completeness(run_path: Path) -> tuple[str, list[str]]:
     if stat_r_json != "VALID": response_details.append(f"JSON: {stat_r_json}")
 
     if not response_details:
-        query_indices = _get_file_indices(run_path, FILE_MANIFEST["query_files"])
+        query_indices = _get_query_indices(run_path)
         response_txt_indices = _get_file_indices(run_path, FILE_MANIFEST["response_files"])
         response_json_indices = _get_file_indices(run_path, FILE_MANIFEST["response_json_files"])
         mismatches = []
@@ -557,7 +579,7 @@ def get_experiment_state(target_dir: Path, expected_reps: int) -> tuple[str, lis
     for run_name, (status, details_list) in fails.items():
         if status == "RESPONSE_ISSUE":
             run_path = run_paths_by_name[run_name]
-            query_indices = _get_file_indices(run_path, FILE_MANIFEST["query_files"])
+            query_indices = _get_query_indices(run_path)
             response_txt_indices = _get_file_indices(run_path, FILE_MANIFEST["response_files"])
             failed_indices = sorted(list(query_indices - response_txt_indices))
             if failed_indices:
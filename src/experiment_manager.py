@@ -41,6 +41,15 @@ Key Features:
     guidance for common failures like model configuration errors.
 -   **Clean User Feedback**: Streamlined error messages that distinguish between
     different failure types and provide actionable guidance.
+-   **Concurrent Replications**: With `[LLM] concurrent_replications` above 1,
+    several replications run at once while sharing one experiment-wide cap on
+    in-flight API calls (`max_experiment_sessions`).
+-   **Parallel Reprocessing**: With `[Analysis] reprocess_workers` other
+    than 1, REPROCESS mode runs Stages 3-6 of several replications at once.
+-   **Pipelined Replications**: With `[LLM] pipeline_replications = true`, the
+    next replication's query build and LLM sessions start as soon as the
+    previous replication's Stage 2 is complete, overlapping its local
+    processing (Stages 3-6).
 
 Its core function is to orchestrate `replication_manager.py` to execute
 the required changes for individual replication runs.
@@ -59,6 +68,9 @@ import json
 import re
 import shutil
 import configparser
+import tempfile
+import threading
+from collections import deque
 from configparser import ConfigParser
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import partial
@@ -119,6 +131,9 @@ except ImportError as e:
 # This constant is specific to the manager's internal flow when a user aborts.
 AUDIT_ABORTED_BY_USER = 99
 
+# Printed by replication_manager.py (with --announce_stage2) once a replication's API calls are done.
+STAGE2_COMPLETE_MARKER = "<<<STAGE2_COMPLETE>>>"
+
 # --- Mode Execution Functions ---
 
 def _verify_experiment_level_files(target_dir: Path) -> tuple[bool, list[str]]:
@@ -166,17 +181,22 @@ def _run_new_mode(target_dir, start_rep, end_rep, notes, verbose, orchestrator_s
         return True
 
     print(f"{C_YELLOW}Will create {len(reps_to_run)} new replication(s), from {min(reps_to_run)} to {max(reps_to_run)}.{C_RESET}")
+
+    concurrency = get_config_value(APP_CONFIG, 'LLM', 'concurrent_replications', value_type=int, fallback=1)
+    if concurrency > 1 and len(reps_to_run) > 1:
+        call_limit = get_config_value(APP_CONFIG, 'LLM', 'max_experiment_sessions', value_type=int, fallback=0) or \
+            get_config_value(APP_CONFIG, 'LLM', 'max_parallel_sessions', value_type=int, fallback=10)
+        return _run_new_mode_concurrent(target_dir, reps_to_run, notes, verbose, orchestrator_script, colors,
+                                        min(concurrency, len(reps_to_run)), call_limit)
+
+    if get_config_value(APP_CONFIG, 'LLM', 'pipeline_replications', value_type=bool, fallback=False) and len(reps_to_run) > 1:
+        return _run_new_mode_pipelined(target_dir, reps_to_run, notes, verbose, orchestrator_script, colors)
+
     batch_start_time = time.time()
     
     for i, rep_num in enumerate(reps_to_run):
-        header_text = f" RUNNING REPLICATION {rep_num} ({i + 1} of {len(reps_to_run)} in this batch) "
-        print(f"\n{C_CYAN}{'='*80}{C_RESET}")
-        print(f"{C_CYAN}{header_text.center(78)}{C_RESET}")
-        print(f"{C_CYAN}{'='*80}{C_RESET}")
-        
-        cmd_orch = [sys.executable, orchestrator_script, "--replication_num", str(rep_num), "--base_output_dir", target_dir]
-        if notes: cmd_orch.extend(["--notes", notes])
-        if verbose: cmd_orch.append("--verbose")
+        _print_replication_header(rep_num, i, len(reps_to_run), C_CYAN, C_RESET)
+        cmd_orch = _build_new_replication_command(orchestrator_script, rep_num, target_dir, notes, verbose)
         
         try:
             # Let stderr pass through to show the progress bar from the child process.
@@ -206,14 +226,201 @@ def _run_new_mode(target_dir, start_rep, end_rep, notes, verbose, orchestrator_s
             # For any failure, immediately stop the batch.
             return False
 
-        elapsed = time.time() - batch_start_time
-        avg_time = elapsed / (i + 1)
-        remaining_reps = len(reps_to_run) - (i + 1)
-        time_remaining = remaining_reps * avg_time
-        eta = datetime.datetime.now() + datetime.timedelta(seconds=time_remaining)
+        _print_batch_timing(batch_start_time, i + 1, len(reps_to_run), C_YELLOW, C_RESET)
 
-        print(f"\n{C_YELLOW}Time Elapsed: {str(datetime.timedelta(seconds=int(elapsed)))} | Time Remaining: {str(datetime.timedelta(seconds=int(time_remaining)))} | ETA: {eta.strftime('%H:%M:%S')}{C_RESET}")
+    return True
+
+
+def _print_replication_header(rep_num, position, total, C_CYAN, C_RESET):
+    header_text = f" RUNNING REPLICATION {rep_num} ({position + 1} of {total} in this batch) "
+    print(f"\n{C_CYAN}{'='*80}{C_RESET}")
+    print(f"{C_CYAN}{header_text.center(78)}{C_RESET}")
+    print(f"{C_CYAN}{'='*80}{C_RESET}")
+
+
+def _build_new_replication_command(orchestrator_script, rep_num, target_dir, notes, verbose):
+    cmd_orch = [sys.executable, orchestrator_script, "--replication_num", str(rep_num), "--base_output_dir", target_dir]
+    if notes: cmd_orch.extend(["--notes", notes])
+    if verbose: cmd_orch.append("--verbose")
+    return cmd_orch
+
+
+def _print_batch_timing(batch_start_time, done, total, C_YELLOW, C_RESET):
+    elapsed = time.time() - batch_start_time
+    avg_time = elapsed / done
+    time_remaining = (total - done) * avg_time
+    eta = datetime.datetime.now() + datetime.timedelta(seconds=time_remaining)
+
+    print(f"\n{C_YELLOW}Time Elapsed: {str(datetime.timedelta(seconds=int(elapsed)))} | Time Remaining: {str(datetime.timedelta(seconds=int(time_remaining)))} | ETA: {eta.strftime('%H:%M:%S')}{C_RESET}")
+
+
+def _run_new_mode_pipelined(target_dir, reps_to_run, notes, verbose, orchestrator_script, colors):
+    """
+    Executes 'NEW' mode with each replication's API calls overlapping the previous one's local stages.
+
+    Every replication is still one `replication_manager.py` process, started
+    with the same arguments (and therefore the same seeds) as in sequential
+    mode. Once it reports that Stage 2 is complete, the next replication is
+    started while Stages 3-6 continue in the background; that output is
+    buffered and printed when the replication is collected. A replication is
+    collected only after its successor's Stage 2 has ended (or the successor
+    has exited without reaching Stage 3), and before the next replication is
+    started, so replications finish in order, at most one is calling the API,
+    and at most one is in Stages 3-6 at a time. A failed replication stops the
+    batch; its successor, if already started, is allowed to finish.
+    """
+    C_CYAN, C_YELLOW, C_RESET = colors['cyan'], colors['yellow'], colors['reset']
+    batch_start_time = time.time()
+    post_processing = None  # (rep_num, proc, drain_thread, buffered_lines) of the replication in Stages 3-6
+    proc = None
+
+    def collect(pending):
+        """Waits for a replication in Stages 3-6, prints its buffered output, and returns whether it succeeded."""
+        rep_num, pending_proc, drain_thread, lines = pending
+        drain_thread.join()
+        pending_proc.wait()
+        print(f"\n{C_CYAN}--- Replication {rep_num}: Stages 3-6 ---{C_RESET}")
+        for line in lines:
+            print(line, end='', flush=True)
+        if pending_proc.returncode != 0:
+            print(f"\n{C_YELLOW}Replication {rep_num} failed.{C_RESET}\n")
+            return False
+        return True
+
+    print(f"{C_CYAN}Pipelined replications: each replication's LLM sessions overlap the previous one's processing.{C_RESET}")
+    try:
+        for i, rep_num in enumerate(reps_to_run):
+            _print_replication_header(rep_num, i, len(reps_to_run), C_CYAN, C_RESET)
+            cmd_orch = _build_new_replication_command(orchestrator_script, rep_num, target_dir, notes, verbose)
+            cmd_orch.append("--announce_stage2")
+
+            # Let stderr pass through to show the progress bar from the child process.
+            proc = subprocess.Popen(cmd_orch, stdout=subprocess.PIPE,
+                                    text=True, encoding='utf-8', errors='replace')
+            reached_stage3 = False
+            for line in proc.stdout:
+                if line.strip() == STAGE2_COMPLETE_MARKER:
+                    reached_stage3 = True
+                    break
+                print(line, end='', flush=True)
+
+            previous_ok = collect(post_processing) if post_processing else True
+            post_processing = None
+
+            if reached_stage3:
+                lines = []
+                drain_thread = threading.Thread(target=lines.extend, args=(proc.stdout,), daemon=True)
+                drain_thread.start()
+                post_processing = (rep_num, proc, drain_thread, lines)
+            else:
+                proc.wait()
+                if proc.returncode != 0:
+                    print(f"\n{C_YELLOW}Replication {rep_num} failed.{C_RESET}\n")
+                    return False
+
+            if not previous_ok:
+                if post_processing:
+                    collect(post_processing)
+                return False
+
+            _print_batch_timing(batch_start_time, i + 1, len(reps_to_run), C_YELLOW, C_RESET)
+
+        return collect(post_processing) if post_processing else True
+
+    except KeyboardInterrupt:
+        for running in (proc, post_processing[1] if post_processing else None):
+            if running is not None and running.poll() is None:
+                running.terminate()
+        print(f"\n{C_YELLOW}Replication batch was interrupted by user.{C_RESET}\n")
+        sys.exit(1)
+
+
+def _run_new_mode_concurrent(target_dir, reps_to_run, notes, verbose, orchestrator_script, colors, concurrency, call_limit):
+    """
+    Executes 'NEW' mode with up to `concurrency` replications running at once.
+
+    All replications share one budget of `call_limit` in-flight API calls,
+    announced to every orchestrator and its workers through the environment
+    (see `call_budget.py`). The orchestrators' output is captured; progress is
+    reported once per finished replication, and the tail of a failed
+    replication's output is printed. After a failure no further replication is
+    started, but running ones finish. On interrupt, all replications are
+    stopped and their run directories are kept for repair mode.
+    """
+    from call_budget import BUDGET_DIR_ENV, BUDGET_LIMIT_ENV
+    C_CYAN, C_YELLOW, C_RESET = colors['cyan'], colors['yellow'], colors['reset']
+    C_RED = colors.get('red', C_YELLOW)
+    output_tail_lines = 40
+
+    budget_dir = tempfile.mkdtemp(prefix="llm_call_budget_")
+    env = dict(os.environ, **{BUDGET_DIR_ENV: budget_dir, BUDGET_LIMIT_ENV: str(call_limit)})
+    stop_launching = threading.Event()
+    running = {}  # rep_num -> Popen of the replications in progress
+    running_lock = threading.Lock()
+
+    def run_replication(rep_num):
+        """Runs one orchestrator to completion; returns (rep_num, returncode or None if not started, output tail)."""
+        with running_lock:
+            if stop_launching.is_set():
+                return rep_num, None, []
+            proc = subprocess.Popen(_build_new_replication_command(orchestrator_script, rep_num, target_dir, notes, verbose),
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, encoding='utf-8', errors='replace', env=env)
+            running[rep_num] = proc
+        output = deque(proc.stdout, maxlen=output_tail_lines)
+        proc.wait()
+        with running_lock:
+            running.pop(rep_num, None)
+        return rep_num, proc.returncode, list(output)
+
+    print(f"{C_CYAN}Running up to {concurrency} replications at once, with at most {call_limit} API calls in flight "
+          f"across the experiment.{C_RESET}")
+    batch_start_time = time.time()
+    failed_reps = []
+    finished = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = [executor.submit(run_replication, rep_num) for rep_num in reps_to_run]
+        for future in as_completed(futures):
+            rep_num, returncode, output = future.result()
+            if returncode is None:
+                continue
+            finished += 1
+            with running_lock:
+                in_progress = sorted(running)
+            if returncode == 0:
+                status = f"{C_CYAN}completed{C_RESET}"
+            else:
+                status = f"{C_RED}FAILED{C_RESET}"
+                failed_reps.append(rep_num)
+                stop_launching.set()
+                print(f"\n{C_YELLOW}--- Last output of replication {rep_num} ---{C_RESET}")
+                for line in output:
+                    print(line, end='')
+            running_str = ", ".join(str(r) for r in in_progress) or "none"
+            print(f"[{finished}/{len(reps_to_run)}] Replication {rep_num} {status} (running: {running_str})")
+            if not failed_reps:
+                _print_batch_timing(batch_start_time, finished, len(reps_to_run), C_YELLOW, C_RESET)
+    except KeyboardInterrupt:
+        stop_launching.set()
+        with running_lock:
+            procs = list(running.values())
+        # The orchestrators received the interrupt too; give them a moment to close their runs cleanly.
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.terminate()
+        print(f"\n{C_YELLOW}Replication batch was interrupted by user. Partially completed runs were kept "
+              f"and will be completed by repair mode.{C_RESET}\n")
+        sys.exit(1)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(budget_dir, ignore_errors=True)
 
+    if failed_reps:
+        print(f"\n{C_YELLOW}Replication(s) {', '.join(map(str, sorted(failed_reps)))} failed.{C_RESET}\n")
+        return False
     return True
 
 # This '_session_worker' function is no longer needed here and has been moved into replication_manager.py's logic.
@@ -489,6 +696,20 @@ def _run_finalization(final_output_dir, script_paths, colors):
         logging.error(f"An unexpected error occurred during finalization: {e}")
         sys.exit(1)
 
+def _build_reprocess_command(orchestrator_script, run_dir, notes, verbose):
+    """Builds the orchestrator command that reprocesses one existing replication."""
+    cmd_orch = [sys.executable, orchestrator_script, "--reprocess", "--run_output_dir", run_dir]
+    if verbose: cmd_orch.append("--verbose")
+    if notes: cmd_orch.extend(["--notes", notes])
+    return cmd_orch
+
+def _resolve_reprocess_workers(num_runs):
+    """Returns how many replications to reprocess at once (`[Analysis] reprocess_workers`, 0 = one per CPU, at most 8)."""
+    workers = get_config_value(APP_CONFIG, 'Analysis', 'reprocess_workers', value_type=int, fallback=1)
+    if workers <= 0:
+        workers = min(os.cpu_count() or 1, 8)
+    return max(1, min(workers, num_runs))
+
 def _run_reprocess_mode(runs_to_reprocess, notes, verbose, orchestrator_script, compile_script, target_dir, log_manager_script, colors):
     """Executes 'REPROCESS' mode to update analysis artifacts for specified runs."""
     C_CYAN = colors['cyan']
@@ -497,6 +718,13 @@ def _run_reprocess_mode(runs_to_reprocess, notes, verbose, orchestrator_script,
     C_GREEN = colors['green']
     print(f"{C_YELLOW}--- Entering REPROCESS Mode: Updating analysis for {len(runs_to_reprocess)} replication(s) ---{C_RESET}")
 
+    workers = _resolve_reprocess_workers(len(runs_to_reprocess))
+    if workers > 1:
+        if not _run_reprocess_mode_concurrent(runs_to_reprocess, notes, verbose, orchestrator_script, colors, workers):
+            return False
+        print(f"\n{C_GREEN}--- All replications reprocessed successfully. ---{C_RESET}")
+        return True
+
     for i, run_info in enumerate(runs_to_reprocess):
         run_dir = run_info["dir"]
         header_text = f" RE-PROCESSING {os.path.basename(run_dir)} ({i+1}/{len(runs_to_reprocess)}) "
@@ -504,9 +732,7 @@ def _run_reprocess_mode(runs_to_reprocess, notes, verbose, orchestrator_script,
         print(f"{C_CYAN}{header_text.center(78)}{C_RESET}")
         print(f"{C_CYAN}{'='*80}{C_RESET}")
 
-        cmd_orch = [sys.executable, orchestrator_script, "--reprocess", "--run_output_dir", run_dir]
-        if verbose: cmd_orch.append("--verbose")
-        if notes: cmd_orch.extend(["--notes", notes])
+        cmd_orch = _build_reprocess_command(orchestrator_script, run_dir, notes, verbose)
 
         try:
             proc = subprocess.Popen(cmd_orch, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
@@ -529,6 +755,69 @@ def _run_reprocess_mode(runs_to_reprocess, notes, verbose, orchestrator_script,
     print(f"\n{C_GREEN}--- All replications reprocessed successfully. ---{C_RESET}")
     return True
 
+def _run_reprocess_mode_concurrent(runs_to_reprocess, notes, verbose, orchestrator_script, colors, workers):
+    """
+    Reprocesses up to `workers` replications at once.
+
+    Reprocessing makes no API calls and each orchestrator only writes to its
+    own run directory, so replications are independent. Each orchestrator's
+    output is captured and printed as one block when it finishes. After a
+    failure no further replication is started, but running ones finish.
+    """
+    C_CYAN, C_YELLOW, C_RESET = colors['cyan'], colors['yellow'], colors['reset']
+    stop_launching = threading.Event()
+    running = {}  # run_dir -> Popen of the replications in progress
+    running_lock = threading.Lock()
+
+    def reprocess(run_dir):
+        """Runs one orchestrator to completion; returns (run_dir, returncode or None if not started, output)."""
+        with running_lock:
+            if stop_launching.is_set():
+                return run_dir, None, ""
+            proc = subprocess.Popen(_build_reprocess_command(orchestrator_script, run_dir, notes, verbose),
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, encoding='utf-8', errors='replace')
+            running[run_dir] = proc
+        output = proc.stdout.read()
+        proc.wait()
+        with running_lock:
+            running.pop(run_dir, None)
+        return run_dir, proc.returncode, output
+
+    print(f"{C_CYAN}Reprocessing up to {workers} replications at once.{C_RESET}")
+    failed_runs = []
+    finished = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(reprocess, run_info["dir"]) for run_info in runs_to_reprocess]
+        for future in as_completed(futures):
+            run_dir, returncode, output = future.result()
+            if returncode is None:
+                continue
+            finished += 1
+            header_text = f" RE-PROCESSED {os.path.basename(run_dir)} ({finished}/{len(runs_to_reprocess)}) "
+            print(f"\n{C_CYAN}{'='*80}{C_RESET}")
+            print(f"{C_CYAN}{header_text.center(78)}{C_RESET}")
+            print(f"{C_CYAN}{'='*80}{C_RESET}")
+            print(output, end='', flush=True)
+            if returncode != 0:
+                logging.error(f"Reprocessing failed for {os.path.basename(run_dir)}.")
+                failed_runs.append(run_dir)
+                stop_launching.set()
+    except KeyboardInterrupt:
+        stop_launching.set()
+        with running_lock:
+            procs = list(running.values())
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        logging.error("Reprocessing was interrupted by user.")
+        sys.exit(AUDIT_ABORTED_BY_USER)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return not failed_runs
+
 
 def main():
     """
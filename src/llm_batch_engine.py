@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/llm_batch_engine.py
+
+"""
+Provider Batch-API Session Engine for Stage 2 (Run LLM Sessions).
+
+Large factorial studies do not need interactive latency, and providers with a
+batch endpoint offer higher throughput limits at lower cost. With
+`[LLM] session_engine = batch`, `replication_manager.py` hands a replication's
+trials to `BatchSessionEngine`, which submits them as one job to an
+OpenAI-compatible Files/Batches API (`[API] batch_api_base_url`, by default
+the base of `api_endpoint`), waits for the job to finish, and unpacks the
+results into the standard `session_responses` layout. Stages 3-6 and the experiment auditor are
+therefore unaffected by the choice of engine.
+
+Key Features:
+-   **One Job per Replication**: Every `llm_query_NNN.txt` becomes one line
+    of a JSONL batch file with the same request body as an interactive call
+    (`llm_prompter.build_chat_payload`), keyed by `query-NNN`.
+-   **Resumable**: The job's id and status are kept in `batch_job.json` in the
+    run directory. An interrupted replication (or a later repair run) resumes
+    polling the submitted job instead of submitting it again.
+-   **Standard Artifacts**: Successful results are written as
+    `llm_response_NNN.txt` and `_full.json`; failed or missing results as
+    `.error.txt`, so repair mode retries exactly those trials.
+-   **Offline Testing**: `mock_llm_server.py` emulates the Files/Batches API.
+"""
+
+# === Start of src/llm_batch_engine.py ===
+
+import configparser
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import requests
+
+try:
+    import llm_prompter
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path:
+        sys.path.insert(0, current_script_dir)
+    import llm_prompter
+
+BATCH_STATE_FILENAME = "batch_job.json"
+CUSTOM_ID_PREFIX = "query-"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def get_batch_settings(config) -> Dict[str, Any]:
+    """Reads the batch submission settings from `[API]` of a (run-specific) config."""
+    get = llm_prompter.get_config_value
+    call_settings = llm_prompter.get_llm_call_settings(config)
+    # By default the batch API lives next to the interactive chat-completions endpoint.
+    endpoint_base = call_settings["api_endpoint"].rstrip('/')
+    if endpoint_base.endswith('/chat/completions'):
+        endpoint_base = endpoint_base[:-len('/chat/completions')]
+    return {
+        "base_url": (get(config, 'API', 'batch_api_base_url', fallback='') or endpoint_base).rstrip('/'),
+        "api_key_env": get(config, 'API', 'batch_api_key_env', fallback='OPENROUTER_API_KEY'),
+        "model_name": get(config, 'API', 'batch_model_name', fallback='') or call_settings["model_name"],
+        "max_tokens": call_settings["max_tokens"],
+        "temperature": call_settings["temperature"],
+        "prompt_caching": call_settings["prompt_caching"],
+        "completion_window": get(config, 'API', 'batch_completion_window', fallback='24h'),
+        "poll_seconds": get(config, 'API', 'batch_poll_seconds', fallback=30.0, value_type=float),
+        "max_wait_hours": get(config, 'API', 'batch_max_wait_hours', fallback=24.0, value_type=float),
+        "timeout_seconds": call_settings["timeout_seconds"],
+    }
+
+
+def build_batch_lines(indices: Iterable[int], queries_dir: str, settings: Dict[str, Any]) -> List[str]:
+    """Returns one JSONL request line per query, in index order."""
+    lines = []
+    for index in sorted(indices):
+        query_text = llm_prompter.read_query_input(os.path.join(queries_dir, f"llm_query_{index:03d}.txt"))
+        body = llm_prompter.build_chat_payload(query_text, settings["model_name"], settings["max_tokens"],
+                                               settings["temperature"], settings.get("prompt_caching", False))
+        lines.append(json.dumps({"custom_id": f"{CUSTOM_ID_PREFIX}{index:03d}", "method": "POST",
+                                 "url": "/v1/chat/completions", "body": body}, ensure_ascii=False))
+    return lines
+
+
+def parse_batch_output(text: str) -> Dict[int, Dict[str, Any]]:
+    """Maps each trial index to its result line from a batch output or error file."""
+    results = {}
+    for line in (text or "").splitlines():
+        try:
+            record = json.loads(line)
+            custom_id = record["custom_id"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if custom_id.startswith(CUSTOM_ID_PREFIX) and custom_id[len(CUSTOM_ID_PREFIX):].isdigit():
+            results[int(custom_id[len(CUSTOM_ID_PREFIX):])] = record
+    return results
+
+
+def describe_batch_failure(record: Optional[Dict[str, Any]], batch: Dict[str, Any]) -> str:
+    """Builds the `.error.txt` message of a trial that has no successful result."""
+    if record is None:
+        return f"No result for this query in batch {batch.get('id')} (status: {batch.get('status')})."
+    error = record.get("error") or ((record.get("response") or {}).get("body") or {}).get("error") or {}
+    status = (record.get("response") or {}).get("status_code")
+    message = error.get("message") if isinstance(error, dict) else str(error)
+    return f"Batch request failed{f' with HTTP {status}' if status else ''}: {message or 'unknown error'}"
+
+
+class BatchSessionEngine:
+    """Runs a replication's LLM queries as one provider batch job."""
+
+    def __init__(self, run_dir: str, responses_dir: str, queries_subdir: str = "session_queries",
+                 config_path: Optional[str] = None, http_session: Optional[requests.Session] = None,
+                 sleep=time.sleep, clock=time.time):
+        self.run_dir = run_dir
+        self.responses_dir = responses_dir
+        self.queries_dir = os.path.join(run_dir, queries_subdir)
+        self.state_path = os.path.join(run_dir, BATCH_STATE_FILENAME)
+
+        config_path = config_path or os.path.join(run_dir, 'config.ini.archived')
+        run_config = configparser.ConfigParser()
+        if os.path.exists(config_path):
+            run_config.read(config_path)
+        else:
+            logging.warning(f"Archived config not found at {config_path}. Using global configuration.")
+            run_config = llm_prompter.APP_CONFIG
+        self.settings = get_batch_settings(run_config)
+
+        llm_prompter.load_env_file(os.path.dirname(os.path.abspath(llm_prompter.__file__)))
+        self.api_key = os.getenv(self.settings["api_key_env"])
+        self._session = http_session or requests.Session()
+        self._sleep = sleep
+        self._clock = clock
+
+    # --- Batch API ---
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        response = self._session.request(method, f"{self.settings['base_url']}{path}",
+                                         headers={"Authorization": f"Bearer {self.api_key}"},
+                                         timeout=self.settings["timeout_seconds"], **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _download(self, file_id: Optional[str]) -> str:
+        return self._request("GET", f"/files/{file_id}/content").text if file_id else ""
+
+    # --- Resumable state ---
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, state: Dict[str, Any]):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _resumable(self, state: Optional[Dict[str, Any]], indices: List[int]) -> bool:
+        """A submitted job is resumed if its results were not unpacked yet and it covers every requested trial."""
+        return (state is not None and not state.get("unpacked") and state.get("status") not in ("failed", "cancelled")
+                and set(indices) <= set(state.get("indices", [])))
+
+    def submit(self, indices: List[int]) -> Dict[str, Any]:
+        """Uploads the batch file, creates the job, and records it in `batch_job.json`."""
+        content = "\n".join(build_batch_lines(indices, self.queries_dir, self.settings)) + "\n"
+        uploaded = self._request("POST", "/files", data={"purpose": "batch"},
+                                 files={"file": ("batch_input.jsonl", content.encode('utf-8'), "application/jsonl")}).json()
+        batch = self._request("POST", "/batches", json={
+            "input_file_id": uploaded["id"], "endpoint": "/v1/chat/completions",
+            "completion_window": self.settings["completion_window"],
+            "metadata": {"run": os.path.basename(os.path.normpath(self.run_dir))},
+        }).json()
+        state = {"batch_id": batch["id"], "input_file_id": uploaded["id"], "indices": sorted(indices),
+                 "status": batch.get("status", "validating"), "submitted_at": self._clock(), "unpacked": False}
+        self._save_state(state)
+        logging.info(f"Submitted batch {batch['id']} with {len(indices)} queries.")
+        return state
+
+    def wait(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Polls the job until it reaches a terminal status; returns the batch object, or None on timeout."""
+        deadline = state["submitted_at"] + self.settings["max_wait_hours"] * 3600.0
+        while True:
+            batch = self._request("GET", f"/batches/{state['batch_id']}").json()
+            if batch.get("status") != state.get("status"):
+                state["status"] = batch.get("status")
+                self._save_state(state)
+                logging.info(f"Batch {state['batch_id']}: {state['status']} {batch.get('request_counts') or ''}")
+            if state["status"] in TERMINAL_STATUSES:
+                return batch
+            if self._clock() >= deadline:
+                return None
+            self._sleep(self.settings["poll_seconds"])
+
+    def unpack(self, batch: Dict[str, Any], indices: List[int]) -> Dict[int, Optional[str]]:
+        """Writes each trial's artifacts; returns the error message per index (None on success)."""
+        results = parse_batch_output(self._download(batch.get("error_file_id")))
+        results.update(parse_batch_output(self._download(batch.get("output_file_id"))))
+        outcomes = {}
+        for index in indices:
+            record = results.get(index)
+            response = (record or {}).get("response") or {}
+            body = response.get("body")
+            response_file = os.path.join(self.responses_dir, f"llm_response_{index:03d}.txt")
+            if response.get("status_code") == 200 and isinstance(body, dict) and body.get("choices"):
+                llm_prompter.write_response_artifacts(body, response_file, os.path.splitext(response_file)[0] + "_full.json")
+                outcomes[index] = None
+            else:
+                outcomes[index] = describe_batch_failure(record, batch)
+                self._write_error(index, outcomes[index])
+        return outcomes
+
+    def _write_error(self, index: int, message: str) -> None:
+        llm_prompter.write_error_artifact(os.path.join(self.responses_dir, f"llm_response_{index:03d}.error.txt"), message)
+
+    def _fail_all(self, indices: List[int], message: str, start_time: float) -> Iterator[tuple]:
+        """Writes the same `.error.txt` for every trial and yields their failures."""
+        for index in indices:
+            self._write_error(index, message)
+            yield index, False, f"Query {index:03d} failed. {message}", self._clock() - start_time
+
+    # --- Engine contract ---
+
+    def run(self, indices: Iterable[int], limiter=None, on_report=None, hedger=None) -> Iterator[tuple]:
+        """
+        Submits (or resumes) the batch job and yields `(index, success, error, duration)` per trial.
+
+        All results arrive together when the job finishes, so the duration of
+        every trial is the job's turnaround time. A job that does not finish
+        within `batch_max_wait_hours` is left in `batch_job.json` for the
+        next run to resume, and its trials are reported (and written) as
+        failed, as are all trials if the job cannot be submitted or its
+        results cannot be downloaded (the job then stays resumable). `limiter`
+        and `hedger` do not apply to batch jobs and are ignored.
+        """
+        indices = sorted(indices)
+        if not indices:
+            return
+        start_time = self._clock()
+        try:
+            if not self.api_key:
+                raise RuntimeError(f"{self.settings['api_key_env']} not set.")
+            state = self.load_state()
+            if self._resumable(state, indices):
+                logging.info(f"Resuming batch {state['batch_id']} (status: {state.get('status')}).")
+            else:
+                state = self.submit(indices)
+            batch = self.wait(state)
+        except (requests.exceptions.RequestException, RuntimeError, OSError, KeyError, ValueError) as e:
+            message = f"Batch submission failed: {e}"
+            logging.error(message)
+            yield from self._fail_all(indices, message, start_time)
+            return
+
+        if batch is None:
+            message = (f"Batch {state['batch_id']} did not finish within {self.settings['max_wait_hours']:g} hours; "
+                       f"it will be resumed by the next repair run.")
+            yield from self._fail_all(indices, message, start_time)
+            return
+
+        try:
+            outcomes = self.unpack(batch, indices)
+        except (requests.exceptions.RequestException, OSError, KeyError, ValueError) as e:
+            message = (f"Could not download or unpack the results of batch {state['batch_id']}: {e}; "
+                       f"they will be unpacked by the next repair run.")
+            logging.error(message)
+            yield from self._fail_all(indices, message, start_time)
+            return
+        state["unpacked"] = True
+        self._save_state(state)
+        duration = self._clock() - start_time
+        for index in indices:
+            error = outcomes[index]
+            if on_report is not None:
+                on_report(index, {"started_at": start_time, "batch_id": state["batch_id"],
+                                  "attempts": [{"attempt": 1, "duration": round(duration, 3),
+                                                "outcome": "ok" if error is None else "BatchError"}]})
+            yield index, error is None, None if error is None else f"Query {index:03d} failed. {error}", duration
+
+# === End of src/llm_batch_engine.py ===
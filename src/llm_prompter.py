@@ -40,20 +40,51 @@ Key Features:
     (timeouts, HTTP errors) and user interruptions.
 -   **Designed for Testability**: Includes `--test_mock_api_outcome` hooks to
     allow for simulating various API responses without making live network calls.
+-   **Server Mode**: With `--serve`, the worker stays alive and processes JSON
+    query jobs from `stdin`, reusing its interpreter, parsed config, and HTTP
+    session across calls. Used by the persistent worker pool in
+    `llm_session_engine.py`.
+-   **Call Reports**: Each call reports its per-attempt timings and, on
+    failure, its HTTP status and any `Retry-After` delay (a
+    `<<<CALL_REPORT:...>>>` line on `stdout`). The orchestrator logs the
+    attempts and the adaptive concurrency controller uses them to back off.
+-   **Retry Policy**: Timeouts, connection errors, and retryable HTTP statuses
+    are retried in the call layer with exponential backoff, full jitter,
+    `Retry-After` support, and a total deadline (`[API] retry_*`).
+-   **Streaming with Early Termination**: With `[LLM] stream_responses = true`,
+    responses are read as server-sent events. The connection is closed once
+    Stage 3's block detector has seen a complete k x k matrix and
+    `stream_trailer_chars` more characters have arrived. Time to first token
+    and time to matrix are recorded per call.
+-   **Hedged Requests**: Given a hedge delay by the orchestrator, a call that
+    is still running after that delay is raced against a duplicate request.
+    The first successful answer is kept and the other request is cancelled.
+-   **Shared Rate Limiting**: With `[RateLimit] enabled = true`, every call
+    first draws from requests- and tokens-per-minute buckets shared by all
+    processes using the same API key and model (`rate_limiter.py`).
+-   **Experiment-Wide Call Budget**: When replications run concurrently, each
+    attempt holds one slot of the experiment's shared budget of in-flight
+    calls (`call_budget.py`).
 """
 
 # === Start of src/llm_prompter.py ===
 
 import argparse
+import contextlib
+import datetime
 import os
+import re
 import sys
 import time
 import logging
 import json
+import queue
+import random
 import requests
 import threading
 import itertools
 from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
 from typing import Optional, Dict, List, Tuple, Any
 
 # --- Import from config_loader ---
@@ -93,6 +124,14 @@ except ImportError:
               "Using minimal fallbacks. This might affect functionality if config is essential.")
 
 
+try:
+    import query_bundle
+except ImportError:
+    current_script_dir_lprompter = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir_lprompter not in sys.path:
+        sys.path.insert(0, current_script_dir_lprompter)
+    import query_bundle
+
 # --- Default filenames for standalone interactive test mode ---
 INTERACTIVE_TEST_QUERY_FILE = "interactive_test_query.txt"
 INTERACTIVE_TEST_RESPONSE_FILE = "interactive_test_response.txt"
@@ -140,11 +179,762 @@ def animate_spinner(stop_event, query_identifier: str):
     sys.stderr.write('\r' + ' ' * 120 + '\r')
     sys.stderr.flush()
 
+# --- Helper: Run Configuration ---
+def _get_api_setting(config, key: str, fallback=None, value_type=str):
+    """Reads an API setting from [API], falling back to the legacy [LLM] location."""
+    legacy_value = get_config_value(config, 'LLM', key, fallback=fallback, value_type=value_type)
+    return get_config_value(config, 'API', key, fallback=legacy_value, value_type=value_type)
+
+def get_llm_call_settings(config) -> Dict[str, Any]:
+    """
+    Resolves all parameters needed for an API call from a (run-specific) config.
+
+    Shared by the command-line worker and the in-process session engines so
+    that every execution path sends identical requests.
+    """
+    return {
+        "model_name": get_config_value(config, 'LLM', 'model_name', fallback_key='model', fallback="google/gemini-1.5-pro-latest"),
+        "api_endpoint": _get_api_setting(config, 'api_endpoint', fallback='https://openrouter.ai/api/v1/chat/completions'),
+        "timeout_seconds": _get_api_setting(config, 'api_timeout_seconds', fallback=120, value_type=int),
+        "referer": _get_api_setting(config, 'referer_header', fallback="http://localhost:3000"),
+        "max_tokens": get_config_value(config, 'LLM', 'max_tokens', fallback=1000, value_type=int),
+        "temperature": get_config_value(config, 'LLM', 'temperature', fallback=None, value_type=float),
+        "retry_policy": get_retry_policy(config),
+        "stream": get_config_value(config, 'LLM', 'stream_responses', fallback=False, value_type=bool),
+        "stream_trailer_chars": get_config_value(config, 'LLM', 'stream_trailer_chars', fallback=200, value_type=int),
+        "prompt_caching": get_config_value(config, 'LLM', 'prompt_caching', fallback=False, value_type=bool),
+    }
+
+# --- Helper: Retry Policy ---
+DEFAULT_RETRY_STATUS_CODES = "408, 429, 500, 502, 503, 504"
+
+def get_retry_policy(config) -> Dict[str, Any]:
+    """
+    Reads the call-layer retry policy from `[API]`.
+
+    The fallback of a single attempt keeps runs whose archived config predates
+    the retry settings behaving exactly as they did originally.
+    """
+    status_codes = _get_api_setting(config, 'retry_status_codes', fallback=DEFAULT_RETRY_STATUS_CODES)
+    return {
+        "max_attempts": max(1, _get_api_setting(config, 'retry_max_attempts', fallback=1, value_type=int)),
+        "base_delay": _get_api_setting(config, 'retry_base_delay_seconds', fallback=2.0, value_type=float),
+        "max_delay": _get_api_setting(config, 'retry_max_delay_seconds', fallback=60.0, value_type=float),
+        "deadline": _get_api_setting(config, 'retry_deadline_seconds', fallback=150.0, value_type=float),
+        "status_codes": sorted({int(code) for code in re.split(r'[,\s]+', str(status_codes)) if code.isdigit()}),
+    }
+
+def compute_retry_delay(retry_policy: Optional[Dict[str, Any]], attempt: int, exc: BaseException,
+                        elapsed: float) -> Optional[float]:
+    """
+    Returns the wait before the next attempt, or None if the failure is final.
+
+    Timeouts, connection errors, and the configured HTTP status codes are
+    retried with exponential backoff and full jitter. A `Retry-After` header
+    sets the minimum wait. No attempt is started past the total deadline.
+    """
+    if retry_policy is None or attempt >= retry_policy["max_attempts"]:
+        return None
+    outcome = describe_call_outcome(exc)
+    retryable = (outcome["timeout"]
+                 or isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError))
+                 or outcome["status"] in retry_policy["status_codes"])
+    if not retryable:
+        return None
+    delay = random.uniform(0, min(retry_policy["max_delay"], retry_policy["base_delay"] * 2 ** (attempt - 1)))
+    if outcome["retry_after"] is not None:
+        delay = max(delay, outcome["retry_after"])
+    if elapsed + delay >= retry_policy["deadline"]:
+        return None
+    return delay
+
+def _record_attempt(attempt_log: Optional[List[Dict[str, Any]]], attempt: int, duration: float,
+                    exc: Optional[BaseException], retry_delay: Optional[float],
+                    details: Optional[Dict[str, Any]] = None, hedge: Optional[Dict[str, Any]] = None):
+    if attempt_log is None:
+        return
+    entry: Dict[str, Any] = {"attempt": attempt, "duration": round(duration, 3), "outcome": "ok"}
+    if details:
+        entry.update(details)
+    if hedge:
+        entry["hedge"] = hedge
+    if exc is not None:
+        outcome = describe_call_outcome(exc)
+        entry.update(status=outcome["status"], timeout=outcome["timeout"],
+                     outcome=f"HTTP {outcome['status']}" if outcome["status"] else type(exc).__name__)
+    if retry_delay is not None:
+        entry["retry_delay"] = round(retry_delay, 3)
+    attempt_log.append(entry)
+
+def _response_metrics(response, read_body: bool) -> Dict[str, Any]:
+    """Collects the HTTP status, time to first byte, and (if `read_body`) body size of a response."""
+    metrics: Dict[str, Any] = {}
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        metrics["status"] = status
+    elapsed = getattr(response, "elapsed", None)
+    if isinstance(elapsed, datetime.timedelta):
+        metrics["ttfb"] = round(elapsed.total_seconds(), 3)
+    if read_body:
+        content = getattr(response, "content", None)
+        if isinstance(content, bytes):
+            metrics["bytes_received"] = len(content)
+    return metrics
+
+def load_env_file(script_dir: str) -> Optional[str]:
+    """Loads the first .env file found in the standard locations and returns its path."""
+    dotenv_paths_to_try = [
+        os.path.join(script_dir, DOTENV_PATH), # Alongside script
+        os.path.join(os.getcwd(), DOTENV_PATH)        # In CWD
+    ]
+    if 'PROJECT_ROOT' in globals() and PROJECT_ROOT:
+        dotenv_paths_to_try.insert(0, os.path.join(PROJECT_ROOT, DOTENV_PATH))
+
+    for d_path in dotenv_paths_to_try:
+        if os.path.exists(d_path) and load_dotenv(d_path):
+            return d_path
+    return None
+
+# --- Helper: Output Artifacts ---
+def extract_response_content(raw_llm_response_json: Dict[str, Any]) -> str:
+    """Extracts the assistant's message text from a chat-completion JSON body."""
+    response_content = ""
+    try:
+        if isinstance(raw_llm_response_json.get('choices'), list) and raw_llm_response_json['choices']:
+            message = raw_llm_response_json['choices'][0].get('message', {})
+            response_content = message.get('content', '')
+        if not response_content.strip():
+             logging.info("  LLM Prompter: Response content is empty or whitespace.")
+    except Exception as e_parse:
+        logging.warning(f"  LLM Prompter: Error extracting message content from LLM JSON: {e_parse}. Saving empty response.")
+    return response_content
+
+def write_response_artifacts(raw_llm_response_json: Dict[str, Any], output_response_file: str,
+                             output_json_file: Optional[str] = None):
+    """Writes the `_full.json` (if requested) and the extracted response text."""
+    if output_json_file:
+        try:
+            output_json_file_abs = os.path.abspath(output_json_file)
+            with open(output_json_file_abs, 'w', encoding='utf-8') as f_json:
+                json.dump(raw_llm_response_json, f_json, indent=2, ensure_ascii=False)
+            logging.info(f"  LLM Prompter: Wrote full JSON to '{os.path.basename(output_json_file_abs)}'.")
+        except IOError as e:
+            logging.error(f"  LLM Prompter: Failed to write JSON file: {e}")
+
+    with open(output_response_file, 'w', encoding='utf-8') as f_response:
+        f_response.write(extract_response_content(raw_llm_response_json))
+
+def write_error_artifact(output_error_file: str, message: str):
+    """Writes a failure description to the query's `.error.txt` file."""
+    with open(output_error_file, 'w', encoding='utf-8') as f_err:
+        f_err.write(message)
+
+def describe_api_exception(exc: BaseException, query_identifier: str) -> str:
+    """Maps an exception raised during an API call to its error-file message."""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return f"API call timed out for query {query_identifier}."
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return f"API call failed with HTTP error for query {query_identifier}. Details: {exc}"
+    if isinstance(exc, requests.exceptions.ChunkedEncodingError):
+        return f"API call failed due to connection issues for query {query_identifier}. The response was incomplete."
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return f"API call failed due to connection problems for query {query_identifier}."
+    if isinstance(exc, FileNotFoundError):
+        return str(exc)
+    if isinstance(exc, KeyboardInterrupt):
+        return "Processing interrupted by user (Ctrl+C)."
+    return f"Unhandled error in llm_prompter.py for query {query_identifier}: {type(exc).__name__}: {exc}"
+
+# --- Call Reports: Throttling Signals for the Orchestrator ---
+CALL_REPORT_TAG = "<<<CALL_REPORT:"
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converts a `Retry-After` header (delta-seconds or HTTP date) to seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def describe_call_outcome(exc: BaseException) -> Dict[str, Any]:
+    """
+    Summarizes a failed API call as `{"status", "retry_after", "timeout"}`.
+
+    The HTTP status is taken from the attached response or, if there is none,
+    from the leading status code in the error text.
+    """
+    report: Dict[str, Any] = {"status": None, "retry_after": None,
+                              "timeout": isinstance(exc, requests.exceptions.Timeout)}
+    if isinstance(exc, requests.exceptions.HTTPError):
+        response = getattr(exc, "response", None)
+        if response is not None:
+            report["status"] = response.status_code
+            report["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+        else:
+            match = re.search(r'\b([45]\d{2})\b', str(exc))
+            if match:
+                report["status"] = int(match.group(1))
+    return report
+
+def emit_call_report(exc: Optional[BaseException] = None, attempts: Optional[List[Dict[str, Any]]] = None):
+    """Prints the call report (failure details and per-attempt timings) for a capturing orchestrator."""
+    report = describe_call_outcome(exc) if exc is not None else {"status": None, "retry_after": None, "timeout": False}
+    if attempts:
+        report["attempts"] = attempts
+    print(f"{CALL_REPORT_TAG}{json.dumps(report)}>>>", flush=True)
+
+def parse_call_report(output: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Extracts the call report from a worker's captured `stdout`, if present."""
+    if not output:
+        return None
+    match = re.search(re.escape(CALL_REPORT_TAG) + r'(\{.*\})>>>\s*$', output, re.MULTILINE)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+
+# --- Helper: Streaming (SSE) Responses ---
+def _import_response_parser():
+    try:
+        import process_llm_responses
+    except ImportError:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+        import process_llm_responses
+    return process_llm_responses
+
+def count_list_a_items(query_text: str) -> int:
+    """Returns k, the number of List A entries in a query (0 if there is no List A)."""
+    return len(_import_response_parser().extract_list_a_items(query_text.splitlines()))
+
+def find_matrix_end(text: str, k_value: int) -> Optional[int]:
+    """
+    Returns the offset just past the first complete k x k score block in `text`, or None.
+
+    Uses the same block detector as Stage 3 (`process_llm_responses.py`) and
+    only considers complete lines, so a row that is still being streamed is
+    never accepted. Because the detector picks the first matching block, the
+    parsed matrix is the same whether a response is cut after this offset or not.
+    """
+    complete = text[:text.rfind('\n') + 1]
+    if k_value <= 0 or not complete:
+        return None
+    lines, line_ends, offset = [], [], 0
+    for raw_line in complete.splitlines(keepends=True):
+        offset += len(raw_line)
+        if raw_line.strip():
+            lines.append(raw_line.strip())
+            line_ends.append(offset)
+    block = _import_response_parser().find_score_block(lines, k_value)
+    if block is None:
+        return None
+    return line_ends[block[0] + k_value - 1]
+
+def read_streamed_completion(response, k_value: int, trailer_chars: int,
+                             attempt_start: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Consumes a server-sent-events chat completion and rebuilds its JSON body.
+
+    Once a complete k x k block has been seen and `trailer_chars` more
+    characters have arrived, the connection is closed without waiting for the
+    rest of the generation. Returns the rebuilt body (shaped like a
+    non-streamed response, so the usual artifacts are written) and the
+    stream statistics: `ttft` (time to first token), `time_to_matrix`,
+    whether the stream was `terminated_early`, and `bytes_received`.
+    """
+    text_parts: List[str] = []
+    received = 0
+    matrix_end: Optional[int] = None
+    stats: Dict[str, Any] = {"ttft": None, "time_to_matrix": None, "terminated_early": False, "bytes_received": 0}
+    body: Dict[str, Any] = {"object": "chat.completion"}
+    finish_reason = None
+    try:
+        for raw_line in response.iter_lines(decode_unicode=True):
+            stats["bytes_received"] += len((raw_line or "").encode('utf-8')) + 1
+            # Blank lines separate events; lines starting with ':' are keep-alive comments.
+            if not raw_line or not raw_line.startswith('data:'):
+                continue
+            data = raw_line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                logging.debug(f"  LLM Prompter: Skipping undecodable stream event: {data[:80]}")
+                continue
+            if chunk.get("error"):
+                raise requests.exceptions.HTTPError(f"Stream reported an error: {chunk['error']}", response=response)
+            for field in ("id", "model", "created", "usage"):
+                if chunk.get(field) is not None:
+                    body[field] = chunk[field]
+            choices = chunk.get("choices") or [{}]
+            finish_reason = choices[0].get("finish_reason") or finish_reason
+            content = (choices[0].get("delta") or {}).get("content") or ""
+            if not content:
+                continue
+            if stats["ttft"] is None:
+                stats["ttft"] = round(time.time() - attempt_start, 3)
+            text_parts.append(content)
+            received += len(content)
+
+            if matrix_end is None and '\n' in content:
+                matrix_end = find_matrix_end("".join(text_parts), k_value)
+                if matrix_end is not None:
+                    stats["time_to_matrix"] = round(time.time() - attempt_start, 3)
+            if matrix_end is not None and received >= matrix_end + trailer_chars:
+                stats["terminated_early"] = True
+                break
+    finally:
+        response.close()
+
+    body["choices"] = [{"index": 0, "message": {"role": "assistant", "content": "".join(text_parts)},
+                        "finish_reason": "early_stop" if stats["terminated_early"] else finish_reason}]
+    body["stream_stats"] = stats
+    return body, stats
+
+# --- Helper: Hedged Requests ---
+def race_hedged(send, hedge_after: float, hedge_report: Dict[str, Any], hold=None):
+    """
+    Runs `send(register, is_hedge)` and, if it has not finished within `hedge_after` seconds, a duplicate.
+
+    The first successful result is returned. If one request fails, the other
+    is awaited. `send` passes each response to `register` as soon as its
+    headers arrive, and the losing request's connection is closed then (or at
+    once, if they have already arrived). A loser still waiting for its headers
+    cannot be cancelled and keeps running until they arrive or it times out.
+    `hold`, if given, returns a context manager (e.g. a call-budget slot) that
+    each request holds for as long as it runs, so a losing request stays
+    counted after the race is decided; the hedge timer starts once the
+    primary holds it. `hedge_report` receives the hedge delay (`after`) and
+    the `winner` ('primary' or 'hedge') if a duplicate was sent.
+    """
+    results: "queue.Queue" = queue.Queue()
+    lock = threading.Lock()
+    responses: Dict[str, Any] = {}
+    decided = {"winner": None}
+    primary_holding = threading.Event()
+
+    def _register(name):
+        def _store(response):
+            with lock:
+                responses[name] = response
+                lost = decided["winner"] is not None and decided["winner"] != name
+            if lost:
+                response.close()
+        return _store
+
+    def _racer(name):
+        try:
+            with hold() if hold is not None else contextlib.nullcontext():
+                primary_holding.set()
+                with lock:
+                    if decided["winner"] is not None:
+                        return  # The race ended while the duplicate waited for its slot.
+                results.put((name, send(_register(name), name == "hedge"), None))
+        except Exception as e:
+            results.put((name, None, e))
+        finally:
+            primary_holding.set()
+
+    threading.Thread(target=_racer, args=("primary",), daemon=True).start()
+    primary_holding.wait()
+    racers = 1
+    try:
+        name, value, exc = results.get(timeout=hedge_after)
+    except queue.Empty:
+        hedge_report["after"] = round(hedge_after, 3)
+        threading.Thread(target=_racer, args=("hedge",), daemon=True).start()
+        racers = 2
+        name, value, exc = results.get()
+    if exc is not None and racers == 2:
+        name, value, exc = results.get()
+    if exc is not None:
+        raise exc
+
+    with lock:
+        decided["winner"] = name
+        losers = [response for racer, response in responses.items() if racer != name]
+    for response in losers:
+        response.close()
+    if racers == 2:
+        hedge_report["winner"] = name
+    return value
+
+@contextlib.contextmanager
+def _budget_slot(call_budget, waits: List[float]):
+    """Holds one call-budget slot and appends the seconds spent waiting for it to `waits`."""
+    with call_budget.slot() as waited:
+        waits.append(waited)
+        yield waited
+
+# --- Shared Cross-Process Rate Limiter ---
+_shared_rate_limiter = None
+_shared_rate_limiter_loaded = False
+
+def get_shared_rate_limiter():
+    """Returns the machine-wide rate limiter configured in `[RateLimit]`, or None."""
+    global _shared_rate_limiter, _shared_rate_limiter_loaded
+    if not _shared_rate_limiter_loaded:
+        try:
+            import rate_limiter
+        except ImportError:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            if script_dir not in sys.path:
+                sys.path.insert(0, script_dir)
+            import rate_limiter
+        _shared_rate_limiter = rate_limiter.create_rate_limiter(APP_CONFIG, get_config_value)
+        _shared_rate_limiter_loaded = True
+    return _shared_rate_limiter
+
+# --- Shared Experiment-Wide Call Budget ---
+_call_budget = None
+_call_budget_loaded = False
+
+def get_call_budget():
+    """Returns the experiment-wide budget of in-flight calls set by `experiment_manager.py`, or None."""
+    global _call_budget, _call_budget_loaded
+    if not _call_budget_loaded:
+        try:
+            import call_budget
+        except ImportError:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            if script_dir not in sys.path:
+                sys.path.insert(0, script_dir)
+            import call_budget
+        _call_budget = call_budget.get_call_budget_from_env()
+        _call_budget_loaded = True
+    return _call_budget
+
 # --- Helper: LLM API Call ---
+LIST_A_HEADING = "List A"
+
+def split_query_prefix(query_text: str) -> Tuple[str, str]:
+    """
+    Splits a trial query into its shared instructions and its trial-specific lists.
+
+    The instructions (`data/base_query.txt` formatted for k) are identical for
+    every trial of an experiment; the lists start at the `List A` heading
+    written by `query_generator.py`. Returns `("", query_text)` if there is no
+    such heading. The two parts always concatenate to the original text.
+    """
+    if query_text.startswith(LIST_A_HEADING + "\n"):
+        return "", query_text
+    split_at = query_text.find("\n" + LIST_A_HEADING + "\n")
+    if split_at < 0:
+        return "", query_text
+    return query_text[:split_at + 1], query_text[split_at + 1:]
+
+def build_chat_payload(query_text: str, model_name: str, max_tokens: Optional[int] = None,
+                       temperature: Optional[float] = None, prompt_caching: bool = False) -> Dict[str, Any]:
+    """
+    Builds the chat-completion request body (shared by interactive and batch submissions).
+
+    With `prompt_caching`, the message is sent as two text parts, and the
+    shared instructions carry a `cache_control` marker so that providers that
+    support explicit prompt caching can reuse them across trials. Providers
+    with automatic prefix caching benefit from the stable prefix either way.
+    """
+    content: Any = query_text
+    if prompt_caching:
+        prefix, suffix = split_query_prefix(query_text)
+        if prefix:
+            content = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                       {"type": "text", "text": suffix}]
+    payload: Dict[str, Any] = {"model": model_name, "messages": [{"role": "user", "content": content}]}
+    if max_tokens is not None: payload["max_tokens"] = max_tokens
+    if temperature is not None: payload["temperature"] = temperature
+    return payload
+
+def log_cached_tokens(data: Any, query_identifier: str):
+    """Logs how many prompt tokens the provider served from its prompt cache, if it reports them."""
+    usage = (data.get("usage") or {}) if isinstance(data, dict) else {}
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached_tokens is not None:
+        logging.info(f"  Query {query_identifier}: {cached_tokens} of {usage.get('prompt_tokens')} "
+                     f"prompt tokens were served from the provider's prompt cache.")
+
+def post_chat_completion(query_text: str, model_name: str, api_key: str, api_endpoint: str,
+                         referer: str, timeout_seconds: int, query_identifier: str,
+                         max_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                         http_session: Optional[requests.Session] = None,
+                         retry_policy: Optional[Dict[str, Any]] = None,
+                         attempt_log: Optional[List[Dict[str, Any]]] = None,
+                         stream: bool = False, stream_trailer_chars: int = 200,
+                         hedge_after: Optional[float] = None, prompt_caching: bool = False):
+    """
+    Sends a single chat-completion request and returns the decoded JSON body.
+
+    If the body cannot be decoded, a descriptive error string is returned
+    instead. Network and HTTP errors that are not absorbed by the
+    `retry_policy` are raised to the caller. When an `http_session` is
+    supplied, its pooled keep-alive connections are reused. Each attempt's
+    duration and outcome are appended to `attempt_log`, if given. With
+    `stream`, the response is read as server-sent events and cut short once
+    the score matrix is complete (see `read_streamed_completion`). With
+    `hedge_after`, one attempt that is still running after that many seconds
+    is raced against a duplicate request (see `race_hedged`). Inside an
+    experiment that runs replications concurrently, each attempt holds a slot
+    of the experiment-wide call budget (see `call_budget.py`). With
+    `prompt_caching`, the shared instructions are marked for provider-side
+    caching (see `build_chat_payload`).
+    """
+    payload = build_chat_payload(query_text, model_name, max_tokens, temperature, prompt_caching)
+    if stream:
+        payload["stream"] = True
+        k_value = count_list_a_items(query_text)
+
+    headers = {"Authorization": f"Bearer {api_key}", "HTTP-Referer": referer, "Content-Type": "application/json"}
+    logging.debug(f"API Request Payload for Query {query_identifier}: {json.dumps(payload, indent=2, ensure_ascii=False)}")
+
+    logging.info(f"  Query {query_identifier}: Calling API with model='{model_name}', "
+                 f"max_tokens={payload.get('max_tokens')}, temperature={payload.get('temperature')}")
+
+    rate_limiter = get_shared_rate_limiter()
+    if rate_limiter is not None or hedge_after is not None:
+        from rate_limiter import estimate_request_tokens
+        estimated_tokens = estimate_request_tokens(query_text, max_tokens)
+
+    call_budget = get_call_budget()
+    post = http_session.post if http_session is not None else requests.post
+    bytes_sent = len(json.dumps(payload).encode('utf-8'))
+
+    def _send_attempt(attempt_timeout, register=None, acquire=False):
+        if acquire and rate_limiter is not None:
+            rate_limiter.acquire(api_key, model_name, estimated_tokens)
+        send_start = time.time()
+        # A hedged request is opened in streaming mode so its transfer can be cancelled.
+        stream_kwargs = {"stream": True} if stream or register is not None else {}
+        response = post(api_endpoint, headers=headers, json=payload, timeout=attempt_timeout, **stream_kwargs)
+        if register is not None:
+            register(response)
+        response.raise_for_status()
+        if stream:
+            return (response,) + read_streamed_completion(response, k_value, stream_trailer_chars, send_start)
+        if register is not None:
+            response.content  # Read the body inside the race.
+        return response, None, None
+
+    started_at = time.time()
+    attempt = 0
+    hedge_report: Dict[str, Any] = {}
+    while True:
+        attempt += 1
+        attempt_timeout = timeout_seconds
+        if retry_policy is not None and attempt > 1:
+            # Later attempts may not run past the total deadline.
+            remaining = retry_policy["deadline"] - (time.time() - started_at)
+            attempt_timeout = max(1, min(timeout_seconds, int(remaining)))
+        rate_limit_wait = 0.0
+        if rate_limiter is not None:
+            rate_limit_wait = rate_limiter.acquire(api_key, model_name, estimated_tokens) or 0.0
+
+        attempt_start = time.time()
+        # At most one attempt per call is hedged.
+        hedge_this_attempt = hedge_after is not None and not hedge_report
+        attempt_hedge: Dict[str, Any] = {}
+        budget_wait = 0.0
+        try:
+            if hedge_this_attempt:
+                # Each request of the race holds its own slot until it ends, including a losing one.
+                budget_waits: List[float] = []
+                response, data, stream_stats = race_hedged(
+                    lambda register, is_hedge: _send_attempt(attempt_timeout, register, acquire=is_hedge),
+                    hedge_after, attempt_hedge,
+                    hold=(lambda: _budget_slot(call_budget, budget_waits)) if call_budget is not None else None)
+                if budget_waits:
+                    budget_wait = budget_waits[0]
+                    attempt_start += budget_wait
+            else:
+                # The slot is released before any retry backoff.
+                with call_budget.slot() if call_budget is not None else contextlib.nullcontext(0.0) as budget_wait:
+                    attempt_start = time.time()
+                    response, data, stream_stats = _send_attempt(attempt_timeout)
+        except requests.exceptions.RequestException as e:
+            retry_delay = compute_retry_delay(retry_policy, attempt, e, time.time() - started_at)
+            if attempt_hedge:
+                attempt_hedge["extra_tokens"] = estimated_tokens
+                hedge_report = attempt_hedge
+            _record_attempt(attempt_log, attempt, time.time() - attempt_start, e, retry_delay, hedge=attempt_hedge)
+            if retry_delay is None:
+                raise
+            logging.warning(f"  Query {query_identifier}: Attempt {attempt} failed ({type(e).__name__}: {e}). "
+                            f"Retrying in {retry_delay:.1f}s.")
+            time.sleep(retry_delay)
+            continue
+        if attempt_hedge:
+            hedge_report = attempt_hedge
+            logging.info(f"  Query {query_identifier}: Hedged after {hedge_report['after']:.1f}s; "
+                         f"the {hedge_report['winner']} request answered first.")
+        details = _response_metrics(response, read_body=not stream)
+        details.update(stream_stats or {})
+        details["bytes_sent"] = bytes_sent
+        if rate_limit_wait:
+            details["rate_limit_wait"] = round(rate_limit_wait, 3)
+        if budget_wait:
+            details["budget_wait"] = round(budget_wait, 3)
+        _record_attempt(attempt_log, attempt, time.time() - attempt_start, None, None, details, hedge=attempt_hedge)
+        break
+    if hedge_report:
+        hedge_report.setdefault("extra_tokens", estimated_tokens)
+
+    if stream:
+        log_cached_tokens(data, query_identifier)
+        logging.info(f"  Query {query_identifier}: Streamed API call successful "
+                     f"(first token {stream_stats['ttft']}s, matrix {stream_stats['time_to_matrix']}s"
+                     f"{', terminated early' if stream_stats['terminated_early'] else ''}).")
+        if rate_limiter is not None:
+            rate_limiter.settle(api_key, model_name, estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+        if hedge_report:
+            hedge_report["extra_tokens"] = (data.get("usage") or {}).get("total_tokens") or estimated_tokens
+        return data
+
+    # Attempt to parse JSON with robust error handling for malformed responses
+    try:
+        data = response.json()
+        logging.info(f"  Query {query_identifier}: API call successful.")
+        log_cached_tokens(data, query_identifier)
+        if rate_limiter is not None and isinstance(data, dict):
+            rate_limiter.settle(api_key, model_name, estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+        if hedge_report:
+            # The cancelled duplicate may still be billed; count it at the winner's size.
+            usage = (data.get("usage") or {}) if isinstance(data, dict) else {}
+            hedge_report["extra_tokens"] = usage.get("total_tokens") or estimated_tokens
+        return data
+    except requests.exceptions.JSONDecodeError as json_exc:
+        return (f"Failed to decode JSON from LLM response. Error: {json_exc}. "
+                f"Raw response text received:\n---\n{response.text.strip()}\n---")
+
+def read_query_input(input_query_file: str) -> str:
+    """Reads a query from its file or, in runs with `query_layout = bundle`, from the run's query bundle."""
+    if not query_bundle.query_exists(input_query_file):
+        raise FileNotFoundError(f"Input query file not found: {input_query_file}")
+    return query_bundle.read_query_file(input_query_file)
+
+
+def execute_query_job(query_identifier: str, input_query_file: str, output_response_file: str,
+                      output_error_file: str, output_json_file: Optional[str],
+                      call_settings: Dict[str, Any], api_key: Optional[str],
+                      http_session: Optional[requests.Session] = None,
+                      call_report: Optional[Dict[str, Any]] = None,
+                      hedge_after: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+    """
+    Runs one query end-to-end without a spinner and writes its artifacts.
+
+    Used by the long-lived execution paths (server mode and the in-process
+    engine). Returns `(success, error_message)`, where the message is the text
+    written to the `.error.txt` file on failure. If a `call_report` dict is
+    given, it receives the per-attempt timings (`attempts`) and, on failure,
+    the status details (see `describe_call_outcome`). `hedge_after` enables a
+    hedged duplicate request for a slow call (see `post_chat_completion`).
+    """
+    attempt_log: List[Dict[str, Any]] = []
+    if call_report is not None:
+        call_report["attempts"] = attempt_log
+    try:
+        if not api_key:
+            error_message = "OPENROUTER_API_KEY not set."
+        else:
+            query_text_content = read_query_input(input_query_file)
+
+            if not query_text_content.strip():
+                error_message = "Query file was empty."
+            else:
+                api_result = post_chat_completion(
+                    query_text_content, call_settings["model_name"], api_key,
+                    call_settings["api_endpoint"], call_settings["referer"],
+                    call_settings["timeout_seconds"], query_identifier,
+                    max_tokens=call_settings["max_tokens"], temperature=call_settings["temperature"],
+                    http_session=http_session, retry_policy=call_settings.get("retry_policy"),
+                    attempt_log=attempt_log, stream=call_settings.get("stream", False),
+                    stream_trailer_chars=call_settings.get("stream_trailer_chars", 200),
+                    hedge_after=hedge_after, prompt_caching=call_settings.get("prompt_caching", False),
+                )
+                if isinstance(api_result, str):
+                    error_message = api_result
+                elif not api_result:
+                    error_message = "LLM API call returned None or failed (see worker log)."
+                else:
+                    write_response_artifacts(api_result, output_response_file, output_json_file)
+                    return True, None
+    except Exception as e:
+        error_message = describe_api_exception(e, query_identifier)
+        if call_report is not None:
+            call_report.update(describe_call_outcome(e))
+
+    try:
+        write_error_artifact(output_error_file, error_message)
+    except OSError as e_write:
+        logging.error(f"  LLM Prompter: Could not write error file for query {query_identifier}: {e_write}")
+    return False, error_message
+
+# --- Server Mode: Persistent Worker ---
+JOB_RESULT_TAG = "<<<JOB_RESULT:"
+
+def serve_query_jobs(input_stream, output_stream, api_key: Optional[str]):
+    """
+    Processes query jobs from `input_stream` until it is closed.
+
+    Each input line is a JSON object with the same fields as the worker's
+    command-line arguments (`query_identifier`, `input_query_file`,
+    `output_response_file`, `output_error_file`, `output_json_file`,
+    `config_path`, and optionally `hedge_after_seconds`). For each job, one tagged line is written to `output_stream`:
+    `<<<JOB_RESULT:{"query_identifier": ..., "success": ..., "error": ..., "report": ..., "duration": ...}>>>`.
+    The HTTP session and the parsed run configs are reused across jobs.
+    """
+    http_session = requests.Session()
+    settings_by_config: Dict[Optional[str], Dict[str, Any]] = {}
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        start_time = time.time()
+        try:
+            job = json.loads(line)
+            config_path = job.get("config_path")
+            if config_path not in settings_by_config:
+                run_config = APP_CONFIG
+                if config_path and os.path.exists(config_path):
+                    from configparser import ConfigParser
+                    run_config = ConfigParser()
+                    run_config.read(config_path)
+                settings_by_config[config_path] = get_llm_call_settings(run_config)
+
+            call_report: Dict[str, Any] = {}
+            success, error_message = execute_query_job(
+                job["query_identifier"], job["input_query_file"], job["output_response_file"],
+                job["output_error_file"], job.get("output_json_file"),
+                settings_by_config[config_path], api_key, http_session=http_session,
+                call_report=call_report, hedge_after=job.get("hedge_after_seconds"),
+            )
+            result = {"query_identifier": job["query_identifier"], "success": success, "error": error_message,
+                      "report": call_report or None}
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            result = {"query_identifier": None, "success": False, "error": f"Malformed job request: {e}"}
+
+        result["duration"] = time.time() - start_time
+        output_stream.write(f"{JOB_RESULT_TAG}{json.dumps(result, ensure_ascii=False)}>>>\n")
+        output_stream.flush()
+
+    http_session.close()
+
 def call_openrouter_api(query_text: str, model_name: str, api_key: str, api_endpoint: str,
                         referer: str, timeout_seconds: int, query_identifier: str,
                         max_tokens: Optional[int] = None, temperature: Optional[float] = None,
-                        quiet: bool = False
+                        quiet: bool = False, retry_policy: Optional[Dict[str, Any]] = None,
+                        attempt_log: Optional[List[Dict[str, Any]]] = None,
+                        stream: bool = False, stream_trailer_chars: int = 200,
+                        hedge_after: Optional[float] = None, prompt_caching: bool = False
                        ) -> Tuple[Optional[Dict[str, Any]], float]:
 
     result_container = {"data": None, "duration": 0.0, "exception": None}
@@ -153,30 +943,19 @@ def call_openrouter_api(query_text: str, model_name: str, api_key: str, api_endp
         """This function runs in a separate thread to make the blocking API call."""
         api_start_time = time.time()
         try:
-            messages = [{"role": "user", "content": query_text}]
-            payload: Dict[str, Any] = {"model": model_name, "messages": messages}
-            if max_tokens is not None: payload["max_tokens"] = max_tokens
-            if temperature is not None: payload["temperature"] = temperature
-
-            headers = {"Authorization": f"Bearer {api_key}", "HTTP-Referer": referer, "Content-Type": "application/json"}
-            logging.debug(f"API Request Payload for Query {query_identifier}: {json.dumps(payload, indent=2, ensure_ascii=False)}")
-            
-            logging.info(f"  Query {query_identifier}: Calling API with model='{model_name}', "
-                         f"max_tokens={payload.get('max_tokens')}, temperature={payload.get('temperature')}")
-
-            response = requests.post(api_endpoint, headers=headers, json=payload, timeout=timeout_seconds)
-            response.raise_for_status()
-            
-            # Attempt to parse JSON with robust error handling for malformed responses
-            try:
-                result_container["data"] = response.json()
-                logging.info(f"  Query {query_identifier}: API call successful.")
-            except requests.exceptions.JSONDecodeError as json_exc:
-                error_details = (f"Failed to decode JSON from LLM response. Error: {json_exc}. "
-                                 f"Raw response text received:\n---\n{response.text.strip()}\n---")
+            outcome = post_chat_completion(
+                query_text, model_name, api_key, api_endpoint, referer, timeout_seconds,
+                query_identifier, max_tokens=max_tokens, temperature=temperature,
+                retry_policy=retry_policy, attempt_log=attempt_log,
+                stream=stream, stream_trailer_chars=stream_trailer_chars, hedge_after=hedge_after,
+                prompt_caching=prompt_caching
+            )
+            if isinstance(outcome, str):
                 # Store the CLEAN error message and set status, do not store an exception
-                result_container["error"] = error_details
+                result_container["error"] = outcome
                 result_container["status"] = "error"
+            else:
+                result_container["data"] = outcome
 
         except Exception as e:
             # Capture any other exception to be re-raised in the main thread
@@ -247,6 +1026,10 @@ def main():
                         help="FOR TESTING ONLY: String content for a 'success' mock API response.")
     parser.add_argument("--config_path", default=None,
                         help="Path to a specific config.ini.archived file for this run.")
+    parser.add_argument("--hedge_after_seconds", type=float, default=None,
+                        help="Send a duplicate request if the call has not finished after this many seconds.")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a persistent worker that reads JSON query jobs from stdin until it is closed.")
     args = parser.parse_args()
 
     # --- Adjust Log Level FIRST ---
@@ -269,6 +1052,22 @@ def main():
     # --- Now continue with the rest of the script ---
     script_dir_worker = os.path.dirname(os.path.abspath(__file__))
 
+    if args.serve:
+        # Keep stdout reserved for the tagged job results.
+        logging.basicConfig(level=numeric_log_level,
+                            format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+                            datefmt='%Y-%m-%d %H:%M:%S',
+                            force=True,
+                            stream=sys.stderr)
+        sys.stdin.reconfigure(encoding='utf-8')
+        load_env_file(script_dir_worker)
+        api_key = os.getenv("OPENROUTER_API_KEY")
+        if not api_key:
+            logging.error("LLM Prompter: OPENROUTER_API_KEY not found. All jobs will fail.")
+        logging.info("LLM Prompter: Serving query jobs from stdin.")
+        serve_query_jobs(sys.stdin, sys.stdout, api_key)
+        sys.exit(0)
+
     is_worker_provided_paths = (args.input_query_file is not None and
                                 args.output_response_file is not None and
                                 args.output_error_file is not None)
@@ -305,19 +1104,8 @@ def main():
     logging.info(f"  Output error file: {output_error_file_abs}")
 
     # Load .env
-    dotenv_paths_to_try = [
-        os.path.join(script_dir_worker, DOTENV_PATH), # Alongside script
-        os.path.join(os.getcwd(), DOTENV_PATH)        # In CWD
-    ]
-    if 'PROJECT_ROOT' in globals() and PROJECT_ROOT:
-        dotenv_paths_to_try.insert(0, os.path.join(PROJECT_ROOT, DOTENV_PATH))
+    env_loaded_path = load_env_file(script_dir_worker)
 
-    env_loaded_path = None
-    for d_path in dotenv_paths_to_try:
-        if os.path.exists(d_path) and load_dotenv(d_path):
-            env_loaded_path = d_path
-            break
-            
     # In interactive mode, create the sample query *before* checking for the API key.
     if run_as_interactive_test and not os.path.exists(input_query_file_abs):
         try:
@@ -338,18 +1126,6 @@ def main():
         sys.exit(1)
     logging.info("LLM Prompter: OPENROUTER_API_KEY loaded.")
 
-    # If a specific config path is given, load it. Otherwise, use the global APP_CONFIG.
-    run_specific_config = APP_CONFIG
-    if args.config_path:
-        if not os.path.exists(args.config_path):
-            logging.error(f"FATAL: Provided config path does not exist: {args.config_path}")
-            sys.exit(1)
-        # Use a new ConfigParser instance to load the run-specific config
-        from configparser import ConfigParser
-        run_specific_config = ConfigParser()
-        run_specific_config.read(args.config_path)
-        logging.info(f"Loaded run-specific configuration from: {args.config_path}")
-
     # If a specific config path is given, load it. Otherwise, use the global APP_CONFIG.
     run_specific_config = APP_CONFIG
     if args.config_path:
@@ -363,19 +1139,11 @@ def main():
         logging.info(f"Loaded run-specific configuration from: {args.config_path}")
 
     # Get LLM parameters from the appropriate config
-    model_name_cfg = get_config_value(run_specific_config, 'LLM', 'model_name', fallback_key='model', fallback="google/gemini-1.5-pro-latest")
-    api_endpoint_cfg = get_config_value(run_specific_config, 'LLM', 'api_endpoint', fallback='https://openrouter.ai/api/v1/chat/completions')
-    api_timeout_cfg = get_config_value(run_specific_config, 'LLM', 'api_timeout_seconds', fallback=120, value_type=int)
-    referer_header_cfg = get_config_value(run_specific_config, 'LLM', 'referer_header', fallback="http://localhost:3000")
-    max_tokens_cfg = get_config_value(run_specific_config, 'LLM', 'max_tokens', fallback=1000, value_type=int)
-    temperature_cfg = get_config_value(run_specific_config, 'LLM', 'temperature', fallback=None, value_type=float)
+    call_settings = get_llm_call_settings(run_specific_config)
+    attempt_log: List[Dict[str, Any]] = []
 
     try:
-        if not os.path.exists(input_query_file_abs):
-            raise FileNotFoundError(f"Input query file not found: {input_query_file_abs}")
-
-        with open(input_query_file_abs, 'r', encoding='utf-8') as f_query:
-            query_text_content = f_query.read()
+        query_text_content = read_query_input(input_query_file_abs)
 
         if not query_text_content.strip():
             logging.warning(f"  Query file '{os.path.basename(input_query_file_abs)}' is empty.")
@@ -407,99 +1175,74 @@ def main():
         else:
             # ---- REAL API CALL ----
             api_result, _ = call_openrouter_api(
-                query_text=query_text_content, model_name=model_name_cfg,
-                api_key=api_key, api_endpoint=api_endpoint_cfg,
-                referer=referer_header_cfg, timeout_seconds=api_timeout_cfg,
+                query_text=query_text_content, model_name=call_settings["model_name"],
+                api_key=api_key, api_endpoint=call_settings["api_endpoint"],
+                referer=call_settings["referer"], timeout_seconds=call_settings["timeout_seconds"],
                 query_identifier=args.query_identifier,
-                max_tokens=max_tokens_cfg, temperature=temperature_cfg,
-                quiet=args.quiet
+                max_tokens=call_settings["max_tokens"], temperature=call_settings["temperature"],
+                quiet=args.quiet, retry_policy=call_settings["retry_policy"], attempt_log=attempt_log,
+                stream=call_settings["stream"], stream_trailer_chars=call_settings["stream_trailer_chars"],
+                hedge_after=args.hedge_after_seconds, prompt_caching=call_settings["prompt_caching"]
             )
 
         # ---- Process the result (real or mocked) ----
         # Check if the result is a string, which indicates a handled error message
         if isinstance(api_result, str):
             logging.error(f"  LLM Prompter: LLM call failed for '{os.path.basename(input_query_file_abs)}'.")
-            with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-                f_err.write(api_result)
+            write_error_artifact(output_error_file_abs, api_result)
             sys.exit(1)
 
         raw_llm_response_json = api_result
 
         if raw_llm_response_json:
-            # If an output path is provided, save the full JSON response there.
-            if args.output_json_file:
-                try:
-                    output_json_file_abs = os.path.abspath(args.output_json_file)
-                    with open(output_json_file_abs, 'w', encoding='utf-8') as f_json:
-                        json.dump(raw_llm_response_json, f_json, indent=2, ensure_ascii=False)
-                    logging.info(f"  LLM Prompter: Wrote full JSON to '{os.path.basename(output_json_file_abs)}'.")
-                except IOError as e:
-                    logging.error(f"  LLM Prompter: Failed to write JSON file: {e}")
-
-            response_content_to_save = ""
-            try:
-                if isinstance(raw_llm_response_json.get('choices'), list) and raw_llm_response_json['choices']:
-                    message = raw_llm_response_json['choices'][0].get('message', {})
-                    response_content_to_save = message.get('content', '')
-                if not response_content_to_save.strip():
-                     logging.info("  LLM Prompter: Response content is empty or whitespace.")
-            except Exception as e_parse:
-                logging.warning(f"  LLM Prompter: Error extracting message content from LLM JSON: {e_parse}. Saving empty response.")
-
-            with open(output_response_file_abs, 'w', encoding='utf-8') as f_response:
-                f_response.write(response_content_to_save)
-
+            write_response_artifacts(raw_llm_response_json, output_response_file_abs, args.output_json_file)
             logging.info(f"  LLM Prompter: Success. Wrote response to '{os.path.basename(output_response_file_abs)}'.")
+            if attempt_log:
+                emit_call_report(attempts=attempt_log)
             sys.exit(0)
         else:
             # This block now correctly handles the `api_returns_none` mock and other non-exception failures.
             logging.error(f"  LLM Prompter: LLM call failed for '{os.path.basename(input_query_file_abs)}'. No response data.")
-            with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-                f_err.write("LLM API call returned None or failed (see worker log).")
+            write_error_artifact(output_error_file_abs, "LLM API call returned None or failed (see worker log).")
             sys.exit(1)
 
     # ---- CENTRALIZED EXCEPTION HANDLING ----
     except requests.exceptions.Timeout as e_timeout:
         # THIS BLOCK WILL NOW CATCH THE TIMEOUT
         logging.error(f"  LLM Prompter: API Timeout Error: {e_timeout}")
-        err_message = f"API call timed out for query {args.query_identifier}."
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-            f_err.write(err_message)
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_timeout, args.query_identifier))
+        emit_call_report(e_timeout, attempt_log)
         sys.exit(1)
     except requests.exceptions.HTTPError as e_http:
         # THIS BLOCK WILL CATCH 4xx/5xx ERRORS
         logging.error(f"  LLM Prompter: HTTP Error: {e_http}")
-        err_message = f"API call failed with HTTP error for query {args.query_identifier}. Details: {e_http}"
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-            f_err.write(err_message)
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_http, args.query_identifier))
+        emit_call_report(e_http, attempt_log)
         sys.exit(1)
     except requests.exceptions.ChunkedEncodingError as e_chunk:
         # THIS BLOCK WILL CATCH CHUNK ENCODING ERRORS
         logging.error(f"  LLM Prompter: Chunked Encoding Error: {e_chunk}")
-        err_message = f"API call failed due to connection issues for query {args.query_identifier}. The response was incomplete."
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-            f_err.write(err_message)
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_chunk, args.query_identifier))
+        emit_call_report(e_chunk, attempt_log)
         sys.exit(1)
     except requests.exceptions.ConnectionError as e_conn:
         # THIS BLOCK WILL CATCH CONNECTION ERRORS
         logging.error(f"  LLM Prompter: Connection Error: {e_conn}")
-        err_message = f"API call failed due to connection problems for query {args.query_identifier}."
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-            f_err.write(err_message)
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_conn, args.query_identifier))
+        emit_call_report(e_conn, attempt_log)
         sys.exit(1)
     except FileNotFoundError as e_fnf:
         logging.error(f"  LLM Prompter: File error: {e_fnf}")
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err: f_err.write(str(e_fnf))
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_fnf, args.query_identifier))
         sys.exit(1)
-    except KeyboardInterrupt:
+    except KeyboardInterrupt as e_int:
         logging.info("\nLLM Prompter: Interrupted by user (Ctrl+C).")
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err: f_err.write("Processing interrupted by user (Ctrl+C).")
+        write_error_artifact(output_error_file_abs, describe_api_exception(e_int, args.query_identifier))
         sys.exit(1)
     except Exception as e:
         # Generic catch-all for truly unexpected errors
-        err_message = f"Unhandled error in llm_prompter.py for query {args.query_identifier}: {type(e).__name__}: {e}"
-        with open(output_error_file_abs, 'w', encoding='utf-8') as f_err:
-            f_err.write(err_message)
+        err_message = describe_api_exception(e, args.query_identifier)
+        write_error_artifact(output_error_file_abs, err_message)
         logging.exception(f"  LLM Prompter: {err_message}")
         sys.exit(1)
 
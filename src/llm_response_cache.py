@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/llm_response_cache.py
+
+"""
+Content-Addressed Cache for Deterministic LLM Responses.
+
+When an experiment is run at `temperature = 0.0`, an identical query sent to
+the same model with the same settings is expected to produce the same answer.
+This module stores each raw API response on disk under a SHA-256 key derived
+from `(model_name, temperature, max_tokens, api_endpoint, query_text)`, so that
+re-running an identical query set (e.g., after a config restore, a migration,
+or when reproducing a published table) fills Stage 2 from disk instead of
+calling the API.
+
+The cache is opt-in (`[Cache] enabled = true`) and is only consulted for runs
+whose archived config sets `temperature = 0.0`. It is used by
+`replication_manager.py` before any session engine is started, so it works the
+same way with the 'subprocess', 'pool', and 'async' engines.
+
+Key Features:
+-   **Content Addressing**: Any change to the model, sampling settings,
+    endpoint, or a single character of the query produces a different key.
+-   **Identical Artifacts**: Hits are written with the same helpers as the
+    prompter, producing the usual `llm_response_NNN.txt` and `_full.json`.
+-   **Complete Responses Only**: Streamed responses that were stopped early
+    once their score matrix arrived are truncated and are never stored.
+-   **Size-Based Eviction**: When the cache grows past `max_size_mb`, the least
+    recently used entries are removed first.
+-   **Safe Concurrent Use**: Entries are written atomically, so parallel
+    replications can share one cache directory.
+-   **Maintenance CLI**: `stats`, `prune`, and `clear` sub-commands.
+
+Usage:
+    python src/llm_response_cache.py stats
+    python src/llm_response_cache.py prune --max-size-mb 200
+    python src/llm_response_cache.py clear
+"""
+
+# === Start of src/llm_response_cache.py ===
+
+import argparse
+import configparser
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import llm_prompter
+    from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path:
+        sys.path.insert(0, current_script_dir)
+    import llm_prompter
+    from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
+
+DEFAULT_CACHE_DIR = os.path.join("output", "llm_response_cache")
+DEFAULT_MAX_SIZE_MB = 500
+# After an eviction the cache is trimmed to this fraction of its limit, so that
+# a full cache is not re-scanned on every subsequent write.
+EVICTION_TARGET_RATIO = 0.9
+
+
+def make_cache_key(model_name: str, temperature: Optional[float], max_tokens: Optional[int],
+                   api_endpoint: str, query_text: str) -> str:
+    """Returns the SHA-256 key identifying one (settings, query) combination."""
+    key_material = json.dumps(
+        [model_name, temperature, max_tokens, api_endpoint, query_text],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(call_settings: Dict[str, Any]) -> bool:
+    """Only deterministic (temperature 0) requests may be served from the cache."""
+    temperature = call_settings.get("temperature")
+    return temperature is not None and float(temperature) == 0.0
+
+
+class LLMResponseCache:
+    """An on-disk, size-bounded store of raw API responses keyed by content hash."""
+
+    def __init__(self, cache_dir: str, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._size_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, call_settings: Dict[str, Any], query_text: str) -> str:
+        """Returns the cache key for a query sent with the given call settings."""
+        return make_cache_key(call_settings.get("model_name"), call_settings.get("temperature"),
+                              call_settings.get("max_tokens"), call_settings.get("api_endpoint"), query_text)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _iter_entries(self) -> List[Tuple[str, int, float]]:
+        """Lists `(path, size, last_used)` for every stored entry."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored response for `key`, or None on a miss or unreadable entry."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {os.path.basename(path)}: {e}")
+            return None
+        try:
+            os.utime(path, None)  # Mark as recently used for LRU eviction.
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, raw_llm_response_json: Dict[str, Any]):
+        """Stores a response atomically, evicting old entries if the size limit is exceeded."""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(raw_llm_response_json, ensure_ascii=False).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = sum(size for _, size, _ in self._iter_entries())
+            else:
+                self._size_bytes += len(payload)
+            needs_eviction = self._size_bytes > self.max_size_bytes
+        if needs_eviction:
+            self.prune(int(self.max_size_bytes * EVICTION_TARGET_RATIO))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the number of entries and total size of the cache."""
+        entries = self._iter_entries()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_size_bytes": self.max_size_bytes,
+        }
+
+    def prune(self, max_size_bytes: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Removes least-recently-used entries until the cache fits `max_size_bytes`.
+
+        Returns the number of entries removed and the number of bytes freed.
+        """
+        limit = self.max_size_bytes if max_size_bytes is None else max_size_bytes
+        with self._lock:
+            entries = sorted(self._iter_entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            removed, freed = 0, 0
+            for path, size, _ in entries:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                freed += size
+            self._size_bytes = total
+        if removed:
+            logging.info(f"LLM response cache: evicted {removed} entries ({freed / 1024:.1f} KiB).")
+        return removed, freed
+
+    def clear(self) -> int:
+        """Removes every entry. Returns the number of entries removed."""
+        removed, _ = self.prune(0)
+        return removed
+
+
+def get_cache_from_config(config=None) -> Optional[LLMResponseCache]:
+    """Returns the configured cache, or None if `[Cache] enabled` is not set."""
+    config = config if config is not None else APP_CONFIG
+    if not get_config_value(config, 'Cache', 'enabled', fallback=False, value_type=bool):
+        return None
+    cache_dir = get_config_value(config, 'Cache', 'cache_dir', fallback=DEFAULT_CACHE_DIR)
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(PROJECT_ROOT, cache_dir)
+    max_size_mb = get_config_value(config, 'Cache', 'max_size_mb', fallback=DEFAULT_MAX_SIZE_MB, value_type=float)
+    return LLMResponseCache(cache_dir, max_size_mb)
+
+
+def load_run_call_settings(run_dir: str) -> Dict[str, Any]:
+    """Resolves the API call settings the workers will use for a run (from its archived config)."""
+    config_path = os.path.join(run_dir, 'config.ini.archived')
+    run_config = configparser.ConfigParser()
+    if os.path.exists(config_path):
+        run_config.read(config_path)
+    else:
+        run_config = APP_CONFIG
+    return llm_prompter.get_llm_call_settings(run_config)
+
+
+def fill_from_cache(cache: LLMResponseCache, call_settings: Dict[str, Any], indices: Iterable[int],
+                    queries_dir: str, responses_dir: str) -> Tuple[List[int], Dict[int, str]]:
+    """
+    Writes the response artifacts of every cached query and reports the rest.
+
+    Returns the list of indices served from the cache and a mapping of the
+    remaining (missed) indices to their cache keys, which `store_responses`
+    uses once the API calls have completed.
+    """
+    hits, misses = [], {}
+    for index in indices:
+        query_path = os.path.join(queries_dir, f"llm_query_{index:03d}.txt")
+        try:
+            key = cache.key_for(call_settings, llm_prompter.read_query_input(query_path))
+        except OSError:
+            continue  # Let the session engine report the missing query file.
+        cached = cache.get(key)
+        if cached is None:
+            misses[index] = key
+            continue
+        response_path = os.path.join(responses_dir, f"llm_response_{index:03d}.txt")
+        try:
+            llm_prompter.write_response_artifacts(cached, response_path,
+                                                  os.path.splitext(response_path)[0] + "_full.json")
+        except (OSError, KeyError, IndexError, TypeError) as e:
+            logging.warning(f"Could not restore cached response for query {index:03d}: {e}")
+            misses[index] = key
+            continue
+        hits.append(index)
+    return hits, misses
+
+
+def is_complete_response(response: Dict[str, Any]) -> bool:
+    """False for a streamed response cut off after its score matrix, which must not be served to other runs."""
+    if (response.get("stream_stats") or {}).get("terminated_early"):
+        return False
+    choices = response.get("choices") or [{}]
+    return choices[0].get("finish_reason") != "early_stop"
+
+
+def store_responses(cache: LLMResponseCache, pending_keys: Dict[int, str], responses_dir: str,
+                    succeeded: Iterable[int]) -> int:
+    """Adds the `_full.json` of each successfully and fully completed query to the cache."""
+    stored = 0
+    for index in succeeded:
+        key = pending_keys.get(index)
+        if key is None:
+            continue
+        json_path = os.path.join(responses_dir, f"llm_response_{index:03d}_full.json")
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                response = json.load(f)
+            if not is_complete_response(response):
+                continue
+            cache.put(key, response)
+            stored += 1
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not cache response for query {index:03d}: {e}")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the LLM response cache.")
+    parser.add_argument("--cache-dir", default=None, help="Cache directory (defaults to [Cache] cache_dir in config.ini).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show the number of entries and total size.")
+    prune_parser = subparsers.add_parser("prune", help="Evict least-recently-used entries down to a size limit.")
+    prune_parser.add_argument("--max-size-mb", type=float, default=None, help="Target size (defaults to [Cache] max_size_mb).")
+    subparsers.add_parser("clear", help="Remove every cached response.")
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or get_config_value(APP_CONFIG, 'Cache', 'cache_dir', fallback=DEFAULT_CACHE_DIR)
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(PROJECT_ROOT, cache_dir)
+    max_size_mb = get_config_value(APP_CONFIG, 'Cache', 'max_size_mb', fallback=DEFAULT_MAX_SIZE_MB, value_type=float)
+    cache = LLMResponseCache(cache_dir, max_size_mb)
+
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Entries:         {stats['entries']}")
+        print(f"Size:            {stats['size_bytes'] / (1024 * 1024):.2f} MB of {max_size_mb:.0f} MB")
+    elif args.command == "prune":
+        target_mb = args.max_size_mb if args.max_size_mb is not None else max_size_mb
+        removed, freed = cache.prune(int(target_mb * 1024 * 1024))
+        print(f"Removed {removed} entries ({freed / (1024 * 1024):.2f} MB freed).")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} entries.")
+
+
+if __name__ == "__main__":
+    main()
+
+# === End of src/llm_response_cache.py ===
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/llm_session_engine.py
+
+"""
+In-Process Session Engine for Stage 2 (Run LLM Sessions).
+
+This module executes all of a replication's LLM queries inside the calling
+process instead of launching one `llm_prompter.py` interpreter per trial. It is
+selected by `replication_manager.py` when `[LLM] session_engine = async`. A
+lower-risk alternative, `session_engine = pool`, keeps the worker processes but
+starts them once per replication as long-lived `llm_prompter.py --serve`
+servers that receive jobs over a pipe.
+
+The engine reuses the request and artifact logic of `llm_prompter.py`, so each
+trial produces exactly the same `llm_response_NNN.txt`, `_full.json`, and
+`.error.txt` files as the subprocess worker. Stages 3-6 and the experiment
+auditor are therefore unaffected by the choice of engine.
+
+Key Features:
+-   **Bounded Thread Pool**: Trials run in a thread pool sized to
+    `max_parallel_sessions`, which caps the number of in-flight calls.
+-   **Pooled Keep-Alive Connections**: All calls share one `requests.Session`
+    whose connection pool matches the concurrency limit, so TLS handshakes are
+    paid once per connection rather than once per trial.
+-   **One-Time Setup**: The `.env` file, API key, and archived run config are
+    loaded once per replication instead of once per trial.
+-   **Persistent Worker Pool**: `PrompterWorkerPool` manages a fixed set of
+    server-mode prompter processes and replaces any that hang or exit.
+-   **Streaming Results**: `run()` yields `(index, success, error, duration)`
+    tuples as trials complete, matching the contract of
+    `replication_manager.session_worker`.
+"""
+
+# === Start of src/llm_session_engine.py ===
+
+import configparser
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import llm_prompter
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path:
+        sys.path.insert(0, current_script_dir)
+    import llm_prompter
+
+SessionResult = Tuple[int, bool, Optional[str], float]
+
+
+def build_query_job(index: int, run_dir: str, responses_dir: str, queries_dir: Optional[str] = None) -> Dict[str, str]:
+    """Builds the job description (input and artifact paths) for one trial."""
+    queries_dir = queries_dir or os.path.join(run_dir, "session_queries")
+    response_filepath = os.path.join(responses_dir, f"llm_response_{index:03d}.txt")
+    return {
+        "query_identifier": f"{index:03d}",
+        "input_query_file": os.path.join(queries_dir, f"llm_query_{index:03d}.txt"),
+        "output_response_file": response_filepath,
+        "output_error_file": os.path.join(responses_dir, f"llm_response_{index:03d}.error.txt"),
+        "output_json_file": os.path.splitext(response_filepath)[0] + "_full.json",
+        "config_path": os.path.join(run_dir, 'config.ini.archived'),
+    }
+
+
+def create_http_session(pool_size: int) -> requests.Session:
+    """Creates a `requests.Session` whose keep-alive pool matches the concurrency limit."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class AsyncSessionEngine:
+    """Runs a replication's LLM queries concurrently within the current process."""
+
+    def __init__(self, run_dir: str, responses_dir: str, max_workers: int,
+                 queries_subdir: str = "session_queries", config_path: Optional[str] = None):
+        self.run_dir = run_dir
+        self.responses_dir = responses_dir
+        self.queries_dir = os.path.join(run_dir, queries_subdir)
+        self.max_workers = max(1, int(max_workers))
+
+        config_path = config_path or os.path.join(run_dir, 'config.ini.archived')
+        run_config = configparser.ConfigParser()
+        if os.path.exists(config_path):
+            run_config.read(config_path)
+        else:
+            logging.warning(f"Archived config not found at {config_path}. Using global configuration.")
+            run_config = llm_prompter.APP_CONFIG
+        self.call_settings = llm_prompter.get_llm_call_settings(run_config)
+
+        llm_prompter.load_env_file(os.path.dirname(os.path.abspath(llm_prompter.__file__)))
+        self.api_key = os.getenv("OPENROUTER_API_KEY")
+
+        self._http_session = None
+        self._stop_event = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops scheduling new trials and releases pooled connections."""
+        self._stop_event.set()
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
+
+    def run_query(self, index: int, call_report: Optional[Dict] = None,
+                  hedge_after: Optional[float] = None) -> SessionResult:
+        """Executes one trial and writes its artifacts. Blocking; safe to call from threads."""
+        job = build_query_job(index, self.run_dir, self.responses_dir, self.queries_dir)
+        start_time = time.time()
+        success, error_message = llm_prompter.execute_query_job(
+            job["query_identifier"], job["input_query_file"], job["output_response_file"],
+            job["output_error_file"], job["output_json_file"], self.call_settings, self.api_key,
+            http_session=self._http_session, call_report=call_report, hedge_after=hedge_after,
+        )
+        error_details = None if success else f"Query {index:03d} failed. {error_message}"
+        return index, success, error_details, time.time() - start_time
+
+    def run(self, indices: Iterable[int], limiter=None, on_report=None, hedger=None) -> Iterator[SessionResult]:
+        """
+        Runs all given trials and yields their results in completion order.
+
+        Closing the generator early stops any trials that have not started
+        yet. A trial whose limiter, hedger, or `on_report` hook raises is
+        reported as failed; the other trials continue. An optional
+        `AdaptiveConcurrencyLimiter` further caps the calls in flight,
+        `on_report(index, call_report)` receives each trial's call report, and
+        a `RequestHedger` sets each trial's hedge delay.
+        """
+        self._stop_event.clear()
+        self._http_session = create_http_session(self.max_workers)
+
+        def _run_if_active(index, call_report=None, hedge_after=None):
+            # Trials waiting for a limiter slot must not start once the run is closed.
+            if self._stop_event.is_set():
+                return None
+            report = call_report if call_report is not None else {}
+            report["started_at"] = time.time()
+            result = self.run_query(index, report, hedge_after)
+            if on_report is not None:
+                on_report(index, report)
+            return result
+        run_one = hedger.wrap(_run_if_active) if hedger is not None else _run_if_active
+        if limiter is not None:
+            run_one = limiter.wrap(run_one)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-session") as executor:
+                tasks = {executor.submit(run_one, index): index for index in indices}
+                try:
+                    for future in as_completed(tasks):
+                        index = tasks[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            logging.error(f"Query {index:03d} could not be run: {e}")
+                            result = (index, False, f"Query {index:03d} failed. {type(e).__name__}: {e}", 0.0)
+                        if result is not None:
+                            yield result
+                finally:
+                    self._stop_event.set()
+                    for task in tasks:
+                        task.cancel()
+        finally:
+            self.close()
+
+
+class _PrompterServer:
+    """One long-lived `llm_prompter.py --serve` process and its stdout reader."""
+
+    def __init__(self, command, cwd, verbose):
+        self.process = subprocess.Popen(
+            command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL,
+            text=True, encoding='utf-8', errors='replace', bufsize=1,
+        )
+        self._lines: "queue.Queue" = queue.Queue()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)  # EOF: the process has exited
+
+    def request(self, job: Dict[str, str], timeout: float) -> Optional[Dict]:
+        """Sends a job and waits for its tagged result. Returns None on timeout or exit."""
+        self.process.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+        self.process.stdin.flush()
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if line is None:
+                return None
+            line = line.strip()
+            if line.startswith(llm_prompter.JOB_RESULT_TAG) and line.endswith(">>>"):
+                return json.loads(line[len(llm_prompter.JOB_RESULT_TAG):-3])
+
+    def stop(self, grace_seconds: float = 5.0):
+        """Closes stdin so the server exits, killing it if it does not."""
+        try:
+            if self.process.stdin and not self.process.stdin.closed:
+                self.process.stdin.close()
+            self.process.wait(timeout=grace_seconds)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+class PrompterWorkerPool:
+    """
+    A fixed pool of persistent `llm_prompter.py --serve` worker processes.
+
+    Workers are started once and then receive query jobs over their stdin
+    pipes, so interpreter startup, config parsing, and HTTP session setup are
+    paid once per worker rather than once per trial. A worker that times out or
+    exits is replaced with a fresh process.
+    """
+
+    def __init__(self, llm_prompter_script: str, src_dir: str, size: int,
+                 verbose: bool = False, job_timeout: float = 180):
+        self.command = [sys.executable, llm_prompter_script, "--serve"]
+        if verbose:
+            self.command.append("-v")
+        self.src_dir = src_dir
+        self.size = max(1, int(size))
+        self.verbose = verbose
+        self.job_timeout = job_timeout
+        self._idle: "queue.Queue" = queue.Queue()
+        self._servers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _spawn(self) -> _PrompterServer:
+        server = _PrompterServer(self.command, self.src_dir, self.verbose)
+        with self._lock:
+            self._servers.append(server)
+        return server
+
+    def _retire(self, server: _PrompterServer):
+        with self._lock:
+            if server in self._servers:
+                self._servers.remove(server)
+        server.stop(grace_seconds=0)
+
+    def start(self):
+        """Starts all worker processes."""
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def close(self):
+        """Stops all worker processes."""
+        self._stop_event.set()
+        with self._lock:
+            servers, self._servers = list(self._servers), []
+        for server in servers:
+            server.stop()
+
+    def run_query(self, index: int, run_dir: str, responses_dir: str,
+                  call_report: Optional[Dict] = None, hedge_after: Optional[float] = None) -> SessionResult:
+        """Sends one trial to an idle worker and waits for its result."""
+        start_time = time.time()
+        job = build_query_job(index, run_dir, responses_dir)
+        if hedge_after is not None:
+            job["hedge_after_seconds"] = hedge_after
+        server = self._idle.get()
+        try:
+            result = server.request(job, self.job_timeout)
+        except (OSError, ValueError) as e:
+            result = None
+            logging.warning(f"Persistent worker failed while handling query {index:03d}: {e}")
+        duration = time.time() - start_time
+
+        if result is None:
+            # The worker hung or died; replace it so the pool keeps its size.
+            self._retire(server)
+            if not self._stop_event.is_set():
+                self._idle.put(self._spawn())
+            error_details = (f"Query {index:03d} failed: Worker process timed out after {self.job_timeout} seconds "
+                             f"(it became unresponsive).")
+            if call_report is not None:
+                call_report["timeout"] = True
+            return index, False, error_details, duration
+
+        self._idle.put(server)
+        if call_report is not None and result.get("report"):
+            call_report.update(result["report"])
+        if result.get("success"):
+            return index, True, None, duration
+        return index, False, f"Query {index:03d} failed. {result.get('error')}", duration
+
+    def run(self, run_dir: str, responses_dir: str, indices: Iterable[int],
+            limiter=None, on_report=None, hedger=None) -> Iterator[SessionResult]:
+        """
+        Runs all given trials on the pool and yields their results in completion order.
+
+        An optional `AdaptiveConcurrencyLimiter` caps the number of busy workers
+        below the pool size, `on_report(index, call_report)` receives each
+        trial's call report, and a `RequestHedger` sets each trial's hedge delay.
+        """
+        stopped = threading.Event()
+
+        def run_one(index, call_report=None, hedge_after=None):
+            # Trials waiting for a limiter slot must not start once the run is closed.
+            if stopped.is_set():
+                return None
+            report = call_report if call_report is not None else {}
+            report["started_at"] = time.time()
+            result = self.run_query(index, run_dir, responses_dir, report, hedge_after)
+            if on_report is not None:
+                on_report(index, report)
+            return result
+        if hedger is not None:
+            run_one = hedger.wrap(run_one)
+        if limiter is not None:
+            run_one = limiter.wrap(run_one)
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            tasks = [executor.submit(run_one, i) for i in indices]
+            try:
+                for future in as_completed(tasks):
+                    yield future.result()
+            finally:
+                stopped.set()
+                for task in tasks:
+                    task.cancel()
+
+# === End of src/llm_session_engine.py ===
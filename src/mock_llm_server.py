@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/mock_llm_server.py
+
+"""
+Local OpenRouter-Compatible Mock Server for Load and Failure Testing.
+
+`llm_prompter.py --test_mock_api_outcome` fakes a single outcome per process,
+which cannot exercise concurrency, retries, or timeouts under load. This
+script runs a local HTTP server that speaks the `/chat/completions` schema,
+so a full experiment can be run offline by pointing `[API] api_endpoint` at it
+(e.g., `http://127.0.0.1:8765/api/v1/chat/completions`).
+
+Key Features:
+-   **Plausible Answers**: Reads List A from the query and answers with a
+    k x k score table followed by some trailing commentary. Scores are seeded
+    by the query text, so repeated queries get identical answers (like a
+    temperature-0 model).
+-   **Latency Distribution**: Each request waits for a log-normally
+    distributed time (`--latency-median`, `--latency-sigma`).
+-   **Failure Injection**: Configurable fractions of requests receive
+    HTTP 429 (with `Retry-After`), HTTP 500, hang until the client times out,
+    or have their body cut off mid-transfer.
+-   **Streaming**: Requests with `"stream": true` are answered as server-sent
+    events in chunks of `--stream-chunk-chars`, optionally with a delay
+    between chunks to simulate slow streams.
+-   **Reproducible and Observable**: `--seed` makes the sequence of injected
+    outcomes repeatable, and `GET /stats` returns per-outcome counters.
+-   **Prompt Caching**: A message part marked with `cache_control` is
+    "cached" on first sight; later requests with the same part report its
+    tokens as `usage.prompt_tokens_details.cached_tokens`.
+-   **Batch API**: `POST /files`, `POST /batches`, `GET /batches/{id}`, and
+    `GET /files/{id}/content` emulate an OpenAI-compatible batch job for
+    `[LLM] session_engine = batch`. A job completes `--batch-seconds` after
+    submission; injected failures become per-request errors in its output.
+
+Usage:
+    python src/mock_llm_server.py --port 8765 --latency-median 2.0 --latency-sigma 0.5 \\
+        --rate-429 0.05 --rate-500 0.02 --rate-timeout 0.01 --rate-truncated 0.01
+"""
+
+# === Start of src/mock_llm_server.py ===
+
+import argparse
+import email.parser
+import email.policy
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+try:
+    from process_llm_responses import extract_list_a_items
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    from process_llm_responses import extract_list_a_items
+
+OUTCOMES = ("rate_limited", "server_error", "timeout", "truncated", "ok")
+
+
+class MockServerProfile:
+    """Latency, failure, and streaming behaviour of the mock server."""
+
+    def __init__(self, latency_median: float = 0.5, latency_sigma: float = 0.0,
+                 rate_429: float = 0.0, rate_500: float = 0.0, rate_timeout: float = 0.0,
+                 rate_truncated: float = 0.0, retry_after: float = 1.0, hang_seconds: float = 300.0,
+                 stream_chunk_chars: int = 16, stream_chunk_delay: float = 0.0,
+                 trailer_chars: int = 400, seed: Optional[int] = None, batch_seconds: float = 1.0):
+        if rate_429 + rate_500 + rate_timeout + rate_truncated > 1.0:
+            raise ValueError("The failure rates must not add up to more than 1.")
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.rates = {"rate_limited": rate_429, "server_error": rate_500,
+                      "timeout": rate_timeout, "truncated": rate_truncated}
+        self.retry_after = retry_after
+        self.hang_seconds = hang_seconds
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.stream_chunk_delay = stream_chunk_delay
+        self.trailer_chars = trailer_chars
+        self.seed = seed
+        self.batch_seconds = batch_seconds
+
+
+def build_mock_answer(query_text: str, trailer_chars: int, seed: Optional[int] = None) -> str:
+    """Returns a score-table answer for the query's List A, seeded by the query text."""
+    names = extract_list_a_items(query_text.splitlines())
+    if not names:
+        return "Mock response: no List A was found in the query."
+    digest = hashlib.sha256(f"{seed}\0{query_text}".encode('utf-8')).digest()
+    rng = random.Random(int.from_bytes(digest[:8], 'big'))
+    k = len(names)
+    lines = ["Here are the similarity scores for each pair:", "",
+             "Name\t" + "\t".join(f"ID {j}" for j in range(1, k + 1))]
+    for name in names:
+        lines.append(name + "\t" + "\t".join(f"{rng.random():.2f}" for _ in range(k)))
+    trailer = ("Note: these scores reflect an overall impression of each description. " * (trailer_chars // 70 + 1))
+    lines += ["", trailer[:trailer_chars].rstrip()]
+    return "\n".join(lines)
+
+
+def build_completion_payload(content: str, model: str, usage: Dict[str, int]) -> Dict[str, Any]:
+    """Returns a non-streamed chat-completion body."""
+    return {"id": f"gen-mock-{time.time_ns()}", "object": "chat.completion", "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": usage}
+
+
+def build_mock_usage(query_text: str, content: str, cached_tokens: Optional[int] = None) -> Dict[str, Any]:
+    usage: Dict[str, Any] = {"prompt_tokens": len(query_text) // 4, "completion_tokens": len(content) // 4}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    if cached_tokens is not None:
+        usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+    return usage
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Returns a chat message's text, whether its content is a string or a list of text parts."""
+    content = message["content"]
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, bytes]:
+    """Returns the fields of a `multipart/form-data` body by name."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + body)
+    fields = {}
+    if message.is_multipart():
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name:
+                fields[name] = part.get_payload(decode=True) or b""
+    return fields
+
+
+class _MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_found(self):
+        self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+
+    def do_GET(self):
+        mock = self.server.mock
+        path = self.path.rstrip('/')
+        batch_match = re.search(r'/batches/([^/]+)$', path)
+        content_match = re.search(r'/files/([^/]+)/content$', path)
+        if path.endswith('/stats'):
+            self._send_json(200, mock.snapshot_stats())
+        elif batch_match:
+            batch = mock.get_batch(batch_match.group(1))
+            if batch is None:
+                self._send_not_found()
+            else:
+                self._send_json(200, batch)
+        elif content_match:
+            content = mock.get_file(content_match.group(1))
+            if content is None:
+                self._send_not_found()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self._send_not_found()
+
+    def do_POST(self):
+        mock = self.server.mock
+        request_body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.rstrip('/')
+        if path.endswith('/files'):
+            uploaded = parse_multipart(self.headers.get('Content-Type', ''), request_body).get("file")
+            if uploaded is None:
+                self._send_json(400, {"error": {"message": "Expected a multipart 'file' field", "code": 400}})
+            else:
+                self._send_json(200, mock.add_file(uploaded, purpose="batch"))
+            return
+        if path.endswith('/batches'):
+            try:
+                input_file_id = json.loads(request_body)["input_file_id"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                self._send_json(400, {"error": {"message": "Malformed batch request", "code": 400}})
+                return
+            batch = mock.create_batch(input_file_id)
+            if batch is None:
+                self._send_not_found()
+            else:
+                self._send_json(200, batch)
+            return
+        if not path.endswith('/chat/completions'):
+            self._send_not_found()
+            return
+        try:
+            request = json.loads(request_body)
+            query_text = message_text(request["messages"][-1])
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+            self._send_json(400, {"error": {"message": "Malformed chat-completion request", "code": 400}})
+            return
+
+        outcome, latency = mock.draw()
+        if mock.stopping.wait(latency):
+            return
+
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Rate limit exceeded (mock)", "code": 429}},
+                            headers={"Retry-After": f"{mock.profile.retry_after:g}"})
+            return
+        if outcome == "server_error":
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "code": 500}})
+            return
+        if outcome == "timeout":
+            # Never answer; the client's read timeout fires first.
+            mock.stopping.wait(mock.profile.hang_seconds)
+            self.close_connection = True
+            return
+
+        content = build_mock_answer(query_text, mock.profile.trailer_chars, mock.profile.seed)
+        model = request.get("model", "mock/model")
+        usage = build_mock_usage(query_text, content, mock.cached_prompt_tokens(request["messages"][-1]))
+        truncated = outcome == "truncated"
+        if request.get("stream"):
+            self._stream(content, model, usage, truncated)
+        else:
+            self._complete(content, model, usage, truncated)
+
+    def _complete(self, content: str, model: str, usage: Dict[str, int], truncated: bool):
+        body = json.dumps(build_completion_payload(content, model, usage)).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if truncated:
+            # Announce the full length but drop the connection halfway through the body.
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def _stream(self, content: str, model: str, usage: Dict[str, int], truncated: bool):
+        profile = self.server.mock.profile
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        generation_id = f"gen-mock-{time.time_ns()}"
+        chunks = [content[i:i + profile.stream_chunk_chars] for i in range(0, len(content), profile.stream_chunk_chars)]
+        if truncated:
+            chunks = chunks[:len(chunks) // 2]
+        try:
+            self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+            for chunk in chunks:
+                if self.server.mock.stopping.wait(profile.stream_chunk_delay):
+                    return
+                event = {"id": generation_id, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            if truncated:
+                return  # The stream ends without a finish reason or [DONE].
+            final = {"id": generation_id, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client closed the stream early (e.g., after receiving the score matrix).
+
+
+class MockLLMServer:
+    """Runs the mock chat-completions endpoint on a background thread."""
+
+    def __init__(self, profile: Optional[MockServerProfile] = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or MockServerProfile()
+        self.stopping = threading.Event()
+        self._rng = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+        self._stats = {outcome: 0 for outcome in OUTCOMES}
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._ids = 0
+        self._prompt_cache: set = set()
+        self._httpd = ThreadingHTTPServer((host, port), _MockLLMHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def draw(self):
+        """Picks the outcome and latency of the next request."""
+        with self._lock:
+            roll = self._rng.random()
+            latency = self.profile.latency_median
+            if self.profile.latency_sigma > 0:
+                latency *= math.exp(self._rng.gauss(0.0, self.profile.latency_sigma))
+            outcome = "ok"
+            cumulative = 0.0
+            for name, rate in self.profile.rates.items():
+                cumulative += rate
+                if roll < cumulative:
+                    outcome = name
+                    break
+            self._stats[outcome] += 1
+        return outcome, latency
+
+    def cached_prompt_tokens(self, message: Dict[str, Any]) -> Optional[int]:
+        """
+        Emulates explicit prompt caching for a message.
+
+        Returns None if no part is marked with `cache_control`; otherwise the
+        tokens of marked parts seen before (marked parts are cached now).
+        """
+        content = message.get("content")
+        if not isinstance(content, list):
+            return None
+        marked = [part.get("text", "") for part in content if isinstance(part, dict) and part.get("cache_control")]
+        if not marked:
+            return None
+        cached = 0
+        with self._lock:
+            for text in marked:
+                digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                if digest in self._prompt_cache:
+                    cached += len(text) // 4
+                self._prompt_cache.add(digest)
+        return cached
+
+    # --- Batch API ---
+
+    def _next_id(self, prefix: str) -> str:
+        self._ids += 1
+        return f"{prefix}-mock-{self._ids:06d}"
+
+    def add_file(self, content: bytes, purpose: str) -> Dict[str, Any]:
+        with self._lock:
+            file_id = self._next_id("file")
+            self._files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "purpose": purpose}
+
+    def get_file(self, file_id: str) -> Optional[bytes]:
+        with self._lock:
+            return self._files.get(file_id)
+
+    def create_batch(self, input_file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if input_file_id not in self._files:
+                return None
+            batch_id = self._next_id("batch")
+            self._batches[batch_id] = {"id": batch_id, "object": "batch", "status": "validating",
+                                       "input_file_id": input_file_id, "created_at": time.time(),
+                                       "output_file_id": None, "error_file_id": None}
+            return dict(self._batches[batch_id])
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job's status, processing it once `batch_seconds` have passed since submission."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            pending = batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.profile.batch_seconds
+            input_content = self._files[batch["input_file_id"]] if pending else None
+        if pending:
+            output_lines, error_lines, completed = self._process_batch(input_content)
+            with self._lock:
+                if batch["status"] == "in_progress":
+                    batch["output_file_id"] = self._next_id("file")
+                    self._files[batch["output_file_id"]] = "".join(output_lines).encode('utf-8')
+                    if error_lines:
+                        batch["error_file_id"] = self._next_id("file")
+                        self._files[batch["error_file_id"]] = "".join(error_lines).encode('utf-8')
+                    total = len(output_lines) + len(error_lines)
+                    batch["request_counts"] = {"total": total, "completed": completed, "failed": total - completed}
+                    batch["status"] = "completed"
+        with self._lock:
+            return dict(batch)
+
+    def _process_batch(self, input_content: bytes):
+        """Answers every request line of a batch input file, drawing one outcome per request."""
+        output_lines, error_lines, completed = [], [], 0
+        for line in input_content.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            custom_id = request.get("custom_id")
+            body = request.get("body") or {}
+            outcome, _ = self.draw()
+            if outcome in ("timeout", "truncated"):
+                error = {"code": "request_failed", "message": f"Request failed in batch (mock {outcome})"}
+                error_lines.append(json.dumps({"custom_id": custom_id, "response": None, "error": error}) + "\n")
+                continue
+            if outcome == "rate_limited":
+                response = {"status_code": 429, "body": {"error": {"message": "Rate limit exceeded (mock)", "code": 429}}}
+            elif outcome == "server_error":
+                response = {"status_code": 500, "body": {"error": {"message": "Internal server error (mock)", "code": 500}}}
+            else:
+                completed += 1
+                query_text = message_text(body["messages"][-1])
+                content = build_mock_answer(query_text, self.profile.trailer_chars, self.profile.seed)
+                usage = build_mock_usage(query_text, content, self.cached_prompt_tokens(body["messages"][-1]))
+                response = {"status_code": 200, "body": build_completion_payload(
+                    content, body.get("model", "mock/model"), usage)}
+            output_lines.append(json.dumps({"custom_id": custom_id, "response": response, "error": None}) + "\n")
+        return output_lines, error_lines, completed
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["requests"] = sum(stats.values())
+        return stats
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a local OpenRouter-compatible mock server for load and failure testing.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind to.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--latency-median", type=float, default=0.5, help="Median response latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.0,
+                        help="Log-normal spread of the latency (0 = fixed latency).")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument("--rate-timeout", type=float, default=0.0, help="Fraction of requests that are never answered.")
+    parser.add_argument("--rate-truncated", type=float, default=0.0, help="Fraction of responses cut off mid-body.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After value sent with HTTP 429, in seconds.")
+    parser.add_argument("--hang-seconds", type=float, default=300.0, help="How long a 'timeout' request hangs.")
+    parser.add_argument("--stream-chunk-chars", type=int, default=16, help="Characters per streamed event.")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="Delay between streamed events in seconds.")
+    parser.add_argument("--trailer-chars", type=int, default=400, help="Length of the commentary after the score table.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible outcomes and scores.")
+    parser.add_argument("--batch-seconds", type=float, default=1.0, help="How long a batch job takes to complete.")
+    args = parser.parse_args(argv)
+
+    profile = MockServerProfile(
+        latency_median=args.latency_median, latency_sigma=args.latency_sigma,
+        rate_429=args.rate_429, rate_500=args.rate_500, rate_timeout=args.rate_timeout,
+        rate_truncated=args.rate_truncated, retry_after=args.retry_after, hang_seconds=args.hang_seconds,
+        stream_chunk_chars=args.stream_chunk_chars, stream_chunk_delay=args.stream_chunk_delay,
+        trailer_chars=args.trailer_chars, seed=args.seed, batch_seconds=args.batch_seconds,
+    )
+    server = MockLLMServer(profile, args.host, args.port).start()
+    print(f"Mock LLM server listening. Set '[API] api_endpoint = {server.endpoint}'. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\nStopping. Outcomes: {json.dumps(server.snapshot_stats())}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
+
+# === End of src/mock_llm_server.py ===
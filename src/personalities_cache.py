@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/personalities_cache.py
+
+"""
+Compiled Cache of the Personalities Database for Stage 1.
+
+Every replication's Stage 1 used to parse `personalities_db.txt` with
+`pd.read_csv` and re-derive `BirthYearInt`. This module stores the cleaned
+table once in a compiled cache next to the source file
+(`personalities_db.txt.cache/`) and reloads it from there while the source
+is unchanged.
+
+Key Features:
+-   **Validated by Content Hash**: The cache records the source's SHA-256.
+    An unchanged size and modification time skip rehashing; otherwise the
+    hash is recomputed, and the cache is rebuilt if it differs.
+-   **Typed Columnar Layout**: Numeric columns are `.npy` arrays; text
+    columns (including the large `DescriptionText`) are UTF-8 blobs indexed
+    by an offsets array. Blobs are memory-mapped, so parallel replications
+    share the same pages of the OS cache.
+-   **Identical Frames**: The reloaded DataFrame has the same columns,
+    dtypes, index labels, and values as a fresh parse, so seeded
+    selections are unaffected.
+-   **Never Fatal**: A missing, stale, or unreadable cache falls back to
+    parsing the source; failures to write the cache are only logged.
+"""
+
+# === Start of src/personalities_cache.py ===
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".cache"
+META_FILENAME = "meta.json"
+
+
+def cache_dir_for(source_path: str) -> str:
+    return source_path + CACHE_SUFFIX
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# --- Writing ---
+
+def _write_text_column(cache_dir: str, position: int, series: pd.Series) -> None:
+    """Writes a text column as one UTF-8 blob plus an offsets array (n + 1 entries) and a mask of missing values."""
+    missing = series.isna().to_numpy()
+    if missing.any():
+        np.save(os.path.join(cache_dir, f"col{position}.missing.npy"), missing)
+    encoded = [b'' if is_missing else str(value).encode('utf-8') for value, is_missing in zip(series.tolist(), missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    with open(os.path.join(cache_dir, f"col{position}.blob"), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(cache_dir, f"col{position}.offsets.npy"), offsets)
+
+
+def write_cache(source_path: str, df: pd.DataFrame, header_line: str) -> bool:
+    """
+    Compiles `df` (the cleaned table parsed from `source_path`) into the cache.
+
+    The cache is written to a temporary directory and renamed into place;
+    returns False (after logging a warning) if it could not be written.
+    """
+    cache_dir = cache_dir_for(source_path)
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        size, mtime_ns = _source_stat(source_path)
+        columns = []
+        for position, name in enumerate(df.columns):
+            series = df[name]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+                np.save(os.path.join(tmp_dir, f"col{position}.npy"), series.to_numpy())
+                kind = "numeric"
+            else:
+                _write_text_column(tmp_dir, position, series)
+                kind = "text"
+            columns.append({"name": name, "kind": kind, "dtype": str(series.dtype)})
+        np.save(os.path.join(tmp_dir, "index.npy"), df.index.to_numpy())
+        meta = {"version": CACHE_FORMAT_VERSION, "source_sha256": _sha256(source_path), "source_size": size,
+                "source_mtime_ns": mtime_ns, "header_line": header_line, "rows": len(df), "columns": columns}
+        with open(os.path.join(tmp_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.isdir(cache_dir):
+            stale_dir = f"{cache_dir}.old-{os.getpid()}"
+            os.replace(cache_dir, stale_dir)
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+        logging.info(f"Compiled personalities cache: {cache_dir}")
+        return True
+    except (OSError, ValueError, TypeError) as e:
+        # Another replication may have published the cache first; either way the parse result is used.
+        logging.warning(f"Could not write personalities cache '{cache_dir}': {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+# --- Reading ---
+
+def _read_meta(source_path: str) -> Optional[dict]:
+    meta_path = os.path.join(cache_dir_for(source_path), META_FILENAME)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_FORMAT_VERSION:
+        return None
+    size, mtime_ns = _source_stat(source_path)
+    if (meta.get("source_size"), meta.get("source_mtime_ns")) == (size, mtime_ns):
+        return meta
+    # Touched or copied files keep their content; only a different hash invalidates the cache.
+    if meta.get("source_sha256") != _sha256(source_path):
+        return None
+    meta["source_size"], meta["source_mtime_ns"] = size, mtime_ns
+    try:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+    except OSError:
+        pass
+    return meta
+
+
+def _read_text_column(cache_dir: str, position: int, rows: int) -> list:
+    offsets = np.load(os.path.join(cache_dir, f"col{position}.offsets.npy")).tolist()
+    if len(offsets) != rows + 1:
+        raise ValueError(f"column {position} has {len(offsets) - 1} entries, expected {rows}")
+    if offsets[-1] == 0:
+        values = [""] * rows
+    else:
+        with open(os.path.join(cache_dir, f"col{position}.blob"), 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+            values = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(rows)]
+    missing_path = os.path.join(cache_dir, f"col{position}.missing.npy")
+    if os.path.exists(missing_path):
+        for i in np.flatnonzero(np.load(missing_path)):
+            values[i] = np.nan
+    return values
+
+
+def read_cache(source_path: str) -> Optional[Tuple[pd.DataFrame, str]]:
+    """Returns `(df, header_line)` from a valid cache of `source_path`, or None."""
+    try:
+        meta = _read_meta(source_path)
+        if meta is None:
+            return None
+        cache_dir = cache_dir_for(source_path)
+        rows = meta["rows"]
+        data = {}
+        for position, column in enumerate(meta["columns"]):
+            if column["kind"] == "numeric":
+                values = np.load(os.path.join(cache_dir, f"col{position}.npy"))
+                if len(values) != rows:
+                    raise ValueError(f"column {column['name']} has {len(values)} rows, expected {rows}")
+                data[column["name"]] = pd.Series(values, dtype=column["dtype"])
+            else:
+                data[column["name"]] = pd.Series(_read_text_column(cache_dir, position, rows), dtype=column["dtype"])
+        df = pd.DataFrame(data)
+        df.index = pd.Index(np.load(os.path.join(cache_dir, "index.npy")))
+        return df, meta["header_line"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable personalities cache for '{source_path}': {e}")
+        return None
+
+
+def load_with_cache(source_path: str, loader: Callable[[str], Tuple[pd.DataFrame, str]]) -> Tuple[pd.DataFrame, str]:
+    """Returns the cached table of `source_path`, parsing it with `loader` and compiling the cache on a miss."""
+    cached = read_cache(source_path) if os.path.exists(source_path) else None
+    if cached is not None:
+        logging.info(f"Loaded personalities from cache: {cache_dir_for(source_path)}")
+        return cached
+    df, header_line = loader(source_path)
+    write_cache(source_path, df, header_line)
+    return df, header_line
+
+# === End of src/personalities_cache.py ===
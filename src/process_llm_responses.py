@@ -29,8 +29,9 @@ into clean, validated, and structured numerical data ready for analysis.
 Key Features:
 -   **Simplified Matrix Extraction**: Identifies exactly k consecutive lines containing
     exactly k numeric values at the end of each line, extracting k×k score matrices.
-    Includes preprocessing to handle mixed formatting (removes "|" characters with
-    adjacent tabs) while maintaining focus on measuring true LLM performance.
+    Includes preprocessing to handle mixed formatting ("|" separators count as
+    whitespace) while maintaining focus on measuring true LLM performance. Each
+    line is classified once, so the search is linear in the response length.
 -   **Rank Conversion Support**: Preserves `is_rank_based` parameter for legitimate
     experimental conditions where LLM outputs ranks instead of scores.
 -   **Parsing Diagnostics**: Generates detailed parsing summaries showing success/failure
@@ -38,10 +39,24 @@ Key Features:
     replication reports for troubleshooting.
 -   **Ground-Truth Validation**: Before accepting a trial's data, it performs a
     critical validation by cross-referencing the master `mappings.txt` against
-    the individual trial's `manifest.txt`, ensuring data integrity.
+    the individual trial's `manifest.txt` (or its query bundle record), ensuring
+    data integrity.
+-   **Parallel Trial Parsing**: Runs with at least
+    `PARALLEL_PARSE_MIN_RESPONSES` responses parse them in a process pool
+    (`--workers`); results and log messages are collected in trial-index
+    order. The script handles one replication, so ordinary runs are parsed
+    in-process.
 -   **Output Self-Validation**: After writing the final `all_scores.txt`, it
-    performs a "read-after-write" check to validate the file's content against
-    the in-memory data, preventing data corruption.
+    checks the file's SHA-256 against the in-memory text and the formatted
+    values against the in-memory matrices, preventing data corruption.
+-   **Incremental Re-Parsing**: With `[Analysis] incremental_parsing`, a
+    per-run parse manifest (`parse_manifest.json`) records each response's
+    size, modification time, SHA-256, and parse result. Later runs (e.g.
+    after a repair re-queries a few trials) parse only new or changed
+    responses and rebuild the aggregated outputs from the manifest.
+-   **Binary Score Store**: Optionally (`[Analysis] score_tensor_store`)
+    also writes the scores, mappings, and successful indices as
+    `score_tensor.npz`, which downstream readers prefer over the text files.
 -   **Clear Orchestration Signals**: Prints machine-readable tags upon success
     (e.g., `PROCESSOR_VALIDATION_SUCCESS`) for the calling script to interpret.
 
@@ -63,6 +78,9 @@ import shutil
 import pandas as pd
 from io import StringIO
 import unicodedata
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
 
 try:
     from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
@@ -76,6 +94,29 @@ except ImportError:
         if project_root_for_loader not in sys.path: sys.path.insert(0, project_root_for_loader)
         from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
 
+try:
+    import query_bundle
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    import query_bundle
+try:
+    import score_store
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    import score_store
+
+# Runs with fewer responses than this are parsed in-process regardless of --workers:
+# starting a pool costs more than parsing a few hundred responses (see
+# scripts/benchmarks/benchmark_response_processing.py).
+PARALLEL_PARSE_MIN_RESPONSES = 500
+
+# Parse results of unchanged responses are reused from this file in analysis_inputs/.
+# Bump the version whenever parsing rules change, so earlier results are re-parsed.
+PARSE_MANIFEST_FILENAME = "parse_manifest.json"
+PARSE_MANIFEST_VERSION = 1
+
 # REMOVED: The top-level DEFAULT_LOG_LEVEL_PROC and logging.basicConfig call.
 # These will now be handled inside main() after args are parsed.
 
@@ -93,7 +134,8 @@ def normalize_text_for_llm(text):
 def filter_mappings_by_index(source_mapping_path, dest_mapping_path, successful_indices, queries_dir_for_manifests):
     """
     Reads a source mappings file, filters it to include only mappings for successful
-    indices, validates each mapping against its manifest, and writes the result.
+    indices, validates each mapping against its manifest (a manifest file or a
+    query bundle record), and writes the result.
     """
     logging.info(f"Filtering and validating mappings for {len(successful_indices)} successful responses.")
     validation_errors = 0
@@ -112,6 +154,7 @@ def filter_mappings_by_index(source_mapping_path, dest_mapping_path, successful_
             for index in sorted(successful_indices):
                 # --- Validation Step ---
                 manifest_path = os.path.join(queries_dir_for_manifests, f"llm_query_{index:03d}_manifest.txt")
+                manifest_text = query_bundle.read_manifest_text(queries_dir_for_manifests, index)
                 
                 # Check if the index is valid for the source_mappings list
                 if index > len(source_mappings):
@@ -121,14 +164,13 @@ def filter_mappings_by_index(source_mapping_path, dest_mapping_path, successful_
                 
                 map_line_from_source = source_mappings[index - 1].strip()  # Get the specific line
                 
-                if not os.path.exists(manifest_path):
+                if manifest_text is None:
                     logging.error(f"  VALIDATION FAIL: Manifest file not found for index {index} at '{manifest_path}'. Cannot validate.")
                     validation_errors += 1
                     continue  # Skip writing this mapping if manifest is missing
                 
                 try:
-                    with open(manifest_path, 'r', encoding='utf-8') as f_manifest:
-                        manifest_lines = f_manifest.read().strip().split('\n')
+                    manifest_lines = manifest_text.strip().split('\n')
                     
                     if len(manifest_lines) < 2:
                         logging.error(f"  VALIDATION ERROR: Manifest for index {index} is empty or has no data rows.")
@@ -171,31 +213,33 @@ def filter_mappings_by_index(source_mapping_path, dest_mapping_path, successful_
         logging.error(f"A critical error occurred during the mapping filter/validation process: {e}", exc_info=True)
         return False
 
+def extract_list_a_items(lines):
+    """Returns the "Name (Year)" entries between the "List A" and "List B" headings."""
+    in_list_a = False
+    list_a_items = []
+    for line in lines:
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+        if stripped_line.lower() == "list a":
+            in_list_a = True
+            continue
+        if stripped_line.lower() == "list b":
+            # List A section ends
+            break
+        if in_list_a:
+            list_a_items.append(stripped_line) # These are "Name (Year)"
+    return list_a_items
+
 def get_list_a_details_from_query(query_filepath):
     """
     Determines 'k' and extracts the ordered list of List A item names
-    from a llm_query_XXX.txt file.
+    from a llm_query_XXX.txt file (or its record in the run's query bundle).
     """
     try:
-        with open(query_filepath, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        in_list_a = False
-        list_a_items = []
-        for line in lines:
-            stripped_line = line.strip()
-            if not stripped_line:
-                continue
-            if stripped_line.lower() == "list a":
-                in_list_a = True
-                continue
-            if stripped_line.lower() == "list b":
-                # List A section ends
-                in_list_a = False # Set this to false so we don't accidentally pick up List B items
-                break 
-            if in_list_a and stripped_line:
-                list_a_items.append(stripped_line) # These are "Name (Year)"
+        lines = query_bundle.read_query_file(query_filepath).splitlines(keepends=True)
         
+        list_a_items = extract_list_a_items(lines)
         k = len(list_a_items)
         if k > 0:
             return k, list_a_items
@@ -211,6 +255,43 @@ def get_list_a_details_from_query(query_filepath):
         logging.error(f"Error reading query file {query_filepath} for k-determination: {e}")
         return None, []
 
+def classify_score_line(line, k_value):
+    """
+    Returns the last k values of a response line as floats, or None if it does not end in k numbers.
+
+    "|" separators count as whitespace, so Markdown table rows qualify.
+    """
+    parts = line.replace('|', ' ').split()
+    if len(parts) < k_value:
+        return None
+    try:
+        return [float(part) for part in parts[-k_value:]]
+    except ValueError:
+        return None
+
+def find_score_block(all_lines, k_value):
+    """
+    Finds the first run of exactly k consecutive lines that each end in k numeric values.
+
+    `all_lines` are the stripped, non-empty lines of a response. Returns
+    `(start_idx, rows)` or None. Each line is classified once and the scan
+    stops at the end of the first complete run, so the cost is linear in the
+    length of the response. Also used by the streaming call layer
+    (`llm_prompter.py`) to detect a complete matrix in a partial response.
+    """
+    if k_value <= 0:
+        return 0, []
+    run = []
+    for line_idx, line in enumerate(all_lines):
+        scores = classify_score_line(line, k_value)
+        if scores is None:
+            run = []
+            continue
+        run.append(scores)
+        if len(run) == k_value:
+            return line_idx - k_value + 1, run
+    return None
+
 def parse_llm_response_table_to_matrix(response_text, k_value, list_a_names_ordered_from_query, is_rank_based=False):
     """
     Extracts a k x k numerical score matrix from LLM response text.
@@ -229,47 +310,25 @@ def parse_llm_response_table_to_matrix(response_text, k_value, list_a_names_orde
             return np.full((k_value, k_value), 0.0), 1, True
 
         # Find k consecutive lines with exactly k numeric values at the end of each line
-        for start_idx in range(len(all_lines) - k_value + 1):
-            candidate_lines = all_lines[start_idx:start_idx + k_value]
-            valid_rows = []
-            
-            # Check if all k lines have exactly k numeric values at the end
-            for line in candidate_lines:
-                # Preprocessing: Remove any "|" characters together with adjacent tabs
-                cleaned_line = re.sub(r'\t*\|\t*', ' ', line)
-                
-                # Split by any whitespace
-                parts = cleaned_line.replace('\t', ' ').split()
-                
-                if len(parts) < k_value:
-                    break  # Not enough parts on this line
-                
-                # Extract last k parts and try to convert to floats
-                last_k_parts = parts[-k_value:]
-                try:
-                    scores = [float(part) for part in last_k_parts]
-                    valid_rows.append(scores)
-                except ValueError:
-                    break  # Non-numeric data in last k positions
+        block = find_score_block(all_lines, k_value)
+        if block is not None:
+            start_idx, valid_rows = block
+            score_matrix = np.array(valid_rows)
             
-            # If we found exactly k valid rows, we have our matrix
-            if len(valid_rows) == k_value:
-                score_matrix = np.array(valid_rows)
-                
-                # Convert ranks to scores if needed
-                if is_rank_based:
-                    if k_value == 1:
-                        score_matrix = np.ones((1, 1))  # Single rank maps to 1.0
-                    else:
-                        score_matrix = (k_value - score_matrix) / (k_value - 1)
+            # Convert ranks to scores if needed
+            if is_rank_based:
+                if k_value == 1:
+                    score_matrix = np.ones((1, 1))  # Single rank maps to 1.0
                 else:
-                    # Reject if any score is out of [0, 1] range
-                    if np.any((score_matrix < 0.0) | (score_matrix > 1.0)):
-                        logging.error(f"Score out of range [0, 1] detected")
-                        return np.full((k_value, k_value), 0.0), 1, True
+                    score_matrix = (k_value - score_matrix) / (k_value - 1)
+            else:
+                # Reject if any score is out of [0, 1] range
+                if np.any((score_matrix < 0.0) | (score_matrix > 1.0)):
+                    logging.error(f"Score out of range [0, 1] detected")
+                    return np.full((k_value, k_value), 0.0), 1, True
 
-                logging.debug(f"Successfully parsed {k_value}x{k_value} matrix from lines {start_idx+1}-{start_idx+k_value}")
-                return score_matrix, warning_count, is_rejected
+            logging.debug(f"Successfully parsed {k_value}x{k_value} matrix from lines {start_idx+1}-{start_idx+k_value}")
+            return score_matrix, warning_count, is_rejected
 
         # If we get here, no valid k×k block was found
         logging.error(f"No valid {k_value}×{k_value} block found in response")
@@ -380,6 +439,263 @@ def validate_all_scores_file_content(filepath, expected_matrices_map, k_value):
     return True
 
 
+def process_response_file(resp_filepath, queries_dir, is_rank_based, quiet):
+    """
+    Parses one trial's response file.
+
+    Returns `(query_index, score_matrix, warnings, status)`. `status` is
+    'success' (the only case with a matrix), 'rejected' (no valid table),
+    'error' (the file could not be processed), or 'skipped' (no index in the
+    name, or no k / List A in the query). Rejections, errors, and skipped
+    queries (those with an index) count as errors of the run, as before.
+    """
+    base_filename = os.path.basename(resp_filepath)
+    match = re.search(r"llm_response_(\d+)\.txt", base_filename)
+    if not match:
+        logging.warning(f"Could not parse index from response filename: {base_filename}. Skipping.")
+        return None, None, 0, 'skipped'
+
+    query_index_str = match.group(1)
+    query_index_int = int(query_index_str)
+    if not quiet:
+        logging.info(f"Processing response file: {base_filename} (Index: {query_index_str})")
+
+    query_filepath = os.path.join(queries_dir, f"llm_query_{query_index_str}.txt")
+    k, list_a_names = get_list_a_details_from_query(query_filepath)
+    if k is None or not list_a_names or len(list_a_names) != k:
+        logging.error(f"  Could not determine k or List A names for query {query_index_str} (k={k}, names found={len(list_a_names)}). Skipping.")
+        return query_index_int, None, 0, 'skipped'
+    if not quiet:
+        logging.info(f"  Determined k = {k} for this query. List A names retrieved.")
+
+    try:
+        with open(resp_filepath, 'r', encoding='utf-8') as f_resp: response_content = f_resp.read()
+
+        if not response_content.strip():
+            logging.warning(f"  Response {base_filename}: EMPTY - contains no content")
+            response_warnings, current_response_rejected = 1, True # Empty response is a rejection
+        else:
+            score_matrix, response_warnings, current_response_rejected = parse_llm_response_table_to_matrix(
+                response_content, k, list_a_names, is_rank_based
+            )
+
+        if current_response_rejected:
+            logging.error(f"  Response {base_filename}: REJECTED - parsing failed")
+            return query_index_int, None, response_warnings, 'rejected'
+        logging.info(f"  Response {base_filename}: SUCCESS - parsed {k}x{k} matrix")
+        return query_index_int, score_matrix, response_warnings, 'success'
+
+    except FileNotFoundError:
+        logging.error(f"  Response file not found: {resp_filepath}. Skipping.")
+    except Exception as e:
+        logging.error(f"  Error processing response file {base_filename}: {e}", exc_info=True)
+    return query_index_int, None, 0, 'error'
+
+class _RecordCollector(logging.Handler):
+    """Keeps the log records of a pool worker so the parent can emit them in trial order."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, self.format(record)))
+
+def _init_parse_worker(log_level):
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(log_level)
+
+def _process_response_file_in_worker(task):
+    collector = _RecordCollector()
+    collector.setFormatter(logging.Formatter('%(message)s'))
+    logging.getLogger().addHandler(collector)
+    try:
+        return process_response_file(*task), collector.records
+    finally:
+        logging.getLogger().removeHandler(collector)
+
+def resolve_parse_workers(requested, num_files):
+    """
+    Returns the number of parser processes for a run.
+
+    `requested` 0 means one per CPU (at most 8); runs with fewer than
+    `PARALLEL_PARSE_MIN_RESPONSES` responses are parsed in-process, since
+    starting the pool would cost more than it saves.
+    """
+    workers = requested if requested > 0 else min(os.cpu_count() or 1, 8)
+    if num_files < PARALLEL_PARSE_MIN_RESPONSES:
+        return 1
+    return max(1, min(workers, num_files))
+
+def iter_response_outcomes(tasks, workers, log_level):
+    """Yields the outcome of every `(resp_filepath, queries_dir, is_rank_based, quiet)` task in task order."""
+    if workers <= 1:
+        for task in tasks:
+            yield process_response_file(*task)
+        return
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker, initargs=(log_level,)) as executor:
+        for outcome, records in executor.map(_process_response_file_in_worker, tasks, chunksize=chunksize):
+            for level, message in records:
+                logging.log(level, message)
+            yield outcome
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _sha256_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _query_stamp(queries_dir, query_index_str):
+    """Stamp of the query a response is parsed against: its query file, or the run's query bundle."""
+    for path in (os.path.join(queries_dir, f"llm_query_{query_index_str}.txt"), query_bundle.bundle_path(queries_dir)):
+        if os.path.exists(path):
+            return _file_stamp(path)
+    return None
+
+def load_parse_manifest(manifest_path, is_rank_based):
+    """
+    Returns the entries of a run's parse manifest, keyed by response filename.
+
+    A missing or unreadable manifest, or one written by another parser
+    version or for the other `--llm_output_ranks` setting, yields no entries.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != PARSE_MANIFEST_VERSION or manifest.get("is_rank_based") != is_rank_based:
+        logging.info("Parse manifest was written by another parser version or rank setting; re-parsing all responses.")
+        return {}
+    return manifest.get("responses", {})
+
+def write_parse_manifest(manifest_path, entries, is_rank_based):
+    tmp_path = f"{manifest_path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": PARSE_MANIFEST_VERSION, "is_rank_based": is_rank_based, "responses": entries}, f)
+        os.replace(tmp_path, manifest_path)
+    except (OSError, TypeError, ValueError) as e:
+        logging.warning(f"Could not write parse manifest '{manifest_path}': {e}")
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def new_manifest_entry(resp_filepath, queries_dir):
+    """Records the response's size, modification time, and SHA-256, and the stamp of its query, before parsing."""
+    match = re.search(r"llm_response_(\d+)\.txt", os.path.basename(resp_filepath))
+    if not match:
+        return None
+    try:
+        size, mtime_ns = _file_stamp(resp_filepath)
+        return {"size": size, "mtime_ns": mtime_ns, "sha256": _sha256_file(resp_filepath),
+                "query": _query_stamp(queries_dir, match.group(1))}
+    except OSError:
+        return None
+
+def reuse_manifest_entry(entry, resp_filepath, queries_dir):
+    """
+    Returns `(entry, outcome)` for a response whose earlier parse still applies, or None.
+
+    The response must have the recorded size and modification time, or
+    failing that the recorded SHA-256 (the entry's stamp is then refreshed),
+    and its query must be unchanged.
+    """
+    match = re.search(r"llm_response_(\d+)\.txt", os.path.basename(resp_filepath))
+    if not entry or not match or entry.get("query") != _query_stamp(queries_dir, match.group(1)):
+        return None
+    try:
+        stamp = _file_stamp(resp_filepath)
+        if stamp != [entry["size"], entry["mtime_ns"]]:
+            if _sha256_file(resp_filepath) != entry["sha256"]:
+                return None
+            entry = dict(entry, size=stamp[0], mtime_ns=stamp[1])
+        matrix = None if entry["matrix"] is None else np.array(entry["matrix"], dtype=float)
+        return entry, (entry["index"], matrix, entry["warnings"], entry["status"])
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+def format_score_matrices(matrices, score_format):
+    """Renders the matrices as the tab-separated `all_scores.txt` text, one blank line between matrices."""
+    blocks = ["".join("\t".join(f"{x:{score_format}}" for x in row) + "\n" for row in matrix) for matrix in matrices]
+    return "\n".join(blocks)
+
+def verify_scores_file(filepath, expected_text, matrices):
+    """
+    Checks a freshly written `all_scores.txt` without re-parsing it line by line.
+
+    The file's bytes must have the SHA-256 of the text that was written
+    (with the platform's line endings), and
+    the written values (parsed from that in-memory text in one vectorized
+    step) must match the parsed matrices, so a `--score_format` that loses
+    precision is still caught.
+    """
+    logging.info(f"Starting cross-validation of '{filepath}'...")
+    validation_errors = 0
+    try:
+        with open(filepath, 'rb') as f:
+            written_digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError as e:
+        logging.error(f"  VALIDATION FAIL: Unexpected error reading '{filepath}': {e}")
+        return False
+    expected_bytes = expected_text.replace('\n', os.linesep).encode('utf-8')
+    if written_digest != hashlib.sha256(expected_bytes).hexdigest():
+        logging.error(f"  VALIDATION FAIL: Checksum of '{filepath}' does not match the scores that were written.")
+        validation_errors += 1
+
+    expected_values = np.concatenate([np.asarray(matrix, dtype=float).ravel() for matrix in matrices])
+    try:
+        written_values = np.array(expected_text.split(), dtype=float)
+    except ValueError:
+        logging.error(f"  VALIDATION FAIL: Non-float data in the formatted scores for '{filepath}'.")
+        written_values = None
+    if written_values is None or written_values.shape != expected_values.shape:
+        validation_errors += 1
+    elif not np.allclose(written_values, expected_values, atol=1e-6):
+        mismatched = np.flatnonzero(~np.isclose(written_values, expected_values, atol=1e-6))
+        logging.error(f"  VALIDATION FAIL: {len(mismatched)} written score(s) differ from the parsed values "
+                      f"(first at position {mismatched[0]}); check --score_format.")
+        validation_errors += 1
+
+    if validation_errors > 0:
+        print(f"\nCRITICAL: ALL_SCORES_FILE_VALIDATION FAILED WITH {validation_errors} ERRORS.\n")
+        return False
+
+    logging.info(f"Successfully cross-validated '{filepath}'. All checks passed.")
+    print("\nALL_SCORES_FILE_VALIDATION_SUCCESS\n")
+    return True
+
+
+def write_score_store(analysis_inputs_dir, scores_text, matrices, score_format, scores_path, mappings_path, indices_path):
+    """
+    Writes the binary copy of the replication's analysis inputs (see `score_store`).
+
+    The score tensor holds the values as written to `all_scores.txt`, parsed
+    from the in-memory text, and the mappings are those written to
+    `all_mappings.txt`, so both copies describe the same trials.
+    """
+    if len({np.shape(matrix) for matrix in matrices}) != 1:
+        logging.warning("Score matrices differ in shape; skipping the binary score store.")
+        return False
+    k = np.shape(matrices[0])[0]
+    try:
+        with open(mappings_path, 'r', encoding='utf-8') as f:
+            mapping_rows = [line.split() for line in f.read().splitlines()[1:] if line.strip()]
+        mappings = np.array(mapping_rows, dtype=np.int64)
+        with open(indices_path, 'r', encoding='utf-8') as f:
+            indices = [int(line) for line in f.read().split()]
+        scores = np.array(scores_text.split(), dtype=float).reshape(len(matrices), k, k)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not prepare the binary score store: {e}")
+        return False
+    return score_store.write_store(analysis_inputs_dir, scores, mappings, indices,
+                                   [scores_path, mappings_path, indices_path],
+                                   score_store.fixed_point_decimals(score_format))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Processes LLM responses into score matrices for analysis.")
     parser.add_argument("--llm_output_ranks", action="store_true", help="Set if LLM output is ranks (1=best) not direct scores, to be converted.")
@@ -388,6 +704,11 @@ def main():
                         help="Increase verbosity level (-v for INFO, -vv for DEBUG).")
     parser.add_argument("--run_output_dir", required=True, help="The absolute or relative path to the self-contained output directory for this specific run.")
     parser.add_argument("--quiet", action="store_true", help="Suppress per-response progress messages.")
+    parser.add_argument("--full_reparse", action="store_true",
+                        help="Parse every response even if the run's parse manifest has a result for it.")
+    parser.add_argument("--workers", type=int,
+                        default=get_config_value(APP_CONFIG, 'Analysis', 'response_parse_workers', fallback=1, value_type=int),
+                        help="Processes used to parse responses (0 = one per CPU). Small runs are always parsed in-process.")
 
     args = parser.parse_args()
 
@@ -442,6 +763,13 @@ def main():
     queries_dir = os.path.join(args.run_output_dir, queries_subdir_cfg)
     analysis_inputs_dir = os.path.join(args.run_output_dir, analysis_inputs_subdir_cfg)
 
+    # Results of the previous parse survive the clean-up below so unchanged responses can reuse them.
+    parse_manifest_path = os.path.join(analysis_inputs_dir, PARSE_MANIFEST_FILENAME)
+    incremental = get_config_value(APP_CONFIG, 'Analysis', 'incremental_parsing', fallback=False, value_type=bool)
+    previous_entries = {}
+    if incremental and not args.full_reparse:
+        previous_entries = load_parse_manifest(parse_manifest_path, args.llm_output_ranks)
+
     # Clean up old analysis inputs directory if it exists to ensure a clean re-run
     if os.path.exists(analysis_inputs_dir):
         logging.warning(f"Found existing analysis directory. Removing for a clean re-run: {analysis_inputs_dir}")
@@ -468,96 +796,73 @@ def main():
     successful_indices = []
     processed_count = 0
     error_count = 0
-    total_parsing_warnings = 0 # This line should already be there from the previous step
+    total_parsing_warnings = 0
 
-    # NEW: Dictionary to store successfully parsed matrices for validation
-    parsed_matrices_for_validation = {}
-
-    for resp_filepath in response_files:
+    # Responses unchanged since the last run reuse their recorded parse; only the rest are parsed.
+    manifest_entries = {}
+    outcomes = [None] * len(response_files)
+    positions_to_parse = []
+    for position, resp_filepath in enumerate(response_files):
         base_filename = os.path.basename(resp_filepath)
-        match = re.search(r"llm_response_(\d+)\.txt", base_filename)
-        if not match:
-            logging.warning(f"Could not parse index from response filename: {base_filename}. Skipping.")
+        reused = reuse_manifest_entry(previous_entries.get(base_filename), resp_filepath, queries_dir)
+        if reused is None:
+            positions_to_parse.append(position)
+            if incremental:
+                manifest_entries[base_filename] = new_manifest_entry(resp_filepath, queries_dir)
             continue
-
-        query_index_str = match.group(1)
-        query_index_int = int(query_index_str)
-        
-        # This logging.info will now respect the --quiet flag because handlers are cleared.
-        if not args.quiet:
-            logging.info(f"Processing response file: {base_filename} (Index: {query_index_str})")
-
-        query_filename = f"llm_query_{query_index_str}.txt"
-        query_filepath = os.path.join(queries_dir, query_filename)
-
-        k, list_a_names = get_list_a_details_from_query(query_filepath)
-        if k is None or not list_a_names or len(list_a_names) != k:
-            logging.error(f"  Could not determine k or List A names for query {query_index_str} (k={k}, names found={len(list_a_names)}). Skipping.")
+        manifest_entries[base_filename], outcomes[position] = reused
+        status = outcomes[position][3]
+        if status == 'rejected':
+            logging.error(f"  Response {base_filename}: REJECTED - parsing failed (unchanged since the last parse)")
+        elif status == 'skipped':
+            logging.error(f"  Response {base_filename}: no k or List A names in its query (unchanged since the last parse). Skipping.")
+    if incremental:
+        logging.info(f"Reusing {len(response_files) - len(positions_to_parse)} unchanged parse results; "
+                     f"parsing {len(positions_to_parse)} new or changed responses.")
+
+    # Trials are parsed independently (in a process pool for large runs); outcomes arrive in file order.
+    workers = resolve_parse_workers(args.workers, len(positions_to_parse))
+    if workers > 1:
+        logging.info(f"Parsing responses with {workers} worker processes.")
+    tasks = [(response_files[position], queries_dir, args.llm_output_ranks, args.quiet) for position in positions_to_parse]
+    for position, outcome in zip(positions_to_parse, iter_response_outcomes(tasks, workers, log_level_to_set)):
+        outcomes[position] = outcome
+        entry = manifest_entries.get(os.path.basename(response_files[position]))
+        if entry is not None and outcome[3] != 'error':
+            query_index_int, score_matrix, response_warnings, status = outcome
+            entry.update(index=query_index_int, status=status, warnings=response_warnings,
+                         matrix=None if score_matrix is None else np.asarray(score_matrix, dtype=float).tolist())
+    if incremental:
+        # Errors are not recorded, so those responses are parsed again next time.
+        write_parse_manifest(parse_manifest_path, {name: entry for name, entry in manifest_entries.items()
+                                                   if entry is not None and "status" in entry}, args.llm_output_ranks)
+
+    for query_index_int, score_matrix, response_warnings, status in outcomes:
+        total_parsing_warnings += response_warnings
+        if status in ('rejected', 'error') or (status == 'skipped' and query_index_int is not None):
             error_count += 1
-            continue
-        
-        # This logging.info will now respect the --quiet flag.
-        if not args.quiet:
-            logging.info(f"  Determined k = {k} for this query. List A names retrieved.")
-
-        try:
-            with open(resp_filepath, 'r', encoding='utf-8') as f_resp: response_content = f_resp.read()
-            
-            score_matrix = np.full((k, k), 0.0) # Default to zero matrix
-            response_warnings = 0
-            current_response_rejected = False
-
-            if not response_content.strip():
-                logging.warning(f"  Response {base_filename}: EMPTY - contains no content")
-                response_warnings = 1
-                current_response_rejected = True # Empty response is a rejection
-            else:
-                score_matrix, response_warnings, current_response_rejected = parse_llm_response_table_to_matrix(
-                    response_content, k, list_a_names, args.llm_output_ranks
-                )
-            
-            total_parsing_warnings += response_warnings # Aggregate warnings from this response
+        elif status == 'success':
+            all_parsed_score_matrices.append(score_matrix)
+            successful_indices.append(query_index_int)
+            processed_count += 1
 
-            if current_response_rejected:
-                logging.error(f"  Response {base_filename}: REJECTED - parsing failed")
-                error_count += 1
-                # Do NOT add to all_parsed_score_matrices or successful_indices
-            else:
-                all_parsed_score_matrices.append(score_matrix)
-                successful_indices.append(query_index_int)
-                processed_count += 1
-                # Store the parsed matrix in the dictionary for validation
-                parsed_matrices_for_validation[query_index_int] = score_matrix
-                logging.info(f"  Response {base_filename}: SUCCESS - parsed {k}x{k} matrix")
-
-        except FileNotFoundError:
-            logging.error(f"  Response file not found: {resp_filepath}. Skipping."); error_count += 1
-        except Exception as e:
-            logging.error(f"  Error processing response file {base_filename}: {e}", exc_info=True); error_count += 1
-            
     all_scores_output_filename = get_config_value(APP_CONFIG, 'Filenames', 'all_scores_for_analysis', fallback="all_scores.txt")
     all_scores_output_path = os.path.join(analysis_inputs_dir, all_scores_output_filename)
 
     try:
         # Always create the file to ensure a consistent state for downstream scripts.
+        scores_text = format_score_matrices(all_parsed_score_matrices, args.score_format)
         with open(all_scores_output_path, 'w', encoding='utf-8') as f_out:
-            if all_parsed_score_matrices:
-                for i, matrix in enumerate(all_parsed_score_matrices):
-                    if i > 0: f_out.write("\n")
-                    for row in matrix: f_out.write("\t".join(map(lambda x: f"{x:{args.score_format}}", row)) + "\n")
-                logging.info(f"Successfully wrote {len(all_parsed_score_matrices)} score matrices to {all_scores_output_path}")
-            else:
-                # This block runs inside the 'with open...' context.
-                # The file is created but remains empty, which is the desired behavior.
-                logging.warning(f"No score matrices were successfully parsed. Creating empty file at '{all_scores_output_path}'.")
+            f_out.write(scores_text)
+        if all_parsed_score_matrices:
+            logging.info(f"Successfully wrote {len(all_parsed_score_matrices)} score matrices to {all_scores_output_path}")
+        else:
+            # The file is created but remains empty, which is the desired behavior.
+            logging.warning(f"No score matrices were successfully parsed. Creating empty file at '{all_scores_output_path}'.")
 
         # After writing, whether empty or not, run validation only if there's data to validate.
         if all_parsed_score_matrices:
-            scores_file_validation_passed = validate_all_scores_file_content(
-                all_scores_output_path,
-                parsed_matrices_for_validation,
-                k  # 'k' is from the last successfully processed item
-            )
+            scores_file_validation_passed = verify_scores_file(all_scores_output_path, scores_text, all_parsed_score_matrices)
             if not scores_file_validation_passed:
                 logging.critical("Halting due to critical all_scores.txt file validation failures.")
                 sys.exit(1)
@@ -586,6 +891,9 @@ def main():
         with open(successful_indices_path, 'w', encoding='utf-8') as f_indices:
             for index in sorted(successful_indices): f_indices.write(f"{index}\n")
         logging.info(f"Successfully wrote {len(successful_indices)} successful indices to {successful_indices_path}")
+        if all_parsed_score_matrices and get_config_value(APP_CONFIG, 'Analysis', 'score_tensor_store', fallback=False, value_type=bool):
+            write_score_store(analysis_inputs_dir, scores_text, all_parsed_score_matrices, args.score_format,
+                              all_scores_output_path, dest_mappings_path, successful_indices_path)
     except IOError as e:
         logging.error(f"Error writing successful indices file to {successful_indices_path}: {e}")
 
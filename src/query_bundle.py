@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/query_bundle.py
+
+"""
+Single-File Query Bundle for a Replication's Session Queries.
+
+By default Stage 1 writes `llm_query_NNN.txt` and `llm_query_NNN_manifest.txt`
+for every trial, and the later stages and the auditor glob and re-read them.
+With `[General] query_layout = bundle`, Stage 1 instead appends one JSON line
+per trial to `session_queries/query_bundle.jsonl`, holding the trial's query
+text, manifest, mapping, and seed metadata. `mappings.txt` and
+`llm_query_base.txt` are written as before.
+
+Key Features:
+-   **Either Layout**: `read_query_file()`, `read_manifest_text()`, and
+    `list_query_indices()` serve a trial from its own files when they exist
+    and from the bundle otherwise, so readers do not need to know which
+    layout a run uses. Stage 2 keeps passing `llm_query_NNN.txt` paths
+    around; they resolve to bundle records transparently.
+-   **Offset Index**: Each line starts with its trial index, so opening a
+    bundle only scans line boundaries; a record is read with one seek.
+    Opened bundles are reused until the file changes.
+-   **Append-Only**: Continued runs append new trials. A torn last line from
+    an interrupted write is ignored and cut off before the next append, and
+    a re-appended trial supersedes the earlier record.
+"""
+
+# === Start of src/query_bundle.py ===
+
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+BUNDLE_FILENAME = "query_bundle.jsonl"
+QUERY_LAYOUTS = ("files", "bundle")
+
+_QUERY_FILE_PATTERN = re.compile(r'^llm_query_(\d+)\.txt$')
+_RECORD_INDEX_PATTERN = re.compile(rb'^\{"index": (\d+),')
+
+_open_bundles: Dict[str, "QueryBundle"] = {}
+_open_bundles_lock = threading.Lock()
+
+
+def bundle_path(queries_dir: str) -> str:
+    return os.path.join(queries_dir, BUNDLE_FILENAME)
+
+
+def query_file_path(queries_dir: str, index: int) -> str:
+    return os.path.join(queries_dir, f"llm_query_{index:03d}.txt")
+
+
+def manifest_file_path(queries_dir: str, index: int) -> str:
+    return os.path.join(queries_dir, f"llm_query_{index:03d}_manifest.txt")
+
+
+class QueryBundle:
+    """Read access to the trial records of one `query_bundle.jsonl`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_size, stat.st_mtime_ns)
+        self._offsets: Dict[int, tuple] = {}
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                match = _RECORD_INDEX_PATTERN.match(line)
+                if match and line.endswith(b'\n'):
+                    self._offsets[int(match.group(1))] = (offset, len(line))
+                offset += len(line)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._offsets
+
+    def indices(self) -> List[int]:
+        return sorted(self._offsets)
+
+    def record(self, index: int) -> Optional[Dict[str, Any]]:
+        """Returns the trial's record (`index`, `qgen_seed`, `personalities`, `mapping`, `manifest`, `query`)."""
+        if index not in self._offsets:
+            return None
+        offset, length = self._offsets[index]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode('utf-8'))
+
+
+def open_bundle(queries_dir: str) -> Optional[QueryBundle]:
+    """Returns the bundle of `queries_dir`, or None if the run uses per-trial files."""
+    path = bundle_path(queries_dir)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _open_bundles_lock:
+        bundle = _open_bundles.get(path)
+        if bundle is None or bundle.signature != (stat.st_size, stat.st_mtime_ns):
+            bundle = QueryBundle(path)
+            _open_bundles[path] = bundle
+        return bundle
+
+
+def _truncate_torn_line(path: str) -> None:
+    """Cuts an interrupted write off the end of the bundle so the next record starts on its own line."""
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b'\n')
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+def append_trial(queries_dir: str, index: int, query_text: str, manifest_text: str, mapping_line: str,
+                 qgen_seed: Optional[int] = None, personalities: Optional[List[int]] = None) -> None:
+    """Appends one trial's record to the bundle of `queries_dir`."""
+    path = bundle_path(queries_dir)
+    record = {"index": index, "qgen_seed": qgen_seed, "personalities": personalities or [],
+              "mapping": mapping_line, "manifest": manifest_text, "query": query_text}
+    if os.path.exists(path) and os.stat(path).st_nlink > 1:
+        # A bundle hard-linked from the shared query-set registry must not change for the other runs.
+        shutil.copyfile(path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    _truncate_torn_line(path)
+    with open(path, 'a', encoding='utf-8', newline='\n') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# --- Layout-independent readers ---
+
+def list_query_indices(queries_dir: str) -> List[int]:
+    """Returns the indices of all trials with a query, from files and bundle combined."""
+    indices = set()
+    try:
+        for name in os.listdir(queries_dir):
+            match = _QUERY_FILE_PATTERN.match(name)
+            if match:
+                indices.add(int(match.group(1)))
+    except OSError:
+        return []
+    bundle = open_bundle(queries_dir)
+    if bundle is not None:
+        indices.update(bundle.indices())
+    return sorted(indices)
+
+
+def _bundle_record_for_file(path: str) -> Optional[Dict[str, Any]]:
+    match = _QUERY_FILE_PATTERN.match(os.path.basename(path))
+    bundle = open_bundle(os.path.dirname(path)) if match else None
+    return bundle.record(int(match.group(1))) if bundle is not None else None
+
+
+def query_exists(path: str) -> bool:
+    """True if the `llm_query_NNN.txt` at `path` exists as a file or as a bundle record."""
+    return os.path.exists(path) or _bundle_record_for_file(path) is not None
+
+
+def read_query_file(path: str) -> str:
+    """
+    Returns the text of the query at an `llm_query_NNN.txt` path.
+
+    Falls back to the bundle in the same directory; raises
+    `FileNotFoundError` if neither holds the query.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        record = _bundle_record_for_file(path)
+        if record is None:
+            raise
+        return record["query"]
+
+
+def read_manifest_text(queries_dir: str, index: int) -> Optional[str]:
+    """Returns the manifest of a trial, or None if it has neither a manifest file nor a bundle record."""
+    try:
+        with open(manifest_file_path(queries_dir, index), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        bundle = open_bundle(queries_dir)
+        record = bundle.record(index) if bundle is not None else None
+        return record["manifest"] if record is not None else None
+
+# === End of src/query_bundle.py ===
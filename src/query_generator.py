@@ -36,6 +36,11 @@ Key Operations:
     - `llm_query.txt`: The final prompt for the LLM.
     - `mapping.txt`: The ground truth mapping for scoring.
     - `manifest.txt`: A detailed audit file to validate the shuffling and mapping.
+
+`build_llm_queries.py` calls `generate_query_set()` in-process with the
+selected rows and a seeded `random.Random`, and writes the returned query,
+mapping, and manifest directly. For the same seed this yields exactly the
+bytes the script writes when run standalone with `--seed`.
 """
 
 # === Start of personality_matching_project/src/query_generator.py ===
@@ -135,12 +140,12 @@ def load_personalities(filepath, required_k_value):
         logging.error(f"Error reading personalities file '{filepath}': {e}")
         sys.exit(1)
 
-def select_and_prepare_k_items(all_personalities, k_to_select):
+def select_and_prepare_k_items(all_personalities, k_to_select, rng=random):
     if len(all_personalities) < k_to_select: 
         logging.error(f"Internal Error: Cannot select {k_to_select} items, only {len(all_personalities)} available.")
         sys.exit(1)
         
-    raw_selected_entries = random.sample(all_personalities, k_to_select)
+    raw_selected_entries = rng.sample(all_personalities, k_to_select)
     
     selected_items_with_ref = []
     for i, entry in enumerate(raw_selected_entries):
@@ -153,6 +158,12 @@ def select_and_prepare_k_items(all_personalities, k_to_select):
         })
     return selected_items_with_ref
 
+def format_tab_separated(header, data_rows):
+    """Returns the text of a tab-separated file with one header line."""
+    lines = [header]
+    lines.extend("\t".join(map(str, row_items)) for row_items in data_rows)
+    return "\n".join(lines) + "\n"
+
 def write_tab_separated_file(filepath, header, data_rows):
     try:
         output_file_dir = os.path.dirname(filepath)
@@ -163,9 +174,7 @@ def write_tab_separated_file(filepath, header, data_rows):
         logging.debug(f"Attempting to open and write to: {filepath}") # DEBUG ADDED
         with open(filepath, 'w', encoding='utf-8') as f:
             logging.debug(f"Successfully opened for writing: {filepath}") # DEBUG ADDED
-            f.write(header + "\n")
-            for row_items in data_rows:
-                f.write("\t".join(map(str, row_items)) + "\n")
+            f.write(format_tab_separated(header, data_rows))
         logging.debug(f"Finished writing, closed: {filepath}") # DEBUG ADDED
         logging.info(f"Successfully wrote: {filepath}")
     except IOError as e:
@@ -175,12 +184,22 @@ def write_tab_separated_file(filepath, header, data_rows):
         logging.error(f"Unexpected error writing {filepath}: {e}")
         raise
 
-def create_shuffled_names_file(selected_items_with_ref, filepath):
-    name_year_to_shuffle = [
+def shuffle_names(selected_items_with_ref, rng=random):
+    """Returns the `(name, year, internal_ref_id)` tuples of the items in shuffled order."""
+    shuffled_name_year_list = [
         (normalize_text_for_llm(item['name']), item['year'], item['internal_ref_id']) for item in selected_items_with_ref
     ]
-    shuffled_name_year_list = list(name_year_to_shuffle) 
-    random.shuffle(shuffled_name_year_list)
+    rng.shuffle(shuffled_name_year_list)
+    return shuffled_name_year_list
+
+def shuffle_descriptions(selected_items_with_ref, rng=random):
+    """Returns the `(description, internal_ref_id)` tuples of the items in shuffled order."""
+    shuffled_description_list = [(item['description'], item['internal_ref_id']) for item in selected_items_with_ref]
+    rng.shuffle(shuffled_description_list)
+    return shuffled_description_list
+
+def create_shuffled_names_file(selected_items_with_ref, filepath, rng=random):
+    shuffled_name_year_list = shuffle_names(selected_items_with_ref, rng)
     
     try:
         output_file_dir = os.path.dirname(filepath)
@@ -198,12 +217,8 @@ def create_shuffled_names_file(selected_items_with_ref, filepath):
         logging.error(f"Error writing {filepath}: {e}")
         sys.exit(1)
 
-def create_shuffled_descriptions_file(selected_items_with_ref, filepath, k_val):
-    description_to_shuffle = [
-        (item['description'], item['internal_ref_id']) for item in selected_items_with_ref
-    ]
-    shuffled_description_list = list(description_to_shuffle) 
-    random.shuffle(shuffled_description_list)
+def create_shuffled_descriptions_file(selected_items_with_ref, filepath, k_val, rng=random):
+    shuffled_description_list = shuffle_descriptions(selected_items_with_ref, rng)
     
     data_rows = []
     for j in range(k_val):
@@ -213,7 +228,8 @@ def create_shuffled_descriptions_file(selected_items_with_ref, filepath, k_val):
     write_tab_separated_file(filepath, "Index\tDescriptionText", data_rows) # write_tab_separated_file handles os.makedirs
     return shuffled_description_list
 
-def create_mapping_file(shuffled_name_year_list, shuffled_description_list, filepath, k_val):
+def compute_mapping(shuffled_name_year_list, shuffled_description_list):
+    """Returns the 1-based position in List B of each List A name's matching description."""
     mapping_indices_1_based = []
     for _, _, ref_id_from_name_list in shuffled_name_year_list:
         found_match = False
@@ -225,15 +241,19 @@ def create_mapping_file(shuffled_name_year_list, shuffled_description_list, file
         if not found_match:
             logging.critical("CRITICAL ERROR: Could not find matching description for a name during mapping generation.")
             sys.exit(1)
-            
-    header_parts = [f"Map_idx{i+1}" for i in range(k_val)]
-    write_tab_separated_file(filepath, "\t".join(header_parts), [mapping_indices_1_based]) # write_tab_separated_file handles os.makedirs
+    return mapping_indices_1_based
 
-def create_manifest_file(shuffled_name_year_list, shuffled_description_list, filepath, k_val, desc_text_to_original_id_map):
-    """
-    Creates a manifest file for auditing the name-to-description mapping.
-    """
-    header = "Name_in_Query\tName_Ref_ID\tShuffled_Desc_Index\tDesc_Ref_ID\tDesc_in_Query"
+def mapping_header(k_val):
+    return "\t".join(f"Map_idx{i+1}" for i in range(k_val))
+
+def create_mapping_file(shuffled_name_year_list, shuffled_description_list, filepath, k_val):
+    mapping_indices_1_based = compute_mapping(shuffled_name_year_list, shuffled_description_list)
+    write_tab_separated_file(filepath, mapping_header(k_val), [mapping_indices_1_based]) # write_tab_separated_file handles os.makedirs
+
+MANIFEST_HEADER = "Name_in_Query\tName_Ref_ID\tShuffled_Desc_Index\tDesc_Ref_ID\tDesc_in_Query"
+
+def build_manifest_rows(shuffled_name_year_list, shuffled_description_list, desc_text_to_original_id_map):
+    """Returns the rows of the manifest that audits the name-to-description mapping."""
     data_rows = []
 
     # Create a lookup map from the mapping_ref_id to its new shuffled index and text
@@ -259,17 +279,39 @@ def create_manifest_file(shuffled_name_year_list, shuffled_description_list, fil
             logging.critical(f"CRITICAL: Manifest generation failed. No matching description for name_ref_id {name_ref_id}.")
             # This should ideally never happen if the logic is sound
             data_rows.append([f"{name} ({year})", name_ref_id, "ERROR", "ERROR", "ERROR"])
-    
-    write_tab_separated_file(filepath, header, data_rows)
+    return data_rows
 
-def assemble_full_query(base_prompt_content, shuffled_name_year_list, shuffled_description_list, filepath, k_val):
-    # --- NEW: Fill in the dynamic placeholders ---
+def create_manifest_file(shuffled_name_year_list, shuffled_description_list, filepath, k_val, desc_text_to_original_id_map):
+    """
+    Creates a manifest file for auditing the name-to-description mapping.
+    """
+    data_rows = build_manifest_rows(shuffled_name_year_list, shuffled_description_list, desc_text_to_original_id_map)
+    write_tab_separated_file(filepath, MANIFEST_HEADER, data_rows)
+
+def format_query_prefix(base_prompt_content, k_val):
+    """Returns the instructions shared by every trial with group size k (the cacheable prompt prefix)."""
     formatted_prompt = base_prompt_content.format(
         k=k_val,
         k_squared=(k_val * k_val),
         k_plus_1=(k_val + 1)
     )
-    # --- END NEW ---
+    return formatted_prompt.strip() + "\n\n" if formatted_prompt.strip() else ""
+
+def format_query_lists(shuffled_name_year_list, shuffled_description_list, k_val):
+    """Returns the trial-specific part of the query: List A followed by List B."""
+    lines = ["List A"]
+    lines.extend(f"{name} ({year})" for name, year, _ in shuffled_name_year_list)
+    lines.extend(["", "List B"])
+    for j in range(k_val):
+        desc, _ = shuffled_description_list[j]
+        lines.append(f"ID {j+1}: {desc}")
+    return "\n".join(lines) + "\n"
+
+def assemble_full_query(base_prompt_content, shuffled_name_year_list, shuffled_description_list, filepath, k_val):
+    # The stable instructions come first so that providers can cache them as a prompt
+    # prefix; llm_prompter.split_query_prefix() recovers the split at "List A".
+    query_text = (format_query_prefix(base_prompt_content, k_val)
+                  + format_query_lists(shuffled_name_year_list, shuffled_description_list, k_val))
 
     try:
         output_file_dir = os.path.dirname(filepath)
@@ -278,26 +320,59 @@ def assemble_full_query(base_prompt_content, shuffled_name_year_list, shuffled_d
             logging.debug(f"Ensured directory exists for {filepath}: {output_file_dir}")
 
         with open(filepath, 'w', encoding='utf-8') as f:
-            # Write the instructions (now with correct 'k' value)
-            if formatted_prompt.strip():
-                f.write(formatted_prompt.strip() + "\n\n")
-            
-            # Append List A
-            f.write("List A\n")
-            for name, year, _ in shuffled_name_year_list:
-                f.write(f"{name} ({year})\n")
-            
-            # Append List B
-            f.write("\nList B\n")
-            for j in range(k_val):
-                desc, _ = shuffled_description_list[j]
-                f.write(f"ID {j+1}: {desc}\n")
+            f.write(query_text)
                 
         logging.info(f"Successfully wrote: {filepath}")
     except Exception as e:
         logging.error(f"Error writing {filepath}: {e}")
         sys.exit(1)
 
+def apply_mapping_strategy(selected_items, mapping_strategy, rng=random):
+    """
+    Returns the items whose descriptions make up List B.
+
+    With 'correct', these are the selected items themselves. With 'random',
+    each description is paired with a randomly permuted reference ID, which
+    breaks the true name-to-description link while keeping both lists intact.
+    """
+    if mapping_strategy != 'random':
+        return selected_items
+    logging.warning("Applying 'random' mapping strategy. The ground truth will be a random permutation.")
+    original_ref_ids = [item['internal_ref_id'] for item in selected_items]
+    rng.shuffle(original_ref_ids)
+    description_items = []
+    for i, item in enumerate(selected_items):
+        new_item = item.copy()
+        new_item['internal_ref_id'] = original_ref_ids[i]
+        description_items.append(new_item)
+    return description_items
+
+def generate_query_set(selected_items, base_prompt_content, k_val, mapping_strategy='correct', rng=random):
+    """
+    Generates one trial in memory from k pre-selected personalities.
+
+    `selected_items` are dicts with `original_index_from_file`, `name`,
+    `year`, and `description`. Random draws are taken from `rng` in the same
+    order as a standalone run, so `random.Random(seed)` reproduces the files
+    of `query_generator.py --seed seed`. Returns the query text, the mapping
+    (1-based List B position per List A name), and the manifest rows.
+    """
+    if len(selected_items) != k_val:
+        raise ValueError(f"Expected k={k_val} pre-selected items, got {len(selected_items)}.")
+    selected_items = [dict(item, internal_ref_id=i) for i, item in enumerate(selected_items)]
+    description_items = apply_mapping_strategy(selected_items, mapping_strategy, rng)
+
+    shuffled_name_year_list = shuffle_names(selected_items, rng)
+    shuffled_description_list = shuffle_descriptions(description_items, rng)
+    desc_text_to_original_id_map = {item['description']: item['internal_ref_id'] for item in selected_items}
+    return {
+        "query_text": (format_query_prefix(base_prompt_content, k_val)
+                       + format_query_lists(shuffled_name_year_list, shuffled_description_list, k_val)),
+        "mapping": compute_mapping(shuffled_name_year_list, shuffled_description_list),
+        "manifest_rows": build_manifest_rows(shuffled_name_year_list, shuffled_description_list,
+                                             desc_text_to_original_id_map),
+    }
+
 
 # --- Main Orchestration ---
 def main():
@@ -345,7 +420,8 @@ def main():
     # 3. Process k_value and seed
     k_value = args.k
     if k_value <= 0: logging.error("k must be a positive integer."); sys.exit(1)
-    if args.seed is not None: random.seed(args.seed); logging.info(f"Using random seed: {args.seed}")
+    rng = random.Random(args.seed)
+    if args.seed is not None: logging.info(f"Using random seed: {args.seed}")
     else: logging.info("No random seed specified by user; results will vary each run for this generator.")
 
     # 4. Determine script directory and resolve INPUT file paths
@@ -452,7 +528,7 @@ def main():
         # Standalone mode: Sample k items from the full list.
         logging.info(f"Standalone run detected. Sampling {k_value} items from the {len(all_personalities)} available.")
         # This function handles the sampling and adds the internal_ref_id
-        selected_items = select_and_prepare_k_items(all_personalities, k_value)
+        selected_items = select_and_prepare_k_items(all_personalities, k_value, rng)
 
     if not selected_items:
         logging.error("No items were selected for processing. This should not happen.")
@@ -464,27 +540,9 @@ def main():
     mapping_strategy = args.mapping_strategy
     logging.info(f"Using mapping strategy: {mapping_strategy}")
 
-    # By default, the items for names and descriptions are the same, ensuring a correct map.
+    # The items for names are the selected items; the description items depend on the strategy.
     name_items = selected_items
-    description_items = selected_items
-
-    if mapping_strategy == 'random':
-        logging.warning("Applying 'random' mapping strategy. The ground truth will be a random permutation.")
-        
-        # Get the list of original internal reference IDs.
-        original_ref_ids = [item['internal_ref_id'] for item in selected_items]
-        
-        # Shuffle these reference IDs using the script's seeded random state.
-        random.shuffle(original_ref_ids)
-        
-        # Create a new list of items for the descriptions. Each original item
-        # is now paired with a RANDOMLY chosen reference ID. This breaks the
-        # original name-to-description link while keeping the sets of names and descriptions identical.
-        description_items = []
-        for i, item in enumerate(selected_items):
-            new_item = item.copy()
-            new_item['internal_ref_id'] = original_ref_ids[i]
-            description_items.append(new_item)
+    description_items = apply_mapping_strategy(selected_items, mapping_strategy, rng)
 
     logging.info("Writing intermediate files...")
     names_data_rows = [[i + 1, item['name'], item['year']] for i, item in enumerate(name_items)]
@@ -494,8 +552,8 @@ def main():
     write_tab_separated_file(descriptions_out_filepath, "Seq\tDescriptionText", descriptions_data_rows)
 
     logging.info("Creating shuffled files, mapping, and manifest file...")
-    shuffled_name_year_list = create_shuffled_names_file(name_items, shuffled_names_out_filepath)
-    shuffled_description_list = create_shuffled_descriptions_file(description_items, shuffled_descriptions_out_filepath, k_value)
+    shuffled_name_year_list = create_shuffled_names_file(name_items, shuffled_names_out_filepath, rng)
+    shuffled_description_list = create_shuffled_descriptions_file(description_items, shuffled_descriptions_out_filepath, k_value, rng)
     create_mapping_file(shuffled_name_year_list, shuffled_description_list, mapping_out_filepath, k_value)
     
     # Create a lookup map from description text to its original, pre-randomization ref ID.
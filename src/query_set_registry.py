@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/query_set_registry.py
+
+"""
+Shared Query-Set Registry for Factorial Studies.
+
+A factorial study launches one experiment per model x group size x mapping
+strategy. When their query sets would be identical (same personalities
+database, base query, k, m, mapping strategy, and seeds), building them once
+and reusing them for every model saves Stage 1 time and guarantees that the
+models answer exactly the same queries.
+
+With `[QuerySets] enabled = true`, `replication_manager.py` asks this
+registry for the replication's query set instead of always running
+`build_llm_queries.py` into the run directory. The first replication that
+needs a set builds it into the registry; every later one links it into its
+own `session_queries` directory.
+
+Key Features:
+-   **Content-Addressed Keys**: A set is keyed by the SHA-256 of the
+    personalities database and base query, plus k, m, mapping strategy,
+    selection mode, and both seeds, so any change to its inputs yields a new
+    set.
+-   **Deterministic Seeds**: Seeds are derived from `[QuerySets] seed` and
+    the replication number, so replication N of every model shares a set.
+-   **Build Once**: Concurrent replications needing the same set wait on a
+    lock file while one of them builds it; sets are published atomically.
+-   **Self-Contained Runs**: Files are hard-linked into the run directory
+    (copied where linking is not possible), and `query_set.json` records which
+    set a run used, so audits, reprocessing, and archiving are unaffected.
+"""
+
+# === Start of src/query_set_registry.py ===
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, Tuple
+
+QUERY_SET_MANIFEST = "query_set.json"
+LOCK_SUFFIX = ".lock"
+# Keeps the shuffling seeds of query_generator.py apart from the selection seeds.
+QGEN_SEED_OFFSET = 1_000_000
+
+
+def file_sha256(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def query_set_key(params: Dict[str, Any]) -> str:
+    """Returns the registry key of a query set from its defining parameters."""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:20]
+
+
+def replication_seeds(seed: int, replication_num: int, num_trials: int) -> Tuple[int, int]:
+    """
+    Returns the `(base_seed, qgen_base_seed)` of a replication.
+
+    `build_llm_queries.py` seeds trial i with `base_seed + i - 1`, so
+    consecutive replications are offset by `num_trials` to keep every trial
+    of the study on its own seed.
+    """
+    base_seed = seed + (replication_num - 1) * num_trials
+    return base_seed, base_seed + QGEN_SEED_OFFSET
+
+
+def get_registry_settings(config, project_root: str, get_config_value) -> Dict[str, Any]:
+    """Reads `[QuerySets]`; `get_config_value` is passed in so callers can use their own config loader."""
+    registry_dir = get_config_value(config, 'QuerySets', 'registry_dir', fallback='output/query_sets')
+    return {
+        "enabled": get_config_value(config, 'QuerySets', 'enabled', fallback=False, value_type=bool),
+        "registry_dir": registry_dir if os.path.isabs(registry_dir) else os.path.join(project_root, registry_dir),
+        "seed": get_config_value(config, 'QuerySets', 'seed', fallback=1000, value_type=int),
+        "link_mode": get_config_value(config, 'QuerySets', 'link_mode', fallback='hardlink'),
+    }
+
+
+class QuerySetRegistry:
+    """Builds each distinct query set once and links it into run directories."""
+
+    def __init__(self, registry_dir: str, queries_subdir: str = "session_queries", link_mode: str = "hardlink",
+                 lock_timeout_seconds: float = 3600.0, poll_seconds: float = 1.0, sleep=time.sleep, clock=time.time):
+        self.registry_dir = registry_dir
+        self.queries_subdir = queries_subdir
+        self.link_mode = link_mode
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.poll_seconds = poll_seconds
+        self._sleep = sleep
+        self._clock = clock
+
+    def set_dir(self, key: str) -> str:
+        return os.path.join(self.registry_dir, key)
+
+    def is_complete(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.set_dir(key), QUERY_SET_MANIFEST))
+
+    # --- Locking ---
+
+    def _acquire_lock(self, key: str) -> bool:
+        """Takes the build lock of `key`; a lock older than the timeout is treated as abandoned."""
+        lock_path = self.set_dir(key) + LOCK_SUFFIX
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if self._clock() - os.path.getmtime(lock_path) > self.lock_timeout_seconds:
+                    logging.warning(f"Removing stale query-set lock {lock_path}.")
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _release_lock(self, key: str):
+        try:
+            os.remove(self.set_dir(key) + LOCK_SUFFIX)
+        except OSError:
+            pass
+
+    # --- Build and link ---
+
+    def ensure(self, key: str, build: Callable[[str], None], params: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        Returns `(set_dir, built)` for the query set `key`, building it if needed.
+
+        `build(staging_dir)` must write the set's files into
+        `staging_dir/<queries_subdir>`. The finished set is renamed into place,
+        so a set directory always holds a complete set.
+        """
+        os.makedirs(self.registry_dir, exist_ok=True)
+        while not self.is_complete(key):
+            if not self._acquire_lock(key):
+                self._sleep(self.poll_seconds)
+                continue
+            try:
+                if self.is_complete(key):
+                    break
+                staging_dir = f"{self.set_dir(key)}.tmp-{os.getpid()}"
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                os.makedirs(staging_dir)
+                try:
+                    build(staging_dir)
+                    with open(os.path.join(staging_dir, QUERY_SET_MANIFEST), 'w', encoding='utf-8') as f:
+                        json.dump({"key": key, "params": params, "created_at": self._clock()}, f, indent=2, sort_keys=True)
+                    shutil.rmtree(self.set_dir(key), ignore_errors=True)
+                    os.replace(staging_dir, self.set_dir(key))
+                finally:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                return self.set_dir(key), True
+            finally:
+                self._release_lock(key)
+        return self.set_dir(key), False
+
+    def _place(self, src: str, dest: str):
+        if self.link_mode == "hardlink":
+            try:
+                os.link(src, dest)
+                return
+            except OSError:
+                pass  # Different volume or no link support: fall back to a copy.
+        shutil.copyfile(src, dest)
+
+    def link_into(self, key: str, run_dir: str) -> int:
+        """Places the set's query files into `run_dir/<queries_subdir>`; returns the number of files."""
+        src_dir = os.path.join(self.set_dir(key), self.queries_subdir)
+        dest_dir = os.path.join(run_dir, self.queries_subdir)
+        os.makedirs(dest_dir, exist_ok=True)
+        count = 0
+        for name in sorted(os.listdir(src_dir)):
+            dest = os.path.join(dest_dir, name)
+            if os.path.exists(dest):
+                os.remove(dest)
+            self._place(os.path.join(src_dir, name), dest)
+            count += 1
+        shutil.copyfile(os.path.join(self.set_dir(key), QUERY_SET_MANIFEST), os.path.join(run_dir, QUERY_SET_MANIFEST))
+        return count
+
+
+def describe_query_set(config, project_root: str, get_config_value, num_trials: int, k: int,
+                       base_seed: int, qgen_base_seed: int) -> Dict[str, Any]:
+    """Collects the parameters that define a replication's query set."""
+    data_dir = os.path.join(project_root, "data")
+    db_name = get_config_value(config, 'Filenames', 'personalities_src', fallback="personalities_db.txt")
+    base_query_name = get_config_value(config, 'Filenames', 'base_query_src', fallback="base_query.txt")
+    return {
+        "personalities_sha256": file_sha256(os.path.join(data_dir, db_name)),
+        "base_query_sha256": file_sha256(os.path.join(data_dir, base_query_name)),
+        "k": k,
+        "m": num_trials,
+        "mapping_strategy": get_config_value(config, 'Experiment', 'mapping_strategy', fallback='correct'),
+        "selection_mode": get_config_value(config, 'Experiment', 'selection_mode', fallback='legacy'),
+        "query_layout": get_config_value(config, 'General', 'query_layout', fallback='files'),
+        "base_seed": base_seed,
+        "qgen_base_seed": qgen_base_seed,
+    }
+
+# === End of src/query_set_registry.py ===
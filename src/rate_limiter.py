@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/rate_limiter.py
+
+"""
+Cross-Process Token-Bucket Rate Limiter for LLM API Calls.
+
+Several experiments and data-preparation scripts (`generate_eminence_scores`,
+`generate_ocean_scores`, `neutralize_delineations`) often run at the same time
+against one API key. Each process used to throttle only itself, so their
+combined bursts caused cascades of HTTP 429 errors. This module provides one
+limiter per (API key, model) pair that is shared by every process on the
+machine. `llm_prompter.py` consults it before each call when
+`[RateLimit] enabled = true`.
+
+Key Features:
+-   **Two Buckets**: A requests-per-minute bucket and a tokens-per-minute
+    bucket. Each refills continuously and holds at most one minute of budget.
+-   **Shared State File**: Bucket levels live in a small JSON file per
+    (API key, model) pair. The file is protected by an exclusive-create lock
+    file, so coordination works on Windows and POSIX alike. Stale locks left
+    by a crashed process are broken after a timeout.
+-   **Estimate, Then Settle**: A call reserves its estimated token count
+    (prompt characters / 4 + `max_tokens`). After the response arrives, the
+    estimate is replaced by the `usage.total_tokens` the provider reports.
+-   **No Secrets on Disk**: State files are named after a hash of the API key,
+    never the key itself.
+"""
+
+# === Start of src/rate_limiter.py ===
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+# A lock older than this is assumed to belong to a crashed process.
+STALE_LOCK_SECONDS = 10.0
+# Upper bound on a single sleep, so waiting processes re-check the shared state.
+MAX_WAIT_SLICE_SECONDS = 1.0
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+
+def estimate_request_tokens(query_text: str, max_tokens: Optional[int]) -> int:
+    """Conservatively estimates the tokens a request will consume (prompt + completion)."""
+    return len(query_text) // CHARS_PER_TOKEN_ESTIMATE + (max_tokens or 0)
+
+
+class SharedRateLimiter:
+    """Requests- and tokens-per-minute buckets shared between processes through a state file."""
+
+    def __init__(self, state_dir: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 clock=time.time, sleep=time.sleep):
+        self.state_dir = state_dir
+        self.requests_per_minute = float(requests_per_minute or 0)
+        self.tokens_per_minute = float(tokens_per_minute or 0)
+        self._clock = clock
+        self._sleep = sleep
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    @property
+    def active(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def _state_path(self, api_key: str, model_name: str) -> str:
+        digest = hashlib.sha256(f"{api_key}\0{model_name}".encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.state_dir, f"bucket_{digest}.json")
+
+    # --- Lock-protected state file ---
+
+    def _lock(self, state_path: str):
+        lock_path = state_path + ".lock"
+        while True:
+            try:
+                with open(lock_path, 'x') as f:
+                    f.write(str(os.getpid()))
+                return lock_path
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(lock_path)
+                        logging.warning(f"Rate limiter: removed stale lock {os.path.basename(lock_path)}.")
+                        continue
+                except OSError:
+                    continue  # The holder released the lock in the meantime.
+                time.sleep(0.005)
+
+    @staticmethod
+    def _unlock(lock_path: str):
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+    def _load(self, state_path: str, now: float) -> Dict[str, float]:
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # A new or unreadable bucket starts full.
+            return {"requests": self.requests_per_minute, "tokens": self.tokens_per_minute, "updated": now}
+        elapsed = max(0.0, now - state.get("updated", now))
+        state["requests"] = min(self.requests_per_minute, state.get("requests", 0.0) + elapsed * self.requests_per_minute / 60.0)
+        state["tokens"] = min(self.tokens_per_minute, state.get("tokens", 0.0) + elapsed * self.tokens_per_minute / 60.0)
+        state["updated"] = now
+        return state
+
+    @staticmethod
+    def _save(state_path: str, state: Dict[str, float]):
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    # --- Public API ---
+
+    def acquire(self, api_key: str, model_name: str, estimated_tokens: int = 0) -> float:
+        """
+        Blocks until both buckets can cover one request and its estimated tokens.
+
+        Returns the number of seconds spent waiting.
+        """
+        if not self.active:
+            return 0.0
+        state_path = self._state_path(api_key, model_name)
+        # A request larger than the whole per-minute budget may still run once the bucket is full.
+        needed_tokens = min(float(estimated_tokens), self.tokens_per_minute) if self.tokens_per_minute > 0 else 0.0
+        waited = 0.0
+        while True:
+            lock_path = self._lock(state_path)
+            try:
+                now = self._clock()
+                state = self._load(state_path, now)
+                wait_for = 0.0
+                if self.requests_per_minute > 0 and state["requests"] < 1.0:
+                    wait_for = max(wait_for, (1.0 - state["requests"]) * 60.0 / self.requests_per_minute)
+                if self.tokens_per_minute > 0 and state["tokens"] < needed_tokens:
+                    wait_for = max(wait_for, (needed_tokens - state["tokens"]) * 60.0 / self.tokens_per_minute)
+                if wait_for <= 0:
+                    if self.requests_per_minute > 0:
+                        state["requests"] -= 1.0
+                    if self.tokens_per_minute > 0:
+                        state["tokens"] -= needed_tokens
+                    self._save(state_path, state)
+                    if waited > 0:
+                        logging.info(f"Rate limiter: waited {waited:.1f}s for '{model_name}' budget.")
+                    return waited
+            finally:
+                self._unlock(lock_path)
+            pause = min(wait_for, MAX_WAIT_SLICE_SECONDS)
+            self._sleep(pause)
+            waited += pause
+
+    def settle(self, api_key: str, model_name: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Replaces a reservation's estimated token count with the actual usage."""
+        if self.tokens_per_minute <= 0 or actual_tokens is None:
+            return
+        state_path = self._state_path(api_key, model_name)
+        lock_path = self._lock(state_path)
+        try:
+            state = self._load(state_path, self._clock())
+            reserved = min(float(estimated_tokens), self.tokens_per_minute)
+            # The bucket may go negative (debt) if a call used more than it reserved.
+            state["tokens"] = min(self.tokens_per_minute, state["tokens"] + reserved - float(actual_tokens))
+            self._save(state_path, state)
+        finally:
+            self._unlock(lock_path)
+
+
+def create_rate_limiter(config, get_config_value) -> Optional[SharedRateLimiter]:
+    """Builds the shared limiter from `[RateLimit]`, or returns None if it is disabled."""
+    if not get_config_value(config, 'RateLimit', 'enabled', fallback=False, value_type=bool):
+        return None
+    state_dir = get_config_value(config, 'RateLimit', 'state_dir', fallback='') or \
+        os.path.join(tempfile.gettempdir(), "llm_narrative_framework_rate_limits")
+    limiter = SharedRateLimiter(
+        state_dir,
+        requests_per_minute=get_config_value(config, 'RateLimit', 'requests_per_minute', fallback=0, value_type=float),
+        tokens_per_minute=get_config_value(config, 'RateLimit', 'tokens_per_minute', fallback=0, value_type=float),
+    )
+    return limiter if limiter.active else None
+
+# === End of src/rate_limiter.py ===
@@ -43,6 +43,35 @@ Key Features:
     progress tracking and status updates.
 -   **Failure Threshold Management**: Continues with partial failures (≤50%) but
     halts on high failure rates with clear diagnostic messages.
+-   **Selectable Session Engine**: Stage 2 runs one `llm_prompter.py`
+    subprocess per trial (`[LLM] session_engine = subprocess`, the default),
+    a persistent pool of server-mode prompter workers (`pool`), all trials
+    in-process over pooled keep-alive connections (`async`), or one
+    provider batch job per replication (`batch`).
+-   **Deterministic Response Cache**: With `[Cache] enabled = true`, queries of
+    temperature-0 runs that were answered before are restored from an on-disk
+    cache instead of calling the API; hit/miss counts go to `api_times.log`.
+-   **Adaptive Concurrency**: With `[LLM] adaptive_concurrency = true`, an AIMD
+    controller raises or lowers the number of in-flight calls from observed
+    latency, HTTP 429/5xx responses, and `Retry-After` headers.
+-   **Request Hedging**: With `[LLM] hedge_requests = true`, a trial still
+    running after a percentile of the run's completed call durations sends a
+    duplicate request, up to a per-replication cap.
+-   **Per-Trial Timing Log**: `api_times.log` records each trial's duration,
+    its retry attempts, any hedge and, for streamed calls, the time to first
+    token and the time until the score matrix was complete.
+-   **Budget Guard**: With a `[Budget]` token or cost ceiling, no new trials
+    are dispatched once the experiment has reached it; the replication halts
+    with its unsent trials left for repair mode.
+-   **Prompt-Prefix Caching**: With `[LLM] prompt_caching = true`, the shared
+    instructions of every query are marked for provider-side caching; the
+    cached share of prompt tokens is summarized in `api_times.log`.
+-   **Shared Query Sets**: With `[QuerySets] enabled = true`, Stage 1 links a
+    query set from the registry (`query_set_registry.py`), building it only
+    if no experiment with the same inputs and seeds has done so already.
+-   **Structured Call Telemetry**: `call_telemetry.jsonl` receives one JSON
+    record per trial (queue wait, TTFB, latency, status, retries, token
+    counts, bytes) for study-wide reporting with `call_telemetry.py`.
 
 It can also operate in a `--reprocess` mode, which re-runs only the data
 processing and analysis stages (3-6) on existing raw data.
@@ -66,6 +95,8 @@ import json
 import glob
 import time
 import configparser
+import contextlib
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from colorama import Fore, init
@@ -98,6 +129,10 @@ except ImportError:
 APP_CONFIG = config_loader.APP_CONFIG
 get_config_value = config_loader.get_config_value
 
+# Printed on stdout with --announce_stage2 once all API calls of the replication are done.
+STAGE2_COMPLETE_MARKER = "<<<STAGE2_COMPLETE>>>"
+
+
 def run_script(command, title, verbose=False):
     """
     Helper to run a script as a subprocess.
@@ -144,8 +179,14 @@ def generate_run_dir_name(model_name, temperature, num_iterations, k_per_query,
     sanitized_parts = [re.sub(r'[^a-zA-Z0-9_.-]', '_', part) for part in parts]
     return "_".join(sanitized_parts)
 
-def session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_script, src_dir, verbose):
-    """Executes a single LLM prompter session as a subprocess."""
+def session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_script, src_dir, verbose, call_report=None, hedge_after=None):
+    """
+    Executes a single LLM prompter session as a subprocess.
+
+    If a `call_report` dict is given, it receives the worker's per-attempt
+    timings and throttling details (HTTP status, `Retry-After`, timeout).
+    `hedge_after` is passed on as the worker's hedge delay in seconds.
+    """
     query_filepath = os.path.join(run_specific_dir_path, "session_queries", f"llm_query_{index:03d}.txt")
     final_response_filepath = os.path.join(responses_dir, f"llm_response_{index:03d}.txt")
     final_error_filepath = os.path.join(responses_dir, f"llm_response_{index:03d}.error.txt")
@@ -159,6 +200,7 @@ def session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_scr
                     "--output_json_file", final_json_filepath,
                     "--config_path", config_path]
     if verbose: worker_cmd.append("-v")
+    if hedge_after is not None: worker_cmd.extend(["--hedge_after_seconds", f"{hedge_after:.3f}"])
     
     start_time = time.time()
     # Read the safety-net timeout from config, with a fallback of 180s (3 minutes).
@@ -167,6 +209,9 @@ def session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_scr
     try:
         result = subprocess.run(worker_cmd, check=False, cwd=src_dir, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=process_timeout)
         duration = time.time() - start_time
+        if call_report is not None:
+            from llm_prompter import parse_call_report
+            call_report.update(parse_call_report(result.stdout) or {})
         if result.returncode == 0:
             return index, True, None, duration
         else:
@@ -176,11 +221,145 @@ def session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_scr
     except subprocess.TimeoutExpired:
         duration = time.time() - start_time
         error_details = f"Query {index:03d} failed: Worker process timed out after {process_timeout} seconds (it became unresponsive)."
+        if call_report is not None:
+            call_report["timeout"] = True
         return index, False, error_details, duration
     except Exception as e:
         return index, False, f"Orchestrator worker failed for index {index}: {e}", time.time() - start_time
 
 
+def iter_session_results(session_engine, indices_to_run, run_specific_dir_path, responses_dir, llm_prompter_script, src_dir, verbose, max_workers, limiter=None, on_report=None, hedger=None):
+    """
+    Runs the LLM sessions for the given indices with the configured engine.
+
+    Yields `(index, success, error_details, duration)` tuples as sessions complete.
+    'subprocess' launches one `llm_prompter.py` worker per trial; 'pool' sends
+    the trials to a fixed set of long-lived `llm_prompter.py --serve` workers;
+    'async' runs all trials in-process over a shared pool of keep-alive connections;
+    'batch' submits all trials as one provider batch job and yields their
+    results when the job finishes.
+    With an `AdaptiveConcurrencyLimiter`, every engine is sized for the
+    limiter's maximum and the limiter decides how many calls run at once.
+    `on_report(index, call_report)` receives each trial's call report (e.g., its
+    per-attempt timings) before the trial's result is yielded. A
+    `RequestHedger` gives each trial the delay after which its call layer may
+    send a duplicate request.
+    """
+    if not indices_to_run:
+        return
+    if limiter is not None:
+        max_workers = limiter.max_limit
+
+    if session_engine == 'pool':
+        from llm_session_engine import PrompterWorkerPool
+        process_timeout = get_config_value(APP_CONFIG, 'LLM', 'worker_process_timeout_seconds', value_type=int, fallback=180)
+        with PrompterWorkerPool(llm_prompter_script, src_dir, max_workers, verbose=verbose, job_timeout=process_timeout) as pool:
+            yield from pool.run(run_specific_dir_path, responses_dir, indices_to_run, limiter=limiter,
+                                on_report=on_report, hedger=hedger)
+        return
+
+    if session_engine == 'async':
+        from llm_session_engine import AsyncSessionEngine
+        engine = AsyncSessionEngine(run_specific_dir_path, responses_dir, max_workers)
+        yield from engine.run(indices_to_run, limiter=limiter, on_report=on_report, hedger=hedger)
+        return
+
+    if session_engine == 'batch':
+        from llm_batch_engine import BatchSessionEngine
+        engine = BatchSessionEngine(run_specific_dir_path, responses_dir)
+        yield from engine.run(indices_to_run, limiter=limiter, on_report=on_report, hedger=hedger)
+        return
+
+    if session_engine != 'subprocess':
+        logging.warning(f"Unknown session_engine '{session_engine}'. Falling back to 'subprocess'.")
+
+    stopped = threading.Event()
+
+    def run_one(index, call_report=None, hedge_after=None):
+        # Trials waiting for a limiter slot must not start once the run is closed.
+        if stopped.is_set():
+            return None
+        report = call_report if call_report is not None else {}
+        report["started_at"] = time.time()
+        result = session_worker(index, run_specific_dir_path, responses_dir, llm_prompter_script, src_dir, verbose,
+                                report, hedge_after=hedge_after)
+        if on_report is not None:
+            on_report(index, report)
+        return result
+    if hedger is not None:
+        run_one = hedger.wrap(run_one)
+    if limiter is not None:
+        run_one = limiter.wrap(run_one)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tasks = [executor.submit(run_one, i) for i in indices_to_run]
+        try:
+            for future in as_completed(tasks):
+                yield future.result()
+        finally:
+            stopped.set()
+            for task in tasks:
+                task.cancel()
+
+
+def format_attempt_timings(attempts):
+    """Formats a trial's per-attempt call timings for the Attempts column of the timing log."""
+    parts = []
+    for attempt in attempts or []:
+        part = f"{attempt.get('attempt')}:{attempt.get('outcome')}:{attempt.get('duration', 0.0):.2f}s"
+        if attempt.get('retry_delay') is not None:
+            part += f"+wait{attempt['retry_delay']:.2f}s"
+        parts.append(part)
+    return ";".join(parts)
+
+
+def format_stream_timings(attempts):
+    """Returns the time to first token and time to matrix of a streamed trial's final attempt ('NA' if not streamed)."""
+    final = (attempts or [{}])[-1]
+    return tuple(f"{final[key]:.2f}" if final.get(key) is not None else "NA" for key in ("ttft", "time_to_matrix"))
+
+
+def get_query_set_settings():
+    """Returns the `[QuerySets]` settings if the shared query-set registry is enabled, else None."""
+    if not get_config_value(APP_CONFIG, 'QuerySets', 'enabled', fallback=False, value_type=bool):
+        return None
+    from query_set_registry import get_registry_settings
+    return get_registry_settings(APP_CONFIG, config_loader.PROJECT_ROOT, get_config_value)
+
+
+def build_shared_query_set(settings, args, run_specific_dir_path, build_script):
+    """
+    Stage 1 with the query-set registry: links the replication's query set into
+    the run directory, building it first if no earlier replication has.
+
+    Seeds passed on the command line take precedence over the seeds derived
+    from `[QuerySets] seed` and the replication number.
+    """
+    from query_set_registry import QuerySetRegistry, describe_query_set, query_set_key, replication_seeds
+    print("--- Running Stage: 1. Build LLM Queries ---")
+    base_seed, qgen_base_seed = replication_seeds(settings["seed"], args.replication_num, args.num_iterations)
+    if args.base_seed is not None:
+        base_seed = args.base_seed
+    if args.qgen_base_seed is not None:
+        qgen_base_seed = args.qgen_base_seed
+    params = describe_query_set(APP_CONFIG, config_loader.PROJECT_ROOT, get_config_value,
+                                args.num_iterations, args.k_per_query, base_seed, qgen_base_seed)
+    key = query_set_key(params)
+    queries_subdir = get_config_value(APP_CONFIG, 'General', 'queries_subdir', fallback='session_queries')
+    registry = QuerySetRegistry(settings["registry_dir"], queries_subdir=queries_subdir, link_mode=settings["link_mode"])
+
+    def build(staging_dir):
+        cmd1 = [sys.executable, build_script, "--run_output_dir", staging_dir,
+                "--base_seed", str(base_seed), "--qgen_base_seed", str(qgen_base_seed)]
+        if args.verbose: cmd1.append("-v")
+        run_script(cmd1, "1a. Build Shared Query Set", verbose=args.verbose)
+
+    _, built = registry.ensure(key, build, params)
+    file_count = registry.link_into(key, run_specific_dir_path)
+    logging.info(f"{'Built' if built else 'Reused'} shared query set {key} ({file_count} files linked into the run).")
+    return key, built
+
+
 def main():
     all_stage_outputs = []
     parser = argparse.ArgumentParser(description="Runs or re-processes a single replication.")
@@ -193,10 +372,12 @@ def main():
     parser.add_argument("--base_output_dir", type=str, default=None, help="The base directory where the new run folder should be created.")
     parser.add_argument("--indices", type=int, nargs='+', help="A specific list of trial indices to run. If provided, only these trials will be executed.")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose (DEBUG level) output from child scripts.")
+    parser.add_argument("--announce_stage2", action="store_true", help="Print a marker line on stdout once Stage 2 is complete (used for pipelined replications).")
     
     args = parser.parse_args()
     
     pipeline_status = "FAILED" # Default to FAILED, changed to COMPLETED only on full success
+    budget_halt = None # Set to the reason when the experiment's [Budget] ceiling stops Stage 2
     output3 = ""
     repair_had_failures = False
 
@@ -276,11 +457,15 @@ def main():
     try:
         # Stage 1: Build Queries (only for new runs)
         if not args.reprocess:
-            cmd1 = [sys.executable, build_script, "--run_output_dir", run_specific_dir_path]
-            if args.verbose: cmd1.append("-v")
-            if args.base_seed: cmd1.extend(["--base_seed", str(args.base_seed)])
-            if args.qgen_base_seed: cmd1.extend(["--qgen_base_seed", str(args.qgen_base_seed)])
-            run_script(cmd1, "1. Build LLM Queries", verbose=args.verbose)
+            query_sets = get_query_set_settings()
+            if query_sets is not None:
+                build_shared_query_set(query_sets, args, run_specific_dir_path, build_script)
+            else:
+                cmd1 = [sys.executable, build_script, "--run_output_dir", run_specific_dir_path]
+                if args.verbose: cmd1.append("-v")
+                if args.base_seed: cmd1.extend(["--base_seed", str(args.base_seed)])
+                if args.qgen_base_seed: cmd1.extend(["--qgen_base_seed", str(args.qgen_base_seed)])
+                run_script(cmd1, "1. Build LLM Queries", verbose=args.verbose)
 
         # Stage 2: Run LLM Sessions (Parallel by default)
         stage_title_2 = "2. Run LLM Sessions"
@@ -292,7 +477,13 @@ def main():
         else:
             queries_dir = os.path.join(run_specific_dir_path, "session_queries")
             query_files = glob.glob(os.path.join(queries_dir, "llm_query_*.txt"))
-            all_indices = sorted([int(re.search(r'_(\d+)\.txt$', f).group(1)) for f in query_files if re.search(r'_(\d+)\.txt$', f)])
+            all_indices = {int(re.search(r'_(\d+)\.txt$', f).group(1)) for f in query_files if re.search(r'_(\d+)\.txt$', f)}
+            # Runs with `query_layout = bundle` keep their queries in one query_bundle.jsonl.
+            from query_bundle import open_bundle
+            bundle = open_bundle(queries_dir)
+            if bundle is not None:
+                all_indices.update(bundle.indices())
+            all_indices = sorted(all_indices)
             
             indices_to_run = []
             responses_dir = os.path.join(run_specific_dir_path, "session_responses")
@@ -332,7 +523,39 @@ def main():
             api_times_log_path = os.path.join(run_specific_dir_path, get_config_value(APP_CONFIG, 'Filenames', 'api_times_log', fallback="api_times.log"))
             if not os.path.exists(api_times_log_path):
                 with open(api_times_log_path, "w", encoding='utf-8') as f:
-                    f.write("Query_ID\tCall_Duration_s\tTotal_Elapsed_s\tEstimated_Time_Remaining_s\n")
+                    f.write("Query_ID\tCall_Duration_s\tTotal_Elapsed_s\tEstimated_Time_Remaining_s\t"
+                            "Time_To_First_Token_s\tTime_To_Matrix_s\tHedge\tAttempts\n")
+            from call_telemetry import CallTelemetryWriter, build_call_record
+            telemetry = CallTelemetryWriter(os.path.join(run_specific_dir_path, get_config_value(
+                APP_CONFIG, 'Filenames', 'call_telemetry_log', fallback="call_telemetry.jsonl")))
+            telemetry_model = get_config_value(APP_CONFIG, 'LLM', 'model_name', fallback_key='model')
+            session_engine = get_config_value(APP_CONFIG, 'LLM', 'session_engine', fallback='subprocess')
+            # Optionally stop dispatching once the experiment's token or cost ceiling is reached.
+            from token_budget import get_budget_guard
+            budget_guard = get_budget_guard(APP_CONFIG, os.path.dirname(os.path.abspath(run_specific_dir_path)), telemetry.path)
+
+            # Serve deterministic (temperature 0) queries from the response cache, if enabled.
+            response_cache, cache_keys = None, {}
+            if get_config_value(APP_CONFIG, 'Cache', 'enabled', fallback=False, value_type=bool):
+                from llm_response_cache import (fill_from_cache, get_cache_from_config, is_cacheable,
+                                                load_run_call_settings, store_responses)
+                call_settings = load_run_call_settings(run_specific_dir_path)
+                if is_cacheable(call_settings):
+                    response_cache = get_cache_from_config(APP_CONFIG)
+                    cache_hits, cache_keys = fill_from_cache(response_cache, call_settings, indices_to_run,
+                                                             os.path.join(run_specific_dir_path, "session_queries"), responses_dir)
+                    with open(api_times_log_path, "a", encoding='utf-8') as f:
+                        f.write(f"Cache_Summary\thits={len(cache_hits)}\tmisses={len(indices_to_run) - len(cache_hits)}\n")
+                    for index in cache_hits:
+                        telemetry.append(build_call_record(
+                            index, True, 0.0, None, os.path.join(responses_dir, f"llm_response_{index:03d}_full.json"),
+                            telemetry_model, session_engine, source="cache"))
+                    if cache_hits:
+                        print(f"{Fore.CYAN}INFO (orchestrator): Served {len(cache_hits)}/{len(indices_to_run)} queries from the response cache.{Fore.RESET}", file=sys.stderr)
+                        served = set(cache_hits)
+                        indices_to_run = [i for i in indices_to_run if i not in served]
+                else:
+                    logging.info("Response cache skipped: it is only used for runs with temperature = 0.0.")
 
             all_logs = [header_2]
             failed_sessions, total_elapsed_time, completed_count = 0, 0.0, 0
@@ -345,18 +568,51 @@ def main():
                     print(f"  - Query {idx:03d}: Preparing to retry...")
             else:
                 repair_mode_desc = "Processing LLM Sessions"
-            
+
+            # In repair mode, enable verbose output to show LLM prompter progress
+            repair_verbose = args.verbose or (args.reprocess or args.indices)
+            # Optionally let an AIMD controller adjust the number of in-flight calls at runtime.
+            limiter = None
+            if get_config_value(APP_CONFIG, 'LLM', 'adaptive_concurrency', fallback=False, value_type=bool):
+                from adaptive_concurrency import AdaptiveConcurrencyLimiter
+                limiter = AdaptiveConcurrencyLimiter(
+                    initial_limit=max_workers,
+                    min_limit=get_config_value(APP_CONFIG, 'LLM', 'adaptive_min_parallel_sessions', value_type=int, fallback=1),
+                    max_limit=get_config_value(APP_CONFIG, 'LLM', 'adaptive_max_parallel_sessions', value_type=int, fallback=max_workers),
+                    decrease_factor=get_config_value(APP_CONFIG, 'LLM', 'adaptive_decrease_factor', value_type=float, fallback=0.5),
+                    latency_tolerance=get_config_value(APP_CONFIG, 'LLM', 'adaptive_latency_tolerance', value_type=float, fallback=2.0),
+                    log_path=os.path.join(run_specific_dir_path, get_config_value(APP_CONFIG, 'Filenames', 'concurrency_log', fallback="concurrency_adjustments.log")),
+                )
+                logging.info(f"Adaptive concurrency enabled: starting at {limiter.limit} (bounds {limiter.min_limit}-{limiter.max_limit}).")
+
+            # Optionally race slow calls against a duplicate request (capped per replication).
+            from request_hedging import RequestHedger, format_hedge
+            hedger = None
+            if get_config_value(APP_CONFIG, 'LLM', 'hedge_requests', fallback=False, value_type=bool):
+                hedger = RequestHedger(
+                    total_trials=len(indices_to_run),
+                    percentile=get_config_value(APP_CONFIG, 'LLM', 'hedge_percentile', value_type=float, fallback=95.0),
+                    min_samples=get_config_value(APP_CONFIG, 'LLM', 'hedge_min_samples', value_type=int, fallback=10),
+                    max_fraction=get_config_value(APP_CONFIG, 'LLM', 'hedge_max_fraction', value_type=float, fallback=0.05),
+                )
+                logging.info(f"Request hedging enabled: p{hedger.percentile:g} delay, at most {hedger.max_hedges} hedge(s).")
+
+            call_reports = {}
+            # Prompt and cached prompt tokens of the calls whose usage reports provider-side prompt caching.
+            prompt_cache_totals = [0, 0]
+            submitted_at = time.time()
+            budget_halt = budget_guard.exhausted() if budget_guard is not None else None
+            session_results = iter_session_results(session_engine, [] if budget_halt else indices_to_run,
+                                                   run_specific_dir_path, responses_dir,
+                                                   llm_prompter_script, src_dir, repair_verbose, max_workers,
+                                                   limiter=limiter, on_report=call_reports.__setitem__, hedger=hedger)
+
             try:
-                with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                with contextlib.closing(session_results), \
                     tqdm(total=len(indices_to_run), desc=repair_mode_desc, ncols=80, file=sys.stderr) as pbar:
-                    
-                    # In repair mode, enable verbose output to show LLM prompter progress
-                    repair_verbose = args.verbose or (args.reprocess or args.indices)
-                    tasks = {executor.submit(session_worker, i, run_specific_dir_path, responses_dir, llm_prompter_script, src_dir, repair_verbose): i for i in indices_to_run}
-                    
-                    for future in as_completed(tasks):
+
+                    for index, success, log, duration in session_results:
                         completed_count += 1
-                        index, success, log, duration = future.result()
                         total_elapsed_time += duration
                         
                         # Enhanced repair mode status updates
@@ -370,12 +626,30 @@ def main():
                         if not success:
                             failed_sessions += 1
                             all_logs.append(log)
+                        elif response_cache is not None:
+                            store_responses(response_cache, cache_keys, responses_dir, [index])
                         
                         avg_time = total_elapsed_time / completed_count
                         eta = avg_time * (len(indices_to_run) - completed_count)
                         pbar.update(1)
+                        report = call_reports.pop(index, {})
+                        record = build_call_record(
+                            index, success, duration, report, os.path.join(responses_dir, f"llm_response_{index:03d}_full.json"),
+                            telemetry_model, session_engine, submitted_at=submitted_at, error=None if success else log)
+                        telemetry.append(record)
+                        if record["cached_tokens"] is not None:
+                            prompt_cache_totals[0] += record["prompt_tokens"] or 0
+                            prompt_cache_totals[1] += record["cached_tokens"]
                         with open(api_times_log_path, "a", encoding='utf-8') as f:
-                            f.write(f"Query_{index:03d}\t{duration:.2f}\t{total_elapsed_time:.2f}\t{eta:.2f}\n")
+                            attempts = report.get("attempts")
+                            ttft, time_to_matrix = format_stream_timings(attempts)
+                            f.write(f"Query_{index:03d}\t{duration:.2f}\t{total_elapsed_time:.2f}\t{eta:.2f}\t"
+                                    f"{ttft}\t{time_to_matrix}\t{format_hedge(report)}\t{format_attempt_timings(attempts)}\n")
+                        if budget_guard is not None:
+                            budget_guard.add(record)
+                            budget_halt = budget_guard.exhausted()
+                            if budget_halt:
+                                break  # Closing the results generator stops the engine from starting new trials.
             
             except KeyboardInterrupt:
                 print(f"\n\n--- LLM SESSIONS INTERRUPTED BY USER ---")
@@ -383,9 +657,30 @@ def main():
                 print(f"Experiment directory preserved at: {run_specific_dir_path}")
                 print(f"You can resume by running repair mode on this directory.")
                 pipeline_status = "INTERRUPTED BY USER"
-                # The 'with' statement will handle executor.shutdown() automatically
+                # Closing the results generator shuts down the active engine automatically
                 return
+
+            if prompt_cache_totals[0]:
+                with open(api_times_log_path, "a", encoding='utf-8') as f:
+                    f.write(f"Prompt_Cache_Summary\tprompt_tokens={prompt_cache_totals[0]}\t"
+                            f"cached_tokens={prompt_cache_totals[1]}\n")
+                logging.info(f"Prompt caching: {prompt_cache_totals[1]} of {prompt_cache_totals[0]} prompt tokens "
+                             f"were served from the provider's cache.")
+            if hedger is not None:
+                with open(api_times_log_path, "a", encoding='utf-8') as f:
+                    f.write(hedger.summary() + "\n")
+                logging.info(f"Request hedging: {hedger.hedges_sent} hedge(s) sent, {hedger.hedges_won} won, "
+                             f"~{hedger.extra_tokens} extra tokens.")
             
+            if budget_halt:
+                # Trials already in flight when the ceiling was reached still complete.
+                unanswered = sum(1 for i in indices_to_run
+                                 if not os.path.exists(os.path.join(responses_dir, f"llm_response_{i:03d}_full.json")))
+                print(f"{C_YELLOW}ERROR (orchestrator): Experiment budget exhausted: {budget_halt}. "
+                      f"{unanswered} trial(s) have no response. Raise the [Budget] ceiling and repair the experiment to resume.{C_RESET}",
+                      file=sys.stderr)
+                raise Exception("Experiment budget exhausted")
+
             if failed_sessions > 0:
                 # Skip individual query failure logging - we'll show summary instead
                 
@@ -411,6 +706,10 @@ def main():
                     if args.reprocess:
                         repair_had_failures = True
 
+        # Stages 3-6 are local. A pipelining experiment_manager.py starts the next replication now.
+        if args.announce_stage2:
+            print(STAGE2_COMPLETE_MARKER, flush=True)
+
         # Stage 3: Process LLM Responses
         cmd3 = [sys.executable, process_script, "--run_output_dir", run_specific_dir_path]
         if args.verbose: cmd3.append("-v")
@@ -449,11 +748,15 @@ def main():
     except (KeyboardInterrupt, subprocess.CalledProcessError, Exception) as e:
         if isinstance(e, KeyboardInterrupt):
             pipeline_status = "INTERRUPTED BY USER"
+        elif budget_halt:
+            pipeline_status = "HALTED: BUDGET EXHAUSTED"
         # Note: pipeline_status defaults to "FAILED"
         
         # Clean failure message without stack trace
         if isinstance(e, Exception) and "All LLM sessions failed" in str(e):
             logging.error("All LLM sessions failed (100%). Check model name and API configuration.")
+        elif budget_halt:
+            logging.error(f"Stage 2 halted: {budget_halt}.")
         elif isinstance(e, subprocess.CalledProcessError):
             logging.error("Pipeline stage failed.")
         elif not isinstance(e, KeyboardInterrupt):
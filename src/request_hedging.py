@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/request_hedging.py
+
+"""
+Request Hedging Policy for Stage 2.
+
+A replication's wall time is set by its slowest trials, and a few calls
+regularly take close to `api_timeout_seconds` while the median takes seconds.
+With `[LLM] hedge_requests = true`, `replication_manager.py` routes every
+trial through a `RequestHedger`, which tells the call layer when to send a
+duplicate request. The race itself (first successful answer wins, the other
+request is closed once its headers arrive) is run by `llm_prompter.race_hedged`.
+
+Key Features:
+-   **Run-Relative Delay**: The hedge delay is the `hedge_percentile` of the
+    durations of the final HTTP attempts of the trials already completed in
+    the run, since it is applied to a single attempt; retry backoff, limiter
+    and budget waits, and worker startup are left out. No hedge is sent until
+    `hedge_min_samples` trials have completed.
+-   **Strict Budget**: At most `hedge_max_fraction` of the run's trials may be
+    hedged. A trial that could still hedge holds a reservation until it
+    finishes, so concurrent trials can never exceed the cap.
+-   **Accounted Cost**: Hedges sent, hedges that won, and the extra tokens they
+    may have consumed are summarized for the timing log.
+"""
+
+# === Start of src/request_hedging.py ===
+
+import bisect
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+def find_hedge(report: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Returns the hedge details of a trial's call report, if a duplicate request was sent."""
+    for attempt in (report or {}).get("attempts") or []:
+        hedge = attempt.get("hedge")
+        if hedge and hedge.get("after") is not None:
+            return hedge
+    return None
+
+
+class RequestHedger:
+    """Decides per trial whether and when a duplicate request may be sent."""
+
+    def __init__(self, total_trials: int, percentile: float = 95.0, min_samples: int = 10,
+                 max_fraction: float = 0.05):
+        self.percentile = min(max(float(percentile), 0.0), 100.0)
+        self.min_samples = max(1, int(min_samples))
+        self.max_hedges = int(math.floor(max(0, total_trials) * max(0.0, float(max_fraction))))
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.extra_tokens = 0
+
+        self._lock = threading.Lock()
+        self._durations: List[float] = []
+        self._reserved = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns the hedge delay for a trial that is about to start, or None.
+
+        A returned delay reserves one hedge from the budget until `record` is
+        called for the trial.
+        """
+        with self._lock:
+            if len(self._durations) < self.min_samples:
+                return None
+            if self.hedges_sent + self._reserved >= self.max_hedges:
+                return None
+            self._reserved += 1
+            # Nearest-rank percentile of the completed durations.
+            rank = max(1, int(math.ceil(self.percentile / 100.0 * len(self._durations))))
+            return self._durations[rank - 1]
+
+    def record(self, delay: Optional[float], success: bool, duration: float, report: Optional[Dict[str, Any]]):
+        """
+        Releases a trial's reservation and adds its outcome to the statistics.
+
+        The duration of the report's last attempt is used when the report has
+        one; `duration` (the whole trial) otherwise.
+        """
+        hedge = find_hedge(report)
+        attempts = (report or {}).get("attempts") or []
+        if attempts and attempts[-1].get("duration") is not None:
+            duration = float(attempts[-1]["duration"])
+        with self._lock:
+            if delay is not None:
+                self._reserved = max(0, self._reserved - 1)
+            if hedge is not None:
+                self.hedges_sent += 1
+                self.hedges_won += hedge.get("winner") == "hedge"
+                self.extra_tokens += int(hedge.get("extra_tokens") or 0)
+            if success:
+                bisect.insort(self._durations, duration)
+
+    def wrap(self, run_query: Callable[..., tuple]) -> Callable[..., tuple]:
+        """
+        Wraps `run_query(index, call_report, hedge_after)` as `run_query(index, call_report)`.
+
+        The wrapped function returns the engine's usual
+        `(index, success, error_details, duration)` result.
+        """
+        def _hedged(index: int, call_report: Optional[Dict[str, Any]] = None):
+            report = call_report if call_report is not None else {}
+            delay = self.hedge_delay()
+            result = None
+            try:
+                result = run_query(index, report, delay)
+                return result
+            finally:
+                self.record(delay, bool(result and result[1]), result[3] if result else 0.0, report)
+        return _hedged
+
+    def summary(self) -> str:
+        """Returns the tab-separated hedge summary row for the timing log."""
+        return (f"Hedge_Summary\tsent={self.hedges_sent}\twon={self.hedges_won}\t"
+                f"cap={self.max_hedges}\textra_tokens={self.extra_tokens}")
+
+
+def format_hedge(report: Optional[Dict[str, Any]]) -> str:
+    """Formats a trial's hedge for the Hedge column of the timing log (empty if none was sent)."""
+    hedge = find_hedge(report)
+    if hedge is None:
+        return ""
+    winner = hedge.get("winner") or "none"
+    return f"after {hedge['after']:.2f}s, {winner} won, +{int(hedge.get('extra_tokens') or 0)} tokens"
+
+# === End of src/request_hedging.py ===
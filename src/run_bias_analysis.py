@@ -27,7 +27,8 @@ This script is a secondary analysis module that completes the unified
 the core performance analysis, its purpose is to answer diagnostic questions
 about *how* the LLM performed the task, not just how well.
 
-It reads the raw `all_scores.txt` and `all_mappings.txt` files to calculate
+It reads the raw `all_scores.txt` and `all_mappings.txt` files (or Stage 3's
+binary copy of them, `score_tensor.npz`, while it is current) to calculate
 positional bias metrics. It then reads the `replication_metrics.json` file
 (generated by `analyze_llm_performance.py`), injects its new metrics, and
 overwrites the file. This augmented JSON becomes the final, authoritative
@@ -47,20 +48,20 @@ import numpy as np
 import logging
 import json
 import glob
+import sys
 from io import StringIO
 
-logging.basicConfig(level=logging.INFO, format='%(levelname)s (run_bias_analysis): %(message)s')
+try:
+    import score_store
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path: sys.path.insert(0, current_script_dir)
+    import score_store
 
-def build_long_format_df(replication_dir, k_value):
-    """Builds the detailed DataFrame for a single replication, validating against k."""
-    analysis_dir = os.path.join(replication_dir, "analysis_inputs")
-    scores_file = os.path.join(analysis_dir, "all_scores.txt")
-    mappings_file = os.path.join(analysis_dir, "all_mappings.txt")
-
-    if not all(os.path.exists(p) for p in [scores_file, mappings_file]):
-        logging.warning(f"Missing scores or mappings file in {analysis_dir}.")
-        return None
+logging.basicConfig(level=logging.INFO, format='%(levelname)s (run_bias_analysis): %(message)s')
 
+def _read_text_inputs(scores_file, mappings_file):
+    """Parses `all_scores.txt` and `all_mappings.txt`; returns `(None, None)` if they cannot be read."""
     try:
         # Use a context manager for reading the file
         with open(scores_file, 'r') as f:
@@ -77,9 +78,28 @@ def build_long_format_df(replication_dir, k_value):
         with open(mappings_file, 'r') as f:
             mappings_list = [list(map(int, line.strip().split())) for line in f if line.strip() and line.strip()[0].isdigit()]
     except Exception as e:
-        logging.error(f"Could not read score/mapping files in {analysis_dir}: {e}")
+        logging.error(f"Could not read score/mapping files in {os.path.dirname(scores_file)}: {e}")
+        return None, None
+    return score_matrices, mappings_list
+
+def build_long_format_df(replication_dir, k_value):
+    """Builds the detailed DataFrame for a single replication, validating against k."""
+    analysis_dir = os.path.join(replication_dir, "analysis_inputs")
+    scores_file = os.path.join(analysis_dir, "all_scores.txt")
+    mappings_file = os.path.join(analysis_dir, "all_mappings.txt")
+
+    if not all(os.path.exists(p) for p in [scores_file, mappings_file]):
+        logging.warning(f"Missing scores or mappings file in {analysis_dir}.")
         return None
 
+    store = score_store.load_store(analysis_dir)
+    if store is not None:
+        score_matrices, mappings_list = list(store.scores), store.mappings.tolist()
+    else:
+        score_matrices, mappings_list = _read_text_inputs(scores_file, mappings_file)
+        if score_matrices is None:
+            return None
+
     all_points = []
     
     # Ensure we don't process more matrices than we have mappings for
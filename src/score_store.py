@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/score_store.py
+
+"""
+Binary Score Store for a Replication's Analysis Inputs.
+
+Stage 3 writes the parsed trials as text (`all_scores.txt`,
+`all_mappings.txt`, `successful_indices.txt`), and every downstream reader
+used to re-parse those files. This module keeps the same data as one
+uncompressed NumPy archive (`analysis_inputs/score_tensor.npz`) next to them:
+an m x k x k score tensor, an m x k mappings array, and the successful-indices
+vector, in the order the text files list them.
+
+Key Features:
+-   **Compact Types**: Scores are float32 when the text was written with a
+    fixed-point format (e.g. `.2f`) and rounding the float32 values back to
+    that many decimals reproduces the text exactly; otherwise float64.
+    Mappings are int8 (int16 for k > 127) and indices int32.
+-   **Identical Values**: `load_store` returns float64 scores equal to what
+    parsing `all_scores.txt` yields, so metrics do not depend on which copy
+    was read.
+-   **Tied to the Text Files**: The archive records the size and
+    modification time of the text files it mirrors and is ignored once any
+    of them changes, so readers fall back to the text.
+-   **Never Fatal**: Failures to write the store are only logged, and a
+    missing, stale, or unreadable store makes readers use the text files.
+"""
+
+# === Start of src/score_store.py ===
+
+import json
+import logging
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+STORE_FORMAT_VERSION = 1
+STORE_FILENAME = "score_tensor.npz"
+
+
+class ScoreStore(NamedTuple):
+    scores: np.ndarray     # (m, k, k) float64
+    mappings: np.ndarray   # (m, k) int64, 1-based column of each row's true match
+    indices: np.ndarray    # (m,) int64, original trial indices
+
+    @property
+    def k(self) -> int:
+        return self.scores.shape[1]
+
+
+def store_path(analysis_inputs_dir: str) -> str:
+    return os.path.join(analysis_inputs_dir, STORE_FILENAME)
+
+
+def remove_store(analysis_inputs_dir: str) -> None:
+    """Deletes the replication's store, e.g. before its text files are rewritten."""
+    try:
+        os.remove(store_path(analysis_inputs_dir))
+    except FileNotFoundError:
+        pass
+
+
+def fixed_point_decimals(score_format: str) -> Optional[int]:
+    """Returns the decimals of a fixed-point format spec such as `.2f`, or None for other formats."""
+    match = re.fullmatch(r"\.(\d+)f", score_format)
+    return int(match.group(1)) if match else None
+
+
+def _stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {"name": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _compact_scores(scores: np.ndarray, decimals: Optional[int]):
+    """Returns `(stored_scores, decimals)`; float32 only when rounding restores every value exactly."""
+    if decimals is not None:
+        narrowed = scores.astype(np.float32)
+        restored = np.round(narrowed.astype(np.float64), decimals)
+        if np.array_equal(restored, scores, equal_nan=True):
+            return narrowed, decimals
+    return scores, -1
+
+
+def write_store(analysis_inputs_dir: str, scores: np.ndarray, mappings: np.ndarray, indices: List[int],
+                source_paths: List[str], decimals: Optional[int] = None) -> bool:
+    """
+    Writes the store for a replication.
+
+    `scores` must hold the values as written to `all_scores.txt` (i.e. parsed
+    back from the formatted text), `decimals` the fixed-point precision of
+    that text if any, and `source_paths` the text files the store mirrors.
+    Returns False (after logging a warning) if it could not be written.
+    """
+    path = store_path(analysis_inputs_dir)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        scores = np.asarray(scores, dtype=np.float64)
+        mappings = np.asarray(mappings)
+        if scores.ndim != 3 or scores.shape[1] != scores.shape[2] or mappings.shape != scores.shape[:2] \
+                or len(indices) != len(scores):
+            raise ValueError(f"inconsistent shapes: scores {scores.shape}, mappings {mappings.shape}, {len(indices)} indices")
+        stored_scores, stored_decimals = _compact_scores(scores, decimals)
+        meta = {"version": STORE_FORMAT_VERSION, "decimals": stored_decimals,
+                "sources": [_stamp(source) for source in source_paths]}
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, scores=stored_scores,
+                     mappings=mappings.astype(np.int8 if scores.shape[1] <= 127 else np.int16),
+                     indices=np.asarray(indices, dtype=np.int32),
+                     meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+        logging.info(f"Wrote binary score store ({len(scores)} trials, {stored_scores.dtype}) to '{path}'.")
+        return True
+    except (OSError, ValueError, TypeError) as e:
+        logging.warning(f"Could not write binary score store '{path}': {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def load_store(analysis_inputs_dir: str) -> Optional[ScoreStore]:
+    """Returns the replication's store if it exists and still matches its text files, or None."""
+    path = store_path(analysis_inputs_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != STORE_FORMAT_VERSION:
+                return None
+            for source in meta["sources"]:
+                source_path = os.path.join(analysis_inputs_dir, source["name"])
+                if not os.path.exists(source_path) or _stamp(source_path) != source:
+                    logging.debug(f"Ignoring stale score store '{path}': '{source['name']}' has changed.")
+                    return None
+            scores = data["scores"].astype(np.float64)
+            if meta["decimals"] >= 0:
+                scores = np.round(scores, meta["decimals"])
+            store = ScoreStore(scores, data["mappings"].astype(np.int64), data["indices"].astype(np.int64))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Could not read binary score store '{path}': {e}")
+        return None
+    if store.scores.ndim != 3 or store.mappings.shape != store.scores.shape[:2] or len(store.indices) != len(store.scores):
+        logging.warning(f"Ignoring malformed score store '{path}'.")
+        return None
+    return store
+
+# === End of src/score_store.py ===
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: src/token_budget.py
+
+"""
+Pre-Flight Token/Cost Estimates and a Runtime Budget Guard.
+
+Before a study is run, `estimate` projects how many tokens it will consume,
+what that will cost, and how long Stage 2 will take. While an experiment runs,
+`replication_manager.py` uses `TokenBudgetGuard` to stop dispatching new
+trials once the experiment has used up its token or cost ceiling (`[Budget]`).
+
+Key Features:
+-   **Offline Tokenization**: Every pending `llm_query_NNN.txt` is counted with
+    a pluggable approximation (`chars`, `words`, or `tiktoken` if installed).
+-   **Completion History**: Completion lengths come from the `usage` blocks of
+    earlier `_full.json` responses for the same model (falling back to
+    `max_tokens`), and per-call latency from earlier `call_telemetry.jsonl`
+    files, so projections improve as more runs complete.
+-   **Wall-Time Projection**: Latency is spread over the configured
+    concurrency and bounded below by any `[RateLimit]` budgets.
+-   **Resumable Halt**: The guard only stops new dispatches. Trials that were
+    never sent have no response files, so `fix_experiment.ps1` runs them after
+    the ceiling is raised.
+
+Usage:
+    python src/token_budget.py estimate output/new_experiments/my_experiment
+    python src/token_budget.py estimate path/to/queries --planned_trials 3000 --json
+"""
+
+# === Start of src/token_budget.py ===
+
+import argparse
+import configparser
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import query_bundle
+    from call_telemetry import find_telemetry_files, iter_records
+    from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
+except ImportError:
+    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_script_dir not in sys.path:
+        sys.path.insert(0, current_script_dir)
+    import query_bundle
+    from call_telemetry import find_telemetry_files, iter_records
+    from config_loader import APP_CONFIG, get_config_value, PROJECT_ROOT
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Typical tokens per whitespace-separated English word for BPE tokenizers.
+TOKENS_PER_WORD = 1.33
+QUERY_FILE_PATTERN = re.compile(r'^llm_query_(\d+)\.txt$')
+FULL_RESPONSE_PATTERN = re.compile(r'^llm_response_\d+_full\.json$')
+
+
+# --- Tokenizers ---
+
+def get_tokenizer(name: str = "chars", chars_per_token: float = DEFAULT_CHARS_PER_TOKEN) -> Callable[[str], int]:
+    """
+    Returns a function counting the (approximate) tokens of a text.
+
+    `chars` divides the length by `chars_per_token`, `words` scales the word
+    count, and `tiktoken` uses the `cl100k_base` encoding if the optional
+    package is installed (otherwise `chars` is used with a warning).
+    """
+    if name == "tiktoken":
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except ImportError:
+            logging.warning("tiktoken is not installed; using the 'chars' token approximation instead.")
+            name = "chars"
+    if name == "chars":
+        return lambda text: math.ceil(len(text) / chars_per_token)
+    if name == "words":
+        return lambda text: math.ceil(len(text.split()) * TOKENS_PER_WORD)
+    raise ValueError(f"Unknown tokenizer '{name}'. Options: chars, words, tiktoken.")
+
+
+# --- History ---
+
+def find_query_files(root: str, pending_only: bool = True) -> List[str]:
+    """
+    Returns the `llm_query_NNN.txt` paths below `root`.
+
+    Queries stored in a `query_bundle.jsonl` are listed under the path their
+    file would have (read them with `query_bundle.read_query_file`). With
+    `pending_only`, queries whose run already holds a `_full.json` response
+    are skipped.
+    """
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        responses_dir = os.path.join(os.path.dirname(dirpath), "session_responses")
+        indices = [int(match.group(1)) for match in map(QUERY_FILE_PATTERN.match, filenames) if match]
+        if query_bundle.BUNDLE_FILENAME in filenames:
+            indices = query_bundle.list_query_indices(dirpath)
+        for index in indices:
+            if pending_only and os.path.exists(
+                    os.path.join(responses_dir, f"llm_response_{index:03d}_full.json")):
+                continue
+            found.append(query_bundle.query_file_path(dirpath, index))
+    return sorted(found)
+
+
+def load_completion_history(root: str) -> Dict[str, List[int]]:
+    """Maps each model to the completion token counts of the `_full.json` responses below `root`."""
+    history: Dict[str, List[int]] = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not FULL_RESPONSE_PATTERN.match(name):
+                continue
+            try:
+                with open(os.path.join(dirpath, name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                completion_tokens = (data.get("usage") or {}).get("completion_tokens")
+            except (OSError, ValueError, AttributeError):
+                continue
+            if isinstance(completion_tokens, int):
+                history.setdefault(data.get("model") or "unknown", []).append(completion_tokens)
+    return history
+
+
+def load_latency_history(root: str) -> Dict[str, List[float]]:
+    """Maps each model to the latencies of successful API calls in the telemetry files below `root`."""
+    history: Dict[str, List[float]] = {}
+    for record in iter_records(find_telemetry_files(root)):
+        if record.get("source", "api") == "api" and record.get("success") and record.get("latency_s"):
+            history.setdefault(record.get("model") or "unknown", []).append(record["latency_s"])
+    return history
+
+
+def _for_model(history: Dict[str, List], model: Optional[str]) -> Tuple[List, str]:
+    """Prefers the model's own history, then the history of all models."""
+    if model and history.get(model):
+        return history[model], "model history"
+    pooled = [value for values in history.values() for value in values]
+    return pooled, "all-model history" if pooled else "none"
+
+
+# --- Estimate ---
+
+def estimate_budget(prompt_token_counts: List[int], completion_history: List[int], latency_history: List[float],
+                    max_tokens: Optional[int], concurrency: int, input_cost_per_million: float = 0.0,
+                    output_cost_per_million: float = 0.0, requests_per_minute: float = 0.0,
+                    tokens_per_minute: float = 0.0, extra_trials: int = 0) -> Dict[str, Any]:
+    """
+    Projects the tokens, cost, and Stage 2 wall time of the given trials.
+
+    `prompt_token_counts` holds one count per pending query; `extra_trials`
+    not yet generated are assumed to match their mean. Without completion
+    history, every trial is assumed to use `max_tokens`.
+    """
+    trials = len(prompt_token_counts) + extra_trials
+    mean_prompt = sum(prompt_token_counts) / len(prompt_token_counts) if prompt_token_counts else 0.0
+    prompt_tokens = round(sum(prompt_token_counts) + extra_trials * mean_prompt)
+    if completion_history:
+        completion_per_trial = sum(completion_history) / len(completion_history)
+    else:
+        completion_per_trial = float(max_tokens or 0)
+    completion_tokens = round(trials * completion_per_trial)
+    cost = (prompt_tokens * input_cost_per_million + completion_tokens * output_cost_per_million) / 1_000_000
+
+    candidates = []
+    if latency_history:
+        ordered = sorted(latency_history)
+        candidates.append(math.ceil(trials / max(1, concurrency)) * ordered[len(ordered) // 2])
+    # Rate limits put a floor under the wall time regardless of concurrency.
+    if requests_per_minute > 0:
+        candidates.append(60.0 * trials / requests_per_minute)
+    if tokens_per_minute > 0:
+        candidates.append(60.0 * (prompt_tokens + completion_tokens) / tokens_per_minute)
+    wall_seconds = max(candidates) if candidates else None
+    return {
+        "trials": trials,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "completion_tokens_per_trial": round(completion_per_trial, 1),
+        "cost": round(cost, 4),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 1) if wall_seconds is not None else None,
+    }
+
+
+def format_estimate(estimate: Dict[str, Any], sources: Dict[str, str]) -> str:
+    wall = estimate["wall_seconds"]
+    wall_str = "unknown (no latency history or rate limit)" if wall is None else f"{wall / 3600:.2f} h ({wall:.0f} s)"
+    return "\n".join([
+        f"Trials:             {estimate['trials']}",
+        f"Prompt tokens:      {estimate['prompt_tokens']:,}",
+        f"Completion tokens:  {estimate['completion_tokens']:,} "
+        f"({estimate['completion_tokens_per_trial']:g} per trial, from {sources['completion']})",
+        f"Total tokens:       {estimate['total_tokens']:,}",
+        f"Estimated cost:     ${estimate['cost']:,.2f}",
+        f"Stage 2 wall time:  {wall_str} at concurrency {estimate['concurrency']}"
+        + ("" if wall is None or sources['latency'] == "none" else f", latency from {sources['latency']}"),
+    ])
+
+
+# --- Runtime Guard ---
+
+class TokenBudgetGuard:
+    """
+    Tracks an experiment's API token usage and cost against its ceilings.
+
+    Usage is read from the `call_telemetry.jsonl` files of every run in the
+    experiment directory, so replications running at the same time count
+    against one budget. Other runs' files are re-read at most every
+    `refresh_seconds`; the current run's calls are added as they complete.
+    """
+
+    def __init__(self, experiment_dir: str, own_telemetry_path: str, max_tokens: int = 0, max_cost: float = 0.0,
+                 input_cost_per_million: float = 0.0, output_cost_per_million: float = 0.0,
+                 refresh_seconds: float = 5.0, clock=time.time):
+        self.experiment_dir = experiment_dir
+        self.own_telemetry_path = os.path.abspath(own_telemetry_path)
+        self.max_tokens = int(max_tokens or 0)
+        self.max_cost = float(max_cost or 0.0)
+        self.input_cost_per_million = float(input_cost_per_million or 0.0)
+        self.output_cost_per_million = float(output_cost_per_million or 0.0)
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._own = self._usage_of([self.own_telemetry_path] if os.path.exists(self.own_telemetry_path) else [])
+        self._others = (0, 0)
+        self._others_read_at: Optional[float] = None
+
+    @staticmethod
+    def _usage_of(paths: Iterable[str]) -> Tuple[int, int]:
+        prompt, completion = 0, 0
+        for record in iter_records(paths):
+            if record.get("source", "api") == "api":
+                prompt += record.get("prompt_tokens") or 0
+                completion += record.get("completion_tokens") or 0
+        return prompt, completion
+
+    def _refresh_others(self):
+        now = self._clock()
+        if self._others_read_at is not None and now - self._others_read_at < self.refresh_seconds:
+            return
+        others = [p for p in find_telemetry_files(self.experiment_dir) if os.path.abspath(p) != self.own_telemetry_path]
+        self._others = self._usage_of(others)
+        self._others_read_at = now
+
+    def add(self, record: Dict[str, Any]):
+        """Counts one telemetry record of the current run."""
+        if record.get("source", "api") == "api":
+            self._own = (self._own[0] + (record.get("prompt_tokens") or 0),
+                         self._own[1] + (record.get("completion_tokens") or 0))
+
+    def usage(self) -> Dict[str, Any]:
+        """Returns the experiment's prompt and completion tokens, total tokens, and cost so far."""
+        self._refresh_others()
+        prompt = self._own[0] + self._others[0]
+        completion = self._own[1] + self._others[1]
+        cost = (prompt * self.input_cost_per_million + completion * self.output_cost_per_million) / 1_000_000
+        return {"prompt_tokens": prompt, "completion_tokens": completion,
+                "total_tokens": prompt + completion, "cost": round(cost, 4)}
+
+    def exhausted(self) -> Optional[str]:
+        """Returns a description of the ceiling that was reached, or None while within budget."""
+        usage = self.usage()
+        if self.max_tokens and usage["total_tokens"] >= self.max_tokens:
+            return f"token ceiling reached ({usage['total_tokens']:,} of {self.max_tokens:,} tokens used)"
+        if self.max_cost and usage["cost"] >= self.max_cost:
+            return f"cost ceiling reached (${usage['cost']:,.2f} of ${self.max_cost:,.2f} spent)"
+        return None
+
+
+def get_budget_guard(config, experiment_dir: str, own_telemetry_path: str) -> Optional[TokenBudgetGuard]:
+    """Returns the guard configured in `[Budget]`, or None if no ceiling is set."""
+    max_tokens = get_config_value(config, 'Budget', 'max_experiment_tokens', fallback=0, value_type=int)
+    max_cost = get_config_value(config, 'Budget', 'max_experiment_cost', fallback=0.0, value_type=float)
+    if not max_tokens and not max_cost:
+        return None
+    return TokenBudgetGuard(
+        experiment_dir, own_telemetry_path, max_tokens=max_tokens, max_cost=max_cost,
+        input_cost_per_million=get_config_value(config, 'Budget', 'input_cost_per_million', fallback=0.0, value_type=float),
+        output_cost_per_million=get_config_value(config, 'Budget', 'output_cost_per_million', fallback=0.0, value_type=float),
+    )
+
+
+# --- Command Line ---
+
+def _find_run_config(root: str):
+    """Returns the first archived run config below `root`, or the global config."""
+    for dirpath, _, filenames in os.walk(root):
+        if 'config.ini.archived' in filenames:
+            run_config = configparser.ConfigParser()
+            run_config.read(os.path.join(dirpath, 'config.ini.archived'))
+            return run_config
+    return APP_CONFIG
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Projects the tokens, cost, and wall time of pending LLM queries.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    estimate_parser = subparsers.add_parser("estimate", help="Estimate the pending queries below a directory.")
+    estimate_parser.add_argument("path", help="An experiment or study directory (or any directory of queries).")
+    estimate_parser.add_argument("--history", default=None,
+                                 help="Directory searched for earlier responses and telemetry "
+                                      "(defaults to [General] base_output_dir).")
+    estimate_parser.add_argument("--planned_trials", type=int, default=0,
+                                 help="Total trials planned, including queries not generated yet.")
+    estimate_parser.add_argument("--concurrency", type=int, default=None,
+                                 help="Calls in flight at once (defaults to max_parallel_sessions x concurrent_replications).")
+    estimate_parser.add_argument("--tokenizer", default=None, help="chars, words, or tiktoken (defaults to [Budget] tokenizer).")
+    estimate_parser.add_argument("--json", action="store_true", help="Print the estimate as JSON.")
+    args = parser.parse_args(argv)
+
+    run_config = _find_run_config(args.path)
+    model = get_config_value(run_config, 'LLM', 'model_name', fallback_key='model', fallback=None)
+    max_tokens = get_config_value(run_config, 'LLM', 'max_tokens', fallback=1000, value_type=int)
+    concurrency = args.concurrency
+    if concurrency is None:
+        concurrency = (get_config_value(APP_CONFIG, 'LLM', 'max_parallel_sessions', fallback=10, value_type=int)
+                       * max(1, get_config_value(APP_CONFIG, 'LLM', 'concurrent_replications', fallback=1, value_type=int)))
+        experiment_cap = get_config_value(APP_CONFIG, 'LLM', 'max_experiment_sessions', fallback=0, value_type=int)
+        if experiment_cap > 0:
+            concurrency = min(concurrency, experiment_cap)
+    tokenizer = get_tokenizer(args.tokenizer or get_config_value(APP_CONFIG, 'Budget', 'tokenizer', fallback='chars'),
+                              get_config_value(APP_CONFIG, 'Budget', 'chars_per_token',
+                                               fallback=DEFAULT_CHARS_PER_TOKEN, value_type=float))
+
+    query_files = find_query_files(args.path)
+    generated = len(find_query_files(args.path, pending_only=False))
+    prompt_token_counts = []
+    for path in query_files:
+        prompt_token_counts.append(tokenizer(query_bundle.read_query_file(path)))
+
+    history_root = args.history or os.path.join(PROJECT_ROOT, get_config_value(APP_CONFIG, 'General', 'base_output_dir', fallback='output'))
+    completion_history, completion_source = _for_model(load_completion_history(history_root), model)
+    latency_history, latency_source = _for_model(load_latency_history(history_root), model)
+    if not completion_history:
+        completion_source = f"max_tokens = {max_tokens}"
+    rate_limited = get_config_value(APP_CONFIG, 'RateLimit', 'enabled', fallback=False, value_type=bool)
+
+    estimate = estimate_budget(
+        prompt_token_counts, completion_history, latency_history, max_tokens, concurrency,
+        input_cost_per_million=get_config_value(APP_CONFIG, 'Budget', 'input_cost_per_million', fallback=0.0, value_type=float),
+        output_cost_per_million=get_config_value(APP_CONFIG, 'Budget', 'output_cost_per_million', fallback=0.0, value_type=float),
+        requests_per_minute=get_config_value(APP_CONFIG, 'RateLimit', 'requests_per_minute', fallback=0.0,
+                                             value_type=float) if rate_limited else 0.0,
+        tokens_per_minute=get_config_value(APP_CONFIG, 'RateLimit', 'tokens_per_minute', fallback=0.0,
+                                           value_type=float) if rate_limited else 0.0,
+        extra_trials=max(0, args.planned_trials - generated),
+    )
+    estimate["model"] = model
+    if args.json:
+        print(json.dumps(estimate, indent=2))
+    else:
+        print(f"Pre-flight estimate for {args.path} (model: {model}):\n")
+        print(format_estimate(estimate, {"completion": completion_source, "latency": latency_source}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# === End of src/token_budget.py ===
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_adaptive_concurrency.py
+
+"""
+Unit Tests for the Adaptive (AIMD) Concurrency Controller (adaptive_concurrency.py).
+
+A fake clock drives the controller so that increases, decreases, the
+decrease window, and Retry-After pauses can be tested deterministically.
+"""
+
+import unittest
+import tempfile
+import threading
+from pathlib import Path
+
+from src.adaptive_concurrency import AdaptiveConcurrencyLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+    """Test suite for the AdaptiveConcurrencyLimiter class."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _limiter(self, **kwargs):
+        params = dict(initial_limit=2, min_limit=1, max_limit=4, clock=self.clock)
+        params.update(kwargs)
+        return AdaptiveConcurrencyLimiter(**params)
+
+    def _complete(self, limiter, success=True, duration=1.0, report=None):
+        limiter.acquire()
+        limiter.release(success, duration, report)
+
+    def test_additive_increase_up_to_max(self):
+        """Verify the limit grows by one per window of healthy calls and stops at the maximum."""
+        limiter = self._limiter()
+        self._complete(limiter)
+        self.assertEqual(limiter.limit, 2)
+        self._complete(limiter)
+        self.assertEqual(limiter.limit, 3)
+        for _ in range(20):
+            self._complete(limiter)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_rate_limit_halves_and_respects_minimum(self):
+        """Verify HTTP 429 and 5xx cut the limit multiplicatively without going below the minimum."""
+        limiter = self._limiter(initial_limit=4)
+        self._complete(limiter, success=False, report={"status": 429})
+        self.assertEqual(limiter.limit, 2)
+        self.clock.now += 10
+        self._complete(limiter, success=False, report={"status": 503})
+        self.assertEqual(limiter.limit, 1)
+        self.clock.now += 10
+        self._complete(limiter, success=False, report={"status": 500})
+        self.assertEqual(limiter.limit, 1)
+        self.assertIn("HTTP 429", limiter.adjustments[0][3])
+
+    def test_burst_of_errors_counts_as_one_decrease(self):
+        """Verify errors within one smoothed call duration trigger only one decrease."""
+        limiter = self._limiter(initial_limit=4)
+        self._complete(limiter, duration=5.0)
+        for _ in range(3):
+            self._complete(limiter, success=False, report={"timeout": True})
+        self.assertEqual(limiter.limit, 2)
+
+    def test_retried_throttling_counts_as_congestion(self):
+        """Verify a call that succeeded only after a retried 429 still reduces the limit."""
+        limiter = self._limiter(initial_limit=4)
+        self._complete(limiter, report={"attempts": [{"attempt": 1, "status": 429}, {"attempt": 2, "status": None}]})
+        self.assertEqual(limiter.limit, 2)
+        self.assertIn("retried HTTP 429", limiter.adjustments[0][3])
+
+    def test_client_errors_do_not_change_limit(self):
+        """Verify failures that are not throttling signals leave the limit unchanged."""
+        limiter = self._limiter(initial_limit=3)
+        self._complete(limiter, success=False, report={"status": 401})
+        self._complete(limiter, success=False)
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual(limiter.adjustments, [])
+
+    def test_latency_growth_triggers_decrease(self):
+        """Verify a smoothed latency above the tolerance counts as congestion."""
+        limiter = self._limiter(initial_limit=4, latency_tolerance=2.0)
+        self._complete(limiter, duration=1.0)
+        for _ in range(10):
+            self.clock.now += 100
+            self._complete(limiter, duration=10.0)
+            if limiter.limit < 4:
+                break
+        self.assertEqual(limiter.limit, 2)
+        self.assertIn("latency", limiter.adjustments[-1][3])
+
+    def test_retry_after_pauses_new_calls(self):
+        """Verify a Retry-After header blocks acquisition until the delay has passed."""
+        limiter = self._limiter(initial_limit=4)
+        self._complete(limiter, success=False, report={"status": 429, "retry_after": 30})
+
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()), daemon=True)
+        waiter.start()
+        self.assertFalse(acquired.wait(0.2))
+
+        self.clock.now += 31
+        with limiter._cond:
+            limiter._cond.notify_all()
+        self.assertTrue(acquired.wait(2))
+
+    def test_wrap_limits_in_flight_calls_and_passes_report(self):
+        """Verify wrapped calls never exceed the limit and their reports reach the controller."""
+        limiter = self._limiter(initial_limit=2, max_limit=2)
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def run_query(index, report):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            threading.Event().wait(0.02)
+            with lock:
+                state["active"] -= 1
+            if index == 0:
+                report["status"] = 429
+                return index, False, "throttled", 0.02
+            return index, True, None, 0.02
+
+        wrapped = limiter.wrap(run_query)
+        threads = [threading.Thread(target=wrapped, args=(i,)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertLessEqual(state["peak"], 2)
+        self.assertTrue(any("HTTP 429" in a[3] for a in limiter.adjustments))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_adjustments_are_written_to_log_file(self):
+        """Verify each adjustment is appended to the TSV log."""
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = Path(tmp) / "concurrency_adjustments.log"
+            limiter = self._limiter(initial_limit=4, log_path=str(log_path))
+            self._complete(limiter, success=False, report={"status": 429})
+            lines = log_path.read_text(encoding='utf-8').splitlines()
+        self.assertTrue(lines[0].startswith("Timestamp\tOld_Limit\tNew_Limit"))
+        self.assertIn("\t4\t2\t", lines[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_adaptive_concurrency.py ===
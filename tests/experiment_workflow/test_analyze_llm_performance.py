@@ -41,6 +41,7 @@ import pytest
 import builtins
 # Import the module to test
 from src import analyze_llm_performance
+import score_store
 
 class TestAnalyzeLLMPerformance(unittest.TestCase):
     """Test suite for analyze_llm_performance.py."""
@@ -161,6 +162,31 @@ class TestAnalyzeLLMPerformance(unittest.TestCase):
         # Check that distribution files were created
         self.assertTrue((self.analysis_dir / "mrr_distribution_k2.txt").is_file())
 
+    @pytest.mark.filterwarnings("ignore::RuntimeWarning")
+    def test_main_prefers_binary_score_store_with_identical_metrics(self):
+        """Verify a current score store replaces parsing the text files and yields the same metrics."""
+        self._create_test_input_files()
+        test_argv = ['analyze_llm_performance.py', '--run_output_dir', str(self.run_dir), '--num_valid_responses', '2']
+        metrics_file = self.analysis_dir / "replication_metrics.json"
+        with patch.object(sys, 'argv', test_argv):
+            analyze_llm_performance.main()
+        text_metrics = metrics_file.read_text()
+
+        score_store.write_store(
+            str(self.analysis_dir), np.array([[[0.9, 0.1], [0.2, 0.8]], [[0.3, 0.7], [0.6, 0.4]]]),
+            np.array([[1, 2], [1, 2]]), [1, 2],
+            [str(self.analysis_dir / name) for name in ("all_scores.txt", "all_mappings.txt", "successful_indices.txt")], 1)
+        metrics_file.unlink()
+        with patch.object(sys, 'argv', test_argv), \
+             patch.object(analyze_llm_performance, 'read_score_matrices') as mock_read_scores, \
+             patch.object(analyze_llm_performance, 'read_mappings_and_deduce_k') as mock_read_mappings:
+            analyze_llm_performance.main()
+
+        mock_read_scores.assert_not_called()
+        mock_read_mappings.assert_not_called()
+        self.mock_sys_exit.assert_not_called()
+        self.assertEqual(metrics_file.read_text(), text_metrics)
+
     def test_main_zero_valid_responses_creates_null_report(self):
         """Verify a null JSON report is created when there are no valid responses."""
         # --- Arrange ---
@@ -1221,6 +1247,52 @@ class TestAnalyzeLLMPerformance(unittest.TestCase):
         np.testing.assert_array_equal(matrices[0], expected_matrix)
 
 
+class TestBatchedTrialEvaluation(unittest.TestCase):
+    """evaluate_all_tests must reproduce evaluate_single_test trial by trial, including the random stream."""
+
+    def assert_same_results(self, batched, per_trial):
+        self.assertEqual(len(batched), len(per_trial))
+        for expected, actual in zip(per_trial, batched):
+            if expected is None:
+                self.assertIsNone(actual)
+                continue
+            self.assertEqual(actual.keys(), expected.keys())
+            for key, value in expected.items():
+                if key.startswith('raw_'):
+                    self.assertEqual([type(x) for x in actual[key]], [type(x) for x in value], key)
+                    np.testing.assert_array_equal(np.array(actual[key]), np.array(value), key)
+                else:
+                    self.assertEqual(type(actual[key]), type(value), key)
+                    np.testing.assert_equal(actual[key], value, key)
+
+    def run_both(self, tensor, mappings, k_val, top_k=3, seed=11):
+        np.random.seed(seed)
+        per_trial = [analyze_llm_performance.evaluate_single_test(np.array(matrix, dtype=float), mapping, k_val, top_k)
+                     for matrix, mapping in zip(tensor, mappings)]
+        per_trial_state = np.random.random()
+        np.random.seed(seed)
+        batched = analyze_llm_performance.evaluate_all_tests(tensor, mappings, k_val, top_k)
+        self.assertEqual(np.random.random(), per_trial_state, "random stream diverged")
+        return batched, per_trial
+
+    def test_matches_per_trial_evaluation_with_ties(self):
+        """Verify identical results on random tensors whose coarse scores produce many ties."""
+        rng = np.random.default_rng(3)
+        for k_val in (1, 2, 3, 7, 10, 30):
+            for decimals in (0, 1, 2):
+                tensor = np.round(rng.random((40, k_val, k_val)), decimals)
+                mappings = [list(rng.permutation(k_val) + 1) for _ in range(40)]
+                self.assert_same_results(*self.run_both(tensor, mappings, k_val, top_k=min(3, k_val)))
+
+    def test_invalid_mappings_fall_back_to_per_trial_evaluation(self):
+        """Verify trials with out-of-range mappings are rejected exactly as before."""
+        tensor = np.round(np.random.default_rng(5).random((3, 3, 3)), 1)
+        mappings = [[1, 2, 3], [0, 2, 3], [3, 1, 2]]
+        with patch('builtins.print'):
+            batched, per_trial = self.run_both(tensor, mappings, 3)
+        self.assertIsNone(batched[1])
+        self.assert_same_results(batched, per_trial)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -38,9 +38,12 @@ import importlib
 from pathlib import Path
 import subprocess
 import logging
+from shutil import copy2 as real_copy2
 
 # Import the script to test
 from src import build_llm_queries
+import query_generator
+import query_bundle
 
 
 class TestHelperFunctions(unittest.TestCase):
@@ -115,6 +118,35 @@ class TestHelperFunctions(unittest.TestCase):
         (queries_dir / "llm_query_abc.txt").touch()
         self.assertEqual(build_llm_queries.get_next_start_index(str(queries_dir)), 6)
 
+    def test_legacy_selection_reproduces_per_trial_sampling(self):
+        """Tests that legacy mode yields the selections of the original sample-and-drop loop."""
+        pool = pd.DataFrame({'Index': range(1, 41)})
+        expected, remaining = [], pool
+        for global_index in (3, 4, 5):
+            subset = remaining.sample(n=4, random_state=100 + global_index - 1)
+            remaining = remaining.drop(subset.index)
+            expected.append(subset['Index'].tolist())
+        selections = build_llm_queries.iter_legacy_selections(pool, 3, 4, 3, 100)
+        self.assertEqual([s['Index'].tolist() for s in selections], expected)
+
+    def test_permutation_selection_slices_disjoint_seeded_blocks(self):
+        """Tests that permutation mode yields disjoint k-blocks that depend only on the seed and start index."""
+        pool = pd.DataFrame({'Index': range(1, 41)})
+        blocks = [s['Index'].tolist() for s in build_llm_queries.iter_permutation_selections(pool, 10, 4, 1, 100)]
+        self.assertEqual(len(blocks), 10)
+        self.assertEqual(sorted(i for block in blocks for i in block), list(range(1, 41)))
+        again = [s['Index'].tolist() for s in build_llm_queries.iter_permutation_selections(pool, 10, 4, 1, 100)]
+        self.assertEqual(blocks, again)
+        continued = [s['Index'].tolist() for s in build_llm_queries.iter_permutation_selections(pool, 10, 4, 11, 100)]
+        self.assertNotEqual(blocks, continued)
+
+    def test_selection_stops_when_pool_runs_out(self):
+        """Tests that both engines stop with an error instead of yielding a short selection."""
+        pool = pd.DataFrame({'Index': range(1, 10)})
+        for engine in build_llm_queries.SELECTION_ENGINES.values():
+            with self.assertLogs(level='ERROR'):
+                self.assertEqual(len(list(engine(pool, 3, 4, 1, 0))), 2)
+
 
 class TestBuildLLMQueries(unittest.TestCase):
     """Test suite for build_llm_queries.py."""
@@ -204,7 +236,7 @@ class TestBuildLLMQueries(unittest.TestCase):
     def test_happy_path_new_run(self):
         """Verify correct file generation and worker calls for a new run."""
         self._setup_happy_path_mocks()
-        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir), '--qgen_base_seed', '123']
+        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir), '--qgen_base_seed', '123', '--qgen_subprocess']
         
         with patch.object(sys, 'argv', test_argv):
             build_llm_queries.main()
@@ -229,7 +261,7 @@ class TestBuildLLMQueries(unittest.TestCase):
 
         self._setup_happy_path_mocks()
         
-        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir)]
+        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir), '--qgen_subprocess']
         
         with patch.object(sys, 'argv', test_argv):
             build_llm_queries.main()
@@ -265,7 +297,7 @@ class TestBuildLLMQueries(unittest.TestCase):
         self.mock_subprocess.side_effect = subprocess.CalledProcessError(1, "cmd", stderr="Worker failed")
         mock_exit.side_effect = SystemExit  # Make the mock raise the exception
 
-        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir)]
+        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir), '--qgen_subprocess']
 
         with self.assertRaises(SystemExit):
             with patch.object(sys, 'argv', test_argv):
@@ -280,7 +312,7 @@ class TestBuildLLMQueries(unittest.TestCase):
         self.mock_subprocess.side_effect = KeyboardInterrupt
         mock_exit.side_effect = SystemExit  # Make the mock raise the exception
 
-        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir)]
+        test_argv = ['build_llm_queries.py', '--run_output_dir', str(self.run_output_dir), '--qgen_subprocess']
 
         with self.assertRaises(SystemExit):
             with patch.object(sys, 'argv', test_argv):
@@ -310,7 +342,7 @@ class TestBuildLLMQueries(unittest.TestCase):
         self._setup_happy_path_mocks()
         
         # Test -v
-        argv_v = ['script.py', '--run_output_dir', str(self.run_output_dir), '-v']
+        argv_v = ['script.py', '--run_output_dir', str(self.run_output_dir), '-v', '--qgen_subprocess']
         with patch.object(sys, 'argv', argv_v):
             build_llm_queries.main()
         first_call_args = self.mock_subprocess.call_args_list[0].args[0]
@@ -319,12 +351,100 @@ class TestBuildLLMQueries(unittest.TestCase):
 
         # Test -vv
         self.mock_subprocess.reset_mock()
-        argv_vv = ['script.py', '--run_output_dir', str(self.run_output_dir), '-vv']
+        argv_vv = ['script.py', '--run_output_dir', str(self.run_output_dir), '-vv', '--qgen_subprocess']
         with patch.object(sys, 'argv', argv_vv):
             build_llm_queries.main()
         first_call_args_vv = self.mock_subprocess.call_args_list[0].args[0]
         self.assertIn('-vv', first_call_args_vv)
 
+    def _run_in_process(self, *extra_args, run_dir=None):
+        run_dir = run_dir or self.run_output_dir
+        argv = ['build_llm_queries.py', '--run_output_dir', str(run_dir),
+                '--base_seed', '7', '--qgen_base_seed', '11', *extra_args]
+        with patch.object(sys, 'argv', argv):
+            build_llm_queries.main()
+        queries_dir = run_dir / "session_queries"
+        return {p.name: p.read_bytes() for p in sorted(queries_dir.iterdir())}
+
+    def test_in_process_generation_writes_trials_directly(self):
+        """Verify the default path generates every trial without a worker subprocess or temp files."""
+        self._setup_happy_path_mocks()
+        (Path(self.project_root) / "data" / "base_query.txt").write_text("Match {k} people.")
+        src_dir = Path(build_llm_queries.__file__).parent
+
+        files = self._run_in_process()
+
+        self.mock_subprocess.assert_not_called()
+        self.assertFalse(list(src_dir.glob("temp_qgen_outputs_iter_*")))
+        for name in ("llm_query_001.txt", "llm_query_002.txt", "llm_query_001_manifest.txt", "llm_query_002_manifest.txt"):
+            self.assertIn(name, files)
+        self.assertTrue(files["llm_query_001.txt"].startswith(b"Match 3 people.\n\nList A\n"))
+        mapping_lines = files["mappings.txt"].decode().splitlines()
+        self.assertEqual(mapping_lines[0], "Map_idx1\tMap_idx2\tMap_idx3")
+        self.assertEqual([sorted(line.split("\t")) for line in mapping_lines[1:]], [["1", "2", "3"]] * 2)
+
+    def test_bundle_layout_holds_the_same_trials_as_files(self):
+        """Verify query_layout = bundle stores the per-trial files' content in one appendable bundle."""
+        self._setup_happy_path_mocks()
+        (Path(self.project_root) / "data" / "base_query.txt").write_text("Match {k} people.")
+        files = self._run_in_process()
+        bundle_run_dir = Path(self.project_root) / "run_bundle"
+        bundled = self._run_in_process('--query_layout', 'bundle', run_dir=bundle_run_dir)
+
+        self.assertFalse([name for name in bundled if name.startswith("llm_query_")])
+        self.assertEqual(bundled["mappings.txt"], files["mappings.txt"])
+        queries_dir = str(bundle_run_dir / "session_queries")
+        self.assertEqual(query_bundle.list_query_indices(queries_dir), [1, 2])
+        for index in (1, 2):
+            query_path = query_bundle.query_file_path(queries_dir, index)
+            self.assertEqual(query_bundle.read_query_file(query_path).encode(), files[f"llm_query_{index:03d}.txt"])
+            self.assertEqual(query_bundle.read_manifest_text(queries_dir, index).encode(),
+                             files[f"llm_query_{index:03d}_manifest.txt"])
+        self.assertEqual(query_bundle.open_bundle(queries_dir).record(1)["qgen_seed"], 11)
+
+        self.mock_config.set('Experiment', 'num_trials', '1')
+        self._run_in_process('--query_layout', 'bundle', run_dir=bundle_run_dir)
+        self.assertEqual(query_bundle.list_query_indices(queries_dir), [1, 2, 3])
+
+    def test_permutation_mode_keeps_used_indices_bookkeeping(self):
+        """Verify a continued permutation-mode run never reuses personalities recorded as used."""
+        self._setup_happy_path_mocks()
+        self.mock_config.set('Experiment', 'selection_mode', 'permutation')
+        self._run_in_process()
+        self.mock_config.set('Experiment', 'num_trials', '1')
+        self._run_in_process()
+
+        queries_dir = self.run_output_dir / "session_queries"
+        used = [int(line) for line in (queries_dir / "used_indices.txt").read_text().split()]
+        self.assertEqual(len(used), 9)
+        self.assertEqual(len(set(used)), 9)
+        self.assertTrue((queries_dir / "llm_query_003.txt").exists())
+        self.assertEqual(len((queries_dir / "mappings.txt").read_text().splitlines()), 4)
+
+    def test_in_process_output_matches_query_generator_worker(self):
+        """Verify in-process generation is byte-identical to running query_generator.py per trial."""
+        self._setup_happy_path_mocks()
+        self.mock_config.set('Experiment', 'mapping_strategy', 'random')
+        (Path(self.project_root) / "data" / "base_query.txt").write_text("Match {k} people.")
+        in_process = self._run_in_process()
+
+        def run_worker(command, **kwargs):
+            with patch.object(sys, 'argv', command[1:]):
+                query_generator.main()
+            return MagicMock(returncode=0, stderr="")
+        self.mock_subprocess.side_effect = run_worker
+        self.mock_shutil_copy.side_effect = real_copy2
+        with patch.object(query_generator, 'PROJECT_ROOT', self.project_root), \
+                patch.object(query_generator, 'APP_CONFIG', self.mock_config), \
+                patch.object(query_generator, 'DEFAULT_TEMP_SUBSET_FN_QGEN', 'temp_subset_personalities.txt'):
+            with_worker = self._run_in_process('--qgen_subprocess', run_dir=Path(self.project_root) / "run_worker")
+
+        self.assertEqual(self.mock_subprocess.call_count, 2)
+        self.assertEqual(set(in_process) - {"llm_query_base.txt"}, set(with_worker) - {"llm_query_base.txt"})
+        for name, content in in_process.items():
+            if name != "llm_query_base.txt":
+                self.assertEqual(content, with_worker[name], name)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_call_budget.py
+
+"""
+Unit Tests for the Experiment-Wide Call Budget (call_budget.py).
+
+Separate `SharedCallBudget` instances over one temporary directory stand in
+for the processes of concurrently running replications.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from src import call_budget
+from src.call_budget import SharedCallBudget, get_call_budget_from_env
+
+
+class TestSharedCallBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.budget_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_slots_are_shared_between_instances(self):
+        """Verify a second holder waits until the first releases the only slot."""
+        first, second = SharedCallBudget(self.budget_dir, 1), SharedCallBudget(self.budget_dir, 1)
+        slot_path, waited = first.acquire()
+        self.assertEqual(waited, 0.0)
+        self.assertEqual(first.in_use(), 1)
+
+        threading.Timer(0.2, first.release, args=(slot_path,)).start()
+        with second.slot() as second_wait:
+            self.assertGreater(second_wait, 0.0)
+            self.assertEqual(second.in_use(), 1)
+        self.assertEqual(second.in_use(), 0)
+
+    def test_in_flight_calls_never_exceed_the_limit(self):
+        """Verify concurrent holders across instances stay within the limit."""
+        budgets = [SharedCallBudget(self.budget_dir, 3) for _ in range(4)]
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def call(budget):
+            with budget.slot():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=call, args=(budgets[i % 4],)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 3)
+        self.assertEqual(budgets[0].in_use(), 0)
+
+    def test_stale_slot_of_crashed_process_is_reclaimed(self):
+        """Verify a slot file that stopped being refreshed is taken over."""
+        budget = SharedCallBudget(self.budget_dir, 1)
+        stale = os.path.join(self.budget_dir, "slot_0000.lock")
+        with open(stale, 'w') as f:
+            f.write("12345")
+        old = time.time() - call_budget.STALE_SLOT_SECONDS - 1
+        os.utime(stale, (old, old))
+
+        slot_path, _ = budget.acquire()
+        self.assertEqual(slot_path, stale)
+        with open(slot_path) as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+        budget.release(slot_path)
+
+    def test_budget_is_read_from_environment(self):
+        """Verify the budget is only active when a directory and a positive limit are set."""
+        self.assertIsNone(get_call_budget_from_env({}))
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(get_call_budget_from_env({call_budget.BUDGET_DIR_ENV: self.budget_dir,
+                                                        call_budget.BUDGET_LIMIT_ENV: "zero"}))
+        budget = get_call_budget_from_env({call_budget.BUDGET_DIR_ENV: self.budget_dir,
+                                           call_budget.BUDGET_LIMIT_ENV: "4"})
+        self.assertEqual((budget.budget_dir, budget.limit), (self.budget_dir, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_call_budget.py ===
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_call_telemetry.py
+
+"""
+Unit Tests for the Per-Call Telemetry Store (call_telemetry.py).
+
+Records are built from hand-written call reports and `_full.json` files in a
+temporary directory; the report tool is run over two fake run directories.
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from src.call_telemetry import (CallTelemetryWriter, build_call_record, find_telemetry_files,
+                                iter_records, main, summarize)
+
+
+class TestCallTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _full_json(self, usage):
+        path = os.path.join(self.root, "llm_response_001_full.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"usage": usage}, f)
+        return path
+
+    def _write_run(self, name, model, latencies, completion_tokens=100):
+        run_dir = os.path.join(self.root, "study", name)
+        os.makedirs(run_dir)
+        writer = CallTelemetryWriter(os.path.join(run_dir, "call_telemetry.jsonl"))
+        for i, latency in enumerate(latencies, start=1):
+            writer.append({"query_id": f"{i:03d}", "model": model, "source": "api", "success": True,
+                           "latency_s": latency, "ttfb_s": latency / 2, "retries": 0,
+                           "prompt_tokens": 1000, "completion_tokens": completion_tokens, "cached_tokens": 500})
+        return run_dir
+
+    def test_record_combines_call_report_and_usage(self):
+        """Verify a record takes timings from the call report and token counts from _full.json."""
+        full_json = self._full_json({"prompt_tokens": 1200, "completion_tokens": 300,
+                                     "prompt_tokens_details": {"cached_tokens": 1024}})
+        report = {"started_at": 1000.5, "attempts": [
+            {"attempt": 1, "duration": 2.0, "outcome": "HTTPError", "status": 429, "bytes_sent": 900,
+             "rate_limit_wait": 0.25},
+            {"attempt": 2, "duration": 4.0, "outcome": "ok", "status": 200, "ttfb": 1.5,
+             "bytes_sent": 900, "bytes_received": 4096,
+             "hedge": {"after": 3.0, "winner": "hedge", "extra_tokens": 10}},
+        ]}
+
+        record = build_call_record(1, True, 6.5, report, full_json, "vendor/model", "async", submitted_at=1000.0)
+
+        self.assertEqual(record["query_id"], "001")
+        self.assertEqual(record["http_status"], 200)
+        self.assertEqual(record["queue_wait_s"], 0.5)
+        self.assertEqual(record["rate_limit_wait_s"], 0.25)
+        self.assertEqual(record["ttfb_s"], 1.5)
+        self.assertEqual(record["latency_s"], 6.5)
+        self.assertEqual((record["attempts"], record["retries"]), (2, 1))
+        self.assertTrue(record["hedged"])
+        self.assertEqual(record["hedge_winner"], "hedge")
+        self.assertEqual((record["bytes_sent"], record["bytes_received"]), (1800, 4096))
+        self.assertEqual((record["prompt_tokens"], record["completion_tokens"], record["cached_tokens"]),
+                         (1200, 300, 1024))
+
+    def test_failed_or_unreported_trial_still_yields_a_record(self):
+        """Verify a failed trial without a call report records its status and last error line."""
+        record = build_call_record(7, False, 30.0, {"status": 500}, os.path.join(self.root, "missing.json"),
+                                   "m", "subprocess", error="Traceback...\nHTTPError: 500 Server Error")
+
+        self.assertFalse(record["success"])
+        self.assertEqual(record["http_status"], 500)
+        self.assertIsNone(record["queue_wait_s"])
+        self.assertIsNone(record["prompt_tokens"])
+        self.assertEqual(record["error"], "HTTPError: 500 Server Error")
+
+    def test_writer_appends_one_json_line_per_record(self):
+        """Verify the writer appends and never truncates the file."""
+        path = os.path.join(self.root, "call_telemetry.jsonl")
+        CallTelemetryWriter(path).append({"query_id": "001"})
+        CallTelemetryWriter(path).append({"query_id": "002"})
+
+        self.assertEqual([r["query_id"] for r in iter_records([path])], ["001", "002"])
+
+    def test_summary_groups_runs_by_model_and_excludes_cache_hits(self):
+        """Verify latency percentiles and tokens/s are computed per model across runs."""
+        self._write_run("run_a", "model-a", [1.0, 2.0, 3.0, 4.0, 5.0])
+        run_b = self._write_run("run_b", "model-b", [10.0])
+        CallTelemetryWriter(os.path.join(run_b, "call_telemetry.jsonl")).append(
+            {"query_id": "002", "model": "model-b", "source": "cache", "success": True, "latency_s": 0.0})
+
+        paths = find_telemetry_files(os.path.join(self.root, "study"))
+        summary = summarize(iter_records(paths))
+
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(summary["model-a"]["calls"], 5)
+        self.assertEqual(summary["model-a"]["latency_s"]["p50"], 3.0)
+        self.assertEqual(summary["model-a"]["latency_s"]["p90"], 4.6)
+        self.assertEqual(summary["model-a"]["tokens_per_s"]["p50"], 33.333)
+        self.assertEqual((summary["model-b"]["calls"], summary["model-b"]["cache_hits"]), (1, 1))
+        self.assertEqual(summary["model-b"]["latency_s"]["p99"], 10.0)
+
+    def test_report_cli_prints_table_and_json(self):
+        """Verify the report subcommand prints a row per model, or JSON with --json."""
+        self._write_run("run_a", "model-a", [1.0, 2.0])
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(main(["report", self.root]), 0)
+        self.assertIn("model-a", out.getvalue())
+        self.assertIn("lat_p99", out.getvalue())
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(["report", self.root, "--json"])
+        self.assertEqual(json.loads(out.getvalue())["model-a"]["calls"], 2)
+
+    def test_report_cli_fails_without_telemetry(self):
+        """Verify the report subcommand returns 1 when no telemetry file exists."""
+        self.assertEqual(main(["report", self.root]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_call_telemetry.py ===
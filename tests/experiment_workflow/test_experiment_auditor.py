@@ -37,9 +37,12 @@ import importlib
 import io
 import builtins
 import json
+import numpy as np
 
 # Import the module to test
 from src import experiment_auditor
+import query_bundle
+import score_store
 
 class TestExperimentAuditor(unittest.TestCase):
     """Test suite for experiment_auditor.py."""
@@ -276,6 +279,63 @@ personalities_src = personalities_db.txt
         self.assertEqual(repair_job['repair_type'], 'session_repair')
         self.assertEqual(repair_job['failed_indices'], [3, 5])
 
+    def _convert_to_query_bundle(self, run_dir, indices):
+        """Replaces a mock run's per-trial query files with a query bundle holding `indices`."""
+        queries_dir = run_dir / "session_queries"
+        for query_file in queries_dir.glob("llm_query_*.txt"):
+            query_file.unlink()
+        for i in indices:
+            query_bundle.append_trial(str(queries_dir), i, f"query {i}", "manifest", "1\t2")
+
+    def test_get_experiment_state_complete_with_query_bundle(self):
+        """Verify a run whose queries are in a query bundle is audited like one with query files."""
+        run_dir = self._create_mock_run_dir(rep_num=1)
+        self._convert_to_query_bundle(run_dir, range(1, 11))
+
+        status, details = experiment_auditor._verify_single_run_completeness(run_dir)
+        self.assertEqual(status, "VALIDATED", details)
+        self.assertIn("queries OK", details)
+
+    def test_repair_needed_for_response_issue_with_query_bundle(self):
+        """Verify failed trials are derived from the query bundle's indices."""
+        run_dir = self._create_mock_run_dir(rep_num=1, m=5)
+        self._convert_to_query_bundle(run_dir, range(1, 6))
+        (run_dir / "session_responses" / "llm_response_003.txt").unlink()
+        (run_dir / "session_responses" / "llm_response_005.txt").unlink()
+
+        state_name, payload, _ = experiment_auditor.get_experiment_state(self.exp_dir, 1)
+
+        self.assertEqual(state_name, "REPAIR_NEEDED")
+        self.assertEqual(payload[0]['repair_type'], 'session_repair')
+        self.assertEqual(payload[0]['failed_indices'], [3, 5])
+
+    def test_query_issue_for_incomplete_query_bundle(self):
+        """Verify a query bundle with too few trials is reported as incomplete."""
+        run_dir = self._create_mock_run_dir(rep_num=1, m=5)
+        self._convert_to_query_bundle(run_dir, range(1, 5))
+
+        _, details = experiment_auditor._verify_single_run_completeness(run_dir)
+        self.assertIn("SESSION_QUERIES_INCOMPLETE", details)
+
+    def _write_score_store(self, run_dir, k=10, m=10):
+        """Writes a score store mirroring the mock run's analysis input files."""
+        analysis_dir = run_dir / "analysis_inputs"
+        (analysis_dir / "successful_indices.txt").write_text("".join(f"{i}\n" for i in range(1, m + 1)))
+        score_store.write_store(str(analysis_dir), np.zeros((m, k, k)), np.tile(np.arange(1, k + 1), (m, 1)),
+                                list(range(1, m + 1)),
+                                [str(analysis_dir / name) for name in ("all_scores.txt", "all_mappings.txt", "successful_indices.txt")])
+
+    def test_analysis_files_counted_from_score_store(self):
+        """Verify a current score store supplies the analysis counts, and a stale one is ignored."""
+        run_dir = self._create_mock_run_dir(rep_num=1)
+        self._write_score_store(run_dir)
+        with patch.object(experiment_auditor, '_count_matrices_in_file') as mock_count:
+            self.assertEqual(experiment_auditor._check_analysis_files(run_dir, 10, 10), "VALID")
+        mock_count.assert_not_called()
+
+        (run_dir / "analysis_inputs" / "all_scores.txt").write_text(("0\n" * 10) * 9)
+        self.assertEqual(experiment_auditor._check_analysis_files(run_dir, 10, 10), "ANALYSIS_DATA_INCOMPLETE")
+
     def test_get_experiment_state_migration_needed_for_corrupted_run(self):
         """Verify a run with multiple error types is marked for migration."""
         # --- Arrange ---
@@ -19,12 +19,15 @@
 #
 # Filename: tests/experiment_workflow/test_experiment_manager.py
 
+import io
 import unittest
 from unittest.mock import patch, MagicMock, call
 import os
 import sys
 import shutil
 import tempfile
+import threading
+import time
 import configparser
 import subprocess
 from pathlib import Path
@@ -463,6 +466,107 @@ class TestModeExecutionHelpers(unittest.TestCase):
         self.assertIn("--replication_num", command_list)
         self.assertIn("2", command_list)
 
+    def _fake_replication_processes(self, events, failing_reps=()):
+        """Returns a Popen side effect whose processes announce Stage 2 and record start/wait order."""
+        def popen(cmd, **kwargs):
+            rep_num = int(cmd[cmd.index("--replication_num") + 1])
+            events.append(("start", rep_num))
+            proc = MagicMock()
+            proc.stdout = iter([f"rep {rep_num} stage 2\n", experiment_manager.STAGE2_COMPLETE_MARKER + "\n",
+                                f"rep {rep_num} stage 3\n"])
+            proc.returncode = 1 if rep_num in failing_reps else 0
+            proc.wait.side_effect = lambda: events.append(("wait", rep_num))
+            proc.poll.return_value = proc.returncode
+            return proc
+        return popen
+
+    @patch('src.experiment_manager.get_config_value',
+           side_effect=lambda config, section, key, **kwargs: key == 'pipeline_replications' or kwargs.get('fallback'))
+    @patch('src.experiment_manager.subprocess.Popen')
+    @patch('glob.glob', return_value=[])
+    def test_pipelined_new_mode_overlaps_replications_in_order(self, mock_glob, mock_popen, mock_config):
+        """Ensure the next replication starts after the previous one's Stage 2 and replications finish in order."""
+        events = []
+        mock_popen.side_effect = self._fake_replication_processes(events)
+
+        success = experiment_manager._run_new_mode(self.test_dir, 1, 3, None, False, self.orchestrator_script, self.colors)
+
+        self.assertTrue(success)
+        self.assertEqual(events, [("start", 1), ("start", 2), ("wait", 1), ("start", 3), ("wait", 2), ("wait", 3)])
+        for call_args in mock_popen.call_args_list:
+            self.assertIn("--announce_stage2", call_args.args[0])
+
+    @patch('src.experiment_manager.get_config_value',
+           side_effect=lambda config, section, key, **kwargs: key == 'pipeline_replications' or kwargs.get('fallback'))
+    @patch('src.experiment_manager.subprocess.Popen')
+    @patch('glob.glob', return_value=[])
+    def test_pipelined_new_mode_stops_after_failed_replication(self, mock_glob, mock_popen, mock_config):
+        """Ensure a replication failing in Stages 3-6 stops the batch once its started successor has finished."""
+        events = []
+        mock_popen.side_effect = self._fake_replication_processes(events, failing_reps={1})
+
+        success = experiment_manager._run_new_mode(self.test_dir, 1, 3, None, False, self.orchestrator_script, self.colors)
+
+        self.assertFalse(success)
+        self.assertEqual(events, [("start", 1), ("start", 2), ("wait", 1), ("wait", 2)])
+
+    def _concurrent_config(self, config, section, key, **kwargs):
+        return {'concurrent_replications': 2, 'max_experiment_sessions': 5}.get(key, kwargs.get('fallback'))
+
+    def _fake_concurrent_processes(self, state, failing_reps=()):
+        """Returns a Popen side effect whose processes run briefly and record the peak number running at once."""
+        lock = threading.Lock()
+
+        def popen(cmd, **kwargs):
+            rep_num = int(cmd[cmd.index("--replication_num") + 1])
+            state["envs"].append(kwargs["env"])
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+
+            def output():
+                time.sleep(0.05)
+                yield f"rep {rep_num} output\n"
+                with lock:
+                    state["running"] -= 1
+            proc = MagicMock()
+            proc.stdout = output()
+            proc.returncode = 1 if rep_num in failing_reps else 0
+            state["started"].append(rep_num)
+            return proc
+        return popen
+
+    @patch('src.experiment_manager.subprocess.Popen')
+    @patch('glob.glob', return_value=[])
+    def test_concurrent_new_mode_shares_one_call_budget(self, mock_glob, mock_popen):
+        """Ensure replications run concurrently and all receive the same experiment-wide call budget."""
+        state = {"envs": [], "running": 0, "peak": 0, "started": []}
+        mock_popen.side_effect = self._fake_concurrent_processes(state)
+
+        with patch('src.experiment_manager.get_config_value', side_effect=self._concurrent_config):
+            success = experiment_manager._run_new_mode(self.test_dir, 1, 4, None, False, self.orchestrator_script, self.colors)
+
+        self.assertTrue(success)
+        self.assertEqual(sorted(state["started"]), [1, 2, 3, 4])
+        self.assertEqual(state["peak"], 2)
+        budget_dirs = {env["LLM_CALL_BUDGET_DIR"] for env in state["envs"]}
+        self.assertEqual(len(budget_dirs), 1)
+        self.assertEqual({env["LLM_CALL_BUDGET_LIMIT"] for env in state["envs"]}, {"5"})
+        self.assertFalse(os.path.exists(budget_dirs.pop()))  # Removed after the batch.
+
+    @patch('src.experiment_manager.subprocess.Popen')
+    @patch('glob.glob', return_value=[])
+    def test_concurrent_new_mode_stops_launching_after_failure(self, mock_glob, mock_popen):
+        """Ensure no new replication starts after one fails, and the batch reports failure."""
+        state = {"envs": [], "running": 0, "peak": 0, "started": []}
+        mock_popen.side_effect = self._fake_concurrent_processes(state, failing_reps={1, 2})
+
+        with patch('src.experiment_manager.get_config_value', side_effect=self._concurrent_config):
+            success = experiment_manager._run_new_mode(self.test_dir, 1, 6, None, False, self.orchestrator_script, self.colors)
+
+        self.assertFalse(success)
+        self.assertLess(len(state["started"]), 6)
+
     @patch('src.experiment_manager.subprocess.Popen')
     @patch('glob.glob', return_value=[])
     def test_run_new_mode_constructs_correct_command(self, mock_glob, mock_popen):
@@ -557,6 +661,63 @@ class TestModeExecutionHelpers(unittest.TestCase):
         self.assertFalse(success)
 
 
+    def _fake_reprocess_processes(self, state, failing_runs=()):
+        """Returns a Popen side effect whose reprocessing runs briefly and record the peak number running at once."""
+        lock = threading.Lock()
+
+        def popen(cmd, **kwargs):
+            run_dir = cmd[cmd.index("--run_output_dir") + 1]
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+
+            def read():
+                time.sleep(0.05)
+                with lock:
+                    state["running"] -= 1
+                return f"{run_dir} reprocessed\n"
+            proc = MagicMock()
+            proc.stdout.read.side_effect = read
+            proc.returncode = 1 if run_dir in failing_runs else 0
+            state["started"].append(run_dir)
+            return proc
+        return popen
+
+    @patch('src.experiment_manager.subprocess.Popen')
+    def test_reprocess_mode_runs_replications_concurrently(self, mock_popen):
+        """Ensure reprocess_workers replications are reprocessed at once and each output is printed."""
+        state = {"running": 0, "peak": 0, "started": []}
+        mock_popen.side_effect = self._fake_reprocess_processes(state)
+        runs = [{"dir": f"run_{i}"} for i in range(4)]
+
+        with patch('src.experiment_manager.get_config_value',
+                   side_effect=lambda config, section, key, **kwargs: {'reprocess_workers': 2}.get(key, kwargs.get('fallback'))), \
+                patch('sys.stdout', new_callable=io.StringIO) as mock_stdout:
+            success = experiment_manager._run_reprocess_mode(runs, None, False, self.orchestrator_script, None,
+                                                             self.test_dir, None, self.colors)
+
+        self.assertTrue(success)
+        self.assertEqual(sorted(state["started"]), [run["dir"] for run in runs])
+        self.assertEqual(state["peak"], 2)
+        for run in runs:
+            self.assertIn(f"{run['dir']} reprocessed", mock_stdout.getvalue())
+
+    @patch('src.experiment_manager.subprocess.Popen')
+    def test_concurrent_reprocess_mode_stops_launching_after_failure(self, mock_popen):
+        """Ensure no further replication is reprocessed after one fails, and the mode reports failure."""
+        state = {"running": 0, "peak": 0, "started": []}
+        mock_popen.side_effect = self._fake_reprocess_processes(state, failing_runs={"run_0", "run_1"})
+        runs = [{"dir": f"run_{i}"} for i in range(6)]
+
+        with patch('src.experiment_manager.get_config_value',
+                   side_effect=lambda config, section, key, **kwargs: {'reprocess_workers': 2}.get(key, kwargs.get('fallback'))), \
+                patch('src.experiment_manager.logging.error'), patch('sys.stdout', new_callable=io.StringIO):
+            success = experiment_manager._run_reprocess_mode(runs, None, False, self.orchestrator_script, None,
+                                                             self.test_dir, None, self.colors)
+
+        self.assertFalse(success)
+        self.assertLess(len(state["started"]), 6)
+
     @patch('src.experiment_manager.subprocess.Popen')
     def test_run_repair_mode_skips_runs_with_no_failed_indices(self, mock_popen):
         """Ensure _run_repair_mode does nothing if a run has no failed indices."""
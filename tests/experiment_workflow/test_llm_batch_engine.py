@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_llm_batch_engine.py
+
+"""
+Unit Tests for the Provider Batch-API Session Engine (llm_batch_engine.py).
+
+Each test runs a real mock server (mock_llm_server.py), which emulates the
+Files/Batches API, on an ephemeral port.
+"""
+
+import configparser
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import requests
+
+from src import llm_prompter
+from src.llm_batch_engine import BATCH_STATE_FILENAME, BatchSessionEngine, build_batch_lines, get_batch_settings
+from src.mock_llm_server import MockLLMServer, MockServerProfile
+from src.process_llm_responses import parse_llm_response_table_to_matrix
+
+NAMES = ["Ada Lovelace (1815)", "Alan Turing (1912)", "Grace Hopper (1906)"]
+
+
+def _query(i):
+    return f"Query {i}.\n\nList A\n" + "\n".join(NAMES) + "\n\nList B\nID 1: a\nID 2: b\nID 3: c\n"
+
+
+class TestBatchSessionEngine(unittest.TestCase):
+    """Test suite for the BatchSessionEngine class."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory(prefix="batch_engine_test_")
+        self.run_dir = Path(self.test_dir.name) / "run"
+        self.responses_dir = self.run_dir / "session_responses"
+        (self.run_dir / "session_queries").mkdir(parents=True)
+        self.responses_dir.mkdir()
+        for i in (1, 2, 3):
+            (self.run_dir / "session_queries" / f"llm_query_{i:03d}.txt").write_text(_query(i), encoding='utf-8')
+        self.env_patcher = patch.dict(os.environ, {"TEST_BATCH_KEY": "fake-key"})
+        self.env_patcher.start()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.test_dir.cleanup()
+
+    def _write_config(self, server, max_wait_hours=1.0):
+        (self.run_dir / "config.ini.archived").write_text(
+            "[LLM]\nmodel_name = test/model\nmax_tokens = 500\ntemperature = 0.0\n"
+            f"[API]\napi_endpoint = {server.endpoint}\napi_timeout_seconds = 5\n"
+            "batch_api_key_env = TEST_BATCH_KEY\nbatch_poll_seconds = 0.02\n"
+            f"batch_max_wait_hours = {max_wait_hours}\n",
+            encoding='utf-8'
+        )
+
+    def _engine(self):
+        return BatchSessionEngine(str(self.run_dir), str(self.responses_dir))
+
+    def _state(self):
+        return json.loads((self.run_dir / BATCH_STATE_FILENAME).read_text(encoding='utf-8'))
+
+    def test_batch_results_are_unpacked_into_standard_artifacts(self):
+        """Verify every trial gets a parseable response, a full JSON file, and a call report."""
+        reports = {}
+        with MockLLMServer(MockServerProfile(latency_median=0.0, batch_seconds=0.05, seed=3)) as server:
+            self._write_config(server)
+            results = list(self._engine().run([1, 2, 3], on_report=lambda i, r: reports.update({i: r})))
+
+        self.assertEqual(sorted(r[0] for r in results), [1, 2, 3])
+        self.assertTrue(all(r[1] for r in results))
+        self.assertEqual(sorted(reports), [1, 2, 3])
+        for i in (1, 2, 3):
+            content = (self.responses_dir / f"llm_response_{i:03d}.txt").read_text(encoding='utf-8')
+            matrix, _, rejected = parse_llm_response_table_to_matrix(content, 3, NAMES)
+            self.assertFalse(rejected)
+            self.assertEqual(matrix.shape, (3, 3))
+            full = json.loads((self.responses_dir / f"llm_response_{i:03d}_full.json").read_text(encoding='utf-8'))
+            self.assertEqual(full["model"], "test/model")
+        state = self._state()
+        self.assertTrue(state["unpacked"])
+        self.assertEqual(state["status"], "completed")
+
+    def test_failed_requests_become_error_files(self):
+        """Verify per-request failures in the output and error files fail only those trials."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, batch_seconds=0.0, rate_500=0.5,
+                                             rate_timeout=0.5)) as server:
+            self._write_config(server)
+            results = list(self._engine().run([1, 2, 3]))
+
+        self.assertFalse(any(r[1] for r in results))
+        for i in (1, 2, 3):
+            error = (self.responses_dir / f"llm_response_{i:03d}.error.txt").read_text(encoding='utf-8')
+            self.assertIn("Batch request failed", error)
+            self.assertFalse((self.responses_dir / f"llm_response_{i:03d}.txt").exists())
+
+    def test_interrupted_job_is_resumed_not_resubmitted(self):
+        """Verify a job that outlives max wait is kept and picked up by the next run."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, batch_seconds=0.3)) as server:
+            self._write_config(server, max_wait_hours=0.0)
+            first = list(self._engine().run([1, 2, 3]))
+            self.assertFalse(any(r[1] for r in first))
+            self.assertIn("resumed", first[0][2])
+            for i in (1, 2, 3):
+                error = (self.responses_dir / f"llm_response_{i:03d}.error.txt").read_text(encoding='utf-8')
+                self.assertIn("did not finish", error)
+            batch_id = self._state()["batch_id"]
+            self.assertFalse(self._state()["unpacked"])
+
+            self._write_config(server, max_wait_hours=1.0)
+            second = list(self._engine().run([2]))
+            self.assertEqual(second[0][:2], (2, True))
+            self.assertEqual(self._state()["batch_id"], batch_id)
+            self.assertEqual(len(server._batches), 1)
+
+    def test_failed_result_download_leaves_job_resumable(self):
+        """Verify a download error fails every trial with an error file and the next run unpacks the same job."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, batch_seconds=0.0)) as server:
+            self._write_config(server)
+            engine = self._engine()
+            with patch.object(engine, '_download', side_effect=requests.exceptions.ConnectionError("reset")):
+                first = list(engine.run([1, 2]))
+            self.assertEqual([r[:2] for r in first], [(1, False), (2, False)])
+            for i in (1, 2):
+                error = (self.responses_dir / f"llm_response_{i:03d}.error.txt").read_text(encoding='utf-8')
+                self.assertIn("next repair run", error)
+            self.assertFalse(self._state()["unpacked"])
+
+            second = list(self._engine().run([1, 2]))
+            self.assertTrue(all(r[1] for r in second))
+            self.assertEqual(len(server._batches), 1)
+
+    def test_missing_api_key_fails_every_trial(self):
+        """Verify the engine reports failures instead of raising when no key is set."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0)) as server:
+            self._write_config(server)
+            with patch.dict(os.environ, {"TEST_BATCH_KEY": ""}):
+                results = list(self._engine().run([1, 2]))
+        self.assertEqual([r[:2] for r in results], [(1, False), (2, False)])
+        self.assertIn("TEST_BATCH_KEY not set", results[0][2])
+        for i in (1, 2):
+            error = (self.responses_dir / f"llm_response_{i:03d}.error.txt").read_text(encoding='utf-8')
+            self.assertIn("Batch submission failed", error)
+
+    def test_batch_lines_use_the_interactive_request_body(self):
+        """Verify each batch line carries exactly the body of an interactive call."""
+        settings = {"model_name": "test/model", "max_tokens": 500, "temperature": 0.0}
+        lines = [json.loads(line) for line in build_batch_lines([2, 1], str(self.run_dir / "session_queries"), settings)]
+        self.assertEqual([line["custom_id"] for line in lines], ["query-001", "query-002"])
+        self.assertEqual(lines[0]["body"], llm_prompter.build_chat_payload(_query(1), "test/model", 500, 0.0))
+
+    def test_base_url_defaults_to_base_of_chat_endpoint(self):
+        """Verify an empty batch_api_base_url is derived from api_endpoint."""
+        config = configparser.ConfigParser()
+        config.read_string("[API]\napi_endpoint = https://api.example.com/v1/chat/completions\n")
+        self.assertEqual(get_batch_settings(config)["base_url"], "https://api.example.com/v1")
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_llm_batch_engine.py ===
@@ -28,6 +28,7 @@ focusing on its handling of API calls and file I/O based on simulated outcomes.
 
 import unittest
 from unittest.mock import patch, MagicMock
+import io
 import os
 import sys
 import tempfile
@@ -40,6 +41,9 @@ import importlib
 
 # Import the module to test
 from src import llm_prompter
+# Loaded up front: streamed calls import the Stage 3 parser (and numpy) lazily,
+# and modules first imported inside a patch.dict('sys.modules') are dropped again.
+from src.process_llm_responses import parse_llm_response_table_to_matrix
 
 class TestLLMPrompter(unittest.TestCase):
     """Test suite for llm_prompter.py."""
@@ -323,6 +327,215 @@ class TestLLMPrompter(unittest.TestCase):
         self.assertIn("Simulated 401 Unauthorized", self.error_file.read_text())
         self.mock_sys_exit.assert_called_with(1)
 
+    def _make_job(self, query_identifier='001'):
+        return json.dumps({
+            "query_identifier": query_identifier,
+            "input_query_file": str(self.query_file),
+            "output_response_file": str(self.response_file),
+            "output_error_file": str(self.error_file),
+            "output_json_file": str(self.json_file),
+            "config_path": None,
+        })
+
+    @patch('src.llm_prompter.requests.Session')
+    def test_serve_mode_processes_jobs_over_one_session(self, mock_session_cls):
+        """Verify server mode handles several jobs, reusing one HTTP session."""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"choices": [{"message": {"content": "Served content"}}]}
+        mock_response.raise_for_status.return_value = None
+        mock_session_cls.return_value.post.return_value = mock_response
+
+        stdin = io.StringIO(self._make_job('001') + "\n\n" + self._make_job('002') + "\n")
+        stdout = io.StringIO()
+        llm_prompter.serve_query_jobs(stdin, stdout, 'fake-api-key')
+
+        results = [json.loads(line[len(llm_prompter.JOB_RESULT_TAG):-3]) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([r['query_identifier'] for r in results], ['001', '002'])
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(self.response_file.read_text(), "Served content")
+        mock_session_cls.assert_called_once()
+        self.assertEqual(mock_session_cls.return_value.post.call_count, 2)
+        self.mock_requests_post.assert_not_called()
+
+    @patch('src.llm_prompter.requests.Session')
+    def test_serve_mode_reports_failures_and_malformed_jobs(self, mock_session_cls):
+        """Verify server mode writes the error file and keeps serving after bad input."""
+        mock_session_cls.return_value.post.side_effect = requests.exceptions.Timeout("slow")
+
+        stdin = io.StringIO("not json\n" + self._make_job('007') + "\n")
+        stdout = io.StringIO()
+        llm_prompter.serve_query_jobs(stdin, stdout, 'fake-api-key')
+
+        malformed, failed = [json.loads(line[len(llm_prompter.JOB_RESULT_TAG):-3]) for line in stdout.getvalue().splitlines()]
+        self.assertFalse(malformed['success'])
+        self.assertIn("Malformed job request", malformed['error'])
+        self.assertFalse(failed['success'])
+        self.assertEqual(self.error_file.read_text(), "API call timed out for query 007.")
+
+    def test_http_error_emits_call_report_with_retry_after(self):
+        """Verify a 429 response reports its status and Retry-After delay on stdout."""
+        response = MagicMock(status_code=429, headers={"Retry-After": "12"})
+        self.mock_requests_post.side_effect = requests.exceptions.HTTPError("429 Client Error", response=response)
+
+        with patch('sys.stdout', new_callable=io.StringIO) as mock_stdout:
+            with self.assertRaises(SystemExit):
+                with patch.object(sys, 'argv', self._get_base_argv()):
+                    llm_prompter.main()
+
+        report = llm_prompter.parse_call_report(mock_stdout.getvalue())
+        attempts = report.pop("attempts")
+        self.assertEqual(report, {"status": 429, "retry_after": 12.0, "timeout": False})
+        self.assertEqual([(a["attempt"], a["outcome"]) for a in attempts], [(1, "HTTP 429")])
+
+    def test_describe_call_outcome_variants(self):
+        """Verify status codes are recovered from bare HTTP errors and timeouts are flagged."""
+        self.assertEqual(llm_prompter.describe_call_outcome(requests.exceptions.HTTPError("503 Server Error"))["status"], 503)
+        self.assertTrue(llm_prompter.describe_call_outcome(requests.exceptions.ReadTimeout("slow"))["timeout"])
+        self.assertIsNone(llm_prompter.parse_retry_after("soon"))
+        self.assertEqual(llm_prompter.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(llm_prompter.parse_call_report("no tag here"))
+
+    def _retry_policy(self, **overrides):
+        policy = {"max_attempts": 3, "base_delay": 1.0, "max_delay": 8.0, "deadline": 100.0,
+                  "status_codes": [429, 500, 503]}
+        policy.update(overrides)
+        return policy
+
+    @patch('src.llm_prompter.time.sleep')
+    def test_retry_absorbs_transient_failures(self, mock_sleep):
+        """Verify 503 and 429 failures are retried, honouring Retry-After, and each attempt is logged."""
+        ok = MagicMock()
+        ok.json.return_value = {"choices": [{"message": {"content": "ok"}}]}
+        throttled = MagicMock(status_code=429, headers={"Retry-After": "5"})
+        self.mock_requests_post.side_effect = [
+            requests.exceptions.HTTPError("503 Server Error"),
+            requests.exceptions.HTTPError("429 Too Many Requests", response=throttled),
+            ok,
+        ]
+        attempt_log = []
+        with patch('src.llm_prompter.random.uniform', return_value=0.5):
+            result = llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001",
+                                                       retry_policy=self._retry_policy(), attempt_log=attempt_log)
+
+        self.assertEqual(result, ok.json.return_value)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [0.5, 5.0])
+        self.assertEqual([a["outcome"] for a in attempt_log], ["HTTP 503", "HTTP 429", "ok"])
+        self.assertEqual(attempt_log[1]["retry_delay"], 5.0)
+
+    @patch('src.llm_prompter.time.sleep')
+    def test_retry_skips_non_retryable_status_and_respects_limits(self, mock_sleep):
+        """Verify client errors fail immediately and retries stop at max_attempts and the deadline."""
+        self.mock_requests_post.side_effect = requests.exceptions.HTTPError("401 Unauthorized")
+        with self.assertRaises(requests.exceptions.HTTPError):
+            llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001", retry_policy=self._retry_policy())
+        self.assertEqual(self.mock_requests_post.call_count, 1)
+
+        self.mock_requests_post.reset_mock()
+        self.mock_requests_post.side_effect = requests.exceptions.Timeout("slow")
+        with self.assertRaises(requests.exceptions.Timeout):
+            llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001", retry_policy=self._retry_policy())
+        self.assertEqual(self.mock_requests_post.call_count, 3)
+
+        self.mock_requests_post.reset_mock()
+        self.mock_requests_post.side_effect = requests.exceptions.HTTPError(
+            "429", response=MagicMock(status_code=429, headers={"Retry-After": "500"}))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001", retry_policy=self._retry_policy())
+        self.assertEqual(self.mock_requests_post.call_count, 1)
+
+    def test_retry_policy_defaults_to_single_attempt(self):
+        """Verify configs without retry settings keep the original single-attempt behaviour."""
+        policy = llm_prompter.get_llm_call_settings(self.mock_config)["retry_policy"]
+        self.assertEqual(policy["max_attempts"], 1)
+        self.assertIn(503, policy["status_codes"])
+
+    def test_each_attempt_holds_a_call_budget_slot(self):
+        """Verify an attempt holds one slot of the experiment-wide call budget and releases it before retrying."""
+        from src.call_budget import SharedCallBudget
+        with tempfile.TemporaryDirectory() as budget_dir:
+            budget = SharedCallBudget(budget_dir, 1)
+            slots_in_use = []
+
+            def post(*args, **kwargs):
+                slots_in_use.append(budget.in_use())
+                if len(slots_in_use) == 1:
+                    raise requests.exceptions.ConnectionError("reset")
+                return MagicMock()
+            self.mock_requests_post.side_effect = post
+
+            with patch.object(llm_prompter, 'get_call_budget', return_value=budget), patch('time.sleep'):
+                llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001",
+                                                  retry_policy=self._retry_policy())
+
+            self.assertEqual(slots_in_use, [1, 1])
+            self.assertEqual(budget.in_use(), 0)
+
+    def test_prompt_caching_marks_shared_instructions(self):
+        """Verify the instructions before List A are sent as a cache-marked part and the text is unchanged."""
+        query = "Rate these.\nList A is below.\n\nList A\nAda (1815)\n\nList B\nID 1: x\n"
+        plain = llm_prompter.build_chat_payload(query, "m", 100, 0.0)
+        cached = llm_prompter.build_chat_payload(query, "m", 100, 0.0, prompt_caching=True)
+
+        self.assertEqual(plain["messages"][0]["content"], query)
+        parts = cached["messages"][0]["content"]
+        self.assertEqual(parts[0], {"type": "text", "text": "Rate these.\nList A is below.\n\n",
+                                    "cache_control": {"type": "ephemeral"}})
+        self.assertEqual(parts[1], {"type": "text", "text": "List A\nAda (1815)\n\nList B\nID 1: x\n"})
+        # A query without shared instructions is sent unchanged.
+        self.assertEqual(llm_prompter.split_query_prefix("List A\nAda (1815)\n"), ("", "List A\nAda (1815)\n"))
+        bare = llm_prompter.build_chat_payload("List A\nAda (1815)\n", "m", prompt_caching=True)
+        self.assertEqual(bare["messages"][0]["content"], "List A\nAda (1815)\n")
+
+    def _sse_response(self, contents, usage=None):
+        """Builds a mock streaming response that yields one SSE event per content chunk."""
+        events = [f"data: {json.dumps({'id': 'gen-1', 'choices': [{'delta': {'content': c}}]})}" for c in contents]
+        if usage:
+            events.append(f"data: {json.dumps({'id': 'gen-1', 'choices': [{'delta': {}, 'finish_reason': 'stop'}], 'usage': usage})}")
+        events = [": OPENROUTER PROCESSING", ""] + [e for event in events for e in (event, "")] + ["data: [DONE]"]
+        response = MagicMock()
+        response.iter_lines.return_value = iter(events)
+        return response
+
+    def test_streaming_stops_after_matrix_and_trailer(self):
+        """Verify a streamed call is cut once the k x k block and the trailer margin have arrived."""
+        query = "Match these.\n\nList A\nAda (1815)\nBob (1900)\n\nList B\nID 1: x\nID 2: y\n"
+        contents = ["Scores:\n", "Ada (1815)\t0.9", "\t0.1\n", "Bob (1900)\t0.2\t0.8\n", "Note: ", "some ",
+                    "more ", "commentary ", "that ", "goes ", "on"]
+        response = self._sse_response(contents)
+        self.mock_requests_post.return_value = response
+        attempt_log = []
+
+        result = llm_prompter.post_chat_completion(query, "m", "k", "http://mock", "ref", 10, "001",
+                                                   attempt_log=attempt_log, stream=True, stream_trailer_chars=10)
+
+        text = result["choices"][0]["message"]["content"]
+        self.assertTrue(text.startswith("Scores:\nAda (1815)\t0.9\t0.1\nBob (1900)\t0.2\t0.8\nNote: some "))
+        self.assertNotIn("goes", text)
+        self.assertEqual(result["choices"][0]["finish_reason"], "early_stop")
+        self.assertTrue(self.mock_requests_post.call_args.kwargs["stream"])
+        self.assertTrue(self.mock_requests_post.call_args.kwargs["json"]["stream"])
+        response.close.assert_called_once()
+        self.assertTrue(attempt_log[0]["terminated_early"])
+        self.assertIsNotNone(attempt_log[0]["ttft"])
+        self.assertIsNotNone(attempt_log[0]["time_to_matrix"])
+
+        names = ["Ada (1815)", "Bob (1900)"]
+        truncated, _, _ = parse_llm_response_table_to_matrix(text, 2, names)
+        full, _, _ = parse_llm_response_table_to_matrix("".join(contents), 2, names)
+        self.assertTrue((truncated == full).all())
+
+    def test_streaming_without_matrix_reads_to_end(self):
+        """Verify a stream without a score block is consumed fully and keeps the reported usage."""
+        self.mock_requests_post.return_value = self._sse_response(["No ", "table ", "here."], usage={"total_tokens": 7})
+        attempt_log = []
+        result = llm_prompter.post_chat_completion("List A\nAda (1815)\n", "m", "k", "http://mock", "ref", 10, "001",
+                                                   attempt_log=attempt_log, stream=True)
+        self.assertEqual(result["choices"][0]["message"]["content"], "No table here.")
+        self.assertEqual(result["choices"][0]["finish_reason"], "stop")
+        self.assertEqual(result["usage"], {"total_tokens": 7})
+        self.assertFalse(attempt_log[0]["terminated_early"])
+        self.assertIsNone(attempt_log[0]["time_to_matrix"])
+
 
 class TestLLMPrompterInteractive(unittest.TestCase):
     """Test suite for llm_prompter.py's standalone interactive mode."""
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_llm_response_cache.py
+
+"""
+Unit Tests for the LLM Response Cache (llm_response_cache.py).
+
+These tests validate key derivation, the temperature-0 restriction, artifact
+restoration for cache hits, storage of new responses, and LRU eviction.
+"""
+
+import unittest
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from src import llm_response_cache
+
+
+SETTINGS = {"model_name": "test/model", "temperature": 0.0, "max_tokens": 50,
+            "api_endpoint": "http://mock.local/v1/chat/completions"}
+
+
+def _response(content):
+    return {"choices": [{"message": {"content": content}}]}
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """Test suite for the LLMResponseCache class and Stage 2 helpers."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory(prefix="response_cache_test_")
+        self.cache = llm_response_cache.LLMResponseCache(os.path.join(self.test_dir.name, "cache"))
+        self.queries_dir = Path(self.test_dir.name) / "session_queries"
+        self.responses_dir = Path(self.test_dir.name) / "session_responses"
+        self.queries_dir.mkdir()
+        self.responses_dir.mkdir()
+        for i in (1, 2):
+            (self.queries_dir / f"llm_query_{i:03d}.txt").write_text(f"Query {i}", encoding='utf-8')
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_key_depends_on_every_setting_and_query(self):
+        """Verify any change in settings or query text yields a different key."""
+        base = self.cache.key_for(SETTINGS, "Query")
+        self.assertEqual(base, self.cache.key_for(dict(SETTINGS), "Query"))
+        self.assertNotEqual(base, self.cache.key_for(SETTINGS, "Query "))
+        for field, value in [("model_name", "other/model"), ("max_tokens", 51), ("api_endpoint", "http://other")]:
+            self.assertNotEqual(base, self.cache.key_for({**SETTINGS, field: value}, "Query"))
+
+    def test_only_temperature_zero_is_cacheable(self):
+        """Verify non-deterministic runs never use the cache."""
+        self.assertTrue(llm_response_cache.is_cacheable(SETTINGS))
+        self.assertFalse(llm_response_cache.is_cacheable({**SETTINGS, "temperature": 0.7}))
+        self.assertFalse(llm_response_cache.is_cacheable({**SETTINGS, "temperature": None}))
+
+    def test_round_trip_fills_artifacts_on_hit(self):
+        """Verify a stored response is restored as the usual response and JSON artifacts."""
+        hits, misses = llm_response_cache.fill_from_cache(self.cache, SETTINGS, [1, 2], str(self.queries_dir), str(self.responses_dir))
+        self.assertEqual(hits, [])
+        self.assertEqual(sorted(misses), [1, 2])
+
+        # Simulate the worker writing query 1's response, then store it.
+        (self.responses_dir / "llm_response_001_full.json").write_text(json.dumps(_response("Answer 1")), encoding='utf-8')
+        self.assertEqual(llm_response_cache.store_responses(self.cache, misses, str(self.responses_dir), [1]), 1)
+
+        for f in self.responses_dir.iterdir():
+            f.unlink()
+        hits, misses = llm_response_cache.fill_from_cache(self.cache, SETTINGS, [1, 2], str(self.queries_dir), str(self.responses_dir))
+        self.assertEqual(hits, [1])
+        self.assertEqual(list(misses), [2])
+        self.assertEqual((self.responses_dir / "llm_response_001.txt").read_text(encoding='utf-8'), "Answer 1")
+        restored = json.loads((self.responses_dir / "llm_response_001_full.json").read_text(encoding='utf-8'))
+        self.assertEqual(restored, _response("Answer 1"))
+
+    def test_early_stopped_responses_are_not_stored(self):
+        """Verify truncated streamed responses never enter the cache."""
+        _, misses = llm_response_cache.fill_from_cache(self.cache, SETTINGS, [1, 2], str(self.queries_dir), str(self.responses_dir))
+        truncated = {"choices": [{"message": {"content": "Matrix"}, "finish_reason": "early_stop"}],
+                     "stream_stats": {"terminated_early": True}}
+        (self.responses_dir / "llm_response_001_full.json").write_text(json.dumps(truncated), encoding='utf-8')
+        streamed = {"choices": [{"message": {"content": "Full"}, "finish_reason": "stop"}],
+                    "stream_stats": {"terminated_early": False}}
+        (self.responses_dir / "llm_response_002_full.json").write_text(json.dumps(streamed), encoding='utf-8')
+
+        self.assertEqual(llm_response_cache.store_responses(self.cache, misses, str(self.responses_dir), [1, 2]), 1)
+        self.assertIsNone(self.cache.get(misses[1]))
+        self.assertEqual(self.cache.get(misses[2]), streamed)
+
+    def test_corrupt_entry_is_treated_as_miss(self):
+        """Verify an unreadable cache entry does not break Stage 2."""
+        key = self.cache.key_for(SETTINGS, "Query 1")
+        self.cache.put(key, _response("ok"))
+        Path(self.cache._entry_path(key)).write_text("{not json", encoding='utf-8')
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(self.cache.get(key))
+
+    def test_eviction_removes_least_recently_used(self):
+        """Verify the size limit evicts the entries that were used least recently."""
+        payload = _response("x" * 400)
+        entry_size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        self.cache.max_size_bytes = int(entry_size * 3.5)
+
+        keys = [f"{i:064x}" for i in range(3)]
+        for offset, key in enumerate(keys):
+            self.cache.put(key, payload)
+            os.utime(self.cache._entry_path(key), (time.time() - 100 + offset,) * 2)
+        self.cache.get(keys[0])  # Touch the oldest so it becomes most recently used.
+
+        self.cache.put(f"{3:064x}", payload)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertLessEqual(self.cache.stats()["size_bytes"], self.cache.max_size_bytes)
+
+    def test_prune_and_clear(self):
+        """Verify the maintenance operations behind the CLI."""
+        for i in range(4):
+            self.cache.put(f"{i:064x}", _response("y"))
+        removed, freed = self.cache.prune(0)
+        self.assertEqual(removed, 4)
+        self.assertGreater(freed, 0)
+        self.cache.put(f"{9:064x}", _response("y"))
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_llm_response_cache.py ===
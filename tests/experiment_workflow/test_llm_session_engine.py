@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_llm_session_engine.py
+
+"""
+Unit Tests for the In-Process Session Engine (llm_session_engine.py).
+
+These tests validate that the engine produces the same per-trial artifacts as
+the `llm_prompter.py` subprocess worker. The HTTP session is mocked so that no
+network calls are made.
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+
+from src import llm_session_engine
+
+
+class TestAsyncSessionEngine(unittest.TestCase):
+    """Test suite for the AsyncSessionEngine class."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory(prefix="session_engine_test_")
+        self.run_dir = Path(self.test_dir.name) / "run"
+        self.queries_dir = self.run_dir / "session_queries"
+        self.responses_dir = self.run_dir / "session_responses"
+        self.queries_dir.mkdir(parents=True)
+        self.responses_dir.mkdir()
+        for i in (1, 2, 3):
+            (self.queries_dir / f"llm_query_{i:03d}.txt").write_text(f"Query {i}", encoding='utf-8')
+        (self.run_dir / "config.ini.archived").write_text(
+            "[LLM]\nmodel_name = test/model\nmax_tokens = 50\ntemperature = 0.0\n"
+            "[API]\napi_endpoint = http://mock.local/v1/chat/completions\napi_timeout_seconds = 5\n",
+            encoding='utf-8'
+        )
+
+        self.getenv_patcher = patch('src.llm_session_engine.os.getenv', return_value='fake-key')
+        self.getenv_patcher.start()
+        self.session_patcher = patch('src.llm_session_engine.create_http_session')
+        self.mock_create_session = self.session_patcher.start()
+        self.mock_session = MagicMock()
+        self.mock_create_session.return_value = self.mock_session
+
+    def tearDown(self):
+        self.getenv_patcher.stop()
+        self.session_patcher.stop()
+        self.test_dir.cleanup()
+
+    def _make_response(self, content):
+        response = MagicMock()
+        response.raise_for_status.return_value = None
+        response.json.return_value = {"choices": [{"message": {"content": content}}]}
+        return response
+
+    def test_run_writes_same_artifacts_as_worker(self):
+        """Verify each trial yields a response text file and a full JSON file."""
+        self.mock_session.post.side_effect = lambda url, **kw: self._make_response(kw['json']['messages'][0]['content'])
+
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=2)
+        results = sorted(engine.run([1, 2, 3]))
+
+        self.assertEqual([r[0] for r in results], [1, 2, 3])
+        self.assertTrue(all(r[1] for r in results))
+        for i in (1, 2, 3):
+            self.assertEqual((self.responses_dir / f"llm_response_{i:03d}.txt").read_text(encoding='utf-8'), f"Query {i}")
+            full_json = json.loads((self.responses_dir / f"llm_response_{i:03d}_full.json").read_text(encoding='utf-8'))
+            self.assertEqual(full_json['choices'][0]['message']['content'], f"Query {i}")
+
+        # All calls must go through the single pooled session with the archived settings.
+        self.mock_create_session.assert_called_once_with(2)
+        _, kwargs = self.mock_session.post.call_args
+        self.assertEqual(kwargs['json']['model'], 'test/model')
+        self.assertEqual(kwargs['timeout'], 5)
+        self.assertEqual(self.mock_session.post.call_args.args[0], 'http://mock.local/v1/chat/completions')
+
+    def test_http_error_writes_error_file(self):
+        """Verify an HTTP error produces the worker's error-file message."""
+        self.mock_session.post.side_effect = requests.exceptions.HTTPError("500 Server Error")
+
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=1)
+        index, success, details, _ = next(iter(engine.run([2])))
+
+        self.assertEqual(index, 2)
+        self.assertFalse(success)
+        self.assertIn("HTTP error", details)
+        error_text = (self.responses_dir / "llm_response_002.error.txt").read_text(encoding='utf-8')
+        self.assertEqual(error_text, "API call failed with HTTP error for query 002. Details: 500 Server Error")
+        self.assertFalse((self.responses_dir / "llm_response_002.txt").exists())
+
+    def test_missing_query_file_is_reported(self):
+        """Verify a missing query file is recorded as a failed trial."""
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=1)
+        _, success, _, _ = list(engine.run([9]))[0]
+
+        self.assertFalse(success)
+        self.assertIn("Input query file not found", (self.responses_dir / "llm_response_009.error.txt").read_text(encoding='utf-8'))
+
+    def test_concurrency_is_bounded(self):
+        """Verify no more than max_workers calls are in flight at once."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_post(url, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            threading.Event().wait(0.05)
+            with lock:
+                state["active"] -= 1
+            return self._make_response("ok")
+
+        self.mock_session.post.side_effect = slow_post
+        for i in range(4, 9):
+            (self.queries_dir / f"llm_query_{i:03d}.txt").write_text("q", encoding='utf-8')
+
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=2)
+        results = list(engine.run(range(1, 9)))
+
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(state["peak"], 2)
+
+    def test_closing_generator_stops_pending_trials(self):
+        """Verify closing the results generator early skips trials not yet started."""
+        def slow_post(url, **kwargs):
+            threading.Event().wait(0.1)
+            return self._make_response("ok")
+        self.mock_session.post.side_effect = slow_post
+
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=1)
+        results = engine.run([1, 2, 3])
+        next(results)
+        results.close()
+
+        self.assertLess(self.mock_session.post.call_count, 3)
+
+    def test_failing_hook_fails_only_its_trial(self):
+        """Verify a trial whose on_report hook raises is reported as failed and the others still complete."""
+        self.mock_session.post.side_effect = lambda url, **kwargs: self._make_response("ok")
+
+        def on_report(index, report):
+            if index == 2:
+                raise RuntimeError("hook failed")
+
+        engine = llm_session_engine.AsyncSessionEngine(str(self.run_dir), str(self.responses_dir), max_workers=1)
+        results = {r[0]: r for r in engine.run([1, 2, 3], on_report=on_report)}
+
+        self.assertEqual(sorted(results), [1, 2, 3])
+        self.assertTrue(results[1][1] and results[3][1])
+        self.assertFalse(results[2][1])
+        self.assertIn("hook failed", results[2][2])
+
+
+# A stand-in for `llm_prompter.py --serve`: echoes each job back as a tagged
+# result, fails query 002, and hangs forever on query 003.
+FAKE_SERVER_SCRIPT = r'''
+import json, sys, time
+for line in sys.stdin:
+    job = json.loads(line)
+    qid = job["query_identifier"]
+    if qid == "003":
+        time.sleep(60)
+    if qid != "002":
+        open(job["output_response_file"], "w").write("served " + qid)
+    result = {"query_identifier": qid, "success": qid != "002", "error": None if qid != "002" else "boom", "duration": 0.0}
+    print("log line that must be ignored", flush=True)
+    print("<<<JOB_RESULT:" + json.dumps(result) + ">>>", flush=True)
+'''
+
+
+class TestPrompterWorkerPool(unittest.TestCase):
+    """Test suite for the persistent PrompterWorkerPool."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory(prefix="worker_pool_test_")
+        self.run_dir = Path(self.test_dir.name) / "run"
+        self.responses_dir = self.run_dir / "session_responses"
+        self.responses_dir.mkdir(parents=True)
+        self.server_script = Path(self.test_dir.name) / "fake_server.py"
+        self.server_script.write_text(FAKE_SERVER_SCRIPT, encoding='utf-8')
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_pool_reuses_workers_across_jobs(self):
+        """Verify a small pool serves many trials and reports per-trial outcomes."""
+        with llm_session_engine.PrompterWorkerPool(str(self.server_script), self.test_dir.name, size=2) as pool:
+            spawned_pids = {s.process.pid for s in pool._servers}
+            results = sorted(pool.run(str(self.run_dir), str(self.responses_dir), [1, 2, 4, 5, 6]))
+            self.assertEqual({s.process.pid for s in pool._servers}, spawned_pids)
+
+        self.assertEqual([r[0] for r in results], [1, 2, 4, 5, 6])
+        self.assertEqual([r[1] for r in results], [True, False, True, True, True])
+        self.assertIn("boom", results[1][2])
+        self.assertEqual((self.responses_dir / "llm_response_005.txt").read_text(), "served 005")
+
+    def test_hung_worker_is_replaced(self):
+        """Verify a worker that exceeds the job timeout is killed and replaced."""
+        with llm_session_engine.PrompterWorkerPool(str(self.server_script), self.test_dir.name, size=1, job_timeout=1) as pool:
+            hung = pool.run_query(3, str(self.run_dir), str(self.responses_dir))
+            after = pool.run_query(1, str(self.run_dir), str(self.responses_dir))
+
+        self.assertFalse(hung[1])
+        self.assertIn("timed out", hung[2])
+        self.assertTrue(after[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_llm_session_engine.py ===
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_mock_llm_server.py
+
+"""
+Unit Tests for the Local OpenRouter-Compatible Mock Server (mock_llm_server.py).
+
+Each test starts a real server on an ephemeral port and talks to it through
+`requests` or the prompter's own call layer.
+"""
+
+import unittest
+import requests
+
+from src import llm_prompter
+from src.mock_llm_server import MockLLMServer, MockServerProfile, build_mock_answer
+from src.process_llm_responses import parse_llm_response_table_to_matrix
+
+NAMES = ["Ada Lovelace (1815)", "Alan Turing (1912)", "Grace Hopper (1906)"]
+QUERY = "Match the people to the descriptions.\n\nList A\n" + "\n".join(NAMES) + "\n\nList B\nID 1: a\nID 2: b\nID 3: c\n"
+
+
+def _post(endpoint, **payload):
+    body = {"model": "mock/model", "messages": [{"role": "user", "content": QUERY}]}
+    body.update(payload)
+    return requests.post(endpoint, json=body, timeout=5)
+
+
+class TestMockLLMServer(unittest.TestCase):
+    """Test suite for the mock chat-completions server."""
+
+    def test_answers_with_parseable_deterministic_score_table(self):
+        """Verify the answer contains a valid k x k block and repeats for the same query."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, seed=7)) as server:
+            first = _post(server.endpoint).json()
+            second = _post(server.endpoint).json()
+        content = first["choices"][0]["message"]["content"]
+        self.assertEqual(content, second["choices"][0]["message"]["content"])
+        self.assertGreater(first["usage"]["total_tokens"], 0)
+        matrix, warnings, rejected = parse_llm_response_table_to_matrix(content, 3, NAMES)
+        self.assertFalse(rejected)
+        self.assertEqual(matrix.shape, (3, 3))
+
+    def test_injects_rate_limits_and_server_errors(self):
+        """Verify 429 responses carry Retry-After and the counters track each outcome."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, rate_429=1.0, retry_after=3)) as server:
+            response = _post(server.endpoint)
+            stats = requests.get(server.endpoint.replace("chat/completions", "stats"), timeout=5).json()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["requests"], 1)
+
+        with MockLLMServer(MockServerProfile(latency_median=0.0, rate_500=1.0)) as server:
+            self.assertEqual(_post(server.endpoint).status_code, 500)
+
+    def test_seeded_outcome_sequence_is_reproducible(self):
+        """Verify the same seed yields the same sequence of injected outcomes."""
+        profile = dict(latency_median=0.0, rate_429=0.3, rate_500=0.3, seed=42)
+        sequences = []
+        for _ in range(2):
+            server = MockLLMServer(MockServerProfile(**profile))
+            sequences.append([server.draw()[0] for _ in range(20)])
+        self.assertEqual(sequences[0], sequences[1])
+        self.assertGreater(len(set(sequences[0])), 1)
+
+    def test_timeouts_and_truncated_bodies_fail_on_the_client(self):
+        """Verify hanging requests time out and truncated bodies raise a connection error."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0, rate_timeout=1.0)) as server:
+            with self.assertRaises(requests.exceptions.Timeout):
+                requests.post(server.endpoint, json={"messages": [{"role": "user", "content": QUERY}]}, timeout=0.3)
+        with MockLLMServer(MockServerProfile(latency_median=0.0, rate_truncated=1.0)) as server:
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                _post(server.endpoint)
+
+    def test_streamed_answer_works_with_prompter_early_termination(self):
+        """Verify the SSE stream is consumed by the prompter and cut after the matrix."""
+        profile = MockServerProfile(latency_median=0.0, stream_chunk_chars=8, trailer_chars=2000)
+        with MockLLMServer(profile) as server:
+            attempts = []
+            result = llm_prompter.post_chat_completion(QUERY, "mock/model", "key", server.endpoint, "ref", 5, "001",
+                                                       attempt_log=attempts, stream=True, stream_trailer_chars=20)
+        content = result["choices"][0]["message"]["content"]
+        full = build_mock_answer(QUERY, 2000)
+        self.assertTrue(full.startswith(content))
+        self.assertLess(len(content), len(full))
+        self.assertTrue(attempts[0]["terminated_early"])
+        matrix, _, rejected = parse_llm_response_table_to_matrix(content, 3, NAMES)
+        self.assertFalse(rejected)
+
+    def test_call_layer_records_status_ttfb_and_bytes(self):
+        """Verify a real HTTP exchange records the status, time to first byte, and bytes in each direction."""
+        with MockLLMServer(MockServerProfile(latency_median=0.0)) as server:
+            attempts = []
+            llm_prompter.post_chat_completion(QUERY, "mock/model", "key", server.endpoint, "ref", 5, "001",
+                                              attempt_log=attempts)
+        self.assertEqual(attempts[0]["status"], 200)
+        self.assertGreaterEqual(attempts[0]["ttfb"], 0.0)
+        self.assertGreater(attempts[0]["bytes_sent"], len(QUERY))
+        self.assertGreater(attempts[0]["bytes_received"], 0)
+
+    def test_prompt_caching_reports_cached_prefix_tokens(self):
+        """Verify a repeated cache-marked prefix is reported as cached tokens and the answer is unchanged."""
+        other_query = QUERY.replace("ID 1: a", "ID 1: z")
+        with MockLLMServer(MockServerProfile(latency_median=0.0, seed=7)) as server:
+            first = llm_prompter.post_chat_completion(QUERY, "mock/model", "key", server.endpoint, "ref", 5, "001",
+                                                      prompt_caching=True)
+            second = llm_prompter.post_chat_completion(other_query, "mock/model", "key", server.endpoint, "ref", 5,
+                                                       "002", prompt_caching=True)
+            plain = _post(server.endpoint).json()
+        self.assertEqual(first["usage"]["prompt_tokens_details"]["cached_tokens"], 0)
+        self.assertGreater(second["usage"]["prompt_tokens_details"]["cached_tokens"], 0)
+        self.assertNotIn("prompt_tokens_details", plain["usage"])
+        self.assertEqual(first["choices"][0]["message"]["content"], plain["choices"][0]["message"]["content"])
+
+    def test_rejects_invalid_profile(self):
+        """Verify failure rates above 100% are rejected."""
+        with self.assertRaises(ValueError):
+            MockServerProfile(rate_429=0.6, rate_500=0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_mock_llm_server.py ===
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_personalities_cache.py
+
+"""
+Unit Tests for the Compiled Personalities Cache (personalities_cache.py).
+
+The cache is compiled from the DataFrame produced by Stage 1's own loader
+(`build_llm_queries.load_all_personalities_df`), so the tests check that a
+reload is indistinguishable from a fresh parse and that content changes
+invalidate the cache.
+"""
+
+import logging
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from src import personalities_cache
+from src.build_llm_queries import load_all_personalities_df
+
+HEADER = "Index\tidADB\tName\tBirthYear\tDescriptionText\tNotes\n"
+ROWS = [
+    "1\t101\tAda Lovelace\t1815\tAnalytical, curious — and tireless.\tfirst\n",
+    "2\t102\tBad Row\tunknown\tNo usable birth year.\t\n",
+    "3\t103\tZoë Ñandú\t480 BC\tWrites in \"quotes\" and ünïcödé.\t\n",
+    "4\t104\tGrace Hopper\t1906\tPragmatic.\tlast\n",
+]
+
+
+class TestPersonalitiesCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.test_dir.name, "personalities_db.txt")
+        self.write_source(ROWS)
+        self.loads = 0
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def write_source(self, rows):
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write(HEADER + "".join(rows))
+
+    def loader(self, path):
+        self.loads += 1
+        return load_all_personalities_df(path)
+
+    def test_reload_matches_fresh_parse(self):
+        """Verify the cached frame has the same columns, dtypes, index, values, and header as a parse."""
+        expected_df, expected_header = load_all_personalities_df(self.source)
+        self.assertTrue(personalities_cache.write_cache(self.source, expected_df, expected_header))
+
+        df, header = personalities_cache.read_cache(self.source)
+        pd.testing.assert_frame_equal(df, expected_df)
+        self.assertEqual(header, expected_header)
+        self.assertEqual(list(df.index), [0, 2, 3])
+        self.assertTrue(pd.isna(df.loc[2, 'Notes']))
+
+    def test_load_with_cache_parses_only_once(self):
+        """Verify the source is parsed on the first load and served from the cache afterwards."""
+        first, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        second, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(os.path.isdir(personalities_cache.cache_dir_for(self.source)))
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_changed_content_rebuilds_cache(self):
+        """Verify editing the database invalidates the cache."""
+        personalities_cache.load_with_cache(self.source, self.loader)
+        self.write_source(ROWS[:1] + ["4\t104\tGrace Hopper\t1906\tEdited.\tlast\n"])
+
+        df, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(df['DescriptionText'].tolist(), ["Analytical, curious — and tireless.", "Edited."])
+        self.assertIsNotNone(personalities_cache.read_cache(self.source))
+
+    def test_touched_source_with_same_content_keeps_cache(self):
+        """Verify a new modification time alone does not force a rebuild."""
+        personalities_cache.load_with_cache(self.source, self.loader)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+        personalities_cache.load_with_cache(self.source, self.loader)
+        self.assertEqual(self.loads, 1)
+
+    def test_corrupt_cache_falls_back_to_source(self):
+        """Verify a damaged cache is ignored with a warning and the source is parsed instead."""
+        expected_df, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        cache_dir = personalities_cache.cache_dir_for(self.source)
+        os.remove(next(os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".offsets.npy")))
+
+        with self.assertLogs(level=logging.WARNING):
+            df, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        self.assertEqual(self.loads, 2)
+        pd.testing.assert_frame_equal(df, expected_df)
+
+    def test_write_failure_is_not_fatal(self):
+        """Verify the parsed frame is still returned when the cache cannot be written."""
+        with patch('src.personalities_cache.os.replace', side_effect=OSError("read-only")), \
+                self.assertLogs(level=logging.WARNING):
+            df, _ = personalities_cache.load_with_cache(self.source, self.loader)
+        self.assertEqual(len(df), 3)
+        self.assertFalse(os.path.exists(personalities_cache.cache_dir_for(self.source)))
+        self.assertEqual([name for name in os.listdir(self.test_dir.name)], ["personalities_db.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_personalities_cache.py ===
@@ -39,9 +39,12 @@ import numpy as np
 import io
 import builtins
 import re
+import random
 
 # Import the module to test
 from src import process_llm_responses
+import query_bundle
+import score_store
 
 class TestProcessLLMResponses(unittest.TestCase):
     """Test suite for process_llm_responses.py."""
@@ -153,6 +156,146 @@ class TestProcessLLMResponses(unittest.TestCase):
         
         self.mock_sys_exit.assert_not_called()
 
+    def test_happy_path_with_query_bundle(self):
+        """Verify queries and manifests are read from a query bundle when the run has no per-trial files."""
+        self._setup_common_files(k=2)
+        query_path, manifest_path = self.queries_dir / "llm_query_001.txt", self.queries_dir / "llm_query_001_manifest.txt"
+        query_bundle.append_trial(str(self.queries_dir), 1, query_path.read_text(), manifest_path.read_text(), "1\t2")
+        query_path.unlink()
+        manifest_path.unlink()
+        (self.responses_dir / "llm_response_001.txt").write_text(
+            "Name\tID 1\tID 2\nPerson A (1900)\t0.9\t0.1\nPerson B (1910)\t0.2\t0.8\n")
+
+        with patch.object(sys, 'argv', ['process_llm_responses.py', '--run_output_dir', str(self.run_dir)]):
+            process_llm_responses.main()
+
+        self.assertEqual((self.analysis_dir / "all_scores.txt").read_text().split(), ["0.90", "0.10", "0.20", "0.80"])
+        self.assertEqual((self.analysis_dir / "all_mappings.txt").read_text().splitlines()[1:], ["1\t2"])
+
+    def _setup_trials(self, scores_by_index):
+        """Helper to create k=2 query, manifest, and response files for several trials."""
+        for index, scores in scores_by_index.items():
+            (self.queries_dir / f"llm_query_{index:03d}.txt").write_text(
+                "LIST A\nPerson A (1900)\nPerson B (1910)\n\nLIST B\nDesc 1\nDesc 2")
+            (self.queries_dir / f"llm_query_{index:03d}_manifest.txt").write_text(
+                "Shuffled_Name\tShuffled_Desc_Text\tShuffled_Desc_Index\n"
+                "Person A (1900)\tDesc_1\t1\nPerson B (1910)\tDesc_2\t2\n")
+            response = "No table here." if scores is None else (
+                f"Name\tID 1\tID 2\nPerson A (1900)\t{scores[0]}\t{scores[1]}\nPerson B (1910)\t{scores[2]}\t{scores[3]}\n")
+            (self.responses_dir / f"llm_response_{index:03d}.txt").write_text(response)
+        (self.queries_dir / "mappings.txt").write_text("Map_idx1\tMap_idx2\n" + "1\t2\n" * len(scores_by_index))
+
+    def test_parallel_parsing_matches_sequential(self):
+        """Verify pool workers return the same outcomes as in-process parsing, in task order."""
+        self._setup_trials({1: (0.9, 0.1, 0.2, 0.8), 2: None, 3: (0.3, 0.7, 0.6, 0.4), 4: (0.5, 0.5, 0.1, 0.9)})
+        tasks = [(str(path), str(self.queries_dir), False, True)
+                 for path in sorted(self.responses_dir.glob("llm_response_*.txt"))]
+
+        sequential = list(process_llm_responses.iter_response_outcomes(tasks, 1, 30))
+        parallel = list(process_llm_responses.iter_response_outcomes(tasks, 2, 30))
+
+        self.assertEqual([outcome[0] for outcome in parallel], [1, 2, 3, 4])
+        self.assertEqual([outcome[2:] for outcome in parallel], [outcome[2:] for outcome in sequential])
+        self.assertIsNone(parallel[1][1])
+        for (_, expected, _, _), (_, actual, _, _) in zip(sequential, parallel):
+            if expected is not None:
+                np.testing.assert_array_equal(actual, expected)
+
+    def test_main_with_workers_writes_scores_in_index_order(self):
+        """Verify a pooled run writes all_scores.txt and successful_indices.txt in trial-index order."""
+        self._setup_trials({1: (0.9, 0.1, 0.2, 0.8), 2: (0.3, 0.7, 0.6, 0.4), 3: None, 4: (0.5, 0.5, 0.1, 0.9)})
+        test_argv = ['process_llm_responses.py', '--run_output_dir', str(self.run_dir), '--workers', '2']
+
+        with patch.object(process_llm_responses, 'PARALLEL_PARSE_MIN_RESPONSES', 1), \
+             patch.object(sys, 'argv', test_argv):
+            process_llm_responses.main()
+
+        self.assertEqual((self.analysis_dir / "all_scores.txt").read_text().split(),
+                         ["0.90", "0.10", "0.20", "0.80", "0.30", "0.70", "0.60", "0.40", "0.50", "0.50", "0.10", "0.90"])
+        self.assertEqual((self.analysis_dir / "successful_indices.txt").read_text().split(), ["1", "2", "4"])
+        self.mock_sys_exit.assert_not_called()
+
+    def test_writes_binary_score_store_matching_text_files(self):
+        """Verify the score store mirrors all_scores.txt, all_mappings.txt, and the indices, and a rerun without it removes it."""
+        self._setup_trials({1: (0.9, 0.1, 0.2, 0.8), 2: None, 3: (0.33, 0.67, 0.6, 0.4)})
+        self.mock_config.read_dict({'Analysis': {'score_tensor_store': 'true'}})
+        test_argv = ['process_llm_responses.py', '--run_output_dir', str(self.run_dir)]
+        with patch.object(sys, 'argv', test_argv):
+            process_llm_responses.main()
+
+        store = score_store.load_store(str(self.analysis_dir))
+        self.assertIsNotNone(store)
+        text_values = [float(x) for x in (self.analysis_dir / "all_scores.txt").read_text().split()]
+        np.testing.assert_array_equal(store.scores.ravel(), text_values)
+        self.assertEqual(store.mappings.tolist(), [[1, 2], [1, 2]])
+        self.assertEqual(store.indices.tolist(), [1, 3])
+
+        self.mock_config.remove_section('Analysis')
+        with patch.object(sys, 'argv', test_argv):
+            process_llm_responses.main()
+        self.assertFalse(os.path.exists(score_store.store_path(str(self.analysis_dir))))
+
+    def _run_main_counting_parses(self, *extra_args):
+        """Runs main() and returns the response filenames that were actually parsed."""
+        test_argv = ['process_llm_responses.py', '--run_output_dir', str(self.run_dir), *extra_args]
+        with patch.object(process_llm_responses, 'process_response_file',
+                          wraps=process_llm_responses.process_response_file) as mock_parse, \
+             patch.object(sys, 'argv', test_argv):
+            process_llm_responses.main()
+        return [os.path.basename(call.args[0]) for call in mock_parse.call_args_list]
+
+    def test_incremental_run_parses_only_new_or_changed_responses(self):
+        """Verify a rerun re-parses only the repaired response and rebuilds outputs identical to a full parse."""
+        self._setup_trials({1: (0.9, 0.1, 0.2, 0.8), 2: None, 3: (0.3, 0.7, 0.6, 0.4)})
+        self.mock_config.read_dict({'Analysis': {'incremental_parsing': 'true'}})
+        self.assertEqual(len(self._run_main_counting_parses()), 3)
+
+        # A repair re-queries the rejected trial 2.
+        (self.responses_dir / "llm_response_002.txt").write_text(
+            "Name\tID 1\tID 2\nPerson A (1900)\t0.5\t0.5\nPerson B (1910)\t0.1\t0.9\n")
+        self.assertEqual(self._run_main_counting_parses(), ["llm_response_002.txt"])
+        incremental_scores = (self.analysis_dir / "all_scores.txt").read_text()
+        incremental_indices = (self.analysis_dir / "successful_indices.txt").read_text()
+
+        self.assertEqual(len(self._run_main_counting_parses('--full_reparse')), 3)
+        self.assertEqual((self.analysis_dir / "all_scores.txt").read_text(), incremental_scores)
+        self.assertEqual(incremental_indices.split(), ["1", "2", "3"])
+        self.mock_sys_exit.assert_not_called()
+
+    def test_incremental_run_checks_content_hash_and_query(self):
+        """Verify a touched but identical response is reused, while a changed query forces a re-parse."""
+        self._setup_trials({1: (0.9, 0.1, 0.2, 0.8), 2: (0.3, 0.7, 0.6, 0.4)})
+        self.mock_config.read_dict({'Analysis': {'incremental_parsing': 'true'}})
+        self._run_main_counting_parses()
+
+        response_path = self.responses_dir / "llm_response_001.txt"
+        stat = response_path.stat()
+        os.utime(response_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+        self.assertEqual(self._run_main_counting_parses(), [])
+
+        query_path = self.queries_dir / "llm_query_002.txt"
+        query_path.write_text(query_path.read_text() + "\n")
+        self.assertEqual(self._run_main_counting_parses(), ["llm_response_002.txt"])
+
+    def test_verify_scores_file_detects_changed_file_and_lossy_format(self):
+        """Verify the post-write check fails on a modified file and on a format that loses precision."""
+        matrices = [np.array([[0.9, 0.1], [0.2, 0.8]]), np.array([[0.25, 0.75], [0.5, 0.5]])]
+        scores_file = Path(self.project_root) / "all_scores.txt"
+
+        text = process_llm_responses.format_score_matrices(matrices, ".2f")
+        with open(scores_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.assertTrue(process_llm_responses.verify_scores_file(str(scores_file), text, matrices))
+
+        with open(scores_file, 'a', encoding='utf-8') as f:
+            f.write("0.00\n")
+        self.assertFalse(process_llm_responses.verify_scores_file(str(scores_file), text, matrices))
+
+        lossy_text = process_llm_responses.format_score_matrices(matrices, ".1f")
+        with open(scores_file, 'w', encoding='utf-8') as f:
+            f.write(lossy_text)
+        self.assertFalse(process_llm_responses.verify_scores_file(str(scores_file), lossy_text, matrices))
+
     def test_happy_path_fallback_no_markdown(self):
         """Verify correct parsing of a response without a markdown fence."""
         # --- Arrange ---
@@ -296,7 +439,7 @@ class TestProcessLLMResponses(unittest.TestCase):
         test_argv = ['script.py', '--run_output_dir', str(self.run_dir)]
         
         # Patch the validation function to simulate a failure
-        with patch('src.process_llm_responses.validate_all_scores_file_content', return_value=False):
+        with patch('src.process_llm_responses.verify_scores_file', return_value=False):
             with self.assertRaises(SystemExit):
                 with patch.object(sys, 'argv', test_argv):
                     process_llm_responses.main()
@@ -563,17 +706,21 @@ class TestProcessLLMResponses(unittest.TestCase):
         (self.responses_dir / "llm_response_001.txt").write_text("valid response")
         (self.queries_dir / "llm_query_001.txt").write_text("LIST A\n\nLIST B\nDesc 1\n")
 
-        with patch.object(sys, 'argv', ['script.py', '--run_output_dir', str(self.run_dir)]):
-            process_llm_responses.main()
+        with patch('sys.stdout', new_callable=io.StringIO) as mock_stdout:
+            with patch.object(sys, 'argv', ['script.py', '--run_output_dir', str(self.run_dir)]):
+                process_llm_responses.main()
         self.assertEqual((self.analysis_dir / "all_scores.txt").read_text(), "")
+        self.assertIn("Errors/Skipped: 1", mock_stdout.getvalue())
 
     def test_skips_response_file_with_invalid_name(self):
         """Verify a response file is skipped if its name doesn't contain an index."""
         self._setup_common_files()
         (self.responses_dir / "llm_response_noname.txt").write_text("valid response")
-        with patch.object(sys, 'argv', ['script.py', '--run_output_dir', str(self.run_dir)]):
-            process_llm_responses.main()
+        with patch('sys.stdout', new_callable=io.StringIO) as mock_stdout:
+            with patch.object(sys, 'argv', ['script.py', '--run_output_dir', str(self.run_dir)]):
+                process_llm_responses.main()
         self.assertEqual((self.analysis_dir / "all_scores.txt").read_text(), "")
+        self.assertIn("Errors/Skipped: 0", mock_stdout.getvalue())
 
     def test_info_log_level_is_set(self):
         """Verify -v or default sets log level to INFO."""
@@ -831,6 +978,53 @@ class TestProcessLLMResponses(unittest.TestCase):
         result = process_llm_responses.validate_all_scores_file_content(str(scores_file), expected_map, k_value=2)
         self.assertFalse(result)
 
+def windowed_find_score_block(all_lines, k_value):
+    """The former window-by-window scan, kept as the reference for the single-pass parser."""
+    for start_idx in range(len(all_lines) - k_value + 1):
+        valid_rows = []
+        for line in all_lines[start_idx:start_idx + k_value]:
+            parts = re.sub(r'\t*\|\t*', ' ', line).replace('\t', ' ').split()
+            if len(parts) < k_value:
+                break
+            try:
+                valid_rows.append([float(part) for part in parts[-k_value:]])
+            except ValueError:
+                break
+        if len(valid_rows) == k_value:
+            return start_idx, valid_rows
+    return None
+
+
+class TestSinglePassScoreBlock(unittest.TestCase):
+    """The single-pass parser must find exactly the blocks the windowed scan found."""
+
+    TOKENS = ["0.5", "1", "0", "-0.2", "1.5", "1e-1", "nan", "inf", "+.3", "1_0", "\uff11",
+              "Name", "(1900)", "ID", "x", "|", "||", "\t", "\t|\t", " ", "\xa0", "0.7|", "--", ""]
+
+    def test_matches_windowed_scan_on_random_responses(self):
+        """Verify identical results on randomized responses mixing numbers, words, pipes, and whitespace."""
+        rng = random.Random(1234)
+        for _ in range(3000):
+            k_value = rng.randint(1, 5)
+            lines = ["".join(rng.choice(self.TOKENS) + rng.choice([" ", "\t", "|", ""])
+                             for _ in range(rng.randint(0, 2 * k_value + 1)))
+                     for _ in range(rng.randint(0, 12))]
+            all_lines = [line.strip() for line in lines if line.strip()]
+            expected = windowed_find_score_block(all_lines, k_value)
+            actual = process_llm_responses.find_score_block(all_lines, k_value)
+            if expected is None:
+                self.assertIsNone(actual, all_lines)
+            else:
+                self.assertIsNotNone(actual, all_lines)
+                self.assertEqual(actual[0], expected[0], all_lines)
+                np.testing.assert_array_equal(np.array(actual[1]), np.array(expected[1]))
+
+    def test_first_complete_run_wins_after_a_broken_run(self):
+        """Verify a run interrupted by a non-numeric line restarts at the next qualifying line."""
+        all_lines = ["Intro", "A\t0.1\t0.2", "B\tn/a\t0.3", "A | 0.4 | 0.6 |", "B | 0.5 | 0.5 |", "C 0.9 0.1"]
+        self.assertEqual(process_llm_responses.find_score_block(all_lines, 2), (3, [[0.4, 0.6], [0.5, 0.5]]))
+
+
 if __name__ == '__main__':
     unittest.main()
 
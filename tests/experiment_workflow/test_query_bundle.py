@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_query_bundle.py
+
+"""
+Unit Tests for the Single-File Query Bundle (query_bundle.py).
+
+Covers appending and reading trial records, and the layout-independent
+readers that serve a trial from its own files or from the bundle.
+"""
+
+import os
+import tempfile
+import unittest
+
+from src import query_bundle
+
+
+class TestQueryBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.queries_dir = self.test_dir.name
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def append(self, index, query="Match 2 people.\n\nList A\nAda (1815)\n", **kwargs):
+        query_bundle.append_trial(self.queries_dir, index, query, "Name_in_Query\tName_Ref_ID\tShuffled_Desc_Index\n",
+                                  "2\t1", **kwargs)
+
+    def test_records_round_trip(self):
+        """Verify every field of an appended trial is read back unchanged."""
+        self.append(1, query="Zoë — line one\nline two\u2028same record\n", qgen_seed=42, personalities=[7, 3])
+        self.append(2)
+
+        bundle = query_bundle.open_bundle(self.queries_dir)
+        self.assertEqual(bundle.indices(), [1, 2])
+        record = bundle.record(1)
+        self.assertEqual(record["query"], "Zoë — line one\nline two\u2028same record\n")
+        self.assertEqual((record["qgen_seed"], record["personalities"], record["mapping"]), (42, [7, 3], "2\t1"))
+        self.assertIsNone(bundle.record(3))
+
+    def test_open_bundle_sees_appended_trials(self):
+        """Verify a cached bundle is re-indexed once the file has grown."""
+        self.append(1)
+        self.assertEqual(query_bundle.open_bundle(self.queries_dir).indices(), [1])
+        self.append(2)
+        self.assertEqual(query_bundle.open_bundle(self.queries_dir).indices(), [1, 2])
+
+    def test_torn_last_line_is_ignored_and_reappended_trial_wins(self):
+        """Verify an interrupted write does not hide earlier trials and a later record supersedes an earlier one."""
+        self.append(1, query="old")
+        self.append(1, query="new")
+        with open(query_bundle.bundle_path(self.queries_dir), 'a', encoding='utf-8') as f:
+            f.write('{"index": 2, "qgen_seed": null, "query": "trunc')
+
+        bundle = query_bundle.open_bundle(self.queries_dir)
+        self.assertEqual(bundle.indices(), [1])
+        self.assertEqual(bundle.record(1)["query"], "new")
+
+    def test_append_after_torn_last_line_starts_a_new_record(self):
+        """Verify a trial appended after an interrupted write is readable and the fragment is dropped."""
+        self.append(1, query="first")
+        with open(query_bundle.bundle_path(self.queries_dir), 'a', encoding='utf-8') as f:
+            f.write('{"index": 2, "qgen_seed": null, "query": "trunc')
+        self.append(2, query="second")
+
+        bundle = query_bundle.open_bundle(self.queries_dir)
+        self.assertEqual(bundle.indices(), [1, 2])
+        self.assertEqual(bundle.record(2)["query"], "second")
+        self.assertEqual(query_bundle.read_query_file(query_bundle.query_file_path(self.queries_dir, 2)), "second")
+        with open(query_bundle.bundle_path(self.queries_dir), 'r', encoding='utf-8') as f:
+            self.assertNotIn("trunc", f.read())
+
+    def test_readers_accept_either_layout(self):
+        """Verify query files take precedence and bundle records fill in the rest."""
+        self.append(1, query="bundled 1")
+        self.append(2, query="bundled 2")
+        with open(query_bundle.query_file_path(self.queries_dir, 2), 'w', encoding='utf-8') as f:
+            f.write("file 2")
+        with open(query_bundle.query_file_path(self.queries_dir, 3), 'w', encoding='utf-8') as f:
+            f.write("file 3")
+
+        self.assertEqual(query_bundle.list_query_indices(self.queries_dir), [1, 2, 3])
+        self.assertEqual(query_bundle.read_query_file(query_bundle.query_file_path(self.queries_dir, 1)), "bundled 1")
+        self.assertEqual(query_bundle.read_query_file(query_bundle.query_file_path(self.queries_dir, 2)), "file 2")
+        self.assertTrue(query_bundle.query_exists(query_bundle.query_file_path(self.queries_dir, 1)))
+        self.assertFalse(query_bundle.query_exists(query_bundle.query_file_path(self.queries_dir, 4)))
+        with self.assertRaises(FileNotFoundError):
+            query_bundle.read_query_file(query_bundle.query_file_path(self.queries_dir, 4))
+        self.assertTrue(query_bundle.read_manifest_text(self.queries_dir, 1).startswith("Name_in_Query"))
+        self.assertIsNone(query_bundle.read_manifest_text(self.queries_dir, 3))
+
+    def test_append_does_not_modify_hard_linked_copies(self):
+        """Verify appending to a bundle shared through hard links leaves the other links unchanged."""
+        self.append(1)
+        shared_dir = os.path.join(self.queries_dir, "shared")
+        os.makedirs(shared_dir)
+        try:
+            os.link(query_bundle.bundle_path(self.queries_dir), query_bundle.bundle_path(shared_dir))
+        except OSError:
+            self.skipTest("hard links are not supported here")
+
+        self.append(2)
+        self.assertEqual(query_bundle.open_bundle(self.queries_dir).indices(), [1, 2])
+        self.assertEqual(query_bundle.open_bundle(shared_dir).indices(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_query_bundle.py ===
@@ -104,6 +104,44 @@ def test_happy_path_correct_mapping(setup_test_environment, monkeypatch):
     assert query_content.count('\n') > 5  # Check it has content beyond the header
 
 
+def test_query_is_shared_prefix_followed_by_trial_lists(setup_test_environment, monkeypatch):
+    """
+    Tests that the query splits at "List A" into the k-specific instructions and the trial's lists.
+    """
+    from llm_prompter import split_query_prefix
+    from query_generator import format_query_prefix
+
+    tmp_path = setup_test_environment
+    run_script(monkeypatch, ["-k", "3", "--seed", "42", "--personalities_file", "personalities_db.txt"])
+
+    query_content = (tmp_path / "output" / "qgen_standalone_output" / "llm_query.txt").read_text(encoding='utf-8')
+    prefix, suffix = split_query_prefix(query_content)
+    assert prefix == format_query_prefix(MOCK_BASE_QUERY_CONTENT, 3) == "Base query for k=3 subjects.\n\n"
+    assert suffix.startswith("List A\n")
+    assert "\nList B\nID 1: " in suffix
+
+
+def test_generate_query_set_matches_standalone_files(setup_test_environment, monkeypatch):
+    """
+    Tests that in-memory generation with random.Random(seed) reproduces the files of a --seed run.
+    """
+    import random
+    from query_generator import MANIFEST_HEADER, format_tab_separated, generate_query_set, load_personalities
+
+    tmp_path = setup_test_environment
+    run_script(monkeypatch, ["-k", "3", "--seed", "7", "--mapping_strategy", "random",
+                             "--personalities_file", "personalities_db.txt"])
+    output_dir = tmp_path / "output" / "qgen_standalone_output"
+
+    rng = random.Random(7)
+    selected = rng.sample(load_personalities(str(tmp_path / "data" / "personalities_db.txt"), 3), 3)
+    trial = generate_query_set(selected, MOCK_BASE_QUERY_CONTENT, 3, "random", rng)
+
+    assert trial["query_text"] == (output_dir / "llm_query.txt").read_text(encoding='utf-8')
+    assert format_tab_separated(MANIFEST_HEADER, trial["manifest_rows"]) == (output_dir / "manifest.txt").read_text(encoding='utf-8')
+    assert "\t".join(map(str, trial["mapping"])) == (output_dir / "mapping.txt").read_text(encoding='utf-8').splitlines()[1]
+
+
 def test_happy_path_random_mapping(setup_test_environment, monkeypatch):
     """
     Tests the script's main functionality with a 'random' mapping strategy.
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_query_set_registry.py
+
+"""
+Unit Tests for the Shared Query-Set Registry (query_set_registry.py).
+
+Query sets are "built" by a stub that writes a few files, so the tests cover
+keying, build-once behaviour, locking, and linking without running Stage 1.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from src.query_set_registry import (QUERY_SET_MANIFEST, QuerySetRegistry, describe_query_set, query_set_key,
+                                    replication_seeds)
+
+
+def fake_config_value(config, section, key, fallback=None, value_type=str, **kwargs):
+    return value_type(config.get(section, {}).get(key, fallback))
+
+
+class TestQuerySetRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.root = self.test_dir.name
+        self.registry = QuerySetRegistry(os.path.join(self.root, "registry"), sleep=lambda s: None)
+        self.builds = []
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def build(self, staging_dir):
+        self.builds.append(staging_dir)
+        queries_dir = os.path.join(staging_dir, "session_queries")
+        os.makedirs(queries_dir)
+        for i in (1, 2):
+            with open(os.path.join(queries_dir, f"llm_query_{i:03d}.txt"), 'w') as f:
+                f.write(f"query {i}")
+
+    def test_key_depends_on_every_parameter(self):
+        """Verify changing any defining parameter yields a different key."""
+        params = {"personalities_sha256": "a", "base_query_sha256": "b", "k": 10, "m": 80,
+                  "mapping_strategy": "correct", "base_seed": 1000, "qgen_base_seed": 1001000}
+        key = query_set_key(params)
+        self.assertEqual(key, query_set_key(dict(reversed(list(params.items())))))
+        for name, value in [("personalities_sha256", "c"), ("k", 7), ("m", 81),
+                            ("mapping_strategy", "random"), ("base_seed", 1080)]:
+            self.assertNotEqual(key, query_set_key({**params, name: value}), name)
+
+    def test_replication_seeds_do_not_overlap(self):
+        """Verify consecutive replications get disjoint per-trial seed ranges."""
+        self.assertEqual(replication_seeds(1000, 1, 80), (1000, 1001000))
+        self.assertEqual(replication_seeds(1000, 2, 80), (1080, 1001080))
+
+    def test_describe_query_set_hashes_inputs(self):
+        """Verify the database and base query enter the parameters by content hash."""
+        os.makedirs(os.path.join(self.root, "data"))
+        for name, text in [("db.txt", "people"), ("base_query.txt", "prompt")]:
+            with open(os.path.join(self.root, "data", name), 'w') as f:
+                f.write(text)
+        config = {"Filenames": {"personalities_src": "db.txt"}, "Experiment": {"mapping_strategy": "random"}}
+        params = describe_query_set(config, self.root, fake_config_value, 80, 10, 1000, 1001000)
+        self.assertEqual(params["mapping_strategy"], "random")
+        with open(os.path.join(self.root, "data", "db.txt"), 'w') as f:
+            f.write("other people")
+        changed = describe_query_set(config, self.root, fake_config_value, 80, 10, 1000, 1001000)
+        self.assertNotEqual(params["personalities_sha256"], changed["personalities_sha256"])
+        self.assertEqual(params["base_query_sha256"], changed["base_query_sha256"])
+
+    def test_set_is_built_once_and_linked_into_each_run(self):
+        """Verify the second request for a set reuses it and both runs receive the files."""
+        _, built = self.registry.ensure("abc", self.build, {"k": 10})
+        _, built_again = self.registry.ensure("abc", self.build, {"k": 10})
+        self.assertEqual((built, built_again, len(self.builds)), (True, False, 1))
+
+        for run in ("run_a", "run_b"):
+            run_dir = os.path.join(self.root, run)
+            self.assertEqual(self.registry.link_into("abc", run_dir), 2)
+            with open(os.path.join(run_dir, "session_queries", "llm_query_002.txt")) as f:
+                self.assertEqual(f.read(), "query 2")
+            with open(os.path.join(run_dir, QUERY_SET_MANIFEST)) as f:
+                self.assertEqual(json.load(f)["key"], "abc")
+        self.assertTrue(os.path.samefile(os.path.join(self.root, "run_a", "session_queries", "llm_query_001.txt"),
+                                         os.path.join(self.root, "run_b", "session_queries", "llm_query_001.txt")))
+        self.assertFalse(any(name.startswith("abc.") for name in os.listdir(self.registry.registry_dir)))
+
+    def test_failed_build_leaves_no_set(self):
+        """Verify a build that raises publishes nothing and releases its lock."""
+        def failing_build(staging_dir):
+            raise RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            self.registry.ensure("abc", failing_build, {})
+        self.assertEqual(os.listdir(self.registry.registry_dir), [])
+        self.registry.ensure("abc", self.build, {})
+        self.assertTrue(self.registry.is_complete("abc"))
+
+    def test_stale_lock_is_taken_over(self):
+        """Verify a lock left behind by a dead builder is removed after the timeout."""
+        registry = QuerySetRegistry(self.registry.registry_dir, lock_timeout_seconds=60.0,
+                                    sleep=lambda s: None, clock=lambda: os.path.getmtime(lock_path) + 120.0)
+        os.makedirs(registry.registry_dir)
+        lock_path = registry.set_dir("abc") + ".lock"
+        open(lock_path, 'w').close()
+        _, built = registry.ensure("abc", self.build, {})
+        self.assertTrue(built)
+        self.assertFalse(os.path.exists(lock_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_query_set_registry.py ===
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_rate_limiter.py
+
+"""
+Unit Tests for the Cross-Process Token-Bucket Rate Limiter (rate_limiter.py).
+
+Independent limiter instances pointing at one state directory stand in for
+separate processes. A fake clock makes bucket refills deterministic.
+"""
+
+import unittest
+import os
+import tempfile
+import threading
+import time
+import configparser
+from unittest.mock import patch, MagicMock
+
+from src import rate_limiter
+from src import llm_prompter
+from src.config_loader import get_config_value
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+    """Test suite for the SharedRateLimiter class."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory(prefix="rate_limiter_test_")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def _limiter(self, rpm=0, tpm=0):
+        return rate_limiter.SharedRateLimiter(self.test_dir.name, rpm, tpm, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_request_bucket_is_shared_between_instances(self):
+        """Verify two 'processes' draw from one requests-per-minute budget."""
+        first, second = self._limiter(rpm=2), self._limiter(rpm=2)
+        self.assertEqual(first.acquire("key", "model"), 0.0)
+        self.assertEqual(second.acquire("key", "model"), 0.0)
+        # The bucket is empty; one request refills every 30 seconds.
+        self.assertAlmostEqual(first.acquire("key", "model"), 30.0, places=3)
+
+    def test_buckets_are_keyed_by_api_key_and_model(self):
+        """Verify different keys or models do not share a budget."""
+        limiter = self._limiter(rpm=1)
+        self.assertEqual(limiter.acquire("key", "model-a"), 0.0)
+        self.assertEqual(limiter.acquire("key", "model-b"), 0.0)
+        self.assertEqual(limiter.acquire("other-key", "model-a"), 0.0)
+        for name in os.listdir(self.test_dir.name):
+            self.assertNotIn("key", name)
+
+    def test_token_bucket_and_settlement(self):
+        """Verify token reservations block until refilled and are corrected by actual usage."""
+        limiter = self._limiter(tpm=1000)
+        self.assertEqual(limiter.acquire("key", "model", 800), 0.0)
+        # Actual usage was only 200 tokens, so 600 are refunded.
+        limiter.settle("key", "model", 800, 200)
+        self.assertEqual(limiter.acquire("key", "model", 800), 0.0)
+        # 0 tokens remain; 600 more need 36 seconds to refill.
+        self.assertAlmostEqual(limiter.acquire("key", "model", 600), 36.0, places=3)
+
+    def test_oversized_request_waits_for_full_bucket_only(self):
+        """Verify a request larger than the per-minute budget cannot deadlock."""
+        limiter = self._limiter(tpm=100)
+        self.assertEqual(limiter.acquire("key", "model", 5000), 0.0)
+        self.assertAlmostEqual(limiter.acquire("key", "model", 5000), 60.0, places=3)
+
+    def test_stale_lock_is_broken(self):
+        """Verify a lock left by a crashed process does not block forever."""
+        limiter = self._limiter(rpm=10)
+        lock_path = limiter._state_path("key", "model") + ".lock"
+        with open(lock_path, 'w') as f:
+            f.write("12345")
+        old = time.time() - rate_limiter.STALE_LOCK_SECONDS - 5
+        os.utime(lock_path, (old, old))
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(limiter.acquire("key", "model"), 0.0)
+        self.assertFalse(os.path.exists(lock_path))
+
+    def test_concurrent_instances_never_overdraw(self):
+        """Verify parallel acquirers through the lock file grant exactly the budget."""
+        limiters = [rate_limiter.SharedRateLimiter(self.test_dir.name, requests_per_minute=5,
+                                                   clock=lambda: 1_000_000.0, sleep=lambda s: None)
+                    for _ in range(4)]
+        granted = []
+        lock = threading.Lock()
+
+        def worker(limiter):
+            # With a frozen clock, only the initial budget of 5 requests is ever available.
+            if limiter.acquire("key", "model") == 0.0:
+                with lock:
+                    granted.append(1)
+
+        threads = [threading.Thread(target=worker, args=(limiters[i % 4],)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(granted), 5)
+        state = limiters[0]._load(limiters[0]._state_path("key", "model"), 1_000_000.0)
+        self.assertAlmostEqual(state["requests"], 0.0)
+
+    def test_create_rate_limiter_from_config(self):
+        """Verify the limiter is only created when enabled with a non-zero budget."""
+        config = configparser.ConfigParser()
+        config.read_dict({'RateLimit': {'enabled': 'false', 'requests_per_minute': '60'}})
+        self.assertIsNone(rate_limiter.create_rate_limiter(config, get_config_value))
+        config.set('RateLimit', 'enabled', 'true')
+        config.set('RateLimit', 'state_dir', self.test_dir.name)
+        limiter = rate_limiter.create_rate_limiter(config, get_config_value)
+        self.assertEqual(limiter.requests_per_minute, 60.0)
+
+
+class TestPrompterUsesSharedLimiter(unittest.TestCase):
+    """Verify llm_prompter consults the shared limiter on every call."""
+
+    @patch('src.llm_prompter.requests.post')
+    def test_post_chat_completion_acquires_and_settles(self, mock_post):
+        limiter = MagicMock()
+        mock_post.return_value.json.return_value = {"choices": [{"message": {"content": "ok"}}],
+                                                    "usage": {"total_tokens": 42}}
+        with patch('src.llm_prompter.get_shared_rate_limiter', return_value=limiter):
+            llm_prompter.post_chat_completion("x" * 40, "test/model", "key", "http://mock", "ref", 5, "001", max_tokens=100)
+
+        limiter.acquire.assert_called_once_with("key", "test/model", 110)
+        limiter.settle.assert_called_once_with("key", "test/model", 110, 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_rate_limiter.py ===
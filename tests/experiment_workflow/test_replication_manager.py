@@ -43,8 +43,10 @@ Test Strategy:
   "new run" and "reprocess" modes.
 """
 
+import io
+import json
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 import os
 import sys
 import shutil
@@ -194,6 +196,27 @@ class TestReplicationManager(unittest.TestCase):
         report_file = next(run_dir_actual.glob('replication_report_*.txt'))
         self.assertIn('Final Status:           COMPLETED', report_file.read_text())
 
+    def test_announce_stage2_prints_marker_before_stage3(self):
+        """Verify --announce_stage2 prints the marker after the LLM sessions and before response processing."""
+        class CapturedStdout(io.StringIO):
+            def reconfigure(self, **kwargs):
+                pass  # llm_prompter reconfigures stdout when first imported by a worker.
+        stdout = CapturedStdout()
+        marker_seen_at_stage3 = []
+
+        def side_effect(cmd, *args, **kwargs):
+            if 'process_llm_responses.py' in ' '.join(map(str, cmd)):
+                marker_seen_at_stage3.append(replication_manager.STAGE2_COMPLETE_MARKER in stdout.getvalue())
+            return self._mock_subprocess_side_effect(cmd, *args, **kwargs)
+        self.mock_subprocess.side_effect = side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir), '--announce_stage2']), \
+                patch('sys.stdout', stdout):
+            replication_manager.main()
+
+        self.assertEqual(marker_seen_at_stage3, [True])
+        self.assertEqual(stdout.getvalue().count(replication_manager.STAGE2_COMPLETE_MARKER), 1)
+
     @patch('replication_manager.ThreadPoolExecutor')
     def test_reprocess_path(self, mock_executor):
         """Test a successful run in reprocess mode."""
@@ -373,6 +396,21 @@ class TestSessionWorker(unittest.TestCase):
         self.assertFalse(success)
         self.assertIn("Orchestrator boom", log)
 
+    def test_format_attempt_timings(self):
+        """Verify per-attempt timings are rendered compactly for the timing log."""
+        attempts = [{"attempt": 1, "outcome": "HTTP 503", "duration": 4.021, "retry_delay": 1.372},
+                    {"attempt": 2, "outcome": "ok", "duration": 3.1, "retry_delay": None}]
+        self.assertEqual(replication_manager.format_attempt_timings(attempts), "1:HTTP 503:4.02s+wait1.37s;2:ok:3.10s")
+        self.assertEqual(replication_manager.format_attempt_timings(None), "")
+
+    def test_format_stream_timings(self):
+        """Verify streamed trials log their final attempt's timings and other trials log NA."""
+        attempts = [{"attempt": 1, "ttft": 9.0, "time_to_matrix": None},
+                    {"attempt": 2, "ttft": 0.412, "time_to_matrix": 3.256}]
+        self.assertEqual(replication_manager.format_stream_timings(attempts), ("0.41", "3.26"))
+        self.assertEqual(replication_manager.format_stream_timings([{"attempt": 1}]), ("NA", "NA"))
+        self.assertEqual(replication_manager.format_stream_timings(None), ("NA", "NA"))
+
 class TestReplicationManagerCoverage(TestReplicationManager):
     """Additional tests to increase coverage for replication_manager.py."""
 
@@ -522,6 +560,182 @@ class TestReplicationManagerCoverage(TestReplicationManager):
             was_called = any('api.log' in str(call.args[0]) and call.args[1] == 'w' for call in mock_file.call_args_list)
             self.assertFalse(was_called, "api.log should not have been opened in write mode")
 
+    @patch('llm_session_engine.AsyncSessionEngine')
+    def test_async_session_engine_replaces_worker_subprocesses(self, mock_engine_cls):
+        """Verify session_engine = async runs Stage 2 in-process instead of via llm_prompter.py."""
+        self.mock_config.set('LLM', 'session_engine', 'async')
+        mock_engine_cls.return_value.run.side_effect = lambda indices, limiter=None, on_report=None, hedger=None: iter([(i, True, None, 0.1) for i in indices])
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        # Only the 6 stage scripts run as subprocesses; no per-trial workers.
+        self.assertEqual(self.mock_subprocess.call_count, 6)
+        mock_engine_cls.return_value.run.assert_called_once_with([1, 2, 3], limiter=None, on_report=ANY, hedger=None)
+
+    @patch('llm_batch_engine.BatchSessionEngine')
+    def test_batch_session_engine_submits_trials_as_one_job(self, mock_engine_cls):
+        """Verify session_engine = batch hands all trials of the replication to the batch engine."""
+        self.mock_config.set('LLM', 'session_engine', 'batch')
+        mock_engine_cls.return_value.run.side_effect = lambda indices, limiter=None, on_report=None, hedger=None: iter([(i, True, None, 0.1) for i in indices])
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        self.assertEqual(self.mock_subprocess.call_count, 6)
+        mock_engine_cls.return_value.run.assert_called_once_with([1, 2, 3], limiter=None, on_report=ANY, hedger=None)
+
+    def test_adaptive_concurrency_routes_workers_through_limiter(self):
+        """Verify adaptive_concurrency runs every worker through the AIMD limiter and logs adjustments."""
+        self.mock_config.set('LLM', 'adaptive_concurrency', 'true')
+        self.mock_config.set('LLM', 'adaptive_max_parallel_sessions', '4')
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        # 6 stage scripts + 3 workers; two healthy calls at limit 2 raise it to 3.
+        self.assertEqual(self.mock_subprocess.call_count, 9)
+        run_dir = next(self.output_dir.iterdir())
+        log_lines = (run_dir / 'concurrency_adjustments.log').read_text().splitlines()
+        self.assertIn("\t2\t3\t", log_lines[1])
+
+    def test_request_hedging_passes_delay_to_workers_and_logs_summary(self):
+        """Verify hedge_requests hands workers a hedge delay once enough trials completed and logs a summary."""
+        self.mock_config.set('LLM', 'hedge_requests', 'true')
+        self.mock_config.set('LLM', 'hedge_min_samples', '1')
+        self.mock_config.set('LLM', 'hedge_max_fraction', '1.0')
+        self.mock_config.set('LLM', 'max_parallel_sessions', '1')
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        worker_cmds = [c.args[0] for c in self.mock_subprocess.call_args_list if 'llm_prompter.py' in str(c.args[0])]
+        self.assertEqual(len(worker_cmds), 3)
+        self.assertNotIn("--hedge_after_seconds", worker_cmds[0])
+        self.assertIn("--hedge_after_seconds", worker_cmds[1])
+        run_dir = next(self.output_dir.iterdir())
+        log_lines = (run_dir / 'api.log').read_text().splitlines()
+        self.assertIn("\tHedge\t", log_lines[0])
+        self.assertTrue(log_lines[-1].startswith("Hedge_Summary\tsent=0\twon=0\tcap=3"))
+
+    @patch('llm_response_cache.store_responses')
+    @patch('llm_response_cache.fill_from_cache', return_value=([1, 2], {3: 'key-3'}))
+    @patch('llm_response_cache.get_cache_from_config')
+    def test_response_cache_skips_cached_queries(self, mock_get_cache, mock_fill, mock_store):
+        """Verify cached temperature-0 queries are not sent to a worker and new responses are stored."""
+        self.mock_config.set('LLM', 'temperature', '0.0')
+        self.mock_config.read_dict({'Cache': {'enabled': 'true'}})
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        # 6 stage scripts + 1 worker for the single cache miss.
+        self.assertEqual(self.mock_subprocess.call_count, 7)
+        mock_store.assert_called_once_with(mock_get_cache.return_value, {3: 'key-3'}, ANY, [3])
+        run_dir = next(self.output_dir.iterdir())
+        self.assertIn("Cache_Summary\thits=2\tmisses=1", (run_dir / 'api.log').read_text())
+        records = [json.loads(line) for line in (run_dir / 'call_telemetry.jsonl').read_text().splitlines()]
+        self.assertEqual([(r["query_id"], r["source"]) for r in records], [("001", "cache"), ("002", "cache"), ("003", "api")])
+
+    def test_call_telemetry_records_every_trial(self):
+        """Verify one structured telemetry record is appended per trial."""
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        run_dir = next(self.output_dir.iterdir())
+        records = [json.loads(line) for line in (run_dir / 'call_telemetry.jsonl').read_text().splitlines()]
+        self.assertEqual(sorted(r["query_id"] for r in records), ["001", "002", "003"])
+        for record in records:
+            self.assertTrue(record["success"])
+            self.assertEqual(record["source"], "api")
+            self.assertIsNotNone(record["queue_wait_s"])
+
+    @patch('call_telemetry.read_usage', return_value={"prompt_tokens": 400, "completion_tokens": 50, "cached_tokens": 300})
+    def test_prompt_cache_summary_totals_cached_tokens(self, mock_read_usage):
+        """Verify cached prompt tokens reported in the usage blocks are summarized in the timing log."""
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            replication_manager.main()
+
+        run_dir = next(self.output_dir.iterdir())
+        self.assertIn("Prompt_Cache_Summary\tprompt_tokens=1200\tcached_tokens=900", (run_dir / 'api.log').read_text())
+
+    @patch('llm_session_engine.AsyncSessionEngine')
+    @patch('call_telemetry.read_usage', return_value={"prompt_tokens": 400, "completion_tokens": 50, "cached_tokens": None})
+    def test_budget_ceiling_stops_dispatching_new_trials(self, mock_read_usage, mock_engine_cls):
+        """Verify the engine is closed once the experiment's token ceiling is reached and the run halts."""
+        self.mock_config.set('LLM', 'session_engine', 'async')
+        self.mock_config.read_dict({'Budget': {'max_experiment_tokens': '800'}})
+        dispatched = []
+
+        def run(indices, limiter=None, on_report=None, hedger=None):
+            for i in indices:
+                dispatched.append(i)
+                yield i, True, None, 0.1
+        mock_engine_cls.return_value.run.side_effect = run
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            with self.assertRaises(SystemExit) as cm:
+                replication_manager.main()
+
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(dispatched, [1, 2])
+        commands = [call.args[0] for call in self.mock_subprocess.call_args_list]
+        self.assertFalse(any('process_llm_responses.py' in c[1] for c in commands))
+
+    def test_exhausted_budget_sends_no_trials(self):
+        """Verify a replication of an experiment that is already over budget makes no API calls."""
+        self.mock_config.read_dict({'Budget': {'max_experiment_tokens': '100'}})
+        earlier_run = self.output_dir / "run_earlier"
+        earlier_run.mkdir()
+        (earlier_run / "call_telemetry.jsonl").write_text(
+            json.dumps({"source": "api", "prompt_tokens": 90, "completion_tokens": 10}) + "\n")
+        self.mock_subprocess.side_effect = self._mock_subprocess_side_effect
+
+        with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(self.output_dir)]):
+            with self.assertRaises(SystemExit):
+                replication_manager.main()
+
+        commands = [call.args[0] for call in self.mock_subprocess.call_args_list]
+        self.assertFalse(any('llm_prompter.py' in c[1] for c in commands))
+
+    def test_shared_query_set_is_built_once_across_models(self):
+        """Verify two models' experiments with the same inputs share one query set built once."""
+        self.mock_config.read_dict({'QuerySets': {'enabled': 'true', 'registry_dir': 'output/query_sets', 'seed': '7'}})
+        data_dir = Path(self.project_root) / "data"
+        data_dir.mkdir()
+        (data_dir / "db.txt").write_text("people")
+        (data_dir / "base_query.txt").write_text("prompt")
+
+        def side_effect(command, **kwargs):
+            if 'build_llm_queries.py' in command[1]:
+                queries_dir = Path(command[command.index('--run_output_dir') + 1]) / "session_queries"
+                queries_dir.mkdir(parents=True)
+                for i in (1, 2, 3):
+                    (queries_dir / f"llm_query_{i:03d}.txt").write_text(f"query {i}")
+            return self._mock_subprocess_side_effect(command, **kwargs)
+        self.mock_subprocess.side_effect = side_effect
+
+        for model in ('test/model-a', 'test/model-b'):
+            self.mock_config.set('LLM', 'model_name', model)
+            experiment_dir = self.output_dir / model.split('/')[-1]
+            with patch.object(sys, 'argv', ['script.py', '--base_output_dir', str(experiment_dir), '--replication_num', '2']):
+                replication_manager.main()
+
+        build_commands = [call.args[0] for call in self.mock_subprocess.call_args_list if 'build_llm_queries.py' in call.args[0][1]]
+        self.assertEqual(len(build_commands), 1)
+        self.assertEqual(build_commands[0][build_commands[0].index('--base_seed') + 1], '10')
+        for model in ('model-a', 'model-b'):
+            run_dir = next((self.output_dir / model).iterdir())
+            self.assertEqual((run_dir / "session_queries" / "llm_query_003.txt").read_text(), "query 3")
+            self.assertTrue((run_dir / "query_set.json").exists())
+
     @patch('src.replication_manager.open')
     def test_final_report_update_io_error(self, mock_open_func):
         """Verify an IOError during final report update is logged."""
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_request_hedging.py
+
+"""
+Unit Tests for Request Hedging (request_hedging.py and llm_prompter.race_hedged).
+
+The policy tests drive `RequestHedger` directly. The race tests replace
+`requests.post` with fake responses whose bodies can be made slow, so the
+primary/hedge race is deterministic.
+"""
+
+import contextlib
+import time
+import unittest
+import threading
+import requests
+from unittest.mock import patch
+
+from src import llm_prompter
+from src.request_hedging import RequestHedger, format_hedge
+
+
+class FakeResponse:
+    """A response whose body arrives after `delay` seconds unless the connection is closed first."""
+
+    def __init__(self, delay=0.0, tokens=50):
+        self.delay = delay
+        self.tokens = tokens
+        self.closed = threading.Event()
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def content(self):
+        if self.closed.wait(self.delay):
+            raise requests.exceptions.ConnectionError("connection closed")
+        return b"{}"
+
+    def json(self):
+        return {"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": self.tokens}}
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeBudget:
+    """A call budget that counts the slots currently held."""
+
+    def __init__(self):
+        self.held = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self):
+        with self.lock:
+            self.held += 1
+            self.peak = max(self.peak, self.held)
+        try:
+            yield 0.0
+        finally:
+            with self.lock:
+                self.held -= 1
+
+
+class TestRequestHedger(unittest.TestCase):
+    """Test suite for the RequestHedger policy."""
+
+    def _complete(self, hedger, duration, report=None):
+        delay = hedger.hedge_delay()
+        hedger.record(delay, True, duration, report or {})
+        return delay
+
+    def test_no_hedging_before_min_samples(self):
+        """Verify no delay is granted until enough trials have completed."""
+        hedger = RequestHedger(total_trials=100, percentile=50, min_samples=3, max_fraction=1.0)
+        self.assertIsNone(self._complete(hedger, 1.0))
+        self.assertIsNone(self._complete(hedger, 3.0))
+        self.assertIsNone(self._complete(hedger, 2.0))
+        self.assertEqual(hedger.hedge_delay(), 2.0)
+
+    def test_delay_follows_percentile_of_completed_durations(self):
+        """Verify the nearest-rank percentile of completed durations is used."""
+        hedger = RequestHedger(total_trials=100, percentile=90, min_samples=1, max_fraction=1.0)
+        for duration in range(1, 11):
+            hedger.record(None, True, float(duration), {})
+        self.assertEqual(hedger.hedge_delay(), 9.0)
+
+    def test_reservations_enforce_the_cap(self):
+        """Verify concurrent trials cannot be granted more hedges than the cap."""
+        hedger = RequestHedger(total_trials=20, min_samples=1, max_fraction=0.1)
+        hedger.record(None, True, 1.0, {})
+        grants = [hedger.hedge_delay() for _ in range(5)]
+        self.assertEqual(sum(g is not None for g in grants), 2)
+
+        # A trial that did not hedge returns its reservation; one that did uses it up.
+        sent = {"attempts": [{"attempt": 1, "hedge": {"after": 1.0, "winner": "hedge", "extra_tokens": 40}}]}
+        hedger.record(grants[0], True, 1.0, {})
+        hedger.record(grants[1], True, 0.5, sent)
+        self.assertIsNotNone(hedger.hedge_delay())
+        self.assertIsNone(hedger.hedge_delay())
+        self.assertEqual((hedger.hedges_sent, hedger.hedges_won, hedger.extra_tokens), (1, 1, 40))
+        self.assertEqual(hedger.summary(), "Hedge_Summary\tsent=1\twon=1\tcap=2\textra_tokens=40")
+        self.assertEqual(format_hedge(sent), "after 1.00s, hedge won, +40 tokens")
+        self.assertEqual(format_hedge({}), "")
+
+    def test_wrap_passes_delay_and_records_result(self):
+        """Verify the wrapper hands the delay to the engine call and records its outcome."""
+        hedger = RequestHedger(total_trials=10, min_samples=1, max_fraction=1.0)
+        hedger.record(None, True, 4.0, {})
+        seen = []
+        wrapped = hedger.wrap(lambda index, report, hedge_after: seen.append(hedge_after) or (index, True, None, 2.0))
+        self.assertEqual(wrapped(1), (1, True, None, 2.0))
+        self.assertEqual(seen, [4.0])
+        self.assertEqual(hedger._reserved, 0)
+        self.assertEqual(hedger._durations, [2.0, 4.0])
+
+    def test_delay_uses_the_final_attempt_duration(self):
+        """Verify retries, waits, and startup in the trial duration do not inflate the delay."""
+        hedger = RequestHedger(total_trials=10, min_samples=1, max_fraction=1.0)
+        report = {"attempts": [{"attempt": 1, "duration": 30.0, "outcome": "HTTP 429", "retry_delay": 4.0},
+                               {"attempt": 2, "duration": 2.5, "outcome": "ok"}]}
+        hedger.record(None, True, 38.0, report)
+        self.assertEqual(hedger.hedge_delay(), 2.5)
+
+
+class TestHedgedCalls(unittest.TestCase):
+    """Test suite for the hedged race in the call layer."""
+
+    def setUp(self):
+        self.post_patcher = patch('src.llm_prompter.requests.post')
+        self.mock_post = self.post_patcher.start()
+
+    def tearDown(self):
+        self.post_patcher.stop()
+
+    def test_slow_primary_loses_to_hedge_and_is_cancelled(self):
+        """Verify a duplicate is sent after the delay, the first answer wins, and the loser is closed."""
+        primary, hedge = FakeResponse(delay=5.0), FakeResponse(delay=0.0, tokens=77)
+        self.mock_post.side_effect = [primary, hedge]
+        attempts = []
+        result = llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001",
+                                                   attempt_log=attempts, hedge_after=0.05)
+
+        self.assertEqual(result["usage"]["total_tokens"], 77)
+        self.assertEqual(self.mock_post.call_count, 2)
+        self.assertTrue(primary.closed.wait(1))
+        self.assertEqual(attempts[0]["hedge"], {"after": 0.05, "winner": "hedge", "extra_tokens": 77})
+
+    def test_fast_primary_sends_no_hedge(self):
+        """Verify a call that finishes before the delay is never duplicated."""
+        self.mock_post.side_effect = [FakeResponse(delay=0.0)]
+        attempts = []
+        llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001",
+                                          attempt_log=attempts, hedge_after=2.0)
+        self.assertEqual(self.mock_post.call_count, 1)
+        self.assertNotIn("hedge", attempts[0])
+
+    def test_failed_primary_waits_for_hedge(self):
+        """Verify the hedge's answer is used when the primary request fails after the hedge was sent."""
+        class SlowFailure(FakeResponse):
+            def raise_for_status(self):
+                threading.Event().wait(0.2)
+                raise requests.exceptions.HTTPError("502 Bad Gateway")
+
+        self.mock_post.side_effect = [SlowFailure(), FakeResponse(delay=0.3)]
+        attempts = []
+        result = llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001",
+                                                   attempt_log=attempts, hedge_after=0.05)
+        self.assertEqual(result["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(attempts[0]["hedge"]["winner"], "hedge")
+
+    def test_losing_request_keeps_its_budget_slot_until_it_ends(self):
+        """Verify a loser still waiting for its headers stays counted against the call budget."""
+        budget = FakeBudget()
+        primary_headers = threading.Event()
+        calls = []
+
+        def post(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                primary_headers.wait(5)
+                return FakeResponse()
+            return FakeResponse(tokens=77)
+
+        self.mock_post.side_effect = post
+        with patch('src.llm_prompter.get_call_budget', return_value=budget):
+            result = llm_prompter.post_chat_completion("q", "m", "k", "http://mock", "ref", 10, "001", hedge_after=0.05)
+        self.assertEqual(result["usage"]["total_tokens"], 77)
+        self.assertEqual(budget.peak, 2)
+        self.assertEqual(budget.held, 1)
+
+        primary_headers.set()
+        deadline = time.time() + 2
+        while budget.held and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(budget.held, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_request_hedging.py ===
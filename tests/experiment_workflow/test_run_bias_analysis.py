@@ -37,6 +37,7 @@ import numpy as np
 
 # Import the module to test
 from src import run_bias_analysis
+import score_store
 
 class TestRunBiasAnalysis(unittest.TestCase):
     """Test suite for run_bias_analysis.py."""
@@ -205,6 +206,22 @@ class TestRunBiasAnalysis(unittest.TestCase):
         self.assertEqual(len(df), 4) # 2x2 matrix = 4 rows in long format
 
 
+    def test_build_df_from_score_store_matches_text_files(self):
+        """Verify a current score store yields the same long-format DataFrame as the text files."""
+        self._create_happy_path_files()
+        (self.analysis_dir / "successful_indices.txt").write_text("1\n2\n")
+        text_df = run_bias_analysis.build_long_format_df(self.replication_dir, 2)
+
+        score_store.write_store(
+            str(self.analysis_dir), np.array([[[0.9, 0.1], [0.2, 0.8]], [[0.3, 0.7], [0.6, 0.4]]]),
+            np.array([[1, 2], [1, 2]]), [1, 2],
+            [str(self.analysis_dir / name) for name in ("all_scores.txt", "all_mappings.txt", "successful_indices.txt")], 1)
+        with patch.object(run_bias_analysis, '_read_text_inputs') as mock_read_text:
+            store_df = run_bias_analysis.build_long_format_df(self.replication_dir, 2)
+
+        mock_read_text.assert_not_called()
+        pd.testing.assert_frame_equal(store_df, text_df)
+
 if __name__ == '__main__':
     unittest.main()
 
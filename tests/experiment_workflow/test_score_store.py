@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_score_store.py
+
+"""
+Unit Tests for the Binary Score Store (score_store.py).
+
+The store must reproduce exactly the values a reader parses from the text
+files, pick float32 only when that is lossless, and be ignored once the text
+files it mirrors change.
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src import score_store
+
+SOURCE_NAMES = ("all_scores.txt", "all_mappings.txt", "successful_indices.txt")
+
+
+class TestScoreStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.analysis_dir = self.test_dir.name
+        self.sources = [os.path.join(self.analysis_dir, name) for name in SOURCE_NAMES]
+        for source in self.sources:
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write("placeholder\n")
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def write(self, scores, decimals):
+        scores = np.asarray(scores, dtype=float)
+        mappings = np.tile(np.arange(1, scores.shape[1] + 1), (len(scores), 1))
+        indices = list(range(1, len(scores) + 1))
+        self.assertTrue(score_store.write_store(self.analysis_dir, scores, mappings, indices, self.sources, decimals))
+        with np.load(score_store.store_path(self.analysis_dir)) as data:
+            return data["scores"].dtype, data["mappings"].dtype
+
+    def test_fixed_point_scores_are_float32_and_reload_exactly(self):
+        """Verify `.2f` scores are stored as float32 and reloaded as the float64 values of their text."""
+        rng = np.random.default_rng(7)
+        text_values = np.array([float(f"{x:.2f}") for x in rng.random(5 * 4 * 4)]).reshape(5, 4, 4)
+
+        scores_dtype, mappings_dtype = self.write(text_values, score_store.fixed_point_decimals(".2f"))
+        store = score_store.load_store(self.analysis_dir)
+
+        self.assertEqual((scores_dtype, mappings_dtype), (np.float32, np.int8))
+        self.assertEqual(store.scores.dtype, np.float64)
+        np.testing.assert_array_equal(store.scores, text_values)
+        self.assertEqual(store.k, 4)
+        self.assertEqual(store.indices.tolist(), [1, 2, 3, 4, 5])
+
+    def test_values_float32_cannot_restore_stay_float64(self):
+        """Verify a non-fixed-point format, or too many decimals for float32, keeps float64."""
+        scores = [[[0.123456789, 0.5], [0.25, 0.987654321]]]
+        self.assertIsNone(score_store.fixed_point_decimals(".6g"))
+        self.assertEqual(self.write(scores, None)[0], np.float64)
+        self.assertEqual(self.write(scores, 9)[0], np.float64)
+        np.testing.assert_array_equal(score_store.load_store(self.analysis_dir).scores, np.array(scores))
+
+    def test_store_is_ignored_after_a_text_file_changes(self):
+        """Verify rewriting any mirrored text file makes the store stale."""
+        self.write([[[1.0]]], 2)
+        self.assertIsNotNone(score_store.load_store(self.analysis_dir))
+
+        with open(self.sources[1], 'a', encoding='utf-8') as f:
+            f.write("1\n")
+        self.assertIsNone(score_store.load_store(self.analysis_dir))
+
+    def test_missing_unreadable_and_removed_stores_return_none(self):
+        """Verify readers get None rather than an error for absent or corrupt stores."""
+        self.assertIsNone(score_store.load_store(self.analysis_dir))
+        with open(score_store.store_path(self.analysis_dir), 'wb') as f:
+            f.write(b"not an archive")
+        self.assertIsNone(score_store.load_store(self.analysis_dir))
+        score_store.remove_store(self.analysis_dir)
+        score_store.remove_store(self.analysis_dir)
+        self.assertFalse(os.path.exists(score_store.store_path(self.analysis_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_score_store.py ===
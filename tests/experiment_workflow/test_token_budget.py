@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+#
+# A Framework for Testing Complex Narrative Systems
+# Copyright (C) 2025 Peter J. Marko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Filename: tests/experiment_workflow/test_token_budget.py
+
+"""
+Unit Tests for the Pre-Flight Estimator and Budget Guard (token_budget.py).
+
+Fake experiment directories with queries, `_full.json` responses, and
+telemetry files are built in a temporary directory.
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from src.call_telemetry import CallTelemetryWriter
+from src.token_budget import (TokenBudgetGuard, estimate_budget, find_query_files, get_tokenizer,
+                              load_completion_history, main)
+
+
+class TestTokenBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.experiment_dir = os.path.join(self.temp_dir.name, "experiment")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_run(self, name, queries, answered=(), completion_tokens=50, model="test/model", telemetry=()):
+        run_dir = os.path.join(self.experiment_dir, name)
+        os.makedirs(os.path.join(run_dir, "session_queries"))
+        os.makedirs(os.path.join(run_dir, "session_responses"))
+        for i, text in enumerate(queries, start=1):
+            with open(os.path.join(run_dir, "session_queries", f"llm_query_{i:03d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+        for i in answered:
+            with open(os.path.join(run_dir, "session_responses", f"llm_response_{i:03d}_full.json"), 'w', encoding='utf-8') as f:
+                json.dump({"model": model, "usage": {"prompt_tokens": 10, "completion_tokens": completion_tokens}}, f)
+        writer = CallTelemetryWriter(os.path.join(run_dir, "call_telemetry.jsonl"))
+        for record in telemetry:
+            writer.append(record)
+        return run_dir
+
+    def test_tokenizers(self):
+        """Verify the built-in approximations and the fallback for an unknown name."""
+        self.assertEqual(get_tokenizer("chars", 4)("x" * 10), 3)
+        self.assertEqual(get_tokenizer("words")("one two three"), 4)
+        with self.assertRaises(ValueError):
+            get_tokenizer("bogus")
+
+    def test_pending_queries_and_completion_history(self):
+        """Verify answered queries are skipped and completion lengths are grouped by model."""
+        self._make_run("run_1", ["a", "b", "c"], answered=[1, 3], completion_tokens=80)
+        pending = find_query_files(self.experiment_dir)
+        self.assertEqual([os.path.basename(p) for p in pending], ["llm_query_002.txt"])
+        self.assertEqual(len(find_query_files(self.experiment_dir, pending_only=False)), 3)
+        self.assertEqual(load_completion_history(self.experiment_dir), {"test/model": [80, 80]})
+
+    def test_estimate_projects_tokens_cost_and_wall_time(self):
+        """Verify tokens, cost, and wall time, including unbuilt trials and a rate-limit floor."""
+        estimate = estimate_budget([100, 300], [40, 60], [2.0, 4.0, 3.0], max_tokens=1000, concurrency=2,
+                                   input_cost_per_million=1.0, output_cost_per_million=2.0, extra_trials=2)
+        self.assertEqual(estimate["trials"], 4)
+        self.assertEqual(estimate["prompt_tokens"], 800)
+        self.assertEqual(estimate["completion_tokens"], 200)
+        self.assertAlmostEqual(estimate["cost"], (800 * 1.0 + 200 * 2.0) / 1e6)
+        self.assertEqual(estimate["wall_seconds"], 6.0)
+
+        no_history = estimate_budget([100], [], [], max_tokens=1000, concurrency=1, requests_per_minute=0.5)
+        self.assertEqual(no_history["completion_tokens"], 1000)
+        self.assertEqual(no_history["wall_seconds"], 120.0)
+
+    def test_guard_counts_every_run_of_the_experiment(self):
+        """Verify the guard sums sibling runs and its own calls, and ignores cache hits."""
+        record = {"source": "api", "prompt_tokens": 100, "completion_tokens": 50}
+        self._make_run("run_1", [], telemetry=[record, dict(record, source="cache")])
+        own = self._make_run("run_2", [], telemetry=[record])
+        guard = TokenBudgetGuard(self.experiment_dir, os.path.join(own, "call_telemetry.jsonl"), max_tokens=400)
+        self.assertEqual(guard.usage()["total_tokens"], 300)
+        self.assertIsNone(guard.exhausted())
+        guard.add(record)
+        self.assertIn("token ceiling reached", guard.exhausted())
+
+        cost_guard = TokenBudgetGuard(self.experiment_dir, os.path.join(own, "call_telemetry.jsonl"), max_cost=0.5,
+                                      input_cost_per_million=1000.0, output_cost_per_million=2000.0)
+        self.assertEqual(cost_guard.usage()["cost"], 0.4)
+        self.assertIsNone(cost_guard.exhausted())
+
+    def test_estimate_command(self):
+        """Verify the CLI prints a JSON estimate of the pending queries."""
+        self._make_run("run_1", ["x" * 400, "y" * 400], answered=[1], completion_tokens=70,
+                       telemetry=[{"source": "api", "success": True, "model": "test/model", "latency_s": 5.0}])
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = main(["estimate", self.experiment_dir, "--history", self.experiment_dir,
+                              "--concurrency", "1", "--tokenizer", "chars", "--json"])
+        self.assertEqual(exit_code, 0)
+        estimate = json.loads(output.getvalue())
+        self.assertEqual(estimate["trials"], 1)
+        self.assertEqual(estimate["prompt_tokens"], 100)
+        self.assertEqual(estimate["completion_tokens"], 70)
+        self.assertEqual(estimate["wall_seconds"], 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# === End of tests/experiment_workflow/test_token_budget.py ===